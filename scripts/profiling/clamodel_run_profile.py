@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+## run python $NUPIC/scripts/profiling/clamodel_run_profile.py [nRecords]
+
+"""
+Reports the latency and the number of objects allocated per record by each
+phase of CLAModel.run(), for the hotgym anomaly model. Run it on two
+revisions to compare their per-record allocations.
+"""
+
+import datetime
+import imp
+import math
+import os
+import sys
+
+from nupic.frameworks.opf.modelfactory import ModelFactory
+
+MODEL_PARAMS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                 os.pardir, os.pardir, "examples", "opf",
+                                 "clients", "hotgym", "anomaly",
+                                 "model_params.py")
+
+
+
+def profileRun(nRecords):
+  """
+  Runs the model on nRecords records and prints the statistics of each phase
+  of run().
+
+  @param nRecords number of records
+  """
+  modelParams = imp.load_source("model_params", MODEL_PARAMS_PATH)
+  model = ModelFactory.create(modelParams.MODEL_PARAMS)
+  model.enableInference({"predictedField": "consumption"})
+  model.enableRuntimeStats()
+
+  start = datetime.datetime(2016, 1, 1)
+  for i in xrange(nRecords):
+    # A record without the private keys, as given by most OPF clients
+    model.run({"timestamp": start + datetime.timedelta(hours=i),
+               "consumption": 20.0 + 10.0 * math.sin(i * math.pi / 12)})
+
+  runtimeStats = model.getRuntimeStats()["runtime"]
+  print "%-20s %12s %12s" % ("phase", "allocs/rec", "mean (ms)")
+  for name, phaseStats in sorted(runtimeStats.iteritems()):
+    print "%-20s %12.1f %12.3f" % (
+      name, float(phaseStats["allocations"]) / phaseStats["count"],
+      phaseStats["meanTime"] * 1000)
+
+
+
+if __name__ == "__main__":
+  records = 2000
+  # read command line params
+  if len(sys.argv) == 2:
+    records = int(sys.argv[1])
+
+  profileRun(records)
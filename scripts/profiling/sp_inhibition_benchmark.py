@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+## run python $NUPIC/scripts/profiling/sp_inhibition_benchmark.py [nEpochs]
+
+"""
+Compares the partial-selection global inhibition of the python SpatialPooler
+against the full python sort it replaced, at several column counts.
+"""
+
+import sys
+import timeit
+
+import numpy
+
+from nupic.research.spatial_pooler import SpatialPooler
+
+
+
+def sortedInhibition(overlaps, numActive):
+  """
+  The original implementation of SpatialPooler._inhibitColumnsGlobal, kept as
+  a reference for speed and output comparison.
+  """
+  return sorted(range(overlaps.size),
+                key=lambda k: overlaps[k],
+                reverse=True)[0:numActive]
+
+
+
+def benchmarkInhibition(numColumns, nRuns):
+  """
+  Times both global inhibition implementations on the same random overlaps
+  and checks that they pick the same winners in the same order.
+
+  @param numColumns number of columns in the SP (1D)
+  @param nRuns number of inhibition rounds to time
+  """
+  sp = SpatialPooler(inputDimensions=[32],
+                     columnDimensions=[numColumns],
+                     potentialRadius=16,
+                     globalInhibition=True,
+                     numActiveColumnsPerInhArea=int(0.02 * numColumns),
+                     seed=42)
+  density = float(sp.getNumActiveColumnsPerInhArea()) / numColumns
+  numActive = int(density * numColumns)
+
+  # integer overlaps plus the SP tie breaker, as seen by _inhibitColumns
+  overlaps = (numpy.random.randint(0, 20, numColumns) +
+              sp._tieBreaker).astype("float32")
+
+  assert (sp._inhibitColumnsGlobal(overlaps, density) ==
+          sortedInhibition(overlaps, numActive))
+
+  sortTime = timeit.timeit(lambda: sortedInhibition(overlaps, numActive),
+                           number=nRuns) / nRuns
+  selectTime = timeit.timeit(lambda: sp._inhibitColumnsGlobal(overlaps,
+                                                              density),
+                             number=nRuns) / nRuns
+
+  print "%6d columns: sorted %9.3f ms  partial %9.3f ms  speedup %6.1fx" % (
+    numColumns, sortTime * 1000, selectTime * 1000, sortTime / selectTime)
+
+
+
+if __name__ == "__main__":
+  epochs=20
+  if len(sys.argv) == 2: # 1 arg + name
+    epochs=int(sys.argv[1])
+
+  for columns in (2048, 16384, 65536):
+    benchmarkInhibition(columns, epochs)
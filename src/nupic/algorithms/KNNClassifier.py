@@ -24,13 +24,19 @@
 
 import numpy
 
-from nupic.bindings.math import (NearestNeighbor, min_score_per_category)
+from nupic.algorithms.knn_index import InvertedIndex, MinHashIndex
+from nupic.bindings.math import (GetNTAReal, NearestNeighbor,
+                                 min_score_per_category)
 
 
 
 g_debugPrefix = "KNN"
 KNNCLASSIFIER_VERSION = 1
 
+# Distance methods computed from overlaps, which can use a prototype index
+_OVERLAP_DISTANCE_METHODS = ("rawOverlap", "pctOverlapOfLarger",
+                             "pctOverlapOfProto")
+
 
 
 def _labeledInput(activeInputs, cellsPerCol=32):
@@ -82,7 +88,10 @@ class KNNClassifier(object):
                      verbosity=0,
                      maxStoredPatterns=-1,
                      replaceDuplicates=False,
-                     cellsPerCol=0):
+                     cellsPerCol=0,
+                     indexType=None,
+                     lshNumBands=20,
+                     lshBandSize=4):
     """Constructor for the kNN classifier.
 
     @param k (int) The number of nearest neighbors used in the classification of
@@ -160,6 +169,23 @@ class KNNClassifier(object):
         columns, in the same manner as the temporal pooler AND whenever a new
         prototype is stored, only the start cell (first cell) is stored in any
         bursting column
+
+    @param indexType (string) Index used to find the prototypes overlapping
+        an input without computing the distance to every stored prototype.
+        Only used with sparse memory and the overlap distance methods,
+        otherwise all distances are computed. The possible options are:
+        None: No index, distances to all prototypes are computed
+        "inverted": Exact inverted index from input bits to prototypes
+        "lsh": Approximate MinHash locality-sensitive hashing index.
+                Prototypes it misses are treated as not overlapping the
+                input. If it finds fewer than k candidates, all distances are
+                computed instead
+
+    @param lshNumBands (int) If indexType is "lsh", the number of bands of the
+        MinHash signatures. More bands find more candidates
+
+    @param lshBandSize (int) If indexType is "lsh", the number of hashes per
+        band. Larger bands find fewer, more similar, candidates
     """
     self.version = KNNCLASSIFIER_VERSION
 
@@ -187,6 +213,10 @@ class KNNClassifier(object):
     self.replaceDuplicates = replaceDuplicates
     self.cellsPerCol = cellsPerCol
     self.maxStoredPatterns = maxStoredPatterns
+    assert indexType in (None, "inverted", "lsh")
+    self.indexType = indexType
+    self.lshNumBands = lshNumBands
+    self.lshBandSize = lshBandSize
     self.clear()
 
 
@@ -213,6 +243,13 @@ class KNNClassifier(object):
     # Cached value of the store prototype sizes
     self._protoSizes = None
 
+    # Index over the stored prototypes
+    self._index = None
+    if self.useSparseMemory and self.indexType == "inverted":
+      self._index = InvertedIndex()
+    elif self.useSparseMemory and self.indexType == "lsh":
+      self._index = MinHashIndex(self.lshNumBands, self.lshBandSize)
+
     # Used by PCA
     self._s = None
     self._vt = None
@@ -316,6 +353,8 @@ class KNNClassifier(object):
       # Delete backwards
       for rowIndex in rowsToRemove[::-1]:
         self._Memory.deleteRow(rowIndex)
+        if self._index is not None:
+          self._index.deleteRow(rowIndex)
     else:
       self._M = numpy.delete(self._M, removalArray, 0)
 
@@ -517,8 +556,12 @@ class KNNClassifier(object):
         self._protoSizes = None     # need to re-compute
         if isSparse == 0:
           self._Memory.addRow(thresholdedInput)
+          if self._index is not None:
+            self._index.addRow(thresholdedInput.nonzero()[0])
         else:
           self._Memory.addRowNZ(inputPattern, [1]*len(inputPattern))
+          if self._index is not None:
+            self._index.addRow(inputPattern)
         self._numPatterns += 1
         self._categoryList.append(int(inputCategory))
         if partitionId is not None:
@@ -529,6 +572,8 @@ class KNNClassifier(object):
             self.maxStoredPatterns > 0:
             leastRecentlyUsedPattern = numpy.argmin(self._categoryRecencyList)
             self._Memory.deleteRow(leastRecentlyUsedPattern)
+            if self._index is not None:
+              self._index.deleteRow(leastRecentlyUsedPattern)
             self._categoryList.pop(leastRecentlyUsedPattern)
             self._categoryRecencyList.pop(leastRecentlyUsedPattern)
             self._numPatterns -= 1
@@ -555,7 +600,7 @@ class KNNClassifier(object):
     """
     assert self.useSparseMemory, "Not implemented yet for dense storage"
 
-    overlaps = self._Memory.rightVecSumAtNZ(inputPattern)
+    overlaps = self._calcOverlaps(inputPattern)
     return (overlaps, self._categoryList)
 
 
@@ -783,7 +828,7 @@ class KNNClassifier(object):
       if self.distanceMethod == "pctOvlerapOfLarger":
         if self._protoSizes is None:
           self._protoSizes = self._Memory.rowSums()
-        dist =  self._Memory.rightVecSumAtNZ(inputPattern)
+        dist =  self._calcOverlaps(inputPattern)
         maxVal = numpy.maximum(self._protoSizes, inputPattern.sum())
         if maxVal > 0:
           dist /= maxVal
@@ -792,13 +837,13 @@ class KNNClassifier(object):
         if self._protoSizes is None:
           self._protoSizes = self._Memory.rowSums()
         inputPatternSum = inputPattern.sum()
-        dist = (inputPatternSum - self._Memory.rightVecSumAtNZ(inputPattern))
+        dist = (inputPatternSum - self._calcOverlaps(inputPattern))
         if inputPatternSum > 0:
           dist /= inputPatternSum
       elif self.distanceMethod == "pctOverlapOfProto":
         if self._protoSizes is None:
           self._protoSizes = self._Memory.rowSums()
-        dist =  self._Memory.rightVecSumAtNZ(inputPattern)
+        dist =  self._calcOverlaps(inputPattern)
         dist /= self._protoSizes
         dist = 1.0 - dist
       elif self.distanceMethod == "norm":
@@ -823,6 +868,29 @@ class KNNClassifier(object):
     return dist
 
 
+  def _calcOverlaps(self, inputPattern):
+    """Calculate the overlaps between inputPattern and all stored patterns,
+    using the prototype index if there is one. The overlap with a prototype is
+    the sum of the input values at the non-zero elements of the prototype.
+
+    @param inputPattern The pattern from which overlaps to all other patterns
+        are calculated
+    """
+    if self._index is None:
+      return self._Memory.rightVecSumAtNZ(inputPattern)
+
+    rows, candidateOverlaps = self._index.candidateOverlaps(inputPattern)
+
+    # Approximate indexes fall back to the exact overlaps when they do not
+    # find enough neighbors
+    if not self._index.exact and len(rows) < self.k:
+      return self._Memory.rightVecSumAtNZ(inputPattern)
+
+    overlaps = numpy.zeros(self._numPatterns, dtype=GetNTAReal())
+    overlaps[rows] = candidateOverlaps
+    return overlaps
+
+
   def _getDistances(self, inputPattern, partitionId=None):
     """Return the distances from inputPattern to all stored patterns.
 
@@ -945,6 +1013,7 @@ class KNNClassifier(object):
     self._Memory = numpy.zeros((self._numPatterns,self.numSVDDims))
     self._M = self._Memory
     self.useSparseMemory = False
+    self._index = None
 
     for i in range(self._numPatterns):
       self._Memory[i] = numpy.dot(self._vt, self._a[i])
@@ -1096,6 +1165,13 @@ class KNNClassifier(object):
       raise RuntimeError("Invalid deserialization of invalid KNNClassifier"
           "Verison")
 
+    # Classifiers saved before prototype indexes were added
+    if "indexType" not in state:
+      state["indexType"] = None
+      state["lshNumBands"] = 20
+      state["lshBandSize"] = 4
+      state["_index"] = None
+
     self.__dict__.update(state)
 
     # Set to new version
@@ -50,6 +50,11 @@ while still_have_data:
   anomalyProbability = anomalyLikelihood.anomalyProbability(
       value, anomalyScore, timestamp)
 
+StreamingAnomalyLikelihood has the same interface but keeps a fixed amount of
+state and updates its estimate in O(1) per record, which makes it better suited
+to running one instance per metric for a large number of metrics. Its
+anomalyProbabilities method evaluates a whole array of records at once.
+
 
 Raw functions
 -------------
@@ -66,6 +71,12 @@ import numpy
 from nupic.utils import MovingAverage
 
 
+# Thresholds used when filtering likelihoods (see _filterLikelihoods)
+_RED_THRESHOLD = 1.0 - 0.99999
+_YELLOW_THRESHOLD = 1.0 - 0.999
+
+
+
 class AnomalyLikelihood(object):
   """
   Helper class for running anomaly likelihood computation.
@@ -220,6 +231,434 @@ class AnomalyLikelihood(object):
     return likelihood
 
 
+class StreamingAnomalyLikelihood(object):
+  """
+  Memory-bounded, incremental variant of AnomalyLikelihood.
+
+  Instead of keeping the raw historical records and periodically re-running
+  estimateAnomalyLikelihoods over them, this class keeps the averaged anomaly
+  scores and metric values of the historical window in fixed-size circular
+  numpy buffers together with their running sums and sums of squares. The
+  mean and variance of the window are therefore updated in O(1) per record
+  and the distribution is effectively re-estimated on every record.
+
+  The estimate follows the same rules as AnomalyLikelihood: the records of the
+  CLA learning period are not used, likelihoods are reported at a flat 0.5
+  during the probationary period, the lower bounds of estimateNormal are
+  applied, flat metrics get the null distribution and the likelihoods are
+  filtered like _filterLikelihoods does. Unlike estimateAnomalyLikelihoods,
+  the moving average of the anomaly scores is not restarted at the start of
+  the historical window, so the results are close to, but not identical to,
+  those of AnomalyLikelihood.
+
+  Use anomalyProbabilities to evaluate a whole array of records at once; it
+  gives the same results as calling anomalyProbability for every record.
+  """
+
+  # Metric variance below which the null distribution is used (see
+  # estimateAnomalyLikelihoods)
+  FLAT_METRIC_VARIANCE = 1.5e-5
+
+
+  def __init__(self,
+               claLearningPeriod=288,
+               estimationSamples=100,
+               historicWindowSize=8640,
+               averagingWindow=10):
+    """
+    NOTE: Anomaly likelihood scores are reported at a flat 0.5 for
+    claLearningPeriod + estimationSamples iterations.
+
+    @param claLearningPeriod - (int) the number of iterations required for the
+      CLA to learn the basic patterns in the dataset and for the anomaly score
+      to 'settle down'. See AnomalyLikelihood.
+
+    @param estimationSamples - (int) the number of reasonable anomaly scores
+      required for the initial estimate of the Gaussian.
+
+    @param historicWindowSize - (int) size of sliding window of historical
+      data points used to estimate the Gaussian. This fixes the memory used by
+      the instance.
+
+    @param averagingWindow - (int) number of anomaly scores to average over
+      before estimating their likelihood.
+    """
+    if historicWindowSize < estimationSamples:
+      raise ValueError("estimationSamples exceeds historicWindowSize")
+
+    self._iteration = 0
+    self._probationaryPeriod = claLearningPeriod + estimationSamples
+    self._claLearningPeriod = claLearningPeriod
+    self._historicWindowSize = historicWindowSize
+    self._averagingWindow = averagingWindow
+
+    # Last averagingWindow anomaly scores and their total
+    self._recentScores = numpy.zeros(averagingWindow, dtype="float64")
+    self._recentScoresTotal = 0.0
+
+    # Averaged scores and metric values of the historical window, written at
+    # _nextSample
+    self._averagedScores = numpy.zeros(historicWindowSize, dtype="float64")
+    self._metricValues = numpy.zeros(historicWindowSize, dtype="float64")
+    self._numSamples = 0
+    self._nextSample = 0
+
+    # Running sums over the historical window. They are taken relative to a
+    # shift, close to the mean of the window, to avoid cancellation errors in
+    # the variances. The sums are recomputed exactly every time the buffers
+    # wrap around so rounding errors do not accumulate.
+    self._scoreShift = 0.0
+    self._valueShift = 0.0
+    self._scoreSum = 0.0
+    self._scoreSumSquares = 0.0
+    self._valueSum = 0.0
+    self._valueSumSquares = 0.0
+
+    # Unfiltered likelihood of the previous record, used for filtering
+    self._previousLikelihood = None
+
+
+  def anomalyProbability(self, value, anomalyScore, timestamp=None):
+    """
+    Compute the probability that the current value plus anomaly score represents
+    an anomaly given the historical distribution of anomaly scores. The closer
+    the number is to 1, the higher the chance it is an anomaly.
+
+    @param value - the current metric ("raw") input value, eg. 21.2
+                   (deg. Celsius). Must be numeric.
+    @param anomalyScore - the current anomaly score
+    @param timestamp - (optional) timestamp of the ocurrence. Unused, accepted
+                       for compatibility with AnomalyLikelihood.
+    @return theanomalyLikelihood for this record.
+    """
+    value = float(value)
+    averagedScore = self._updateMovingAverage(float(anomalyScore))
+
+    # We ignore the first probationaryPeriod data points
+    if self._iteration < self._probationaryPeriod:
+      likelihood = 0.5
+    else:
+      rawLikelihood = normalProbability(averagedScore, self._distribution())
+
+      if (rawLikelihood <= _RED_THRESHOLD and
+          self._previousLikelihood is not None and
+          self._previousLikelihood <= _RED_THRESHOLD):
+        filteredLikelihood = _YELLOW_THRESHOLD
+      else:
+        filteredLikelihood = rawLikelihood
+      self._previousLikelihood = rawLikelihood
+
+      likelihood = 1.0 - filteredLikelihood
+
+    # Records of the CLA learning period are not used for estimation
+    if self._iteration >= self._claLearningPeriod:
+      self._addSample(averagedScore, value)
+
+    self._iteration += 1
+
+    return likelihood
+
+
+  def anomalyProbabilities(self, values, anomalyScores):
+    """
+    Compute the anomaly likelihoods of a sequence of records at once. This is
+    equivalent to calling anomalyProbability for every record in order, but
+    the moving averages, window statistics and likelihoods are computed with
+    array operations.
+
+    @param values - (list or numpy.ndarray) metric values of the records
+    @param anomalyScores - (list or numpy.ndarray) anomaly scores of the
+                           records
+    @return (numpy.ndarray) the anomaly likelihood of every record.
+    """
+    values = numpy.asarray(values, dtype="float64")
+    anomalyScores = numpy.asarray(anomalyScores, dtype="float64")
+    if values.shape != anomalyScores.shape or values.ndim != 1:
+      raise ValueError("values and anomalyScores must be 1D arrays of the same "
+                       "length")
+
+    likelihoods = numpy.empty(len(values), dtype="float64")
+    averagedScores = self._updateMovingAverages(anomalyScores)
+
+    # Process the records in chunks that end where the sample buffers wrap
+    # around, so the running sums are recomputed at the same records as
+    # anomalyProbability would
+    firstIteration = self._iteration
+    start = 0
+    while start < len(values):
+      firstSample = max(start, self._claLearningPeriod - firstIteration)
+      if firstSample >= len(values):
+        end = len(values)
+      else:
+        end = min(len(values),
+                  firstSample + self._historicWindowSize - self._nextSample)
+
+      likelihoods[start:end] = self._evaluateChunk(averagedScores[start:end],
+                                                   values[start:end])
+      start = end
+
+    return likelihoods
+
+
+  def _updateMovingAverage(self, anomalyScore):
+    """
+    Adds an anomaly score to the moving average window.
+
+    @param anomalyScore (float) new anomaly score
+    @return (float) the moving average including the new score.
+    """
+    position = self._iteration % self._averagingWindow
+    total = self._recentScoresTotal
+    if self._iteration >= self._averagingWindow:
+      total -= self._recentScores[position]
+    total += anomalyScore
+
+    self._recentScores[position] = anomalyScore
+    self._recentScoresTotal = total
+    return total / min(self._iteration + 1, self._averagingWindow)
+
+
+  def _updateMovingAverages(self, anomalyScores):
+    """
+    Vectorized version of _updateMovingAverage for records starting at the
+    current iteration. Does not advance the iteration.
+
+    @param anomalyScores (numpy.ndarray) new anomaly scores
+    @return (numpy.ndarray) the moving average at every new score.
+    """
+    numScores = len(anomalyScores)
+    if numScores == 0:
+      return numpy.empty(0, dtype="float64")
+
+    window = self._averagingWindow
+    iterations = self._iteration + numpy.arange(numScores)
+    positions = iterations % window
+
+    # The scores leaving the window, taken from the buffer for the first
+    # window of records
+    removedScores = numpy.empty(numScores, dtype="float64")
+    numFromBuffer = min(numScores, window)
+    removedScores[:numFromBuffer] = self._recentScores[positions[:numFromBuffer]]
+    removedScores[numFromBuffer:] = anomalyScores[:numScores - numFromBuffer]
+    removedScores[iterations < window] = 0.0
+
+    # Interleaving the updates lets cumsum accumulate the totals in the same
+    # order as _updateMovingAverage
+    totals = _accumulate(self._recentScoresTotal, -removedScores,
+                         anomalyScores)
+
+    self._recentScores[positions[-numFromBuffer:]] = (
+      anomalyScores[-numFromBuffer:])
+    self._recentScoresTotal = totals[-1]
+    return totals[1:] / numpy.minimum(iterations + 1, window)
+
+
+  def _distribution(self):
+    """
+    Returns the distribution of the averaged anomaly scores in the historical
+    window, in the format of estimateNormal.
+    """
+    numSamples = self._numSamples
+    if numSamples == 0:
+      return nullDistribution()
+
+    valueMean = self._valueSum / numSamples
+    valueVariance = self._valueSumSquares / numSamples - valueMean * valueMean
+    if valueVariance < self.FLAT_METRIC_VARIANCE:
+      return nullDistribution()
+
+    scoreMean = self._scoreSum / numSamples
+    variance = self._scoreSumSquares / numSamples - scoreMean * scoreMean
+    mean = scoreMean + self._scoreShift
+
+    # Same lower bounds as estimateNormal
+    if mean < 0.03:
+      mean = 0.03
+    if variance < 0.0003:
+      variance = 0.0003
+
+    return {
+      "name": "normal",
+      "mean": mean,
+      "variance": variance,
+      "stdev": math.sqrt(variance),
+    }
+
+
+  def _addSample(self, averagedScore, value):
+    """
+    Adds an averaged score and metric value to the historical window, evicting
+    the oldest ones once the window is full.
+    """
+    if self._numSamples == 0:
+      self._scoreShift = averagedScore
+      self._valueShift = value
+
+    position = self._nextSample
+    if self._numSamples == self._historicWindowSize:
+      oldScore = self._averagedScores[position] - self._scoreShift
+      oldValue = self._metricValues[position] - self._valueShift
+      self._scoreSum -= oldScore
+      self._scoreSumSquares -= oldScore * oldScore
+      self._valueSum -= oldValue
+      self._valueSumSquares -= oldValue * oldValue
+    else:
+      self._numSamples += 1
+
+    newScore = averagedScore - self._scoreShift
+    newValue = value - self._valueShift
+    self._scoreSum += newScore
+    self._scoreSumSquares += newScore * newScore
+    self._valueSum += newValue
+    self._valueSumSquares += newValue * newValue
+
+    self._averagedScores[position] = averagedScore
+    self._metricValues[position] = value
+    self._nextSample = (position + 1) % self._historicWindowSize
+    if self._nextSample == 0:
+      self._resetRunningSums()
+
+
+  def _resetRunningSums(self):
+    """
+    Recomputes the running sums from the (full) historical window, relative to
+    the mean of the window.
+    """
+    self._scoreShift = self._averagedScores.mean()
+    self._valueShift = self._metricValues.mean()
+
+    scores = self._averagedScores - self._scoreShift
+    values = self._metricValues - self._valueShift
+    self._scoreSum = scores.sum()
+    self._scoreSumSquares = (scores * scores).sum()
+    self._valueSum = values.sum()
+    self._valueSumSquares = (values * values).sum()
+
+
+  def _evaluateChunk(self, averagedScores, values):
+    """
+    Vectorized version of anomalyProbability for records starting at the
+    current iteration, during which the sample buffers do not wrap around
+    (except at the very last record).
+
+    @param averagedScores (numpy.ndarray) moving averages of anomaly scores
+    @param values (numpy.ndarray) metric values
+    @return (numpy.ndarray) the anomaly likelihood of every record.
+    """
+    numRecords = len(values)
+    likelihoods = numpy.empty(numRecords, dtype="float64")
+    likelihoods.fill(0.5)
+
+    # The records added to the historical window form a suffix of the chunk
+    firstSample = min(numRecords,
+                      max(0, self._claLearningPeriod - self._iteration))
+    newScores = averagedScores[firstSample:]
+    newValues = values[firstSample:]
+    numNew = len(newScores)
+
+    if numNew > 0:
+      if self._numSamples == 0:
+        self._scoreShift = newScores[0]
+        self._valueShift = newValues[0]
+
+      # Samples evicted from the buffers, zero while the window fills up
+      start = self._nextSample
+      numSamples = numpy.minimum(self._numSamples + numpy.arange(numNew + 1),
+                                 self._historicWindowSize)
+      evicting = (self._numSamples + numpy.arange(numNew) >=
+                  self._historicWindowSize)
+      oldScores = numpy.where(
+        evicting, self._averagedScores[start:start + numNew] - self._scoreShift,
+        0.0)
+      oldValues = numpy.where(
+        evicting, self._metricValues[start:start + numNew] - self._valueShift,
+        0.0)
+      newShiftedScores = newScores - self._scoreShift
+      newShiftedValues = newValues - self._valueShift
+
+      # Running sums before each new sample and after the last one
+      scoreSums = _accumulate(self._scoreSum, -oldScores, newShiftedScores)
+      scoreSumSquares = _accumulate(self._scoreSumSquares,
+                                    -oldScores * oldScores,
+                                    newShiftedScores * newShiftedScores)
+      valueSums = _accumulate(self._valueSum, -oldValues, newShiftedValues)
+      valueSumSquares = _accumulate(self._valueSumSquares,
+                                    -oldValues * oldValues,
+                                    newShiftedValues * newShiftedValues)
+
+      # Likelihoods of the records past the probationary period
+      firstEvaluated = min(numNew, max(
+        0, self._probationaryPeriod - self._iteration - firstSample))
+      evaluated = slice(firstEvaluated, numNew)
+      if firstEvaluated < numNew:
+        # Without samples (no estimationSamples) the null distribution is used
+        empty = numSamples[evaluated] == 0
+        n = numpy.maximum(numSamples[evaluated], 1)
+        valueMeans = valueSums[evaluated] / n
+        valueVariances = (valueSumSquares[evaluated] / n -
+                          valueMeans * valueMeans)
+        scoreMeans = scoreSums[evaluated] / n
+        variances = scoreSumSquares[evaluated] / n - scoreMeans * scoreMeans
+        means = scoreMeans + self._scoreShift
+
+        means = numpy.where(means < 0.03, 0.03, means)
+        variances = numpy.where(variances < 0.0003, 0.0003, variances)
+        stdevs = numpy.sqrt(variances)
+
+        flat = (valueVariances < self.FLAT_METRIC_VARIANCE) | empty
+        null = nullDistribution()
+        means[flat] = null["mean"]
+        stdevs[flat] = null["stdev"]
+
+        rawLikelihoods = _normalProbabilities(newScores[evaluated], means,
+                                              stdevs)
+
+        previousLikelihoods = numpy.empty_like(rawLikelihoods)
+        previousLikelihoods[0] = (numpy.inf if self._previousLikelihood is None
+                                  else self._previousLikelihood)
+        previousLikelihoods[1:] = rawLikelihoods[:-1]
+        filteredLikelihoods = numpy.where(
+          (rawLikelihoods <= _RED_THRESHOLD) &
+          (previousLikelihoods <= _RED_THRESHOLD),
+          _YELLOW_THRESHOLD, rawLikelihoods)
+        self._previousLikelihood = float(rawLikelihoods[-1])
+
+        likelihoods[firstSample + firstEvaluated:] = 1.0 - filteredLikelihoods
+
+      # Add the new samples to the historical window
+      self._averagedScores[start:start + numNew] = newScores
+      self._metricValues[start:start + numNew] = newValues
+      self._numSamples = int(numSamples[-1])
+      self._scoreSum = scoreSums[-1]
+      self._scoreSumSquares = scoreSumSquares[-1]
+      self._valueSum = valueSums[-1]
+      self._valueSumSquares = valueSumSquares[-1]
+      self._nextSample = (start + numNew) % self._historicWindowSize
+      if self._nextSample == 0:
+        self._resetRunningSums()
+
+    self._iteration += numRecords
+    return likelihoods
+
+
+
+def _accumulate(initial, removals, additions):
+  """
+  Returns the running totals obtained by starting at `initial` and, for each
+  record, adding the removal and then the addition. The totals are the ones
+  sequential scalar code would compute: cumsum accumulates in order.
+
+  :returns: numpy array with the total before the first record and after each
+      record.
+  """
+  updates = numpy.empty(2 * len(additions) + 1, dtype="float64")
+  updates[0] = initial
+  updates[1::2] = removals
+  updates[2::2] = additions
+  return numpy.cumsum(updates)[::2]
+
+
+
 #
 # USAGE FOR LOW-LEVEL FUNCTIONS
 # -----------------------------
@@ -640,6 +1079,25 @@ def normalProbability(x, distributionParams):
 
 
 
+def _normalProbabilities(x, mean, stdev):
+  """
+  Vectorized version of normalProbability. Returns, for each element, the
+  probability of getting samples > x under the normal distribution with the
+  matching mean and standard deviation.
+  """
+  below = x < mean
+  xp = numpy.where(below, 2 * mean - x, x)
+  xs = 10 * (xp - mean) / stdev
+
+  # Round half away from zero, like round()
+  roundedXs = numpy.floor(xs)
+  roundedXs += (xs - roundedXs) >= 0.5
+
+  probabilities = numpy.where(roundedXs > 70, 0.0,
+                              Q[numpy.minimum(roundedXs, 70).astype(int)])
+  return numpy.where(below, 1.0 - probabilities, probabilities)
+
+
 def isValidEstimatorParams(p):
   """
   :returns: ``True`` if ``p`` is a valid estimator params as might be returned
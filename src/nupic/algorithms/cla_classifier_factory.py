@@ -23,6 +23,7 @@
 
 from nupic.algorithms.CLAClassifier import CLAClassifier
 from nupic.algorithms.cla_classifier_diff import CLAClassifierDiff
+from nupic.algorithms.dense_cla_classifier import DenseCLAClassifier
 from nupic.bindings.algorithms import FastCLAClassifier
 from nupic.support.configuration import Configuration
 
@@ -43,6 +44,8 @@ class CLAClassifierFactory(object):
       return FastCLAClassifier(*args, **kwargs)
     elif impl == 'diff':
       return CLAClassifierDiff(*args, **kwargs)
+    elif impl == 'dense':
+      return DenseCLAClassifier(*args, **kwargs)
     else:
       raise ValueError('Invalid classifier implementation (%r). Value must be '
-                       '"py" or "cpp".' % impl)
+                       '"py", "cpp", "diff" or "dense".' % impl)
@@ -0,0 +1,448 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""This file implements the DenseCLAClassifier."""
+
+from collections import deque
+
+import numpy
+
+from nupic.algorithms.CLAClassifier import (DUTY_CYCLE_UPDATE_INTERVAL,
+                                            _pFormatArray)
+
+
+g_debugPrefix = "DenseCLAClassifier"
+
+
+
+class DenseCLAClassifier(object):
+  """
+  A CLA classifier that keeps the bucket duty cycles of all activation
+  pattern bits in one dense matrix per prediction step.
+
+  It learns and infers exactly like the CLAClassifier, but instead of one
+  BitHistory object per (bit, nSteps) key, row 'bit' of the weight matrix for
+  nSteps holds the duty cycle of every bucket for that bit, together with a
+  per-bit last update iteration. Learning updates all bits of a pattern with
+  one vectorized operation, and inference normalizes the rows selected by the
+  active bits and sums them in a single pass.
+
+  The weight matrices grow (by doubling) to fit the highest bit and bucket
+  index seen so far. getMemoryUsage() reports their size for each step.
+  """
+
+  __VERSION__ = 1
+
+
+  def __init__(self, steps=(1,), alpha=0.001, actValueAlpha=0.3, verbosity=0):
+    """Constructor for the dense CLA classifier.
+
+    Parameters:
+    ---------------------------------------------------------------------
+    steps:    Sequence of the different steps of multi-step predictions to learn
+    alpha:    The alpha used to compute running averages of the bucket duty
+               cycles for each activation pattern bit. A lower alpha results
+               in longer term memory.
+    verbosity: verbosity level, can be 0, 1, or 2
+    """
+    # Save constructor args
+    self.steps = steps
+    self.alpha = alpha
+    self.actValueAlpha = actValueAlpha
+    self.verbosity = verbosity
+
+    # Init learn iteration index
+    self._learnIteration = 0
+
+    # This contains the offset between the recordNum (provided by caller) and
+    #  learnIteration (internal only, always starts at 0).
+    self._recordNumMinusLearnIteration = None
+
+    # History of the last _maxSteps activation patterns, as
+    # (learnIteration, patternNZ) tuples, like in the CLAClassifier. When a
+    # recordNum repeats or goes backwards, the history holds several patterns
+    # of the same learn iteration, and the oldest one is learned.
+    self._maxSteps = max(self.steps) + 1
+    self._patternNZHistory = deque(maxlen=self._maxSteps)
+
+    # Bucket duty cycles, keyed by nSteps. Each entry is a float32 matrix with
+    # one row per activation pattern bit and one column per bucket index. As
+    # in BitHistory, each row is scaled relative to its own last update
+    # iteration, kept in _lastTotalUpdate. _learnedBits marks the bits that
+    # have stored at least one sample.
+    self._weights = dict()
+    self._lastTotalUpdate = dict()
+    self._learnedBits = dict()
+    for nSteps in self.steps:
+      self._weights[nSteps] = numpy.zeros((0, 1), dtype=numpy.float32)
+      self._lastTotalUpdate[nSteps] = numpy.zeros(0, dtype=numpy.int64)
+      self._learnedBits[nSteps] = numpy.zeros(0, dtype=bool)
+
+    # This contains the value of the highest bucket index we've ever seen
+    # It is used to pre-allocate fixed size arrays that hold the weights of
+    # each bucket index during inference
+    self._maxBucketIdx = 0
+
+    # This keeps track of the actual value to use for each bucket index. We
+    # start with 1 bucket, no actual value so that the first infer has something
+    # to return
+    self._actualValues = [None]
+
+    # Set the version to the latest version.
+    # This is used for serialization/deserialization
+    self._version = DenseCLAClassifier.__VERSION__
+
+
+  def compute(self, recordNum, patternNZ, classification, learn, infer):
+    """
+    Process one input sample. See CLAClassifier.compute() for a description of
+    the parameters and return value, which are identical.
+    """
+
+    # Save the offset between recordNum and learnIteration if this is the first
+    #  compute
+    if self._recordNumMinusLearnIteration is None:
+      self._recordNumMinusLearnIteration = recordNum - self._learnIteration
+
+    # Update the learn iteration
+    self._learnIteration = recordNum - self._recordNumMinusLearnIteration
+
+    if self.verbosity >= 1:
+      print "\n%s: compute" % g_debugPrefix
+      print "  recordNum:", recordNum
+      print "  learnIteration:", self._learnIteration
+      print "  patternNZ (%d):" % len(patternNZ), patternNZ
+      print "  classificationIn:", classification
+
+    # Store pattern in our history
+    self._patternNZHistory.append((self._learnIteration, patternNZ))
+
+    retval = None
+
+    # ------------------------------------------------------------------------
+    # Inference:
+    # For each active bit in the activationPattern, get the classification
+    # votes
+    if infer:
+      retval = self.infer(patternNZ, classification)
+
+    # ------------------------------------------------------------------------
+    # Learning:
+    # For each active bit in the activationPattern, store the classification
+    # info. If the bucketIdx is None, we can't learn. This can happen when the
+    # field is missing in a specific record.
+    if learn and classification["bucketIdx"] is not None:
+
+      # Get classification info
+      bucketIdx = classification["bucketIdx"]
+      actValue = classification["actValue"]
+
+      # Update maxBucketIndex
+      self._maxBucketIdx = max(self._maxBucketIdx, bucketIdx)
+
+      # Update rolling average of actual values if it's a scalar. If it's
+      # not, it must be a category, in which case each bucket only ever
+      # sees one category so we don't need a running average.
+      while self._maxBucketIdx > len(self._actualValues) - 1:
+        self._actualValues.append(None)
+      if self._actualValues[bucketIdx] is None:
+        self._actualValues[bucketIdx] = actValue
+      else:
+        if isinstance(actValue, int) or isinstance(actValue, float):
+          self._actualValues[bucketIdx] = ((1.0 - self.actValueAlpha)
+                                           * self._actualValues[bucketIdx]
+                                           + self.actValueAlpha * actValue)
+        else:
+          self._actualValues[bucketIdx] = actValue
+
+      # Train each pattern that we have in our history that aligns with the
+      # steps we have in self.steps
+      for nSteps in self.steps:
+        iteration = self._learnIteration - nSteps
+        for (learnIteration, learnPatternNZ) in self._patternNZHistory:
+          if learnIteration == iteration:
+            self._store(nSteps, learnPatternNZ, bucketIdx)
+            break
+
+    # ------------------------------------------------------------------------
+    # Verbose print
+    if infer and self.verbosity >= 1:
+      print "  inference: combined bucket likelihoods:"
+      print "    actual bucket values:", retval["actualValues"]
+      for (nSteps, votes) in retval.items():
+        if nSteps == "actualValues":
+          continue
+        print "    %d steps: " % (nSteps), _pFormatArray(votes)
+        bestBucketIdx = votes.argmax()
+        print ("      most likely bucket idx: "
+               "%d, value: %s" % (bestBucketIdx,
+                                  retval["actualValues"][bestBucketIdx]))
+      print
+
+    return retval
+
+
+  def infer(self, patternNZ, classification):
+    """
+    Return the inference value from one input sample. See
+    CLAClassifier.infer() for a description of the parameters and return
+    value, which are identical.
+    """
+    # NOTE: If doing 0-step prediction, we shouldn't use any knowledge
+    #  of the classification input during inference.
+    if self.steps[0] == 0:
+      defaultValue = 0
+    else:
+      defaultValue = classification["actValue"]
+    actValues = [x if x is not None else defaultValue
+                 for x in self._actualValues]
+    retval = {"actualValues": actValues}
+
+    numBuckets = self._maxBucketIdx + 1
+    bits = numpy.asarray(patternNZ, dtype=numpy.int64)
+
+    # For each n-step prediction...
+    for nSteps in self.steps:
+      weights = self._weights[nSteps]
+
+      # Each active bit votes with its bucket duty cycles, normalized to sum
+      # to 1. Bits that never learned have all-zero rows and don't vote.
+      rows = weights[bits[bits < weights.shape[0]], :numBuckets]
+      rows = rows.astype(numpy.float64)
+      totals = rows.sum(axis=1)
+      voting = totals > 0
+      sumVotes = numpy.zeros(numBuckets)
+      sumVotes[:rows.shape[1]] = (rows[voting] /
+                                  totals[voting, numpy.newaxis]).sum(axis=0)
+
+      # Return the votes for each bucket, normalized
+      total = sumVotes.sum()
+      if total > 0:
+        sumVotes /= total
+      else:
+        # If all buckets have zero probability then simply make all of the
+        # buckets equally likely. There is no actual prediction for this
+        # timestep so any of the possible predictions are just as good.
+        if sumVotes.size > 0:
+          sumVotes = numpy.ones(sumVotes.shape)
+          sumVotes /= sumVotes.size
+
+      retval[nSteps] = sumVotes
+
+    return retval
+
+
+  def getMemoryUsage(self):
+    """
+    Returns the number of bytes used by the weight matrices and per-bit
+    bookkeeping arrays of each prediction step, as a dict keyed by nSteps.
+    """
+    return dict((nSteps, self._weights[nSteps].nbytes +
+                         self._lastTotalUpdate[nSteps].nbytes +
+                         self._learnedBits[nSteps].nbytes)
+                for nSteps in self.steps)
+
+
+  def _store(self, nSteps, patternNZ, bucketIdx):
+    """
+    Stores a new sample for every bit of an activation pattern. This applies
+    the BitHistory.store() duty cycle update to all of the bits at once.
+
+    Parameters:
+    --------------------------------------------------------------------
+    nSteps:     number of steps of prediction the pattern is learned for
+    patternNZ:  list of the active bits of the pattern seen nSteps ago
+    bucketIdx:  the bucket index to store
+    """
+    bits = numpy.asarray(patternNZ, dtype=numpy.int64)
+    if bits.size == 0:
+      return
+    self._reserve(nSteps, bits.max() + 1, bucketIdx + 1)
+
+    weights = self._weights[nSteps]
+    lastTotalUpdate = self._lastTotalUpdate[nSteps]
+    learnedBits = self._learnedBits[nSteps]
+    iteration = self._learnIteration
+
+    # Bits storing their first sample start counting from this iteration
+    newBits = bits[~learnedBits[bits]]
+    lastTotalUpdate[newBits] = iteration
+    learnedBits[newBits] = True
+
+    # Bring the new duty cycle back to each bit's last update iteration, see
+    # BitHistory.store()
+    denom = (1.0 - self.alpha) ** (iteration - lastTotalUpdate[bits])
+    dc = weights[bits, bucketIdx].astype(numpy.float64)
+    with numpy.errstate(divide="ignore"):
+      dcNew = dc + self.alpha / denom
+
+    # To avoid overflow, bits whose duty cycle gets too large are rescaled to
+    # the current iteration instead
+    rescale = (denom == 0) | (dcNew > DUTY_CYCLE_UPDATE_INTERVAL)
+    if rescale.any():
+      rescaleBits = bits[rescale]
+      weights[rescaleBits] = (weights[rescaleBits] *
+                              denom[rescale][:, numpy.newaxis])
+      lastTotalUpdate[rescaleBits] = iteration
+      weights[rescaleBits, bucketIdx] = (
+        weights[rescaleBits, bucketIdx].astype(numpy.float64) + self.alpha)
+
+    weights[bits[~rescale], bucketIdx] = dcNew[~rescale]
+
+    if self.verbosity >= 2:
+      for bit in bits:
+        print "updated DC for %d[%d], bucket %d to %f" % (
+          bit, nSteps, bucketIdx, weights[bit, bucketIdx])
+
+
+  def _reserve(self, nSteps, numBits, numBuckets):
+    """
+    Grows the arrays of a prediction step so that they hold at least numBits
+    bits and numBuckets buckets. Capacity is doubled to amortize growth.
+    """
+    weights = self._weights[nSteps]
+    rows, cols = weights.shape
+    if numBits <= rows and numBuckets <= cols:
+      return
+
+    newRows = max(numBits, 2 * rows) if numBits > rows else rows
+    newCols = max(numBuckets, 2 * cols) if numBuckets > cols else cols
+
+    newWeights = numpy.zeros((newRows, newCols), dtype=numpy.float32)
+    newWeights[:rows, :cols] = weights
+    self._weights[nSteps] = newWeights
+
+    if newRows > rows:
+      lastTotalUpdate = numpy.zeros(newRows, dtype=numpy.int64)
+      lastTotalUpdate[:rows] = self._lastTotalUpdate[nSteps]
+      self._lastTotalUpdate[nSteps] = lastTotalUpdate
+
+      learnedBits = numpy.zeros(newRows, dtype=bool)
+      learnedBits[:rows] = self._learnedBits[nSteps]
+      self._learnedBits[nSteps] = learnedBits
+
+
+  @classmethod
+  def read(cls, proto):
+    """
+    Reads a classifier serialized in the CLAClassifier proto format, as
+    written by either DenseCLAClassifier.write() or CLAClassifier.write().
+    """
+    classifier = cls(steps=list(proto.steps),
+                     alpha=proto.alpha,
+                     actValueAlpha=proto.actValueAlpha,
+                     verbosity=proto.verbosity)
+
+    classifier._learnIteration = proto.learnIteration
+    classifier._recordNumMinusLearnIteration = (
+      proto.recordNumMinusLearnIteration)
+
+    patternNZHistoryProto = proto.patternNZHistory
+    learnIteration = classifier._learnIteration - len(patternNZHistoryProto) + 1
+    for i in xrange(len(patternNZHistoryProto)):
+      classifier._patternNZHistory.append((learnIteration,
+                                           list(patternNZHistoryProto[i])))
+      learnIteration += 1
+
+    classifier._maxBucketIdx = proto.maxBucketIdx
+
+    for stepBitHistories in proto.activeBitHistory:
+      nSteps = stepBitHistories.steps
+      if nSteps not in classifier._weights:
+        continue
+      for indexBitHistoryProto in stepBitHistories.bitHistories:
+        bit = indexBitHistoryProto.index
+        historyProto = indexBitHistoryProto.history
+        classifier._reserve(nSteps, bit + 1, classifier._maxBucketIdx + 1)
+        for statProto in historyProto.stats:
+          classifier._reserve(nSteps, bit + 1, statProto.index + 1)
+          classifier._weights[nSteps][bit, statProto.index] = (
+            statProto.dutyCycle)
+        classifier._lastTotalUpdate[nSteps][bit] = historyProto.lastTotalUpdate
+        classifier._learnedBits[nSteps][bit] = True
+
+    classifier._actualValues = []
+    for actValue in proto.actualValues:
+      if actValue == 0:
+        classifier._actualValues.append(None)
+      else:
+        classifier._actualValues.append(actValue)
+
+    return classifier
+
+
+  def write(self, proto):
+    """
+    Writes the classifier in the CLAClassifier proto format, with one
+    BitHistory per learned bit, so that it can be read back by either
+    DenseCLAClassifier.read() or CLAClassifier.read().
+    """
+    stepsProto = proto.init("steps", len(self.steps))
+    for i in xrange(len(self.steps)):
+      stepsProto[i] = self.steps[i]
+
+    proto.alpha = self.alpha
+    proto.actValueAlpha = self.actValueAlpha
+    proto.learnIteration = self._learnIteration
+    proto.recordNumMinusLearnIteration = self._recordNumMinusLearnIteration
+
+    proto.patternNZHistory = [list(patternNZ)
+                              for (_, patternNZ) in self._patternNZHistory]
+
+    activeBitHistoryProtos = proto.init("activeBitHistory", len(self.steps))
+    for i, nSteps in enumerate(self.steps):
+      weights = self._weights[nSteps]
+      bits = numpy.where(self._learnedBits[nSteps])[0]
+
+      stepBitHistoryProto = activeBitHistoryProtos[i]
+      stepBitHistoryProto.steps = nSteps
+      indexBitHistoryListProto = stepBitHistoryProto.init("bitHistories",
+                                                          len(bits))
+      for j, bit in enumerate(bits):
+        indexBitHistoryProto = indexBitHistoryListProto[j]
+        indexBitHistoryProto.index = int(bit)
+
+        # BitHistory only holds stats up to the highest bucket it stored
+        stats = weights[bit, :self._maxBucketIdx + 1]
+        storedBuckets = numpy.where(stats > 0)[0]
+        numStats = storedBuckets[-1] + 1 if storedBuckets.size else 0
+
+        bitHistoryProto = indexBitHistoryProto.history
+        bitHistoryProto.id = "%d[%d]" % (bit, nSteps)
+        statsProto = bitHistoryProto.init("stats", numStats)
+        for bucketIdx in xrange(numStats):
+          statsProto[bucketIdx].index = bucketIdx
+          statsProto[bucketIdx].dutyCycle = float(stats[bucketIdx])
+        bitHistoryProto.lastTotalUpdate = int(
+          self._lastTotalUpdate[nSteps][bit])
+        bitHistoryProto.learnIteration = 0
+
+    proto.maxBucketIdx = self._maxBucketIdx
+
+    actualValuesProto = proto.init("actualValues", len(self._actualValues))
+    for i in xrange(len(self._actualValues)):
+      if self._actualValues[i] is not None:
+        actualValuesProto[i] = self._actualValues[i]
+      else:
+        actualValuesProto[i] = 0
+
+    proto.version = self._version
+    proto.verbosity = self.verbosity
@@ -0,0 +1,338 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Indexes over the prototypes stored by the KNNClassifier. They find the
+prototypes that overlap an input pattern without scanning the whole memory.
+
+An index mirrors the rows of the classifier memory: rows are added at the end
+and deleting a row shifts the following rows up by one, exactly like
+NearestNeighbor.addRow and NearestNeighbor.deleteRow. Internally every
+prototype gets a permanent id so that deleting a row does not require
+renumbering the index; stale ids are purged once they make up half of the
+index.
+"""
+
+import itertools
+
+import numpy
+
+
+
+class PrototypeIndex(object):
+  """
+  Base class for prototype indexes. Keeps the mapping between the rows of the
+  classifier memory and the permanent prototype ids.
+  """
+
+  # Whether candidateOverlaps returns all the overlapping prototypes
+  exact = True
+
+  # Initial number of rows the row array can hold
+  INITIAL_CAPACITY = 1024
+
+
+  def __init__(self):
+    # Ids of the prototypes, in row order, in the first _numRows elements.
+    # Ids are assigned in increasing order, so they are always sorted.
+    self._rowIds = numpy.zeros(self.INITIAL_CAPACITY, dtype="int64")
+    self._numRows = 0
+    self._nextId = 0
+    self._numDeleted = 0
+
+
+  def numRows(self):
+    """
+    Returns the number of indexed prototypes.
+    """
+    return self._numRows
+
+
+  def addRow(self, nonZeros):
+    """
+    Adds a prototype as the last row.
+
+    @param nonZeros (list) Indices of the non-zero elements of the prototype
+    """
+    protoId = self._nextId
+    self._nextId += 1
+
+    if self._numRows == len(self._rowIds):
+      self._rowIds = numpy.resize(self._rowIds, 2 * len(self._rowIds))
+    self._rowIds[self._numRows] = protoId
+    self._numRows += 1
+
+    self._addPrototype(protoId, numpy.asarray(nonZeros, dtype="int64"))
+
+
+  def deleteRow(self, row):
+    """
+    Deletes a prototype. The prototypes of the following rows move up by one
+    row.
+
+    @param row (int) Row of the prototype
+    """
+    if not 0 <= row < self._numRows:
+      raise IndexError("Invalid row %d" % row)
+
+    protoId = int(self._rowIds[row])
+    self._rowIds[row:self._numRows - 1] = self._rowIds[row + 1:self._numRows]
+    self._numRows -= 1
+    self._deletePrototype(protoId)
+
+    self._numDeleted += 1
+    if self._numDeleted > self._numRows:
+      self._purge()
+      self._numDeleted = 0
+
+
+  def candidateOverlaps(self, inputPattern):
+    """
+    Returns the prototypes that may overlap an input pattern together with
+    their overlap, computed like NearestNeighbor.rightVecSumAtNZ: the sum of
+    the input values at the non-zero elements of the prototype.
+
+    @param inputPattern (numpy.ndarray) Dense input pattern
+
+    @return (tuple) Contains:
+                      `rows`     (numpy.ndarray) sorted rows of the candidates,
+                      `overlaps` (numpy.ndarray) overlap of every candidate
+    """
+    raise NotImplementedError()
+
+
+  def _rowsForIds(self, protoIds):
+    """
+    Maps prototype ids to rows, dropping the ids of deleted prototypes.
+
+    @param protoIds (numpy.ndarray) Prototype ids
+
+    @return (tuple) Contains:
+                      `rows` (numpy.ndarray) rows of the live prototypes,
+                      `live` (numpy.ndarray) mask of the live prototype ids
+    """
+    rowIds = self._rowIds[:self._numRows]
+    rows = numpy.searchsorted(rowIds, protoIds)
+    live = rows < self._numRows
+    live[live] = rowIds[rows[live]] == protoIds[live]
+    return rows[live], live
+
+
+  def _addPrototype(self, protoId, nonZeros):
+    raise NotImplementedError()
+
+
+  def _deletePrototype(self, protoId):
+    raise NotImplementedError()
+
+
+  def _purge(self):
+    """
+    Removes the ids of deleted prototypes from the index structures.
+    """
+    raise NotImplementedError()
+
+
+
+class InvertedIndex(PrototypeIndex):
+  """
+  Inverted index from each input bit to the prototypes that have it on.
+
+  Overlaps are computed by scattering the posting lists of the active input
+  bits, so the cost grows with the number of prototypes sharing bits with the
+  input rather than with the size of the memory. The overlaps are exact.
+  """
+
+
+  def __init__(self):
+    super(InvertedIndex, self).__init__()
+
+    # Prototype ids, keyed by input bit. Ids are appended to the lists and
+    # moved to the arrays when the bit is queried.
+    self._postingArrays = dict()
+    self._postingLists = dict()
+
+
+  def candidateOverlaps(self, inputPattern):
+    activeBits = [bit for bit in numpy.asarray(inputPattern).nonzero()[0]
+                  if bit in self._postingLists]
+    if not activeBits:
+      return numpy.zeros(0, dtype="int64"), numpy.zeros(0)
+
+    postings = [self._getPostings(bit) for bit in activeBits]
+    weights = numpy.repeat(inputPattern[activeBits],
+                           [len(posting) for posting in postings])
+    protoIds = numpy.concatenate(postings)
+
+    rows, live = self._rowsForIds(protoIds)
+    numRows = self.numRows()
+    overlaps = numpy.bincount(rows, weights=weights[live],
+                              minlength=max(numRows, 1))[:numRows]
+
+    # Every posting counts as a candidate, even when its input value is 0
+    candidates = numpy.unique(rows)
+    return candidates, overlaps[candidates]
+
+
+  def _getPostings(self, bit):
+    """
+    Returns the ids of the prototypes that have a bit on, some of which may be
+    deleted.
+
+    @param bit (int) Input bit
+
+    @return (numpy.ndarray) Prototype ids
+    """
+    pending = self._postingLists[bit]
+    if pending:
+      self._postingArrays[bit] = numpy.append(self._postingArrays[bit],
+                                              pending)
+      del pending[:]
+    return self._postingArrays[bit]
+
+
+  def _addPrototype(self, protoId, nonZeros):
+    for bit in nonZeros:
+      bit = int(bit)
+      if bit not in self._postingLists:
+        self._postingArrays[bit] = numpy.zeros(0, dtype="int64")
+        self._postingLists[bit] = []
+      self._postingLists[bit].append(protoId)
+
+
+  def _deletePrototype(self, protoId):
+    # Postings are purged lazily
+    pass
+
+
+  def _purge(self):
+    for bit in self._postingLists.keys():
+      protoIds = self._getPostings(bit)
+      _, live = self._rowsForIds(protoIds)
+      if live.all():
+        continue
+      if live.any():
+        self._postingArrays[bit] = protoIds[live]
+      else:
+        del self._postingArrays[bit]
+        del self._postingLists[bit]
+
+
+
+class MinHashIndex(PrototypeIndex):
+  """
+  Locality-sensitive hashing index for sparse binary prototypes.
+
+  Each prototype gets a MinHash signature of numBands * bandSize hashes of its
+  non-zero elements. Prototypes that agree with the input on all the hashes
+  of at least one band are candidates, and the overlaps are computed exactly
+  for the candidates only. The probability that a prototype is a candidate is
+  1 - (1 - J ** bandSize) ** numBands, where J is the Jaccard similarity of
+  the prototype and the input, so prototypes with a low overlap may be missed.
+  """
+
+  exact = False
+
+  # Mersenne prime used by the hash functions, larger than any input bit
+  _PRIME = (1 << 31) - 1
+
+
+  def __init__(self, numBands=20, bandSize=4, seed=42):
+    """
+    @param numBands (int) Number of bands of the signatures
+    @param bandSize (int) Number of hashes per band
+    @param seed     (int) Seed of the hash functions
+    """
+    super(MinHashIndex, self).__init__()
+
+    self.numBands = numBands
+    self.bandSize = bandSize
+
+    random = numpy.random.RandomState(seed)
+    numHashes = numBands * bandSize
+    self._hashA = random.randint(1, self._PRIME, numHashes).astype("int64")
+    self._hashB = random.randint(0, self._PRIME, numHashes).astype("int64")
+
+    # Prototype ids, keyed by band signature, one dict per band
+    self._buckets = [dict() for _ in xrange(numBands)]
+
+    # Non-zero elements of the prototypes, keyed by prototype id
+    self._prototypes = dict()
+
+
+  def candidateOverlaps(self, inputPattern):
+    activeBits = numpy.asarray(inputPattern).nonzero()[0]
+    if len(activeBits) == 0:
+      return numpy.zeros(0, dtype="int64"), numpy.zeros(0)
+
+    candidateIds = set()
+    for buckets, key in itertools.izip(self._buckets,
+                                       self._bandKeys(activeBits)):
+      candidateIds.update(buckets.get(key, ()))
+
+    protoIds = numpy.array(sorted(candidateIds), dtype="int64")
+    rows, live = self._rowsForIds(protoIds)
+    overlaps = numpy.array([inputPattern[self._prototypes[protoId]].sum()
+                            for protoId in protoIds[live]])
+    return rows, overlaps
+
+
+  def _bandKeys(self, nonZeros):
+    """
+    Returns the band keys of the MinHash signature of a pattern.
+
+    @param nonZeros (numpy.ndarray) Indices of the non-zero elements
+
+    @return (list) One key per band
+    """
+    hashes = ((numpy.outer(self._hashA, nonZeros) + self._hashB[:, None]) %
+              self._PRIME)
+    signature = hashes.min(axis=1)
+    return [signature[band * self.bandSize:(band + 1) * self.bandSize].tostring()
+            for band in xrange(self.numBands)]
+
+
+  def _addPrototype(self, protoId, nonZeros):
+    self._prototypes[protoId] = nonZeros
+
+    # Empty prototypes never overlap and are not put in any bucket
+    if len(nonZeros) == 0:
+      return
+
+    for buckets, key in itertools.izip(self._buckets,
+                                       self._bandKeys(nonZeros)):
+      buckets.setdefault(key, []).append(protoId)
+
+
+  def _deletePrototype(self, protoId):
+    # Buckets are purged lazily
+    del self._prototypes[protoId]
+
+
+  def _purge(self):
+    for buckets in self._buckets:
+      for key in buckets.keys():
+        protoIds = [protoId for protoId in buckets[key]
+                    if protoId in self._prototypes]
+        if protoIds:
+          buckets[key] = protoIds
+        else:
+          del buckets[key]
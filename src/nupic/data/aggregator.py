@@ -25,10 +25,12 @@ import time
 import datetime
 from collections import defaultdict
 
+import numpy
 from pkg_resources import resource_filename
 
 from nupic.data import SENTINEL_VALUE_FOR_MISSING_DATA
 from nupic.data.file_record_stream import FileRecordStream
+from nupic.data.record_chunk import RecordChunk
 
 
 """The aggregator aggregates PF datasets
@@ -719,6 +721,502 @@ class Aggregator(object):
 
 
 
+# Number of records read at once by generateDataset()
+_CHUNK_SIZE = 65536
+
+# Aggregation functions that BulkAggregator can compute with numpy
+_BULK_FUNCTIONS = {_aggr_first: 'first', _aggr_last: 'last', _aggr_sum: 'sum',
+                   _aggr_mean: 'mean', max: 'max', min: 'min',
+                   _aggr_weighted_mean: 'wmean'}
+
+_MICROSECONDS_PER_DAY = 24 * 3600 * 1000000
+
+# Integer sums are computed with numpy only if they can't overflow
+_MAX_INT_SUM = 2 ** 62
+
+
+
+def _sequentialSums(values, starts, ends):
+  """ Returns the sums of the values of each window. Float values are added
+  from left to right, like the aggregation functions do, because numpy adds
+  them in a different order, which changes the rounding.
+  """
+  if values.dtype.kind != 'f':
+    return numpy.add.reduceat(values, starts)
+
+  lengths = ends - starts
+  maxLength = lengths.max()
+  if len(starts) >= maxLength:
+    # Many short windows: add the k-th value of all the windows at once
+    sums = numpy.zeros(len(starts), dtype=values.dtype)
+    for k in xrange(maxLength):
+      active = numpy.flatnonzero(lengths > k)
+      sums[active] += values[starts[active] + k]
+    return sums
+
+  valueList = values.tolist()
+  return numpy.array([sum(valueList[start:end])
+                      for start, end in zip(starts.tolist(), ends.tolist())],
+                     dtype=values.dtype)
+
+
+
+def _toMonths(times):
+  """ Returns the number of months from 1970-01 to datetime64 values
+  """
+  return times.astype('datetime64[M]').astype(numpy.int64)
+
+
+
+def _fromMonths(months):
+  """ Returns the start of months counted from 1970-01, as datetime64[us]
+  """
+  return months.astype('datetime64[M]').astype('datetime64[us]')
+
+
+
+def _isNumeric(chunk, fieldIdx):
+  """ Returns True if the values of a field of a chunk are numbers. The
+  category codes of string fields are not.
+  """
+  return (chunk.categories[fieldIdx] is None and
+          chunk.columns[fieldIdx].dtype.kind in 'biuf')
+
+
+
+class BulkAggregator(object):
+  """
+  Aggregates nupic.data.record_chunk.RecordChunks. The aggregated records are
+  the same as those returned by Aggregator.next() for the records of the
+  chunks.
+
+  The aggregation windows of all the records of a chunk are computed at once
+  from the time column, and the first, last, sum, mean, max, min and weighted
+  mean of numeric fields are computed for all the windows with numpy. Float
+  sums are still added from left to right, so that they are rounded like those
+  of Aggregator. Other aggregation functions are called with the values of
+  each window.
+
+  An Aggregator holds the state of the aggregation between chunks. Chunks
+  with out of order records within a sequence, aggregations with a filter and
+  monthly windows that start after the 28th of a month are aggregated one
+  record at a time by the Aggregator.
+
+  The caller should do a loop like this:
+    while True:
+      chunk = reader.getNextRecordChunk(chunkSize)
+      if chunk is None:
+        break
+      for aggRecord in aggregator.aggregate(chunk):
+        processRecord(aggRecord)
+    for aggRecord in aggregator.finish():
+      processRecord(aggRecord)
+  """
+
+
+  def __init__(self, aggregationInfo, inputFields, timeFieldName=None,
+               sequenceIdFieldName=None, resetFieldName=None, filterInfo=None):
+    """ See Aggregator.__init__() for the parameters.
+    """
+    self._aggregator = Aggregator(aggregationInfo, inputFields,
+                                  timeFieldName=timeFieldName,
+                                  sequenceIdFieldName=sequenceIdFieldName,
+                                  resetFieldName=resetFieldName,
+                                  filterInfo=filterInfo)
+
+    aggregator = self._aggregator
+    self._months = aggregator._aggYears * 12 + aggregator._aggMonths
+    delta = aggregator._aggTimeDelta
+    self._deltaUs = ((delta.days * 24 * 3600 + delta.seconds) * 1000000 +
+                     delta.microseconds)
+
+
+  def isNullAggregation(self):
+    """ Return True if no aggregation will be performed, see
+    Aggregator.isNullAggregation().
+    """
+    return self._aggregator.isNullAggregation()
+
+
+  def aggregate(self, chunk):
+    """ Aggregates the records of a chunk
+
+    Parameters:
+    ------------------------------------------------------------------------
+    chunk:  RecordChunk with the next input records
+    retval: list of the aggregated records of the windows that ended within
+            the chunk. The records of the last window are kept until the
+            window ends.
+    """
+    aggregator = self._aggregator
+    if len(chunk) == 0:
+      return []
+    if aggregator.isNullAggregation() or aggregator._filter is not None:
+      return self._aggregateRecords(chunk)
+
+    windows = self._getWindows(chunk)
+    if windows is None:
+      return self._aggregateRecords(chunk)
+    return self._aggregateWindows(chunk, *windows)
+
+
+  def finish(self):
+    """ Returns the list of the aggregated records of the last window, once
+    the input reached EOF
+    """
+    outRecord, _ = self._aggregator.next(None, None)
+    return [] if outRecord is None else [outRecord]
+
+
+  def _aggregateRecords(self, chunk):
+    """ Aggregates the records of a chunk one at a time
+    """
+    outRecords = []
+    for record in chunk.getRecords():
+      outRecord, _ = self._aggregator.next(record, None)
+      if outRecord is not None:
+        outRecords.append(outRecord)
+    return outRecords
+
+
+  def _getWindows(self, chunk):
+    """ Computes the aggregation windows of the records of a chunk
+
+    Parameters:
+    ------------------------------------------------------------------------
+    chunk:  RecordChunk of input records
+    retval: (newSequence, windowIdx, windowStart): a bool array that is True
+            for the records that start a sequence, the index of the window of
+            each record, counted from the start of its sequence or from the
+            current window, and the start of the window of each record as
+            datetime64[us]. None if the chunk can't be aggregated by windows.
+    """
+    aggregator = self._aggregator
+    numRecords = len(chunk)
+    times = chunk.columns[aggregator._timeFieldIdx]
+    if (times.dtype.kind != 'M' or
+        chunk.masks[aggregator._timeFieldIdx].any()):
+      return None
+    times = times.astype('datetime64[us]')
+
+    firstRecord = aggregator._inIdx == -1
+    # After out of order records, the end of the current window may not
+    #  follow from its start
+    if (not firstRecord and
+        aggregator._getEndTime(aggregator._startTime) != aggregator._endTime):
+      return None
+
+    # Records that start a new sequence
+    newSequence = numpy.zeros(numRecords, dtype=bool)
+    newSequence[0] = firstRecord
+
+    resetFieldIdx = aggregator._resetFieldIdx
+    if resetFieldIdx is not None:
+      if not _isNumeric(chunk, resetFieldIdx):
+        return None
+      newSequence |= ((chunk.columns[resetFieldIdx] == 1) &
+                      ~chunk.masks[resetFieldIdx])
+
+    sequenceIdFieldIdx = aggregator._sequenceIdFieldIdx
+    if sequenceIdFieldIdx is not None:
+      sequenceIds = chunk.columns[sequenceIdFieldIdx]
+      missing = chunk.masks[sequenceIdFieldIdx]
+      if sequenceIds.dtype.kind == 'O':
+        return None
+      newSequence[1:] |= (
+        ((sequenceIds[1:] != sequenceIds[:-1]) & ~missing[1:]) |
+        (missing[1:] != missing[:-1]))
+      firstSequenceId = self._getValues(chunk, sequenceIdFieldIdx, [0])[0]
+      newSequence[0] |= firstSequenceId != aggregator._sequenceId
+
+    # The windows of each sequence start with its first record. The records
+    #  before the first new sequence continue the current window.
+    anchorRows = numpy.where(newSequence, numpy.arange(numRecords), -1)
+    numpy.maximum.accumulate(anchorRows, out=anchorRows)
+    anchors = times[anchorRows]
+    if anchorRows[0] == -1:
+      anchors[anchorRows == -1] = numpy.datetime64(aggregator._startTime, 'us')
+
+    if self._months:
+      windowIdx, windowStart = self._getMonthWindows(times, anchors)
+      if windowIdx is None:
+        return None
+    else:
+      windowIdx = (times - anchors).astype(numpy.int64) // self._deltaUs
+      windowStart = anchors + (windowIdx * self._deltaUs).astype(
+        'timedelta64[us]')
+
+    # Time must not go back to a previous window within a sequence
+    if (windowIdx[0] < 0 or
+        ((windowIdx[1:] < windowIdx[:-1]) & ~newSequence[1:]).any()):
+      return None
+
+    return newSequence, windowIdx, windowStart
+
+
+  def _getMonthWindows(self, times, anchors):
+    """ Computes the windows of records for periods of years and months. The
+    windows start on the same day and time of the month as their anchor, like
+    those of Aggregator._getEndTime().
+
+    Parameters:
+    ------------------------------------------------------------------------
+    times:   datetime64[us] times of the records
+    anchors: datetime64[us] start of the first window of each record
+    retval:  (windowIdx, windowStart), or (None, None) if an anchor is after
+             the 28th day of its month, which isn't in every month.
+    """
+    anchorMonths = _toMonths(anchors)
+    anchorOffsets = anchors - _fromMonths(anchorMonths)
+    if (anchorOffsets.astype(numpy.int64) >= 28 * _MICROSECONDS_PER_DAY).any():
+      return None, None
+
+    windowIdx = (_toMonths(times) - anchorMonths) // self._months
+    windowStart = (_fromMonths(anchorMonths + windowIdx * self._months) +
+                   anchorOffsets)
+    # Records before the day and time of the anchor in their month are in the
+    #  previous window
+    early = numpy.flatnonzero(times < windowStart)
+    windowIdx[early] -= 1
+    windowStart[early] = (
+      _fromMonths(anchorMonths[early] + windowIdx[early] * self._months) +
+      anchorOffsets[early])
+    return windowIdx, windowStart
+
+
+  def _aggregateWindows(self, chunk, newSequence, windowIdx, windowStart):
+    """ Aggregates the records of a chunk, given their windows
+    """
+    aggregator = self._aggregator
+    numRecords = len(chunk)
+    outRecords = []
+
+    newWindow = newSequence.copy()
+    newWindow[1:] |= windowIdx[1:] != windowIdx[:-1]
+    newWindow[0] |= windowIdx[0] != 0
+    starts = numpy.flatnonzero(newWindow)
+
+    # Records of the current window
+    end = starts[0] if len(starts) > 0 else numRecords
+    self._appendToSlice(chunk.slice(0, end))
+    if len(starts) > 0 and aggregator._slice:
+      outRecords.append(self._createSliceRecord())
+
+    if len(starts) > 0:
+      # Windows that end within the chunk
+      lastStart = starts[-1]
+      if len(starts) > 1:
+        outRecords.extend(self._reduceWindows(
+          chunk.slice(starts[0], lastStart), starts[:-1] - starts[0],
+          windowStart[starts[:-1]]))
+
+      # The last window continues in the next chunk
+      aggregator._slice = defaultdict(list)
+      self._appendToSlice(chunk.slice(lastStart, numRecords))
+      aggregator._startTime = windowStart[lastStart].tolist()
+      aggregator._endTime = aggregator._getEndTime(aggregator._startTime)
+
+    if aggregator._firstSequenceStartTime is None:
+      aggregator._firstSequenceStartTime = self._getValues(
+        chunk, aggregator._timeFieldIdx, [0])[0]
+    if aggregator._sequenceIdFieldIdx is not None:
+      aggregator._sequenceId = self._getValues(
+        chunk, aggregator._sequenceIdFieldIdx, [numRecords - 1])[0]
+    aggregator._inIdx += numRecords
+    return outRecords
+
+
+  def _getValues(self, chunk, fieldIdx, rows):
+    """ Returns the values of a field for some records of a chunk, as they
+    are in the records returned by RecordChunk.getRecords()
+    """
+    column = chunk.columns[fieldIdx][rows]
+    categories = chunk.categories[fieldIdx]
+    if categories is not None:
+      column = numpy.array(categories + [None], dtype=numpy.object_)[column]
+    values = column.tolist()
+    for i in numpy.flatnonzero(chunk.masks[fieldIdx][rows]).tolist():
+      values[i] = SENTINEL_VALUE_FOR_MISSING_DATA
+    return values
+
+
+  def _appendToSlice(self, chunk):
+    """ Appends the records of a chunk to the slice of the current window
+    """
+    if len(chunk) == 0:
+      return
+    values = zip(*chunk.getRecords())
+    for j, (fieldIdx, _, _) in enumerate(self._aggregator._fields):
+      self._aggregator._slice[j].extend(values[fieldIdx])
+
+
+  def _createSliceRecord(self):
+    """ Returns the aggregated record of the current window, like
+    Aggregator.next() does when the window ends
+    """
+    aggregator = self._aggregator
+    for j, (fieldIdx, _, _) in enumerate(aggregator._fields):
+      if fieldIdx == aggregator._timeFieldIdx:
+        aggregator._slice[j][0] = aggregator._startTime
+        break
+    return aggregator._createAggregateRecord()
+
+
+  def _reduceWindows(self, chunk, starts, windowStartTimes):
+    """ Returns the aggregated records of consecutive windows
+
+    Parameters:
+    ------------------------------------------------------------------------
+    chunk:            RecordChunk with the records of the windows
+    starts:           index of the first record of each window
+    windowStartTimes: datetime64[us] start of each window, which replaces the
+                      time of its first record
+    retval:           list of the aggregated records
+    """
+    aggregator = self._aggregator
+    timeFieldIdx = aggregator._timeFieldIdx
+    columns = list(chunk.columns)
+    masks = list(chunk.masks)
+    columns[timeFieldIdx] = columns[timeFieldIdx].astype('datetime64[us]')
+    columns[timeFieldIdx][starts] = windowStartTimes
+    chunk = RecordChunk(chunk.fields, columns, masks, chunk.categories)
+
+    ends = numpy.append(starts[1:], len(chunk))
+    windows = zip(starts.tolist(), ends.tolist())
+    fieldValues = None
+
+    values = []
+    for fieldIdx, funcPtr, paramIdx in aggregator._fields:
+      result = None
+      if funcPtr in _BULK_FUNCTIONS:
+        result = self._reduceColumn(chunk, _BULK_FUNCTIONS[funcPtr], fieldIdx,
+                                    paramIdx, starts, ends)
+      if result is None:
+        # Call the aggregation function for each window
+        if fieldValues is None:
+          fieldValues = [list(v) for v in zip(*chunk.getRecords())]
+        inList = fieldValues[fieldIdx]
+        if paramIdx is not None:
+          params = fieldValues[paramIdx]
+          result = [funcPtr(inList[start:end], params[start:end])
+                    for start, end in windows]
+        else:
+          result = [funcPtr(inList[start:end]) for start, end in windows]
+      values.append(result)
+
+    return [list(record) for record in zip(*values)]
+
+
+  def _reduceColumn(self, chunk, funcName, fieldIdx, paramIdx, starts, ends):
+    """ Computes an aggregation function for the windows of a column with
+    numpy
+
+    Parameters:
+    ------------------------------------------------------------------------
+    chunk:    RecordChunk with the records of the windows
+    funcName: name of the aggregation function, see _BULK_FUNCTIONS
+    fieldIdx: index of the aggregated field
+    paramIdx: index of the weights field of weighted means
+    starts:   index of the first record of each window
+    ends:     index after the last record of each window
+    retval:   list of the aggregated values of the windows, or None if the
+              values can't be computed exactly with numpy
+    """
+    column = chunk.columns[fieldIdx]
+    mask = chunk.masks[fieldIdx]
+    numRecords = len(column)
+    positions = numpy.arange(numRecords)
+
+    if funcName in ('first', 'last'):
+      if funcName == 'first':
+        rows = numpy.minimum.reduceat(
+          numpy.where(mask, numRecords, positions), starts)
+        missing = rows == numRecords
+      else:
+        rows = numpy.maximum.reduceat(numpy.where(mask, -1, positions), starts)
+        missing = rows == -1
+      rows[missing] = 0
+      result = self._getValues(chunk, fieldIdx, rows)
+      for i in numpy.flatnonzero(missing).tolist():
+        result[i] = None
+      return result
+
+    if not _isNumeric(chunk, fieldIdx):
+      return None
+    if column.dtype.kind == 'b':
+      column = column.astype(numpy.int64)
+    present = ~mask
+    if column.dtype.kind == 'f':
+      if funcName in ('max', 'min'):
+        # max() and min() depend on the order of NaN and signed zero values
+        values = column[present]
+        if (numpy.isnan(values).any() or
+            ((values == 0) & numpy.signbit(values)).any()):
+          return None
+    else:
+      # Python ints don't overflow
+      maxLength = (ends - starts).max()
+      if numpy.abs(column.astype(numpy.float64)).max() * maxLength >= \
+         _MAX_INT_SUM:
+        return None
+    isInt = column.dtype.kind != 'f'
+
+    if funcName in ('sum', 'mean'):
+      counts = numpy.add.reduceat(present.astype(numpy.int64), starts)
+      sums = _sequentialSums(numpy.where(present, column, 0), starts, ends)
+      noValues = counts == 0
+      counts[noValues] = 1
+      means = sums // counts if isInt else sums / counts
+      if funcName == 'sum' and mask.any():
+        # Missing values count as the mean of the window
+        sums = _sequentialSums(
+          numpy.where(present, column, numpy.repeat(means, ends - starts)),
+          starts, ends)
+      result = (means if funcName == 'mean' else sums).tolist()
+
+    elif funcName in ('max', 'min'):
+      if funcName == 'max':
+        # None is smaller than every value, max() ignores it
+        fill = -numpy.inf if not isInt else numpy.iinfo(numpy.int64).min
+        result = numpy.maximum.reduceat(numpy.where(present, column, fill),
+                                        starts)
+        noValues = ~numpy.logical_or.reduceat(present, starts)
+      else:
+        result = numpy.minimum.reduceat(column, starts)
+        noValues = numpy.logical_or.reduceat(mask, starts)
+      if chunk.columns[fieldIdx].dtype.kind == 'b':
+        result = result.astype(bool)
+      result = result.tolist()
+
+    else:
+      # wmean: missing values fail in _aggr_weighted_mean()
+      weights = chunk.columns[paramIdx]
+      if (mask.any() or chunk.masks[paramIdx].any() or
+          not _isNumeric(chunk, paramIdx)):
+        return None
+      if weights.dtype.kind == 'b':
+        weights = weights.astype(numpy.int64)
+      if weights.dtype.kind != 'f':
+        maxLength = (ends - starts).max()
+        if (numpy.abs(weights.astype(numpy.float64)).max() *
+            max(numpy.abs(column.astype(numpy.float64)).max(), 1) *
+            maxLength >= _MAX_INT_SUM):
+          return None
+      weightSums = _sequentialSums(weights, starts, ends)
+      productSums = _sequentialSums(column * weights, starts, ends)
+      noValues = weightSums == 0
+      weightSums[noValues] = 1
+      if isInt and weights.dtype.kind != 'f':
+        result = (productSums // weightSums).tolist()
+      else:
+        result = (productSums / weightSums.astype(numpy.float64)).tolist()
+
+    for i in numpy.flatnonzero(noValues).tolist():
+      result[i] = None
+    return result
+
+
+
 def generateDataset(aggregationInfo, inputFilename, outputFilename=None):
   """Generate a dataset of aggregated values
 
@@ -770,8 +1268,8 @@ def generateDataset(aggregationInfo, inputFilename, outputFilename=None):
   
 
   # Instantiate the aggregator
-  aggregator = Aggregator(aggregationInfo=aggregationInfo, 
-                          inputFields=inputObj.getFields())
+  aggregator = BulkAggregator(aggregationInfo=aggregationInfo,
+                              inputFields=inputObj.getFields())
   
   
   # Is it a null aggregation? If so, just return the input file unmodified
@@ -823,15 +1321,12 @@ def generateDataset(aggregationInfo, inputFilename, outputFilename=None):
   # -------------------------------------------------------------------------
   # Write all aggregated records to the output
   while True:
-    inRecord = inputObj.getNextRecord()
-    
-    (aggRecord, aggBookmark) = aggregator.next(inRecord, None)
-    
-    if aggRecord is None and inRecord is None:
+    chunk = inputObj.getNextRecordChunk(_CHUNK_SIZE)
+    if chunk is None:
       break
-    
-    if aggRecord is not None:
-      outputObj.appendRecord(aggRecord)
+    outputObj.appendRecords(aggregator.aggregate(chunk))
+
+  outputObj.appendRecords(aggregator.finish())
 
   return outputFilename
 
@@ -0,0 +1,568 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Binary columnar record files
+
+A binary record file holds the same records and field descriptions as a
+FileRecordStream CSV file, stored as the typed columns of
+nupic.data.record_chunk, so that reading it requires no parsing. The file is
+memory-mapped by BinaryRecordStream, so processes that read the same file
+share a single copy of it in the page cache.
+
+The file is made of blocks of consecutive records, each holding the column
+and the missing value mask of every field of its records, followed by a JSON
+footer that describes the fields and the blocks:
+
+  magic (8 bytes)
+  block 0: column 0, mask 0, column 1, mask 1, ...
+  block 1: ...
+  footer: JSON
+  footer offset (8 bytes, little endian), magic (8 bytes)
+
+Columns are little endian and aligned to 8 bytes. Masks are omitted when no
+value of the column is missing. list and sdr columns are stored as the int64
+offsets of the values of each record followed by the int64 values. The
+categories of the string fields are stored in the footer. The strings of the
+footer are decoded as Latin-1, so that strings in any encoding are stored as
+they are.
+
+Use convertCsvToBinary() to convert a FileRecordStream CSV file:
+
+  convertCsvToBinary("data.csv", "data.nrec")
+  with BinaryRecordStream("data.nrec") as s:
+    for r in s:
+      print r
+"""
+
+import json
+import os
+
+import numpy
+
+from nupic.data.fieldmeta import FieldMetaInfo, FieldMetaType
+from nupic.data.file_record_stream import FileRecordStream
+from nupic.data.record_chunk import RecordChunk
+from nupic.data.record_stream import RecordStreamIface
+from nupic.data.streaming_stats import MomentStats
+
+
+
+# Format version, stored in the footer
+_VERSION = 1
+
+_MAGIC = "NUPICREC"
+
+_ALIGNMENT = 8
+
+# Number of records converted at once by getNextRecord()
+_READ_AHEAD = 1024
+
+# Default number of records of the blocks written by convertCsvToBinary()
+DEFAULT_BLOCK_SIZE = 65536
+
+_COLUMN_DTYPES = {FieldMetaType.integer: numpy.dtype("<i8"),
+                  FieldMetaType.float: numpy.dtype("<f8"),
+                  FieldMetaType.boolean: numpy.dtype("bool"),
+                  FieldMetaType.datetime: numpy.dtype("<M8[us]"),
+                  FieldMetaType.string: numpy.dtype("<i4")}
+
+# Variable length columns, stored as offsets and values
+_LIST_VALUES_DTYPE = numpy.dtype("<i8")
+_LIST_OFFSETS_DTYPE = numpy.dtype("<i8")
+
+
+
+# Encoding of the strings of the footer, which maps every byte to a character
+_FOOTER_ENCODING = "latin-1"
+
+
+
+def _toStr(value):
+  """ Converts the unicode strings of the JSON footer back to str
+  """
+  return value.encode(_FOOTER_ENCODING)
+
+
+
+def isBinaryRecordFile(filename):
+  """
+  Returns True if a file is a binary record file.
+
+  @param filename (str) Path of the file
+  """
+  try:
+    with open(filename, "rb") as f:
+      return f.read(len(_MAGIC)) == _MAGIC
+  except IOError:
+    return False
+
+
+
+def convertCsvToBinary(csvPath, binaryPath, blockSize=DEFAULT_BLOCK_SIZE,
+                       missingValues=None):
+  """
+  Converts a FileRecordStream CSV file to a binary record file.
+
+  @param csvPath (str) Path of the CSV file
+  @param binaryPath (str) Path of the binary record file
+  @param blockSize (int) Number of records of the blocks of the binary file
+  @param missingValues (list) Missing values of the CSV file, see
+                              FileRecordStream
+  @return (int) Number of records
+  """
+  with FileRecordStream(csvPath, missingValues=missingValues) as reader:
+    with BinaryRecordWriter(binaryPath, reader.getFields()) as writer:
+      while True:
+        chunk = reader.getNextRecordChunk(blockSize)
+        if chunk is None:
+          break
+        writer.writeChunk(chunk)
+      return writer.numRecords
+
+
+
+class BinaryRecordWriter(object):
+  """
+  Writes RecordChunks to a binary record file, a block per chunk. All the
+  chunks must come from the same stream, so that they share the categories
+  of their string fields.
+  """
+
+  def __init__(self, filename, fields):
+    """
+    @param filename (str) Path of the file
+    @param fields (list) nupic.data.fieldmeta.FieldMetaInfo of the fields
+    """
+    self._filename = filename
+    self._fields = [FieldMetaInfo(*field) for field in fields]
+    self._categories = [[] if field.type == FieldMetaType.string else None
+                        for field in self._fields]
+    self._blocks = []
+    self.numRecords = 0
+    self._file = open(filename, "wb")
+    self._file.write(_MAGIC)
+
+
+  def __enter__(self):
+    return self
+
+
+  def __exit__(self, excType, excValue, traceback):
+    self.close()
+
+
+  def writeChunk(self, chunk):
+    """
+    Writes the records of a chunk as a block.
+
+    @param chunk (RecordChunk) The records
+    """
+    assert self._file is not None
+    if [field.type for field in chunk.fields] != [field.type
+                                                  for field in self._fields]:
+      raise ValueError("The fields of the chunk don't match the file")
+    if len(chunk) == 0:
+      return
+
+    columns = []
+    for i, field in enumerate(self._fields):
+      if chunk.categories[i] is not None:
+        self._categories[i] = chunk.categories[i]
+      columns.append(self._writeColumn(field.type, chunk.columns[i],
+                                       chunk.masks[i]))
+
+    self._blocks.append({"numRecords": len(chunk), "columns": columns})
+    self.numRecords += len(chunk)
+
+
+  def _writeArray(self, array):
+    """ Writes an array at the next aligned offset, returns its location
+    """
+    padding = -self._file.tell() % _ALIGNMENT
+    self._file.write("\0" * padding)
+    offset = self._file.tell()
+    data = numpy.ascontiguousarray(array).tostring()
+    self._file.write(data)
+    return [offset, len(data)]
+
+
+  def _writeColumn(self, fieldType, column, mask):
+    if fieldType in _COLUMN_DTYPES:
+      location = {"values": self._writeArray(
+        column.astype(_COLUMN_DTYPES[fieldType]))}
+    else:
+      values = [[] if value is None else value for value in column.tolist()]
+      offsets = numpy.zeros(len(values) + 1, dtype=_LIST_OFFSETS_DTYPE)
+      numpy.cumsum([len(value) for value in values], out=offsets[1:])
+      flatValues = numpy.fromiter((item for value in values for item in value),
+                                  dtype=_LIST_VALUES_DTYPE, count=offsets[-1])
+      location = {"offsets": self._writeArray(offsets),
+                  "values": self._writeArray(flatValues)}
+
+    location["mask"] = self._writeArray(mask) if mask.any() else None
+    return location
+
+
+  def close(self):
+    """
+    Writes the footer and closes the file.
+    """
+    if self._file is None:
+      return
+
+    footer = {"version": _VERSION,
+              "fields": [list(field) for field in self._fields],
+              "numRecords": self.numRecords,
+              "categories": self._categories,
+              "blocks": self._blocks}
+    footerOffset = self._file.tell()
+    self._file.write(json.dumps(footer, encoding=_FOOTER_ENCODING))
+    self._file.write(numpy.array([footerOffset], dtype="<i8").tostring())
+    self._file.write(_MAGIC)
+    self._file.close()
+    self._file = None
+
+
+
+class BinaryRecordStream(RecordStreamIface):
+  """
+  Memory-mapped reader of binary record files. The records it returns are the
+  same as those of a FileRecordStream reading the CSV file the binary file was
+  converted from.
+  """
+
+  def __init__(self, streamID, bookmark=None, firstRecord=None):
+    """
+    @param streamID (str) Path of the binary record file
+    @param bookmark (str) Bookmark of the first record to read, see
+                          getBookmark(). Either bookmark or firstRecord can be
+                          specified, not both.
+    @param firstRecord (int) Index of the first record to read
+    """
+    super(BinaryRecordStream, self).__init__()
+
+    if bookmark is not None and firstRecord is not None:
+      raise RuntimeError(
+          "Only bookmark or firstRecord can be specified, not both")
+
+    self._filename = streamID
+    self.rewindAtEOF = False
+    self._stats = None
+    self._open()
+
+    if bookmark is not None:
+      self._seekToRecord(self._getStartRecord(bookmark))
+    elif firstRecord is not None:
+      self._seekToRecord(firstRecord)
+    else:
+      self._seekToRecord(0)
+
+
+  def _open(self):
+    """ Memory-maps the file and reads its footer
+    """
+    self._data = numpy.memmap(self._filename, dtype=numpy.uint8, mode="r")
+    trailerSize = 8 + len(_MAGIC)
+    if (len(self._data) < len(_MAGIC) + trailerSize or
+        self._data[:len(_MAGIC)].tostring() != _MAGIC or
+        self._data[-len(_MAGIC):].tostring() != _MAGIC):
+      raise ValueError("%s is not a binary record file" % self._filename)
+
+    footerOffset = int(self._data[-trailerSize:-len(_MAGIC)].view("<i8")[0])
+    footer = json.loads(self._data[footerOffset:-trailerSize].tostring())
+    if footer["version"] != _VERSION:
+      raise ValueError("Unsupported version %d of binary record file %s" %
+                       (footer["version"], self._filename))
+
+    self._fields = [FieldMetaInfo(*(_toStr(attr) for attr in field))
+                    for field in footer["fields"]]
+    self._numRecords = footer["numRecords"]
+    self._categories = [None if categories is None
+                        else [_toStr(category) for category in categories]
+                        for categories in footer["categories"]]
+    self._blocks = footer["blocks"]
+    self._blockStarts = numpy.cumsum(
+      [0] + [block["numRecords"] for block in self._blocks])
+    # The chunk of the last block read, as (block index, chunk)
+    self._blockChunk = (None, None)
+
+
+  def __getstate__(self):
+    state = dict(self.__dict__)
+    for name in ("_data", "_fields", "_categories", "_blocks", "_blockStarts",
+                 "_blockChunk", "_pendingRecords"):
+      del state[name]
+    return state
+
+
+  def __setstate__(self, state):
+    self.__dict__.update(state)
+    self._open()
+    self._seekToRecord(self._recordCount)
+
+
+  def __enter__(self):
+    return self
+
+
+  def __exit__(self, excType, excValue, traceback):
+    self.close()
+
+
+  def __iter__(self):
+    return self
+
+
+  def next(self):
+    record = self.getNextRecord()
+    if record is None:
+      raise StopIteration
+    return record
+
+
+  def close(self):
+    # The memory map is closed when the arrays that use it are deleted
+    self._data = None
+    self._blockChunk = (None, None)
+    self._pendingRecords = []
+
+
+  def rewind(self):
+    super(BinaryRecordStream, self).rewind()
+    self._seekToRecord(0)
+
+
+  def _getArray(self, location, dtype):
+    offset, size = location
+    return self._data[offset:offset + size].view(dtype)
+
+
+  def _getBlockChunk(self, blockIndex):
+    """ Returns the RecordChunk of the records of a block. Its columns are
+    views of the memory map, except those of list and sdr fields. Only the
+    chunk of the last block read is kept, so that reading the file does not
+    accumulate its list and sdr values in memory.
+    """
+    if self._blockChunk[0] == blockIndex:
+      return self._blockChunk[1]
+
+    block = self._blocks[blockIndex]
+    numRecords = block["numRecords"]
+    columns = []
+    masks = []
+    for field, location in zip(self._fields, block["columns"]):
+      if location["mask"] is None:
+        mask = numpy.zeros(numRecords, dtype=bool)
+      else:
+        mask = self._getArray(location["mask"], bool)
+
+      if field.type in _COLUMN_DTYPES:
+        column = self._getArray(location["values"], _COLUMN_DTYPES[field.type])
+      else:
+        offsets = self._getArray(location["offsets"], _LIST_OFFSETS_DTYPE)
+        values = self._getArray(location["values"], _LIST_VALUES_DTYPE)
+        column = numpy.empty(numRecords, dtype=numpy.object_)
+        for i in numpy.flatnonzero(~mask).tolist():
+          column[i] = values[offsets[i]:offsets[i + 1]].tolist()
+
+      columns.append(column)
+      masks.append(mask)
+
+    chunk = RecordChunk(self._fields, columns, masks, self._categories)
+    self._blockChunk = (blockIndex, chunk)
+    return chunk
+
+
+  def _seekToRecord(self, recordIdx):
+    """ Moves to a record, which is the next record getNextRecord() returns.
+    Records past the end move to the end.
+    """
+    self._recordCount = int(min(max(recordIdx, 0), self._numRecords))
+    self._pendingRecords = []
+
+
+  def getNextRecordChunk(self, numRecords):
+    """ Returns the next records as a nupic.data.record_chunk.RecordChunk,
+    whose columns are views of the memory-mapped file.
+
+    numRecords: maximum number of records of the chunk. Chunks don't span
+                blocks, so the chunk can have fewer records.
+
+    retval: a RecordChunk; None, if no more records in the file.
+    """
+    if self._recordCount == self._numRecords:
+      if not self.rewindAtEOF or self._numRecords == 0:
+        return None
+      self.rewind()
+
+    blockIndex = int(numpy.searchsorted(self._blockStarts, self._recordCount,
+                                        side="right")) - 1
+    start = self._recordCount - self._blockStarts[blockIndex]
+    chunk = self._getBlockChunk(blockIndex).slice(start, start + numRecords)
+    self._seekToRecord(self._recordCount + len(chunk))
+    return chunk
+
+
+  def getNextRecord(self, useCache=True):
+    """ Returns the next record, or None at the end of the file.
+    """
+    if not self._pendingRecords:
+      chunk = self.getNextRecordChunk(_READ_AHEAD)
+      if chunk is None:
+        return None
+      # The record count is the number of records returned so far
+      self._recordCount -= len(chunk)
+      self._pendingRecords = chunk.getRecords()
+      self._pendingRecords.reverse()
+
+    self._recordCount += 1
+    return self._pendingRecords.pop()
+
+
+  def getRecordsRange(self, bookmark=None, range=None):
+    """ Returns a range of records, starting from the bookmark. If 'bookmark'
+    is None, then records read from the first available. If 'range' is
+    None, all available records will be returned.
+    """
+    start = self._getStartRecord(bookmark) if bookmark is not None else 0
+    start = min(start, self._numRecords)
+    end = self._numRecords if range is None else min(start + range,
+                                                     self._numRecords)
+
+    records = []
+    blockIndex = int(numpy.searchsorted(self._blockStarts, start,
+                                        side="right")) - 1
+    while start < end:
+      blockStart = self._blockStarts[blockIndex]
+      blockEnd = self._blockStarts[blockIndex + 1]
+      chunk = self._getBlockChunk(blockIndex).slice(start - blockStart,
+                                                    min(end, blockEnd) -
+                                                    blockStart)
+      records.extend(chunk.getRecords())
+      start = min(end, blockEnd)
+      blockIndex += 1
+    return records
+
+
+  def getNextRecordIdx(self):
+    return self._recordCount
+
+
+  def getDataRowCount(self):
+    return self._numRecords
+
+
+  def getLastRecords(self, numRecords):
+    raise Exception("getLastRecords() is not supported for binary record "
+                    "files")
+
+
+  def removeOldData(self):
+    raise Exception("removeOldData is not supported for binary record files")
+
+
+  def appendRecord(self, record, inputRef=None):
+    raise Exception("Binary record files are written with BinaryRecordWriter")
+
+
+  def appendRecords(self, records, inputRef=None, progressCB=None):
+    raise Exception("Binary record files are written with BinaryRecordWriter")
+
+
+  def getBookmark(self):
+    return json.dumps(dict(filepath=os.path.realpath(self._filename),
+                           currentRow=self._recordCount))
+
+
+  def _getStartRecord(self, bookmark):
+    bookmarkDict = json.loads(bookmark)
+    if bookmarkDict.get("filepath") != os.path.realpath(self._filename):
+      return 0
+    return bookmarkDict["currentRow"]
+
+
+  def recordsExistAfter(self, bookmark):
+    return self._numRecords - self._recordCount > 0
+
+
+  def seekFromEnd(self, numRecords):
+    self._seekToRecord(self._numRecords - numRecords)
+    return self.getBookmark()
+
+
+  def setAutoRewind(self, autoRewind):
+    self.rewindAtEOF = autoRewind
+
+
+  def getStats(self):
+    """ Returns the min and max of the int and float fields, like
+    FileRecordStream.getStats().
+    """
+    if self._stats is None:
+      self._stats = {"min": [None] * len(self._fields),
+                     "max": [None] * len(self._fields)}
+      for i, field in enumerate(self._fields):
+        if field.type not in (FieldMetaType.integer, FieldMetaType.float):
+          continue
+        moments = MomentStats()
+        for blockIndex in xrange(len(self._blocks)):
+          chunk = self._getBlockChunk(blockIndex)
+          moments.add(chunk.columns[i][~chunk.masks[i]])
+        self._stats["min"][i] = moments.min
+        self._stats["max"][i] = moments.max
+    return self._stats
+
+
+  def clearStats(self):
+    self._stats = None
+
+
+  def getError(self):
+    return None
+
+
+  def setError(self, error):
+    return
+
+
+  def isCompleted(self):
+    return True
+
+
+  def setCompleted(self, completed=True):
+    return
+
+
+  def getFieldNames(self):
+    return [field.name for field in self._fields]
+
+
+  def getFields(self):
+    return list(self._fields)
+
+
+  def setTimeout(self, timeout):
+    pass
+
+
+  def flush(self):
+    pass
@@ -54,24 +54,41 @@ with FileRecordStream(filename) as f:
 When the control exits the 'with' block the file will be closed automatically.
 You may still call the .close() method at any point (even multiple times).
 
+Bookmarks, seekFromEnd(), getDataRowCount() and getRecordsRange() use an index
+of the byte offsets of the rows (see nupic.data.file_row_index), so they don't
+need to read the records that come before the ones they return. The index is
+built the first time it is needed. With rowIndex=True it is also saved next
+to the file, and kept up to date as records are appended to it. rowIndex can
+also be the path where the index is saved, e.g. to share it between processes
+without writing next to the file.
+
 The FileRecordStream also supports the iteration protocol so you may read its
 contents using a for loop:
 
   for r in f:
     print r
+
+getNextRecordChunk() reads many records at once and converts them a field at a
+time to typed numpy columns (see nupic.data.record_chunk), which is much faster
+than converting the records a value at a time. With chunkSize set,
+getNextRecord() and iteration read the file in chunks as well.
 """
 
 import os
 import csv
 import copy
+import itertools
 import json
 
 from nupic.data.fieldmeta import FieldMetaInfo, FieldMetaType, FieldMetaSpecial
 from nupic.data import SENTINEL_VALUE_FOR_MISSING_DATA
+from nupic.data.file_row_index import FileRowIndex, getIndexPath
+from nupic.data.record_chunk import RecordChunkParser
 from nupic.data.record_stream import RecordStreamIface
-from nupic.data.utils import (intOrNone, floatOrNone, parseBool, parseTimestamp,
-    serializeTimestamp, serializeTimestampNoMS, escape, unescape, parseSdr,
-    serializeSdr, parseStringList, stripList)
+from nupic.data.streaming_stats import MomentStats
+from nupic.data.utils import (intOrNone, floatOrNone, parseBool,
+    TimestampParser, serializeTimestamp, serializeTimestampNoMS, escape,
+    unescape, parseSdr, serializeSdr, parseStringList, stripList)
 
 
 
@@ -82,6 +99,9 @@ class FileRecordStream(RecordStreamIface):
   # Private: number of header rows (field names, types, special)
   _NUM_HEADER_ROWS = 3
 
+  # Private: number of rows parsed at once by getStats()
+  _STATS_CHUNK_SIZE = 65536
+
   # Private: file mode for opening file for writing
   _FILE_WRITE_MODE = 'w'
 
@@ -90,7 +110,8 @@ class FileRecordStream(RecordStreamIface):
 
 
   def __init__(self, streamID, write=False, fields=None, missingValues=None,
-               bookmark=None, includeMS=True, firstRecord=None):
+               bookmark=None, includeMS=True, firstRecord=None,
+               rowIndex=False, chunkSize=None):
     """
     streamID:
         CSV file name, input or output
@@ -114,6 +135,17 @@ class FileRecordStream(RecordStreamIface):
         0-based index of the first record to start reading from. Either bookmark
         or firstRecord can be specified, not both. If bookmark is used, then
         firstRecord MUST be None.
+    rowIndex:
+        If True, the index of the row offsets is saved next to the file
+        (see nupic.data.file_row_index.getIndexPath). If a str, the index is
+        saved to that path instead. When writing, it is updated as records
+        are appended. When reading, a saved index is reused and only the rows
+        appended since it was saved are indexed.
+    chunkSize:
+        If not None, getNextRecord() reads and converts chunkSize records at a
+        time, like getNextRecordChunk(), and returns them one by one. The
+        records are the same, but rows with the wrong number of fields raise
+        a ValueError.
 
     Each field is a 3-tuple (name, type, special or FieldMetaSpecial.none)
 
@@ -160,6 +192,12 @@ class FileRecordStream(RecordStreamIface):
     self._file = open(self._filename, self._mode)
     self._sequences = set()
     self.rewindAtEOF = False
+    self._saveRowIndex = bool(rowIndex)
+    self._rowIndexPath = (rowIndex if isinstance(rowIndex, basestring)
+                          else getIndexPath(self._filename))
+    self._rowIndex = None
+    self._chunkSize = chunkSize
+    self._clearPendingRecords()
 
     if write:
       assert fields is not None
@@ -243,7 +281,8 @@ class FileRecordStream(RecordStreamIface):
            FieldMetaType.float: floatOrNone,
            FieldMetaType.boolean: parseBool,
            FieldMetaType.string: unescape,
-           FieldMetaType.datetime: parseTimestamp,
+           # Remembers the format of the timestamps of the file
+           FieldMetaType.datetime: TimestampParser(),
            FieldMetaType.sdr: parseSdr,
            FieldMetaType.list: parseStringList}
     else:
@@ -262,20 +301,20 @@ class FileRecordStream(RecordStreamIface):
     self._adapters = [m[t] for t in types]
 
     self._missingValues = missingValues
+    self._chunkParser = RecordChunkParser(self._fields, missingValues)
 
     #
     # If the bookmark is set, we need to skip over first N records
     #
     if bookmark is not None:
-      rowsToSkip = self._getStartRow(bookmark)
+      startRow = self._getStartRow(bookmark)
     elif firstRecord is not None:
-      rowsToSkip = firstRecord
+      startRow = firstRecord
     else:
-      rowsToSkip = 0
+      startRow = 0
 
-    while rowsToSkip > 0:
-      self.next()
-      rowsToSkip -= 1
+    if startRow > 0:
+      self._seekToRow(startRow)
 
 
     # Dictionary to store record statistics (min and max of scalars for now)
@@ -287,6 +326,9 @@ class FileRecordStream(RecordStreamIface):
     d.update(self.__dict__)
     del d['_reader']
     del d['_file']
+    d['_rowIndex'] = None
+    d['_pendingChunk'] = None
+    d['_pendingRecords'] = None
     return d
 
 
@@ -299,6 +341,8 @@ class FileRecordStream(RecordStreamIface):
 
   def close(self):
     if self._file is not None:
+      if self._write and self._saveRowIndex:
+        self._saveWrittenRowIndex()
       self._file.close()
       self._file = None
 
@@ -321,6 +365,7 @@ class FileRecordStream(RecordStreamIface):
 
     # Reset record count, etc.
     self._recordCount = 0
+    self._clearPendingRecords()
 
 
   def getNextRecord(self, useCache=True):
@@ -333,6 +378,9 @@ class FileRecordStream(RecordStreamIface):
     assert self._file is not None
     assert self._mode == self._FILE_READ_MODE
 
+    if self._chunkSize is not None:
+      return self._getNextPendingRecord()
+
     # Read the line
     try:
       line = self._reader.next()
@@ -351,6 +399,86 @@ class FileRecordStream(RecordStreamIface):
     # Keep score of how many records were read
     self._recordCount += 1
 
+    return self._parseRecord(line)
+
+
+  def getNextRecordChunk(self, numRecords):
+    """ Returns the next records of the file as a
+    nupic.data.record_chunk.RecordChunk of typed columns.
+
+    numRecords: maximum number of records of the chunk. The chunk has fewer
+                records at the end of the file.
+
+    retval: a RecordChunk; None, if no more records in the file.
+    """
+    assert self._file is not None
+    assert self._mode == self._FILE_READ_MODE
+
+    if self._pendingChunk is not None:
+      # Records read ahead by getNextRecord()
+      start = self._pendingIdx
+      chunk = self._pendingChunk.slice(start, start + numRecords)
+      self._pendingIdx += len(chunk)
+      if self._pendingIdx == len(self._pendingChunk):
+        self._clearPendingRecords()
+    else:
+      chunk = self._readRecordChunk(numRecords)
+      if chunk is None:
+        return None
+
+    self._recordCount += len(chunk)
+    return chunk
+
+
+  def _readRecordChunk(self, numRecords):
+    """ Reads and converts up to numRecords rows, rewinding at EOF if needed.
+    Returns None at EOF.
+    """
+    rows = list(itertools.islice(self._reader, numRecords))
+    if not rows and self.rewindAtEOF:
+      if self._recordCount == 0:
+        raise Exception("The source configured to reset at EOF but "
+                        "'%s' appears to be empty" % self._filename)
+      self.rewind()
+      rows = list(itertools.islice(self._reader, numRecords))
+
+    if not rows:
+      return None
+    return self._chunkParser.parse(rows)
+
+
+  def _getNextPendingRecord(self):
+    """ Returns the next record of the chunk read ahead by getNextRecord(),
+    reading a new chunk when needed.
+    """
+    if self._pendingChunk is None:
+      chunk = self._readRecordChunk(self._chunkSize)
+      if chunk is None:
+        return None
+      self._pendingChunk = chunk
+    if self._pendingRecords is None:
+      self._pendingRecords = self._pendingChunk.getRecords()
+
+    record = self._pendingRecords[self._pendingIdx]
+    self._pendingIdx += 1
+    if self._pendingIdx == len(self._pendingChunk):
+      self._clearPendingRecords()
+
+    self._recordCount += 1
+    return record
+
+
+  def _clearPendingRecords(self):
+    """ Drops the records read ahead by getNextRecord().
+    """
+    self._pendingChunk = None
+    self._pendingRecords = None
+    self._pendingIdx = 0
+
+
+  def _parseRecord(self, line):
+    """ Converts the text fields of a line to a record
+    """
     # Split the line to text fields and convert each text field to a Python
     # object if value is missing (empty string) encode appropriately for
     # upstream consumers in the case of numeric types, this means replacing
@@ -375,9 +503,27 @@ class FileRecordStream(RecordStreamIface):
     is None, then records read from the first available. If 'range' is
     None, all available records will be returned (caution: this could be
     a lot of records and require a lot of memory).
+
+    The records are read with a separate file handle, so the position of the
+    stream is not changed.
     """
+    assert self._mode == self._FILE_READ_MODE
 
-    raise Exception('getRecordsRange() is not supported for the file storage')
+    startRow = self._getStartRow(bookmark) if bookmark is not None else 0
+    rowIndex = self._getRowIndex()
+    startRow = min(startRow, rowIndex.numRows)
+    if range is None:
+      range = rowIndex.numRows - startRow
+
+    records = []
+    with open(self._filename, self._FILE_READ_MODE) as f:
+      reader = self._openReaderAtRow(f, startRow)
+      for line in reader:
+        if len(records) == range:
+          break
+        records.append(self._parseRecord(line))
+
+    return records
 
 
   def getLastRecords(self, numRecords):
@@ -427,6 +573,11 @@ class FileRecordStream(RecordStreamIface):
 
     line = [self._adapters[i](f) for i, f in enumerate(record)]
 
+    if self._saveRowIndex:
+      if self._rowIndex is None:
+        self._rowIndex = FileRowIndex(self._filename, self._NUM_HEADER_ROWS)
+      self._rowIndex.addWrittenRow(self._file.tell())
+
     self._writer.writerow(line)
     self._recordCount += 1
 
@@ -475,7 +626,8 @@ class FileRecordStream(RecordStreamIface):
     """Seeks to numRecords from the end and returns a bookmark to the new
     position.
     """
-    self._file.seek(self._getTotalLineCount() - numRecords)
+    assert self._mode == self._FILE_READ_MODE
+    self._seekToRow(max(self._getRowIndex().numRows - numRecords, 0))
     return self.getBookmark()
 
 
@@ -524,33 +676,34 @@ class FileRecordStream(RecordStreamIface):
       # Skip over specials
       reader.next()
 
-      # Initialize stats to all None
-      self._stats = dict()
-      self._stats['min'] = []
-      self._stats['max'] = []
-
-      for i in xrange(len(names)):
-        self._stats['min'].append(None)
-        self._stats['max'].append(None)
+      # Only the scalar fields are parsed, a chunk of rows at a time. Short
+      # rows have missing values.
+      scalarIdx = [i for i, t in enumerate(types)
+                   if t in [FieldMetaType.integer, FieldMetaType.float]]
+      parser = RecordChunkParser([FieldMetaInfo(names[i], types[i], '')
+                                  for i in scalarIdx],
+                                 missingValues=self._missingValues)
+      moments = [MomentStats() for _ in scalarIdx]
 
       # Read the file, collect stats
       while True:
-        try:
-          line = reader.next()
-          for i, f in enumerate(line):
-            if (len(types) > i and
-                types[i] in [FieldMetaType.integer, FieldMetaType.float] and
-                f not in self._missingValues):
-              value = self._adapters[i](f)
-              if self._stats['max'][i] == None or \
-                 self._stats['max'][i] < value:
-                self._stats['max'][i] = value
-              if self._stats['min'][i] == None or \
-                 self._stats['min'][i] > value:
-                self._stats['min'][i] = value
-
-        except StopIteration:
+        lines = list(itertools.islice(reader, self._STATS_CHUNK_SIZE))
+        if not lines:
           break
+        chunk = parser.parse([[line[i] if i < len(line) else ''
+                               for i in scalarIdx] for line in lines])
+        for j, fieldMoments in enumerate(moments):
+          fieldMoments.add(chunk.columns[j][~chunk.masks[j]])
+
+      inFile.close()
+
+      # Initialize stats to all None
+      self._stats = dict()
+      self._stats['min'] = [None] * len(names)
+      self._stats['max'] = [None] * len(names)
+      for i, fieldMoments in zip(scalarIdx, moments):
+        self._stats['min'][i] = fieldMoments.min
+        self._stats['max'][i] = fieldMoments.max
 
     return self._stats
 
@@ -677,6 +830,64 @@ class FileRecordStream(RecordStreamIface):
       return bookMarkDict['currentRow']
 
 
+  def _getRowIndex(self):
+    """ Returns the row offset index of the file, brought up to date with it.
+    The index is loaded or built the first time it is needed.
+    """
+    if self._rowIndex is None:
+      if self._saveRowIndex:
+        self._rowIndex = FileRowIndex.load(self._filename,
+                                           self._rowIndexPath)
+      if self._rowIndex is None:
+        self._rowIndex = FileRowIndex(self._filename, self._NUM_HEADER_ROWS)
+
+    if self._rowIndex.update() and self._saveRowIndex:
+      try:
+        self._rowIndex.save(self._rowIndexPath)
+      except (IOError, OSError):
+        # The index is still used from memory, e.g. in read-only directories
+        pass
+
+    return self._rowIndex
+
+
+  def _openReaderAtRow(self, f, row):
+    """ Seeks a file to a data row and returns a csv reader that starts there.
+    """
+    offset, rowsToSkip = self._getRowIndex().getRowOffset(row)
+    f.seek(offset)
+    reader = csv.reader(f, dialect="excel")
+    for _ in xrange(rowsToSkip):
+      reader.next()
+    return reader
+
+
+  def _seekToRow(self, row):
+    """ Moves to a data row, which is the next record getNextRecord() returns.
+    Rows past the end of the file move to the end of the file.
+    """
+    assert self._mode == self._FILE_READ_MODE
+    row = min(row, self._getRowIndex().numRows)
+    self._reader = self._openReaderAtRow(self._file, row)
+    self._recordCount = row
+    self._clearPendingRecords()
+
+
+  def _saveWrittenRowIndex(self):
+    """ Saves the row index of the records written so far.
+    """
+    if self._rowIndex is None:
+      # Nothing was written
+      return
+
+    self._file.flush()
+    try:
+      self._rowIndex.finishWrittenRows(self._file.tell())
+      self._rowIndex.save(self._rowIndexPath)
+    except (IOError, OSError):
+      pass
+
+
   def _getTotalLineCount(self):
     """ Returns:  count of ALL lines in dataset, including header lines
     """
@@ -697,6 +908,9 @@ class FileRecordStream(RecordStreamIface):
     """
     Returns:  count of data rows in dataset (excluding header lines)
     """
+    if self._mode == self._FILE_READ_MODE:
+      return self._getRowIndex().numRows
+
     numLines = self._getTotalLineCount()
 
     if numLines == 0:
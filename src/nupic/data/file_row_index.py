@@ -0,0 +1,349 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Row offset index of CSV files
+
+A FileRowIndex holds the byte offset of every stride-th data row of a CSV
+file (after its header rows) and the number of data rows. A reader can seek to
+any row by seeking to the closest indexed row before it and skipping less than
+stride rows.
+
+The index is built with a single pass over the file. Files that don't contain
+quotes or lone carriage returns are scanned in large blocks, by looking for
+newlines with numpy. Other files are parsed with the csv module, so that
+newlines in quoted fields don't start new rows. When the file grows, only the
+appended data is scanned.
+
+The index can be saved next to the file it indexes (see getIndexPath()), so
+that it is built only once.
+"""
+
+import csv
+import os
+import zlib
+
+import numpy
+
+
+
+# Number of rows between two indexed rows
+DEFAULT_STRIDE = 256
+
+# Version of the saved index format
+_VERSION = 1
+
+# Size of the blocks read when scanning the file
+_BLOCK_SIZE = 1 << 24
+
+# Number of bytes before the end of the indexed data whose checksum is saved,
+# to detect files that were rewritten instead of appended to
+_CHECKSUM_SIZE = 4096
+
+_NEWLINE = ord("\n")
+_CARRIAGE_RETURN = ord("\r")
+_QUOTE = ord('"')
+
+
+
+def getIndexPath(filename):
+  """
+  Returns the path of the saved row index of a file.
+
+  @param filename (str) Path of the indexed file
+  """
+  return filename + ".rowidx"
+
+
+
+class FileRowIndex(object):
+  """
+  Byte offsets of the rows of a CSV file with numHeaderRows header rows.
+  """
+
+  def __init__(self, filename, numHeaderRows, stride=DEFAULT_STRIDE):
+    """
+    @param filename (str) Path of the indexed file
+    @param numHeaderRows (int) Number of rows before the first data row
+    @param stride (int) Number of rows between two indexed rows
+    """
+    if stride < 1:
+      raise ValueError("stride must be positive")
+
+    self.filename = filename
+    self.numHeaderRows = numHeaderRows
+    self.stride = stride
+    self._clear()
+
+
+  def _clear(self):
+    # Offsets of the data rows whose index is a multiple of stride
+    self._offsets = []
+    # Number of complete (newline terminated) rows, including the header rows
+    self._numCompleteRows = 0
+    # Offset of the end of the last complete row
+    self._endOffset = 0
+    # Size of the file when it was last scanned
+    self._fileSize = 0
+    self._checksum = self._computeChecksum(None, 0)
+
+
+  @property
+  def numRows(self):
+    """
+    Number of data rows, including an unterminated last row.
+    """
+    numRows = self._numCompleteRows - self.numHeaderRows
+    if self._fileSize > self._endOffset:
+      numRows += 1
+    return max(numRows, 0)
+
+
+  @property
+  def dataOffset(self):
+    """
+    Offset of the first data row, or None if the header rows are incomplete.
+    """
+    if self._numCompleteRows < self.numHeaderRows:
+      return None
+    elif self._offsets:
+      return self._offsets[0]
+    else:
+      return self._endOffset
+
+
+  def getRowOffset(self, row):
+    """
+    Returns the offset of the closest indexed row at or before a data row.
+
+    @param row (int) Index of a data row. It may be numRows, the end of the
+                     data.
+    @return (tuple) Offset of an indexed row and number of rows to skip after
+                    it to reach row
+    """
+    if row < 0 or row > self.numRows:
+      raise IndexError("Row %d out of range (0 - %d)" % (row, self.numRows))
+
+    indexedRow = min(row // self.stride, len(self._offsets) - 1)
+    if indexedRow < 0:
+      # There are no complete data rows
+      return self.dataOffset, row
+    return self._offsets[indexedRow], row - indexedRow * self.stride
+
+
+  def update(self):
+    """
+    Brings the index up to date with the file. Only the data appended since
+    the last update is scanned, unless the file was truncated or rewritten.
+
+    @return (bool) True if the index changed
+    """
+    fileSize = os.path.getsize(self.filename)
+
+    with open(self.filename, "rb") as f:
+      if (fileSize < self._endOffset or
+          self._computeChecksum(f, self._endOffset) != self._checksum):
+        self._clear()
+      elif fileSize == self._fileSize:
+        return False
+
+      self._scan(f, fileSize)
+      self._fileSize = fileSize
+      self._checksum = self._computeChecksum(f, self._endOffset)
+
+    return True
+
+
+  def addWrittenRow(self, offset):
+    """
+    Adds a data row that is being written to the end of the file. The header
+    rows must have been written before it.
+
+    @param offset (int) Offset of the start of the row
+    """
+    if self._numCompleteRows == 0:
+      self._numCompleteRows = self.numHeaderRows
+    if (self._numCompleteRows - self.numHeaderRows) % self.stride == 0:
+      self._offsets.append(offset)
+    self._numCompleteRows += 1
+
+
+  def finishWrittenRows(self, endOffset):
+    """
+    Marks the end of the rows added with addWrittenRow(). The file must be
+    flushed.
+
+    @param endOffset (int) Offset of the end of the last written row
+    """
+    self._endOffset = endOffset
+    self._fileSize = endOffset
+    with open(self.filename, "rb") as f:
+      self._checksum = self._computeChecksum(f, endOffset)
+
+
+  def _addRows(self, rowStarts):
+    """
+    Adds complete rows to the index.
+
+    @param rowStarts (numpy.array) Offsets of the starts of the rows
+    """
+    dataRows = (numpy.arange(len(rowStarts)) + self._numCompleteRows -
+                self.numHeaderRows)
+    indexed = (dataRows >= 0) & (dataRows % self.stride == 0)
+    self._offsets.extend(rowStarts[indexed].tolist())
+    self._numCompleteRows += len(rowStarts)
+
+
+  def _scan(self, f, fileSize):
+    """
+    Scans the file from the end of the last complete row.
+    """
+    offset = self._endOffset
+    f.seek(offset)
+    while offset < fileSize:
+      block = f.read(min(_BLOCK_SIZE, fileSize - offset))
+      if not block:
+        break
+      if block[-1] == "\r":
+        # Make sure "\r\n" is not split between blocks
+        block += f.read(1)
+
+      data = numpy.frombuffer(block, dtype=numpy.uint8)
+      newlines = numpy.flatnonzero(data == _NEWLINE)
+      carriageReturns = numpy.flatnonzero(data == _CARRIAGE_RETURN)
+      hasLoneCarriageReturns = (
+        len(carriageReturns) > 0 and
+        (carriageReturns[-1] + 1 == len(data) or
+         (data[carriageReturns + 1] != _NEWLINE).any()))
+
+      if hasLoneCarriageReturns or (data == _QUOTE).any():
+        # Newlines don't always end rows, parse the rest of the file
+        self._scanRows(fileSize)
+        return
+
+      if len(newlines) > 0:
+        rowEnds = newlines + offset + 1
+        rowStarts = numpy.empty(len(rowEnds), dtype=numpy.int64)
+        rowStarts[0] = self._endOffset
+        rowStarts[1:] = rowEnds[:-1]
+        self._addRows(rowStarts)
+        self._endOffset = int(rowEnds[-1])
+
+      offset += len(block)
+
+
+  def _scanRows(self, fileSize):
+    """
+    Scans the file from the end of the last complete row with the csv module.
+    """
+    # Universal newlines, like FileRecordStream
+    with open(self.filename, "rU") as f:
+      f.seek(self._endOffset)
+
+      def readLines():
+        while True:
+          line = f.readline()
+          if not line:
+            return
+          yield line
+
+      # The reader reads one line at a time and stops at the end of a row, so
+      # the position of the file is the end of the last row read
+      reader = csv.reader(readLines(), dialect="excel")
+      rowStarts = []
+      rowStart = f.tell()
+      for _ in reader:
+        rowEnd = f.tell()
+        if rowEnd == fileSize and not self._endsWithNewline(fileSize):
+          # Unterminated last row
+          break
+        rowStarts.append(rowStart)
+        rowStart = rowEnd
+
+    self._addRows(numpy.array(rowStarts, dtype=numpy.int64))
+    self._endOffset = rowStart
+
+
+  def _endsWithNewline(self, fileSize):
+    with open(self.filename, "rb") as f:
+      f.seek(fileSize - 1)
+      return f.read(1) in ("\n", "\r")
+
+
+  @staticmethod
+  def _computeChecksum(f, endOffset):
+    """
+    Returns the checksum of the bytes before endOffset.
+    """
+    if f is None or endOffset == 0:
+      return 0
+    start = max(endOffset - _CHECKSUM_SIZE, 0)
+    f.seek(start)
+    return zlib.crc32(f.read(endOffset - start)) & 0xffffffff
+
+
+  def save(self, path):
+    """
+    Saves the index. The index is written to a temporary file first, so that
+    readers never see a partially written index.
+
+    @param path (str) Path of the saved index
+    """
+    tempPath = "%s.%d.tmp" % (path, os.getpid())
+    with open(tempPath, "wb") as f:
+      numpy.savez(f,
+                  offsets=numpy.array(self._offsets, dtype=numpy.int64),
+                  header=numpy.array([_VERSION, self.numHeaderRows,
+                                      self.stride, self._numCompleteRows,
+                                      self._endOffset, self._fileSize,
+                                      self._checksum], dtype=numpy.int64))
+    os.rename(tempPath, path)
+
+
+  @classmethod
+  def load(cls, filename, path):
+    """
+    Loads a saved index. Call update() to make sure it matches the file.
+
+    @param filename (str) Path of the indexed file
+    @param path (str) Path of the saved index
+    @return (FileRowIndex) The index, or None if it can't be loaded
+    """
+    try:
+      with open(path, "rb") as f:
+        data = numpy.load(f)
+        offsets = data["offsets"]
+        header = data["header"].tolist()
+    except (IOError, ValueError, KeyError):
+      return None
+
+    (version, numHeaderRows, stride, numCompleteRows, endOffset, fileSize,
+     checksum) = header
+    if version != _VERSION:
+      return None
+
+    index = cls(filename, numHeaderRows, stride)
+    index._offsets = offsets.tolist()
+    index._numCompleteRows = numCompleteRows
+    index._endOffset = endOffset
+    index._fileSize = fileSize
+    index._checksum = checksum
+    return index
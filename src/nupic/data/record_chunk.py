@@ -0,0 +1,298 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Columnar chunks of records
+
+A RecordChunk holds consecutive records of a stream as one numpy array per
+field, and one boolean array per field that is True where the value is
+missing. The dtype of a column depends on the type of its field:
+
+  int       numpy.int64, 0 where missing
+  float     numpy.float64, NaN where missing
+  bool      numpy.bool_, False where missing
+  datetime  numpy.datetime64[us], NaT where missing
+  string    numpy.int32 category codes, -1 where missing. The code of a value
+            is its index in the categories of the column, which are shared by
+            all the chunks of a stream, so codes are stable within a stream.
+  list, sdr numpy.object_ arrays of lists, None where missing
+
+RecordChunkParser converts the text fields of CSV rows to chunks a column at a
+time. Records can be read back from a chunk in the format returned by
+RecordStreamIface.getNextRecord().
+"""
+
+import itertools
+
+import numpy
+
+from nupic.data import SENTINEL_VALUE_FOR_MISSING_DATA
+from nupic.data.fieldmeta import FieldMetaType
+from nupic.data.utils import (TimestampParser, parseSdr, parseStringList,
+                              unescape)
+
+
+
+# Text values that intOrNone() and floatOrNone() convert to None
+_INT_NONE_VALUES = ("None", "NULL")
+_FLOAT_NONE_VALUES = ("None",)
+
+_TRUE_VALUES = ("true", "t", "1")
+_FALSE_VALUES = ("false", "f", "0")
+
+_DATETIME_DTYPE = "datetime64[us]"
+
+_OBJECT_ADAPTERS = {FieldMetaType.sdr: parseSdr,
+                    FieldMetaType.list: parseStringList}
+
+
+
+class RecordChunk(object):
+  """
+  Consecutive records stored as typed columns.
+  """
+
+  def __init__(self, fields, columns, masks, categories):
+    """
+    @param fields (list) nupic.data.fieldmeta.FieldMetaInfo of the fields
+    @param columns (list) numpy array of the values of each field
+    @param masks (list) numpy bool array of each field, True where the value
+                        is missing
+    @param categories (list) For string fields, the list of the values of the
+                             category codes. None for other fields.
+    """
+    self.fields = fields
+    self.columns = columns
+    self.masks = masks
+    self.categories = categories
+
+
+  def __len__(self):
+    if not self.columns:
+      return 0
+    return len(self.columns[0])
+
+
+  def __iter__(self):
+    return iter(self.getRecords())
+
+
+  def getFieldIndex(self, name):
+    """
+    Returns the index of a field.
+
+    @param name (str) Name of the field
+    """
+    for i, field in enumerate(self.fields):
+      if field.name == name:
+        return i
+    raise KeyError("No field named %r" % name)
+
+
+  def getColumn(self, name):
+    """
+    Returns the values and missing value mask of a field.
+
+    @param name (str) Name of the field
+    @return (tuple) The column and the mask of the field
+    """
+    i = self.getFieldIndex(name)
+    return self.columns[i], self.masks[i]
+
+
+  def slice(self, start, stop):
+    """
+    Returns the chunk of the records from start to stop. The columns of the
+    returned chunk are views of the columns of this chunk.
+    """
+    return RecordChunk(self.fields,
+                       [column[start:stop] for column in self.columns],
+                       [mask[start:stop] for mask in self.masks],
+                       self.categories)
+
+
+  def take(self, indices):
+    """
+    Returns the chunk of the records at some indices, in their order.
+
+    @param indices (numpy.array) Indices of the records
+    """
+    return RecordChunk(self.fields,
+                       [column[indices] for column in self.columns],
+                       [mask[indices] for mask in self.masks],
+                       self.categories)
+
+
+  def getRecords(self):
+    """
+    Returns the records of the chunk, in the format returned by
+    RecordStreamIface.getNextRecord(): a list of Python values per record,
+    with SENTINEL_VALUE_FOR_MISSING_DATA for missing values.
+    """
+    values = []
+    for column, mask, categories in zip(self.columns, self.masks,
+                                        self.categories):
+      if categories is not None:
+        # The code of missing values, -1, selects the trailing None
+        column = numpy.array(categories + [None], dtype=numpy.object_)[column]
+      # datetime64[us] columns are converted to datetime.datetime
+      fieldValues = column.tolist()
+      if mask.any():
+        for i in numpy.flatnonzero(mask).tolist():
+          fieldValues[i] = SENTINEL_VALUE_FOR_MISSING_DATA
+      values.append(fieldValues)
+
+    return [list(record) for record in zip(*values)]
+
+
+
+class RecordChunkParser(object):
+  """
+  Converts the text fields of rows to RecordChunks. The category codes of the
+  string fields are kept by the parser, so all the chunks of a parser share
+  them.
+  """
+
+  def __init__(self, fields, missingValues=("",)):
+    """
+    @param fields (list) nupic.data.fieldmeta.FieldMetaInfo of the fields
+    @param missingValues (sequence) Text values that are missing values
+    """
+    self.fields = list(fields)
+    self.missingValues = list(missingValues)
+    self._categories = [[] if field.type == FieldMetaType.string else None
+                        for field in self.fields]
+    self._categoryCodes = [{} for _ in self.fields]
+    self._timestampParser = TimestampParser()
+
+
+  def parse(self, rows):
+    """
+    Converts rows to a chunk.
+
+    @param rows (list) Rows of text fields, as returned by csv.reader
+    @return (RecordChunk) The records of the rows
+    """
+    rowLengths = numpy.array(map(len, rows), dtype=int)
+    invalidRows = numpy.flatnonzero(rowLengths != len(self.fields))
+    if len(invalidRows) > 0:
+      i = invalidRows[0]
+      raise ValueError("Row %d of the chunk has %d fields instead of %d" %
+                       (i, rowLengths[i], len(self.fields)))
+
+    if rows:
+      textColumns = [numpy.array(values) for values in zip(*rows)]
+    else:
+      textColumns = [numpy.array([], dtype=str) for _ in self.fields]
+
+    columns = []
+    masks = []
+    for i, field in enumerate(self.fields):
+      column, mask = self._parseColumn(i, field.type, textColumns[i])
+      columns.append(column)
+      masks.append(mask)
+
+    return RecordChunk(self.fields, columns, masks, self._categories)
+
+
+  def _getMissingMask(self, values, noneValues=()):
+    mask = numpy.zeros(len(values), dtype=bool)
+    for missingValue in itertools.chain(self.missingValues, noneValues):
+      mask |= values == missingValue
+    return mask
+
+
+  def _parseColumn(self, index, fieldType, values):
+    """
+    Converts a column of text fields to its typed column and missing mask.
+    """
+    if fieldType == FieldMetaType.integer:
+      mask = self._getMissingMask(values)
+      try:
+        column = numpy.where(mask, "0", values).astype(numpy.int64)
+      except ValueError:
+        # intOrNone() converts None values, after stripping them, to None
+        stripped = numpy.char.strip(values)
+        for noneValue in _INT_NONE_VALUES:
+          mask |= stripped == noneValue
+        column = numpy.where(mask, "0", values).astype(numpy.int64)
+      return column, mask
+
+    elif fieldType == FieldMetaType.float:
+      mask = self._getMissingMask(values, _FLOAT_NONE_VALUES)
+      return numpy.where(mask, "nan", values).astype(numpy.float64), mask
+
+    elif fieldType == FieldMetaType.boolean:
+      mask = self._getMissingMask(values)
+      lowerValues = numpy.char.lower(values)
+      column = numpy.in1d(lowerValues, _TRUE_VALUES)
+      invalid = ~(column | mask | numpy.in1d(lowerValues, _FALSE_VALUES))
+      if invalid.any():
+        raise Exception("Unable to convert string '%s' to a boolean value" %
+                        values[numpy.flatnonzero(invalid)[0]])
+      column[mask] = False
+      return column, mask
+
+    elif fieldType == FieldMetaType.datetime:
+      mask = self._getMissingMask(values)
+      column = numpy.empty(len(values), dtype=_DATETIME_DTYPE)
+      column[mask] = numpy.datetime64("NaT")
+      present = numpy.flatnonzero(~mask)
+      column[present] = self._timestampParser.parseArray(values[present])
+      return column, mask
+
+    elif fieldType == FieldMetaType.string:
+      mask = self._getMissingMask(values)
+      return self._getCategoryCodes(index, values, mask), mask
+
+    else:
+      mask = self._getMissingMask(values)
+      adapter = _OBJECT_ADAPTERS[fieldType]
+      column = numpy.empty(len(values), dtype=numpy.object_)
+      for i in numpy.flatnonzero(~mask).tolist():
+        column[i] = adapter(values[i])
+      return column, mask
+
+
+  def _getCategoryCodes(self, index, values, mask):
+    """
+    Returns the category codes of the values of a string field, adding the
+    new values to its categories.
+    """
+    categories = self._categories[index]
+    categoryCodes = self._categoryCodes[index]
+
+    codes = numpy.empty(len(values), dtype=numpy.int32)
+    codes[mask] = -1
+    present = numpy.flatnonzero(~mask)
+    uniqueValues, inverse = numpy.unique(values[present], return_inverse=True)
+    uniqueCodes = numpy.empty(len(uniqueValues), dtype=numpy.int32)
+    for i, value in enumerate(uniqueValues.tolist()):
+      code = categoryCodes.get(value)
+      if code is None:
+        code = len(categories)
+        categoryCodes[value] = code
+        categories.append(unescape(value))
+      uniqueCodes[i] = code
+
+    codes[present] = uniqueCodes[inverse]
+    return codes
+
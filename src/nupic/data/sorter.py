@@ -20,14 +20,23 @@
 # http://numenta.org/licenses/
 # ----------------------------------------------------------------------
 
+import heapq
+import itertools
+import multiprocessing
 import os
+import shutil
 import sys
+import tempfile
+import time
 from operator import itemgetter
 
-import psutil
+import numpy
 
-from nupic.support import title
+from nupic.data.binary_record_stream import (BinaryRecordStream,
+                                             BinaryRecordWriter)
+from nupic.data.fieldmeta import FieldMetaInfo, FieldMetaType
 from nupic.data.file_record_stream import FileRecordStream
+from nupic.data.record_chunk import RecordChunk
 
 
 """The sorter sorts PF datasets in the standard File format
@@ -36,154 +45,390 @@ from nupic.data.file_record_stream import FileRecordStream
 - It allows sorting of datasets that don't fit in memory
 - It allows selecting a subset of the original fields
 
-The sorter uses merge sort ()
+The sorter uses an external merge sort. The file is split in chunks of
+consecutive records that fit in the memory budget. The chunks are sorted by a
+pool of processes, which write them to temporary binary record files (see
+nupic.data.binary_record_stream). The sorted chunks are then merged into the
+output file with a heap, reading a buffer of records of each chunk at a time.
+When there are more than _MAX_MERGE_FILES chunks, groups of consecutive chunks
+are first merged into larger chunk files, so that the number of files open at
+once stays bounded.
 
+The sort is stable: records with equal keys keep their order in the file.
 """
-def sort(filename, key, outputFile, fields=None, watermark=1024 * 1024 * 100):
+
+# Default memory budget of sort(), in bytes
+DEFAULT_MEMORY_BUDGET = 1024 * 1024 * 512
+
+# Estimate of the memory used to sort and merge records, as a multiple of the
+# size of the records in the file
+_MEMORY_PER_FILE_BYTE = 8
+
+# Maximum number of records read at once from a chunk file during the merge
+_MAX_MERGE_BUFFER = 65536
+
+# Maximum number of chunk files merged at once, each of which holds a file
+# descriptor
+_MAX_MERGE_FILES = 64
+
+# Number of merged records between progress reports
+_PROGRESS_INTERVAL = 100000
+
+
+
+def sort(filename, key, outputFile, fields=None, watermark=None,
+         memoryBudget=DEFAULT_MEMORY_BUDGET, numWorkers=None,
+         progressCB=None):
   """Sort a potentially big file
 
   filename - the input file (standard File format)
   key - a list of field names to sort by
   outputFile - the name of the output file
   fields - a list of fields that should be included (all fields if None)
-  watermark - when available memory goes bellow the watermark create a new chunk
-
-  sort() works by reading as records from the file into memory
-  and calling _sortChunk() on each chunk. In the process it gets
-  rid of unneeded fields if any. Once all the chunks have been sorted and
-  written to chunk files it calls _merge() to merge all the chunks into a
-  single sorted file.
+  watermark - ignored, memoryBudget limits the memory instead
+  memoryBudget - approximate number of bytes of memory used by the sort
+  numWorkers - number of processes that sort chunks (the number of CPUs if
+    None)
+  progressCB - called with the dict of counters returned by sort() after each
+    sorted chunk and periodically during the merge
+
+  sort() splits the file into chunks of consecutive records, small enough that
+  numWorkers chunks fit in memoryBudget, and calls _sortChunk() on each chunk
+  in a pool of processes. In the process it gets rid of unneeded fields if
+  any. Once all the chunks have been sorted and written to chunk files it
+  calls _mergeFiles() to merge all the chunks into a single sorted file.
 
   Note, that sort() gets a key that contains field names, which it converts
-  into field indices for _sortChunk() becuase _sortChunk() doesn't need to know
+  into field indices for _sortChunk() because _sortChunk() doesn't need to know
   the field name.
 
-  sort() figures out by itself how many chunk files to use by reading records
-  from the file until the low watermark value of availabel memory is hit and
-  then it sorts the current records, generates a chunk file, clears the sorted
-  records and starts on a new chunk.
-
-  The key field names are turned into indices
+  Returns a dict of counters:
+    numRecords - the number of records of the file
+    numChunks - the number of sorted chunks
+    numMergePasses - the number of passes of the merge, more than 1 when
+      the chunks are merged into intermediate chunk files first
+    sortedRecords - the number of records of the sorted chunks
+    mergedRecords - the number of records written to the output file
+    sortSeconds, mergeSeconds - the duration of the sort and merge phases
+    recordsPerSecond - the throughput of the current phase
   """
   if fields is not None:
     assert set(key).issubset(set([f[0] for f in fields]))
 
-  with FileRecordStream(filename) as f:
-
-
-    # Find the indices of the requested fields
-    if fields:
-      fieldNames = [ff[0] for ff in fields]
-      indices = [f.getFieldNames().index(name) for name in fieldNames]
-      assert len(indices) == len(fields)
-    else:
-      fileds = f.getFields()
-      fieldNames = f.getFieldNames()
-      indices = None
-
-    # turn key fields to key indices
-    key = [fieldNames.index(name) for name in key]
-
-    chunk = 0
-    records = []
-    for i, r in enumerate(f):
-      # Select requested fields only
-      if indices:
-        temp = []
-        for i in indices:
-          temp.append(r[i])
-        r = temp
-      # Store processed record
-      records.append(r)
-
-      # Check memory
-      available_memory = psutil.avail_phymem()
-
-      # If bellow the watermark create a new chunk, reset and keep going
-      if available_memory < watermark:
-        _sortChunk(records, key, chunk, fields)
-        records = []
-        chunk += 1
-
-    # Sort and write the remainder
-    if len(records) > 0:
-      _sortChunk(records, key, chunk, fields)
-      chunk += 1
-
-    # Marge all the files
-    _mergeFiles(key, chunk, outputFile, fields)
-
-def _sortChunk(records, key, chunkIndex, fields):
+  chunkDir = tempfile.mkdtemp(prefix="sort_",
+                              dir=os.path.dirname(os.path.abspath(outputFile)))
+  try:
+    return _sort(filename, key, outputFile, fields, memoryBudget, numWorkers,
+                 progressCB, chunkDir)
+  finally:
+    shutil.rmtree(chunkDir, ignore_errors=True)
+
+
+
+def _sort(filename, key, outputFile, fields, memoryBudget, numWorkers,
+          progressCB, chunkDir):
+  """Implements sort(), with the temporary files in chunkDir"""
+  # The row index is saved in the chunk directory, so that the chunk processes
+  #  don't index the file again to seek to their chunk
+  rowIndexPath = os.path.join(chunkDir, "input.rowidx")
+  with FileRecordStream(filename, rowIndex=rowIndexPath) as f:
+    inputFields = f.getFields()
+    numRecords = f.getDataRowCount()
+
+  # Find the indices of the requested fields
+  inputFieldNames = [ff[0] for ff in inputFields]
+  if fields:
+    fieldNames = [ff[0] for ff in fields]
+    indices = [inputFieldNames.index(name) for name in fieldNames]
+    assert len(indices) == len(fields)
+  else:
+    fields = inputFields
+    fieldNames = inputFieldNames
+    indices = range(len(inputFields))
+
+  # turn key fields to key indices
+  key = [fieldNames.index(name) for name in key]
+
+  if numWorkers is None:
+    numWorkers = multiprocessing.cpu_count()
+  recordSize = max(os.path.getsize(filename) // max(numRecords, 1), 1)
+  recordMemory = recordSize * _MEMORY_PER_FILE_BYTE
+  chunkSize = max(memoryBudget // (numWorkers * recordMemory), 1)
+  numChunks = (numRecords + chunkSize - 1) // chunkSize
+
+  stats = dict(numRecords=numRecords, numChunks=numChunks, numMergePasses=0,
+               sortedRecords=0, mergedRecords=0, sortSeconds=0.0, mergeSeconds=0.0,
+               recordsPerSecond=0.0)
+
+  tasks = [(filename, rowIndexPath, indices, key, i * chunkSize, chunkSize,
+            os.path.join(chunkDir, "chunk_%d.nrec" % i))
+           for i in xrange(numChunks)]
+
+  startTime = time.time()
+  pool = None
+  if numWorkers > 1 and numChunks > 1:
+    pool = multiprocessing.Pool(min(numWorkers, numChunks))
+  try:
+    results = (pool.imap_unordered(_sortChunkFile, tasks) if pool else
+               itertools.imap(_sortChunkFile, tasks))
+    for numSorted in results:
+      stats["sortedRecords"] += numSorted
+      stats["sortSeconds"] = time.time() - startTime
+      stats["recordsPerSecond"] = (stats["sortedRecords"] /
+                                   max(stats["sortSeconds"], 1e-6))
+      if progressCB is not None:
+        progressCB(stats)
+    if pool:
+      pool.close()
+  finally:
+    if pool:
+      pool.terminate()
+      pool.join()
+
+  # Merge all the files, at most _MAX_MERGE_FILES at a time
+  numMergeFiles = min(max(numChunks, 1), _MAX_MERGE_FILES)
+  bufferSize = min(max(memoryBudget // (numMergeFiles * recordMemory), 1),
+                   _MAX_MERGE_BUFFER)
+  chunkFiles = [task[-1] for task in tasks]
+  while len(chunkFiles) > _MAX_MERGE_FILES:
+    mergedFiles = []
+    for i in xrange(0, len(chunkFiles), _MAX_MERGE_FILES):
+      group = chunkFiles[i:i + _MAX_MERGE_FILES]
+      mergedFile = os.path.join(chunkDir, "merge_%d_%d.nrec" %
+                                (stats["numMergePasses"], len(mergedFiles)))
+      _mergeChunkFiles(key, group, mergedFile, fields, bufferSize)
+      for chunkFile in group:
+        os.remove(chunkFile)
+      mergedFiles.append(mergedFile)
+    chunkFiles = mergedFiles
+    stats["numMergePasses"] += 1
+
+  stats["numMergePasses"] += 1
+  _mergeFiles(key, chunkFiles, outputFile, fields, bufferSize, stats,
+              progressCB)
+
+  return stats
+
+
+
+def _getSortKeys(chunk, key):
+  """Returns the numpy.lexsort() keys that sort the records of a chunk like
+  Python sorts them by the values of the key fields.
+
+  Missing values are smaller than all the other values, like None. The
+  category codes of strings and lists are replaced by their rank.
+  """
+  sortKeys = []
+  for i in reversed(key):
+    column = chunk.columns[i]
+    mask = chunk.masks[i]
+    if chunk.categories[i] is not None:
+      categories = numpy.array(chunk.categories[i], dtype=numpy.object_)
+      ranks = numpy.empty(len(categories), dtype=numpy.int64)
+      ranks[numpy.argsort(categories, kind="mergesort")] = numpy.arange(
+        len(categories))
+      column = ranks[numpy.where(mask, 0, column)] if len(ranks) else column
+    elif column.dtype.kind == "O":
+      column = _getRanks(column.tolist())
+    elif column.dtype.kind == "M":
+      column = column.view(numpy.int64)
+    sortKeys.append(numpy.where(mask, 0, column))
+    sortKeys.append(~mask)
+  return sortKeys
+
+
+
+def _getRanks(values):
+  """Returns the ranks of values, equal values have the same rank."""
+  order = sorted(xrange(len(values)), key=values.__getitem__)
+  ranks = numpy.empty(len(values), dtype=numpy.int64)
+  rank = 0
+  for j, i in enumerate(order):
+    if j > 0 and values[order[j - 1]] != values[i]:
+      rank += 1
+    ranks[i] = rank
+  return ranks
+
+
+
+def _sortChunk(chunk, key):
   """Sort in memory chunk of records
 
-  records - a list of records read from the original dataset
+  chunk - a nupic.data.record_chunk.RecordChunk of records of the dataset
   key - a list of indices to sort the records by
-  chunkIndex - the index of the current chunk
 
-  The records contain only the fields requested by the user.
+  Returns the sorted chunk. The sort is stable.
+  """
+  if len(chunk) == 0 or not key:
+    return chunk
+  return chunk.take(numpy.lexsort(_getSortKeys(chunk, key)))
+
+
+
+def _sortChunkFile(task):
+  """Sorts a chunk of a file, in a process of the pool
+
+  task - (filename, rowIndexPath, indices, key, firstRecord, numRecords,
+    chunkFile): the input file, the path of its saved row index, the indices
+    of its fields to keep, the key, the range of records of the chunk and the
+    binary record file of the sorted chunk
 
-  _sortChunk() will write the sorted records to a standard File
-  named "chunk_<chunk index>.csv" (chunk_0.csv, chunk_1.csv,...).
+  Returns the number of records of the chunk.
   """
-  title(additional='(key=%s, chunkIndex=%d)' % (str(key), chunkIndex))
+  (filename, rowIndexPath, indices, key, firstRecord, numRecords,
+   chunkFile) = task
 
-  assert len(records) > 0
+  with FileRecordStream(filename, firstRecord=firstRecord,
+                        rowIndex=rowIndexPath) as f:
+    chunk = f.getNextRecordChunk(numRecords)
 
-  # Sort the current records
-  records.sort(key=itemgetter(*key))
+  # Select requested fields only
+  fields = [FieldMetaInfo(*chunk.fields[i]) for i in indices]
+  chunk = RecordChunk(fields, [chunk.columns[i] for i in indices],
+                      [chunk.masks[i] for i in indices],
+                      [chunk.categories[i] for i in indices])
 
-  # Write to a chunk file
-  if chunkIndex is not None:
-    filename = 'chunk_%d.csv' % chunkIndex
-    with FileRecordStream(filename, write=True, fields=fields) as o:
-      for r in records:
-        o.appendRecord(r)
+  with BinaryRecordWriter(chunkFile, fields) as o:
+    o.writeChunk(_sortChunk(chunk, key))
 
-    assert os.path.getsize(filename) > 0
+  return len(chunk)
 
-  return records
 
-def _mergeFiles(key, chunkCount, outputFile, fields):
-  """Merge sorted chunk files into a sorted output file
 
-  chunkCount - the number of available chunk files
-  outputFile the name of the sorted output file
+def _readChunkFile(chunkFile, bufferSize):
+  """Yields the records of a chunk file, reading bufferSize records at a time
+  """
+  with BinaryRecordStream(chunkFile) as f:
+    while True:
+      chunk = f.getNextRecordChunk(bufferSize)
+      if chunk is None:
+        return
+      for r in chunk.getRecords():
+        yield r
+
+
+
+def _mergeRecords(key, chunkFiles, bufferSize):
+  """Yields the records of sorted chunk files, merged in sorted order
+
+  key - a list of indices to sort the records by
+  chunkFiles - the sorted chunk files, in the order of their records in the
+    input file
+  bufferSize - the number of records read at once from each chunk file
+
+  The chunk index breaks ties between equal keys, so the merge is stable.
+  """
+  getKey = itemgetter(*key) if key else lambda r: None
+
+  def decorate(chunkIndex, chunkFile):
+    for r in _readChunkFile(chunkFile, bufferSize):
+      yield getKey(r), chunkIndex, r
+
+  for _, _, r in heapq.merge(*[decorate(i, chunkFile)
+                               for i, chunkFile in enumerate(chunkFiles)]):
+    yield r
+
+
+
+def _getRecordChunk(fields, records, categories, categoryCodes):
+  """Converts records to a chunk
+
+  fields - the fields of the records
+  records - the records, as returned by RecordChunk.getRecords()
+  categories - the categories of the string fields, shared by the chunks of a
+    file, to which the new values are added
+  categoryCodes - the codes of the categories, by value
+
+  Returns the nupic.data.record_chunk.RecordChunk of the records.
+  """
+  columns = []
+  masks = []
+  for i, field in enumerate(fields):
+    values = [r[i] for r in records]
+    mask = numpy.array([value is None for value in values], dtype=bool)
+    if field.type == FieldMetaType.string:
+      codes = categoryCodes[i]
+      for value in values:
+        if value is not None and value not in codes:
+          codes[value] = len(categories[i])
+          categories[i].append(value)
+      column = numpy.array([-1 if value is None else codes[value]
+                            for value in values], dtype=numpy.int32)
+    elif field.type == FieldMetaType.integer:
+      column = numpy.array([0 if value is None else value
+                            for value in values], dtype=numpy.int64)
+    elif field.type == FieldMetaType.float:
+      column = numpy.array(values, dtype=numpy.float64)
+    elif field.type == FieldMetaType.boolean:
+      column = numpy.array([bool(value) for value in values], dtype=bool)
+    elif field.type == FieldMetaType.datetime:
+      column = numpy.array(values, dtype="datetime64[us]")
+    else:
+      column = numpy.empty(len(values), dtype=numpy.object_)
+      for j, value in enumerate(values):
+        column[j] = value
+    columns.append(column)
+    masks.append(mask)
+  return RecordChunk(fields, columns, masks, categories)
+
 
-  _mergeFiles()
 
+def _mergeChunkFiles(key, chunkFiles, mergedFile, fields, bufferSize):
+  """Merge sorted chunk files into a sorted chunk file
+
+  mergedFile - the name of the merged chunk file
+
+  See _mergeRecords() for the other arguments.
   """
-  title()
+  fields = [FieldMetaInfo(*field) for field in fields]
+  categories = [[] if field.type == FieldMetaType.string else None
+                for field in fields]
+  categoryCodes = [{} for _ in fields]
+  merged = _mergeRecords(key, chunkFiles, bufferSize)
+
+  with BinaryRecordWriter(mergedFile, fields) as o:
+    while True:
+      records = list(itertools.islice(merged, _PROGRESS_INTERVAL))
+      if not records:
+        break
+      o.writeChunk(_getRecordChunk(fields, records, categories,
+                                   categoryCodes))
+
 
-  # Open all chun files
-  files = [FileRecordStream('chunk_%d.csv' % i) for i in range(chunkCount)]
 
-  # Open output file
+def _mergeFiles(key, chunkFiles, outputFile, fields, bufferSize, stats,
+                progressCB):
+  """Merge sorted chunk files into a sorted output file
+
+  key - a list of indices to sort the records by
+  chunkFiles - the sorted chunk files, in the order of their records in the
+    input file
+  outputFile - the name of the sorted output file
+  fields - the fields of the output file
+  bufferSize - the number of records read at once from each chunk file
+  stats - the counters of sort(), updated with the merged records
+  progressCB - called with stats every _PROGRESS_INTERVAL records
+
+  The chunk index breaks ties between equal keys, so the merge is stable.
+  """
+  startTime = time.time()
+  merged = _mergeRecords(key, chunkFiles, bufferSize)
+
   with FileRecordStream(outputFile, write=True, fields=fields) as o:
-    # Open all chunk files
-    files = [FileRecordStream('chunk_%d.csv' % i) for i in range(chunkCount)]
-    records = [f.getNextRecord() for f in files]
-
-    # This loop will run until all files are exhausted
-    while not all(r is None for r in records):
-      # Cleanup None values (files that were exhausted)
-      indices = [i for i,r in enumerate(records) if r is not None]
-      records = [records[i] for i in indices]
-      files = [files[i] for i in indices]
-
-      # Find the current record
-      r = min(records, key=itemgetter(*key))
-      # Write it to the file
-      o.appendRecord(r)
-
-      # Find the index of file that produced the current record
-      index = records.index(r)
-      # Read a new record from the file
-      records[index] = files[index].getNextRecord()
-
-  # Cleanup chunk files
-  for i, f in enumerate(files):
-    f.close()
-    os.remove('chunk_%d.csv' % i)
+    while True:
+      records = list(itertools.islice(merged, _PROGRESS_INTERVAL))
+      if not records:
+        break
+      o.appendRecords(records)
+
+      stats["mergedRecords"] += len(records)
+      stats["mergeSeconds"] = time.time() - startTime
+      stats["recordsPerSecond"] = (stats["mergedRecords"] /
+                                   max(stats["mergeSeconds"], 1e-6))
+      if progressCB is not None:
+        progressCB(stats)
+
+
 
 def writeTestFile(testFile, fields, big):
   if big:
@@ -229,19 +474,16 @@ def test(long):
   if not os.path.isfile(testFile):
     writeTestFile(testFile, fields, big=long)
 
-  # Set watermark here to 300MB bellow current available memory. That ensures
-  # multiple chunk files in the big testcase
-
-  mem = psutil.avail_phymem()
-  watermark = mem - 300 * 1024 * 1024
+  # A memory budget smaller than a record makes a chunk file per record
 
-  print 'Test sorting by f1 and f2, watermak:', watermark
+  print 'Test sorting by f1 and f2'
   results = []
   sort(testFile,
        key=['f1', 'f2'],
        fields=fields,
        outputFile='f1_f2.csv',
-       watermark=watermark)
+       memoryBudget=1,
+       numWorkers=2)
   with FileRecordStream('f1_f2.csv') as f:
     for r in f:
       results.append(r[:3])
@@ -257,15 +499,14 @@ def test(long):
     [2, 4, 5],
   ]
 
-  mem = psutil.avail_phymem()
-  watermark = mem - 300 * 1024 * 1024
-  print 'Test sorting by f2 and f1, watermark:', watermark
+  print 'Test sorting by f2 and f1'
   results = []
   sort(testFile,
        key=['f2', 'f1'],
        fields=fields,
        outputFile='f2_f1.csv',
-       watermark=watermark)
+       memoryBudget=1,
+       numWorkers=2)
   with FileRecordStream('f2_f1.csv') as f:
     for r in f:
       results.append(r[:3])
@@ -280,15 +521,14 @@ def test(long):
     [2, 4, 5],
   ]
 
-  mem = psutil.avail_phymem()
-  watermark = mem - 300 * 1024 * 1024
-  print 'Test sorting by f3 and f2, watermark:', watermark
+  print 'Test sorting by f3 and f2'
   results = []
   sort(testFile,
        key=['f3', 'f2'],
        fields=fields,
        outputFile='f3_f2.csv',
-       watermark=watermark)
+       memoryBudget=1,
+       numWorkers=2)
   with FileRecordStream('f3_f2.csv') as f:
     for r in f:
       results.append(r[:3])
@@ -19,15 +19,22 @@
 # http://numenta.org/licenses/
 # ----------------------------------------------------------------------
 
+import datetime
 import itertools
+import multiprocessing
+import os
 import pprint
-import operator
-from collections import defaultdict
+import shutil
+import tempfile
 
 from pkg_resources import resource_filename
 
 import numpy
+from nupic.data import SENTINEL_VALUE_FOR_MISSING_DATA
 from nupic.data.file_record_stream import FileRecordStream
+from nupic.data.streaming_stats import (DistinctCountSketch, HeavyHitters,
+                                        MomentStats, QuantileSketch,
+                                        hashValues)
 from nupic.encoders import date as DateEncoder
 
 
@@ -44,6 +51,11 @@ string
 datetime
 bool
 
+Each collector summarizes the values of its field in a single pass, in
+bounded memory, with the sketches of nupic.data.streaming_stats. Collectors
+of the same field can be merged, so generateStats() can collect the stats of
+parts of the file in parallel.
+
 class ModelStatsCollector(object):
   def __init__(self, fieldname):
     pass
@@ -51,34 +63,115 @@ class ModelStatsCollector(object):
   def addValue(self, value):
     pass
 
+  def addValues(self, values, numMissing=0):
+    pass
+
+  def merge(self, other):
+    pass
+
   def getStats(self,):
     pass
 """
 
+# Number of values buffered by addValue() before they are summarized
+_BATCH_SIZE = 4096
+
+# Number of records read at once by generateStats()
+_CHUNK_SIZE = 65536
+
+# Number of most frequent values in the stats of string fields
+_NUM_TOP_VALUES = 5
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+# Datetime encoder of DateTimeStatsCollector, created when first needed
+_dateEncoder = None
+
+
+
+def _getDateEncoder():
+  """ Returns a datetime encoder with maximal resolution for each subencoder
+  """
+  global _dateEncoder
+  if _dateEncoder is None:
+    _dateEncoder = DateEncoder.DateEncoder(
+      season=(1,1), # width=366, resolution=1day
+      dayOfWeek=(1,1), # width=7, resolution=1day
+      timeOfDay=(1,1.0/60), # width=1440, resolution=1min
+      weekend=1, # width=2, binary encoding
+      holiday=1, # width=2, binary encoding
+      )
+  return _dateEncoder
+
+
+
 class BaseStatsCollector(object):
 
+  # dtype of the arrays of values given to _addValues()
+  dtype = numpy.object_
+
   def __init__(self, fieldname, fieldtype, fieldspecial):
     self.fieldname = fieldname
     self.fieldtype = fieldtype
     self.fieldspecial = fieldspecial
-    # we can remove value list if it is a speed or memory bottleneck
-    self.valueList = []
-    self.valueSet = set()
+    self.numEntries = 0
+    self.numMissing = 0
+    self.distinctCount = DistinctCountSketch()
+    # Values added by addValue() that are not summarized yet
+    self._pendingValues = []
 
   def addValue(self, value):
-    self.valueList.append(value)
-    self.valueSet.add(value)
+    self._pendingValues.append(value)
+    if len(self._pendingValues) >= _BATCH_SIZE:
+      self._flush()
+
+  def addValues(self, values, numMissing=0):
+    """ Adds a batch of values
+
+        values: numpy array or list of the values that are not missing
+        numMissing: number of missing values of the batch
+    """
+    self._flush()
+    values = numpy.asarray(values, dtype=self.dtype)
+    self.numEntries += len(values) + numMissing
+    self.numMissing += numMissing
+    if len(values) > 0:
+      self._addValues(values)
+
+  def _addValues(self, values):
+    """ Summarizes values, overridden by the collectors of each type
+    """
+    self.distinctCount.add(hashValues(values))
+
+  def _flush(self):
+    if self._pendingValues:
+      values = self._pendingValues
+      self._pendingValues = []
+      present = [v for v in values if v != SENTINEL_VALUE_FOR_MISSING_DATA]
+      self.addValues(present, len(values) - len(present))
+
+  def merge(self, other):
+    """ Adds the values of another collector of the same field
+    """
+    self._flush()
+    other._flush()
+    self.numEntries += other.numEntries
+    self.numMissing += other.numMissing
+    self.distinctCount.merge(other.distinctCount)
 
   def getStats(self, stats):
+    self._flush()
+
     # Intialize a new dict for this field
     stats[self.fieldname] = dict()
     stats[self.fieldname]['name']    = self.fieldname
     stats[self.fieldname]['type']    = self.fieldtype
     stats[self.fieldname]['special'] = self.fieldspecial
 
-    # Basic stats valid for all fields
-    totalNumEntries = len(self.valueList)
-    totalNumDistinctEntries = len(self.valueSet)
+    # Basic stats valid for all fields. The missing value is a distinct entry.
+    totalNumEntries = self.numEntries
+    totalNumDistinctEntries = (self.distinctCount.estimate() +
+                               int(self.numMissing > 0))
     stats[self.fieldname]['totalNumEntries'] = totalNumEntries
     stats[self.fieldname]['totalNumDistinctEntries'] = totalNumDistinctEntries
 
@@ -92,30 +185,58 @@ class BaseStatsCollector(object):
 
 class StringStatsCollector(BaseStatsCollector):
 
+  def __init__(self, fieldname, fieldtype, fieldspecial):
+    BaseStatsCollector.__init__(self, fieldname, fieldtype, fieldspecial)
+    self.heavyHitters = HeavyHitters()
+
+  def _addValues(self, values):
+    BaseStatsCollector._addValues(self, values)
+    self.heavyHitters.add(values.tolist())
+
+  def merge(self, other):
+    BaseStatsCollector.merge(self, other)
+    self.heavyHitters.merge(other.heavyHitters)
+
   def getStats(self, stats):
 
     BaseStatsCollector.getStats(self, stats)
 
-    if VERBOSITY > 2:
-
-      valueCountDict = defaultdict(int)
-      for value in self.valueList:
-        valueCountDict[value] += 1
+    # The most frequent strings, with approximate counts
+    topN = _NUM_TOP_VALUES
+    topValues = self.heavyHitters.getTopValues(topN)
+    stats[self.fieldname]['topValues'] = topValues
 
+    if VERBOSITY > 2:
       print "--"
       # Print the top 5 frequent strings
-      topN = 5
       print " Sorted list:"
-      for key, value in sorted(valueCountDict.iteritems(),
-                               key=operator.itemgetter(1),
-                               reverse=True,)[:topN]:
-
+      for key, value in topValues:
         print "%s:%d" % (key, value)
-      if len(valueCountDict) > topN:
+      if len(self.heavyHitters.counts) > topN:
         print "..."
 
 class NumberStatsCollector(BaseStatsCollector):
 
+  dtype = numpy.float64
+
+  def __init__(self, fieldname, fieldtype, fieldspecial):
+    BaseStatsCollector.__init__(self, fieldname, fieldtype, fieldspecial)
+    self.moments = MomentStats()
+    self.quantiles = QuantileSketch()
+
+  def _addValues(self, values):
+    BaseStatsCollector._addValues(self, values)
+    self.moments.add(values)
+    self.quantiles.add(values)
+
+  def merge(self, other):
+    BaseStatsCollector.merge(self, other)
+    self.moments.merge(other.moments)
+    self.quantiles.merge(other.quantiles)
+
+  def _getQuantile(self, q):
+    return self.quantiles.quantile(q)
+
   def getStats(self, stats):
     """ Override of getStats()  in BaseStatsCollector
 
@@ -125,43 +246,39 @@ class NumberStatsCollector(BaseStatsCollector):
     """
     BaseStatsCollector.getStats(self, stats)
 
-    sortedNumberList = sorted(self.valueList)
-    listLength = len(sortedNumberList)
-    min = sortedNumberList[0]
-    max = sortedNumberList[-1]
-    mean = numpy.mean(self.valueList)
-    median = sortedNumberList[int(0.5*listLength)]
-    percentile1st = sortedNumberList[int(0.01*listLength)]
-    percentile99th = sortedNumberList[int(0.99*listLength)]
+    min = self.moments.min
+    max = self.moments.max
+    mean = self.moments.mean if self.moments.count > 0 else None
+    variance = self.moments.variance
+    stdev = numpy.sqrt(variance) if variance is not None else None
+    median = self._getQuantile(0.5)
+    percentile1st = self._getQuantile(0.01)
+    percentile99th = self._getQuantile(0.99)
 
-    differenceList = \
-               [(cur - prev) for prev, cur in itertools.izip(list(self.valueSet)[:-1],
-                                                             list(self.valueSet)[1:])]
-    if min > max:
-      print self.fieldname, min, max, '-----'
-    meanResolution = numpy.mean(differenceList)
+    # Mean difference between consecutive distinct values
+    numDistinctValues = self.distinctCount.estimate()
+    if numDistinctValues > 1:
+      meanResolution = float(max - min) / (numDistinctValues - 1)
+    else:
+      meanResolution = None
 
 
     stats[self.fieldname]['min'] = min
     stats[self.fieldname]['max'] = max
     stats[self.fieldname]['mean'] = mean
+    stats[self.fieldname]['stdev'] = stdev
     stats[self.fieldname]['median'] = median
     stats[self.fieldname]['percentile1st'] = percentile1st
     stats[self.fieldname]['percentile99th'] = percentile99th
     stats[self.fieldname]['meanResolution'] = meanResolution
 
-    # TODO: Right now, always pass the data along.
-    # This is used for data-dependent encoders.
-    passData = True
-    if passData:
-      stats[self.fieldname]['data'] = self.valueList
-
     if VERBOSITY > 2:
       print '--'
       print "Statistics:"
       print "min:", min
       print "max:", max
       print "mean:", mean
+      print "stdev:", stdev
       print "median:", median
       print "1st percentile :", percentile1st
       print "99th percentile:", percentile99th
@@ -170,29 +287,74 @@ class NumberStatsCollector(BaseStatsCollector):
       print "Resolution:"
       print "Mean Resolution:", meanResolution
 
-    if VERBOSITY > 3:
-      print '--'
-      print "Histogram:"
-      counts, bins = numpy.histogram(self.valueList, new=True)
-      print "Counts:", counts.tolist()
-      print "Bins:", bins.tolist()
-
 
 class IntStatsCollector(NumberStatsCollector):
-  pass
+
+  dtype = numpy.int64
+
+  def _getQuantile(self, q):
+    # The sketch keeps values as floats
+    value = NumberStatsCollector._getQuantile(self, q)
+    return int(value) if value is not None else None
 
 class FloatStatsCollector(NumberStatsCollector):
   pass
 
 class BoolStatsCollector(BaseStatsCollector):
-  pass
+
+  dtype = numpy.bool_
 
 class DateTimeStatsCollector(BaseStatsCollector):
 
+  dtype = 'datetime64[us]'
+
+  def __init__(self, fieldname, fieldtype, fieldspecial):
+    BaseStatsCollector.__init__(self, fieldname, fieldtype, fieldspecial)
+    # The moments and quantiles of the microseconds since the epoch
+    self.moments = MomentStats()
+    self.quantiles = QuantileSketch()
+    # Union of the encodings of the values by _getDateEncoder()
+    self.totalOrEncoderOutput = None
+
+  def _addValues(self, values):
+    BaseStatsCollector._addValues(self, values)
+    microseconds = values.astype(numpy.int64)
+    self.moments.add(microseconds)
+    self.quantiles.add(microseconds)
+
+    encoder = _getDateEncoder()
+    if self.totalOrEncoderOutput is None:
+      self.totalOrEncoderOutput = numpy.zeros(encoder.getWidth(),
+                                              dtype=numpy.uint8)
+    for value in numpy.unique(values).tolist():
+      numpy.logical_or(self.totalOrEncoderOutput, encoder.encode(value),
+                       self.totalOrEncoderOutput)
+
+  def merge(self, other):
+    BaseStatsCollector.merge(self, other)
+    self.moments.merge(other.moments)
+    self.quantiles.merge(other.quantiles)
+    if self.totalOrEncoderOutput is None:
+      self.totalOrEncoderOutput = other.totalOrEncoderOutput
+    elif other.totalOrEncoderOutput is not None:
+      numpy.logical_or(self.totalOrEncoderOutput, other.totalOrEncoderOutput,
+                       self.totalOrEncoderOutput)
+
+  @staticmethod
+  def _toDatetime(microseconds):
+    if microseconds is None:
+      return None
+    return _EPOCH + datetime.timedelta(microseconds=int(microseconds))
+
   def getStats(self, stats):
 
     BaseStatsCollector.getStats(self, stats)
 
+    stats[self.fieldname]['min'] = self._toDatetime(self.moments.min)
+    stats[self.fieldname]['max'] = self._toDatetime(self.moments.max)
+    stats[self.fieldname]['median'] = self._toDatetime(
+      self.quantiles.quantile(0.5))
+
     # We include subencoders for datetime field if there is a variation in encodings
     # for that particular subencoding
     # gym_melbourne_wed_train.csv has data only on the wednesdays, it doesn't
@@ -202,20 +364,10 @@ class DateTimeStatsCollector(BaseStatsCollector):
     # We check for variation in sub-encodings by passing the timestamp field
     # through the maximal sub-encoder and checking for variation in post-encoding
     # values
-
-    # Setup a datetime encoder with maximal resolution for each subencoder
-    encoder = DateEncoder.DateEncoder(season=(1,1), # width=366, resolution=1day
-                                      dayOfWeek=(1,1), # width=7, resolution=1day
-                                      timeOfDay=(1,1.0/60), # width=1440, resolution=1min
-                                      weekend=1, # width=2, binary encoding
-                                      holiday=1, # width=2, binary encoding
-                                      )
-
-    # Collect all encoder outputs
-    totalOrEncoderOutput = numpy.zeros(encoder.getWidth(), dtype=numpy.uint8)
-    for value in self.valueList:
-      numpy.logical_or(totalOrEncoderOutput, encoder.encode(value),
-                       totalOrEncoderOutput)
+    encoder = _getDateEncoder()
+    totalOrEncoderOutput = self.totalOrEncoderOutput
+    if totalOrEncoderOutput is None:
+      totalOrEncoderOutput = numpy.zeros(encoder.getWidth(), dtype=numpy.uint8)
 
     encoderDescription = encoder.getDescription()
     numSubEncoders = len(encoderDescription)
@@ -229,23 +381,73 @@ class DateTimeStatsCollector(BaseStatsCollector):
       stats[self.fieldname][subEncoderName] = \
                                  (totalOrEncoderOutput[beginIdx:endIdx].sum()>1)
 
-    decodedInput = encoder.decode(totalOrEncoderOutput)[0]
-
     if VERBOSITY > 2:
       print "--"
       print "Sub-encoders:"
       for subEncoderName,_ in encoderDescription:
         print "%s:%s" % (subEncoderName, stats[self.fieldname][subEncoderName])
 
-def generateStats(filename, maxSamples = None,):
+# Mapping from field type to stats collector object
+statsCollectorMapping = {'float':    FloatStatsCollector,
+                         'int':      IntStatsCollector,
+                         'string':   StringStatsCollector,
+                         'datetime': DateTimeStatsCollector,
+                         'bool':     BoolStatsCollector,
+                         }
+
+def _addChunk(statsCollectors, chunk):
+  """ Adds the values of a nupic.data.record_chunk.RecordChunk to the
+  collectors of its fields
+  """
+  for i, statsCollector in enumerate(statsCollectors):
+    present = ~chunk.masks[i]
+    values = chunk.columns[i][present]
+    if chunk.categories[i] is not None:
+      values = numpy.array(chunk.categories[i], dtype=numpy.object_)[values]
+    statsCollector.addValues(values, len(present) - len(values))
+
+def _collectStats(task):
+  """ Collects the stats of a range of records of a file, in a process of the
+  pool of generateStats()
+
+  task: (filename, firstRecord, numRecords, rowIndex), where rowIndex is the
+        path of the saved row index of the file, or False
+  retval: the list of the collectors of the fields
+  """
+  filename, firstRecord, numRecords, rowIndex = task
+  with FileRecordStream(filename, firstRecord=firstRecord,
+                        rowIndex=rowIndex) as dataFile:
+    # Initialize collector objects
+    # statsCollectors list holds statsCollector objects for each field
+    statsCollectors = []
+    for fieldName, fieldType, fieldSpecial in dataFile.getFields():
+      # Find the corresponding stats collector for each field based on field
+      # type and intialize an instance
+      statsCollector = \
+            statsCollectorMapping[fieldType](fieldName, fieldType, fieldSpecial)
+      statsCollectors.append(statsCollector)
+
+    while numRecords > 0:
+      chunk = dataFile.getNextRecordChunk(min(numRecords, _CHUNK_SIZE))
+      if chunk is None:
+        break
+      _addChunk(statsCollectors, chunk)
+      numRecords -= len(chunk)
+
+  return statsCollectors
+
+def generateStats(filename, maxSamples = None, numWorkers = 1):
   """
   Collect statistics for each of the fields in the user input data file and
   return a stats dict object.
 
   Parameters:
   ------------------------------------------------------------------------------
-  filename:             The path and name of the data file.
+  filename:             The path and name of the data file, relative to
+                        nupic.datafiles unless it is absolute.
   maxSamples:           Upper bound on the number of rows to be processed
+  numWorkers:           Number of processes that collect the stats of parts of
+                        the file, which are then merged
   retval:               A dictionary of dictionaries. The top level keys are the
                         field names and the corresponding values are the statistics
                         collected for the individual file.
@@ -258,38 +460,50 @@ def generateStats(filename, maxSamples = None,):
 
 
   """
-  # Mapping from field type to stats collector object
-  statsCollectorMapping = {'float':    FloatStatsCollector,
-                           'int':      IntStatsCollector,
-                           'string':   StringStatsCollector,
-                           'datetime': DateTimeStatsCollector,
-                           'bool':     BoolStatsCollector,
-                           }
-
-  filename = resource_filename("nupic.datafiles", filename)
+  if not os.path.isabs(filename):
+    filename = resource_filename("nupic.datafiles", filename)
   print "*"*40
   print "Collecting statistics for file:'%s'" % (filename,)
-  dataFile = FileRecordStream(filename)
-
-  # Initialize collector objects
-  # statsCollectors list holds statsCollector objects for each field
-  statsCollectors = []
-  for fieldName, fieldType, fieldSpecial in dataFile.getFields():
-    # Find the corresponding stats collector for each field based on field type
-    # and intialize an instance
-    statsCollector = \
-            statsCollectorMapping[fieldType](fieldName, fieldType, fieldSpecial)
-    statsCollectors.append(statsCollector)
+  # With several processes, the row index is saved in a temporary directory,
+  # so that the processes don't index the file again to seek to their part
+  indexDir = None
+  rowIndex = False
+  if numWorkers > 1:
+    indexDir = tempfile.mkdtemp(prefix="stats_")
+    rowIndex = os.path.join(indexDir, "input.rowidx")
+  try:
+    return _generateStats(filename, maxSamples, numWorkers, rowIndex)
+  finally:
+    if indexDir is not None:
+      shutil.rmtree(indexDir, ignore_errors=True)
+
+def _generateStats(filename, maxSamples, numWorkers, rowIndex):
+  """ Implements generateStats(), with the row index saved to rowIndex
+  """
+  dataFile = FileRecordStream(filename, rowIndex=rowIndex)
 
   # Now collect the stats
   if maxSamples is None:
     maxSamples = 500000
-  for i in xrange(maxSamples):
-    record = dataFile.getNextRecord()
-    if record is None:
-      break
-    for i, value in enumerate(record):
-      statsCollectors[i].addValue(value)
+  numRecords = min(dataFile.getDataRowCount(), maxSamples)
+  partSize = max((numRecords + numWorkers - 1) // numWorkers, 1)
+  tasks = [(filename, start, min(partSize, numRecords - start), rowIndex)
+           for start in xrange(0, max(numRecords, 1), partSize)]
+  if numWorkers > 1 and len(tasks) > 1:
+    pool = multiprocessing.Pool(numWorkers)
+    try:
+      results = pool.map(_collectStats, tasks)
+    finally:
+      pool.terminate()
+      pool.join()
+  else:
+    results = map(_collectStats, tasks)
+
+  statsCollectors = results[0]
+  for otherCollectors in results[1:]:
+    for statsCollector, other in itertools.izip(statsCollectors,
+                                                otherCollectors):
+      statsCollector.merge(other)
 
   # stats dict holds the statistics for each field
   stats = {}
@@ -298,9 +512,11 @@ def generateStats(filename, maxSamples = None,):
 
   # We don't want to include reset field in permutations
   # TODO: handle reset field in a clean way
-  if dataFile.getResetFieldIdx() is not None:
-    resetFieldName,_,_ = dataFile.getFields()[dataFile.reset]
+  resetFieldIdx = dataFile.getResetFieldIdx()
+  if resetFieldIdx is not None:
+    resetFieldName,_,_ = dataFile.getFields()[resetFieldIdx]
     stats.pop(resetFieldName)
+  dataFile.close()
 
   if VERBOSITY > 0:
     pprint.pprint(stats)
@@ -27,6 +27,8 @@ import tempfile
 import pkg_resources
 
 from nupic.data.aggregator import Aggregator
+from nupic.data.binary_record_stream import (BinaryRecordStream,
+                                             isBinaryRecordFile)
 from nupic.data.fieldmeta import FieldMetaInfo, FieldMetaType, FieldMetaSpecial
 from nupic.data.file_record_stream import FileRecordStream
 from nupic.data import jsonhelpers
@@ -285,12 +287,19 @@ class StreamReader(RecordStreamIface):
     """Open the underlying file stream
     This only supports 'file://' prefixed paths.
 
+    The file may be a FileRecordStream CSV file or a binary record file (see
+    nupic.data.binary_record_stream).
+
     :returns: record stream instance
-    :rtype: FileRecordStream
+    :rtype: FileRecordStream or BinaryRecordStream
     """
     filePath = dataUrl[len(FILE_PREF):]
     if not os.path.isabs(filePath):
       filePath = os.path.join(os.getcwd(), filePath)
+    if isBinaryRecordFile(filePath):
+      return BinaryRecordStream(streamID=filePath,
+                                bookmark=bookmark,
+                                firstRecord=firstRecordIdx)
     return FileRecordStream(streamID=filePath,
                             write=False,
                             bookmark=bookmark,
@@ -0,0 +1,338 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Single-pass statistics of streams of values
+
+Each class summarizes the values added to it in bounded memory, and can be
+merged with another instance that summarized other values. The merged
+instance summarizes all the values, so the statistics of a large stream can
+be computed over parts of the stream in parallel and combined.
+
+  MomentStats           count, mean, variance, min and max
+  QuantileSketch        approximate quantiles
+  DistinctCountSketch   approximate number of distinct values
+  HeavyHitters          approximate counts of the most frequent values
+
+Values are added in batches, as numpy arrays. NaN values are ignored by
+MomentStats and QuantileSketch.
+"""
+
+import collections
+
+import numpy
+
+
+
+# Default number of values of each level of QuantileSketch
+DEFAULT_QUANTILE_CAPACITY = 2048
+
+# Default number of hashes kept by DistinctCountSketch
+DEFAULT_DISTINCT_CAPACITY = 4096
+
+# Default number of counters of HeavyHitters
+DEFAULT_HEAVY_HITTERS_CAPACITY = 1024
+
+_UINT64_RANGE = 2.0 ** 64
+
+
+
+def _dropNaN(values):
+  values = numpy.asarray(values)
+  if values.dtype.kind == "f":
+    values = values[~numpy.isnan(values)]
+  return values
+
+
+
+def hashValues(values):
+  """
+  Returns 64 bit hashes of values, which are the same for equal values in all
+  processes.
+
+  @param values (numpy.array) Numbers, datetimes, bools or strings
+  @return (numpy.array) uint64 hashes
+  """
+  values = numpy.asarray(values)
+  if values.dtype.kind == "f":
+    # -0.0 and 0.0 are equal
+    bits = (values.astype(numpy.float64) + 0.0).view(numpy.uint64)
+  elif values.dtype.kind in "biuM":
+    bits = values.astype(numpy.int64).view(numpy.uint64)
+  else:
+    bits = numpy.fromiter((hash(value) for value in values.tolist()),
+                          dtype=numpy.int64, count=len(values))
+    bits = bits.view(numpy.uint64)
+
+  # Finalizer of the splitmix64 generator, to spread the bits of the values
+  h = bits.copy()
+  h ^= h >> numpy.uint64(30)
+  h *= numpy.uint64(0xbf58476d1ce4e5b9)
+  h ^= h >> numpy.uint64(27)
+  h *= numpy.uint64(0x94d049bb133111eb)
+  h ^= h >> numpy.uint64(31)
+  return h
+
+
+
+class MomentStats(object):
+  """
+  Count, mean, variance, min and max of numbers. Batches of values are added
+  with the parallel form of Welford's algorithm, which also merges two
+  MomentStats, so the mean and variance are numerically stable.
+  """
+
+  def __init__(self):
+    self.count = 0
+    self.mean = 0.0
+    self._m2 = 0.0
+    self.min = None
+    self.max = None
+
+
+  @property
+  def variance(self):
+    """
+    Population variance of the values, None if there are no values.
+    """
+    if self.count == 0:
+      return None
+    return self._m2 / self.count
+
+
+  def add(self, values):
+    """
+    Adds values.
+
+    @param values (numpy.array) Numbers. min and max keep their type.
+    """
+    values = _dropNaN(values)
+    if len(values) == 0:
+      return
+    floatValues = values.astype(numpy.float64)
+    mean = floatValues.mean()
+    m2 = numpy.square(floatValues - mean).sum()
+    self._combine(len(values), mean, m2, values.min().item(),
+                  values.max().item())
+
+
+  def merge(self, other):
+    """
+    Adds the values summarized by another MomentStats.
+    """
+    if other.count > 0:
+      self._combine(other.count, other.mean, other._m2, other.min, other.max)
+
+
+  def _combine(self, count, mean, m2, minValue, maxValue):
+    total = self.count + count
+    delta = mean - self.mean
+    self.mean += delta * count / total
+    self._m2 += m2 + delta * delta * self.count * count / total
+    self.count = total
+    if self.min is None or minValue < self.min:
+      self.min = minValue
+    if self.max is None or maxValue > self.max:
+      self.max = maxValue
+
+
+
+class QuantileSketch(object):
+  """
+  Approximate quantiles of numbers, in the style of the KLL sketch. The values
+  are kept in levels, where a value of level h stands for 2**h values. When a
+  level holds more than capacity values, they are sorted and every other
+  value is moved to the next level. The quantiles are exact until the first
+  level is compacted, and the memory grows with the logarithm of the number of
+  values.
+  """
+
+  def __init__(self, capacity=DEFAULT_QUANTILE_CAPACITY):
+    """
+    @param capacity (int) Maximum number of values of each level
+    """
+    self.capacity = capacity
+    self.count = 0
+    self._levels = []
+    # Alternates the values kept by the compactions of each level, so that
+    #  the errors cancel out
+    self._offsets = []
+
+
+  def add(self, values):
+    """
+    Adds values.
+
+    @param values (numpy.array) Numbers
+    """
+    values = _dropNaN(values).astype(numpy.float64)
+    self._addToLevel(0, values)
+    self.count += len(values)
+    self._compact()
+
+
+  def merge(self, other):
+    """
+    Adds the values summarized by another QuantileSketch.
+    """
+    for h, values in enumerate(other._levels):
+      self._addToLevel(h, values)
+    self.count += other.count
+    self._compact()
+
+
+  def _addToLevel(self, h, values):
+    while len(self._levels) <= h:
+      self._levels.append(numpy.array([], dtype=numpy.float64))
+      self._offsets.append(0)
+    self._levels[h] = numpy.concatenate([self._levels[h], values])
+
+
+  def _compact(self):
+    h = 0
+    while h < len(self._levels):
+      values = self._levels[h]
+      if len(values) > self.capacity:
+        values = numpy.sort(values)
+        # An odd value stays in the level
+        numPaired = len(values) - len(values) % 2
+        self._addToLevel(h + 1, values[self._offsets[h]:numPaired:2])
+        self._levels[h] = values[numPaired:]
+        self._offsets[h] = 1 - self._offsets[h]
+      h += 1
+
+
+  def quantile(self, q):
+    """
+    Returns the value whose rank is about int(q * count), None if there are no
+    values.
+
+    @param q (float) Quantile, between 0 and 1
+    """
+    if self.count == 0:
+      return None
+    values = numpy.concatenate(self._levels)
+    weights = numpy.concatenate([numpy.repeat(2 ** h, len(level))
+                                 for h, level in enumerate(self._levels)])
+    order = numpy.argsort(values, kind="mergesort")
+    ranks = numpy.cumsum(weights[order])
+    i = numpy.searchsorted(ranks, int(q * self.count), side="right")
+    return values[order[min(i, len(order) - 1)]].item()
+
+
+
+class DistinctCountSketch(object):
+  """
+  Approximate number of distinct values, with a k minimum values sketch. The
+  capacity smallest hashes of the values are kept. The count is exact while
+  there are fewer distinct values than capacity, and the relative error is
+  about 1 / sqrt(capacity) otherwise.
+  """
+
+  def __init__(self, capacity=DEFAULT_DISTINCT_CAPACITY):
+    """
+    @param capacity (int) Number of hashes kept
+    """
+    self.capacity = capacity
+    self._hashes = numpy.array([], dtype=numpy.uint64)
+
+
+  def add(self, hashes):
+    """
+    Adds values.
+
+    @param hashes (numpy.array) uint64 hashes of the values, see hashValues()
+    """
+    self._hashes = numpy.union1d(self._hashes, hashes)[:self.capacity]
+
+
+  def merge(self, other):
+    """
+    Adds the values summarized by another DistinctCountSketch.
+    """
+    self.add(other._hashes)
+
+
+  def estimate(self):
+    """
+    Returns the approximate number of distinct values.
+    """
+    if len(self._hashes) < self.capacity:
+      return len(self._hashes)
+    return int(round((self.capacity - 1) /
+                     (float(self._hashes[-1]) / _UINT64_RANGE)))
+
+
+
+class HeavyHitters(object):
+  """
+  Approximate counts of the most frequent values, with the Misra-Gries
+  algorithm. At most capacity counters are kept, and each count is lower than
+  the real count by at most total / (capacity + 1). The counts are exact while
+  there are at most capacity distinct values.
+  """
+
+  def __init__(self, capacity=DEFAULT_HEAVY_HITTERS_CAPACITY):
+    """
+    @param capacity (int) Maximum number of counters
+    """
+    self.capacity = capacity
+    self.total = 0
+    self.counts = {}
+
+
+  def add(self, values):
+    """
+    Adds values.
+
+    @param values (iterable) Hashable values
+    """
+    self._addCounts(collections.Counter(values))
+
+
+  def merge(self, other):
+    """
+    Adds the values summarized by another HeavyHitters.
+    """
+    self._addCounts(other.counts, other.total)
+
+
+  def _addCounts(self, counts, total=None):
+    for value, count in counts.iteritems():
+      self.counts[value] = self.counts.get(value, 0) + count
+    self.total += sum(counts.itervalues()) if total is None else total
+
+    if len(self.counts) > self.capacity:
+      threshold = sorted(self.counts.itervalues(), reverse=True)[self.capacity]
+      self.counts = dict((value, count - threshold)
+                         for value, count in self.counts.iteritems()
+                         if count > threshold)
+
+
+  def getTopValues(self, n):
+    """
+    Returns the n most frequent values.
+
+    @param n (int) Number of values
+    @return (list) (value, count) pairs, most frequent first
+    """
+    return sorted(self.counts.iteritems(), key=lambda item: (-item[1],
+                                                              item[0]))[:n]
@@ -24,7 +24,12 @@ Collection of utilities to process input data
 """
 
 import datetime
+import itertools
+import re
 import string
+
+import numpy
+
 # Workaround for this error: 
 #  "ImportError: Failed to import _strptime because the import lockis held by 
 #     another thread"
@@ -40,6 +45,203 @@ DATETIME_FORMATS = ('%Y-%m-%d %H:%M:%S.%f', '%Y-%m-%d %H:%M:%S:%f',
 
 
 
+class _FixedWidthLayout(object):
+  """A fixed width timestamp layout, such as 'YYYY-MM-DD hh:mm:ss.ffffff'.
+
+  Y, M, D, h, m, s and f are the digits of the year, month, day, hour, minute,
+  second and fraction of second, in this order. Other characters must be
+  present as is.
+  """
+
+  _FIELDS = "YMDhmsf"
+
+  def __init__(self, template):
+    self.template = template
+    self._literals = [(i, c) for i, c in enumerate(template)
+                      if c not in self._FIELDS]
+    # (start, end) of each field, (0, 0) for the missing ones
+    self._slices = []
+    for field in self._FIELDS:
+      start = template.find(field)
+      end = template.rfind(field) + 1 if start >= 0 else 0
+      self._slices.append((max(start, 0), end))
+    start, end = self._slices[-1]
+    self._fractionScale = 10 ** (6 - (end - start))
+    self._hasFraction = end > start
+
+    pattern = ""
+    for field, group in itertools.groupby(template):
+      size = len(list(group))
+      if field in self._FIELDS:
+        pattern += r"(\d{%d})" % size
+      else:
+        pattern += re.escape(field * size)
+    self._regex = re.compile(pattern + r"\Z")
+
+
+  def parse(self, s):
+    """Returns the datetime of s, or None if s doesn't match the layout."""
+    match = self._regex.match(s)
+    if match is None:
+      return None
+    values = [int(value) for value in match.groups()]
+    if self._hasFraction:
+      values[-1] *= self._fractionScale
+    try:
+      return datetime.datetime(*values)
+    except ValueError:
+      return None
+
+
+  def parseArray(self, chars):
+    """Returns the datetime64[us] array of the timestamps of a matrix of
+    characters (a row of numpy.uint8 per timestamp), or None if any of them
+    doesn't match the layout.
+    """
+    for i, c in self._literals:
+      if (chars[:, i] != ord(c)).any():
+        return None
+    digits = chars - ord("0")
+    values = []
+    for start, end in self._slices:
+      value = numpy.zeros(len(chars), dtype=numpy.int64)
+      for i in xrange(start, end):
+        if (digits[:, i] > 9).any():
+          return None
+        value = value * 10 + digits[:, i]
+      values.append(value)
+    year, month, day, hour, minute, second, fraction = values
+
+    if ((year < datetime.MINYEAR).any() or (month < 1).any() or
+        (month > 12).any() or (day < 1).any() or (hour > 23).any() or
+        (minute > 59).any() or (second > 59).any()):
+      return None
+    months = (year - 1970) * 12 + month - 1
+    dates = (months.astype("datetime64[M]").astype("datetime64[D]") +
+             (day - 1).astype("timedelta64[D]"))
+    if (dates >= (months + 1).astype("datetime64[M]")).any():
+      # Day past the end of the month
+      return None
+
+    microseconds = (((hour * 60 + minute) * 60 + second) * 1000000 +
+                    fraction * self._fractionScale)
+    return (dates.astype("datetime64[us]") +
+            microseconds.astype("timedelta64[us]"))
+
+
+
+def _getFixedWidthLayouts():
+  """Returns the fixed width layouts of DATETIME_FORMATS, by length."""
+  date = "YYYY-MM-DD"
+  templates = [date, date + " hh:mm", date + " hh:mm:ss",
+               date + "Thh:mm:ss", date + "Thh:mm:ssZ"]
+  for fractionDigits in xrange(1, 7):
+    fraction = "f" * fractionDigits
+    templates.extend([date + " hh:mm:ss." + fraction,
+                      date + " hh:mm:ss:" + fraction,
+                      date + "Thh:mm:ss." + fraction + "Z"])
+  layouts = {}
+  for template in templates:
+    layouts.setdefault(len(template), []).append(_FixedWidthLayout(template))
+  return layouts
+
+
+
+class TimestampParser(object):
+  """Parses timestamps in any of the DATETIME_FORMATS, remembering the format
+  of the last timestamp so that the timestamps of a stream, which almost
+  always share their format, are parsed with a single attempt.
+
+  Timestamps with the common fixed width layouts (e.g. 'YYYY-MM-DD hh:mm:ss')
+  are parsed directly, the other ones with datetime.strptime(). A string
+  matches at most one of the DATETIME_FORMATS, so the result doesn't depend
+  on the formats that were seen before.
+
+  TimestampParser objects are callable, parser(s) is parser.parse(s).
+  """
+
+  _layouts = _getFixedWidthLayouts()
+
+  def __init__(self):
+    self._layout = None
+    self._format = DATETIME_FORMATS[0]
+
+
+  def __call__(self, s):
+    return self.parse(s)
+
+
+  def parse(self, s):
+    """Parses a textual datetime and returns a Python datetime object.
+
+    @param s (str) The timestamp, in one of the DATETIME_FORMATS
+    @raises ValueError if s is not in any of the DATETIME_FORMATS
+    """
+    s = s.strip()
+    if self._layout is not None:
+      result = self._layout.parse(s)
+      if result is not None:
+        return result
+
+    for layout in self._layouts.get(len(s), ()):
+      result = layout.parse(s)
+      if result is not None:
+        self._layout = layout
+        return result
+
+    try:
+      return datetime.datetime.strptime(s, self._format)
+    except ValueError:
+      pass
+    for pattern in DATETIME_FORMATS:
+      try:
+        result = datetime.datetime.strptime(s, pattern)
+      except ValueError:
+        continue
+      self._format = pattern
+      return result
+    raise ValueError('The provided timestamp %s is malformed. The supported '
+                     'formats are: [%s]' % (s, ', '.join(DATETIME_FORMATS)))
+
+
+  def parseArray(self, values):
+    """Parses a sequence of textual datetimes.
+
+    Timestamps with a fixed width layout are parsed all at once with numpy,
+    the other ones one at a time.
+
+    @param values (sequence) The timestamps, in any of the DATETIME_FORMATS
+    @returns (numpy.array) datetime64[us] array of the timestamps
+    @raises ValueError if a value is not in any of the DATETIME_FORMATS
+    """
+    values = numpy.asarray(values, dtype=str)
+    result = numpy.empty(len(values), dtype="datetime64[us]")
+    if len(values) == 0:
+      return result
+
+    chars = values.view(numpy.uint8).reshape(len(values), -1)
+    lengths = numpy.char.str_len(values)
+    for length in numpy.unique(lengths).tolist():
+      rows = numpy.flatnonzero(lengths == length)
+      timestamps = None
+      for layout in self._layouts.get(length, ()):
+        timestamps = layout.parseArray(chars[rows, :length])
+        if timestamps is not None:
+          break
+      if timestamps is None:
+        timestamps = numpy.array([self.parse(value)
+                                  for value in values[rows].tolist()],
+                                 dtype="datetime64[us]")
+      result[rows] = timestamps
+
+    return result
+
+
+
+_timestampParser = TimestampParser()
+
+
+
 def parseTimestamp(s):
   """Parses a textual datetime format and return a Python datetime object.
 
@@ -50,15 +252,18 @@ def parseTimestamp(s):
   minutes are 00..59
   seconds are 00..59
   micro-seconds are 000000..999999
+
+  Parsers of streams of timestamps should use their own TimestampParser.
   """
-  s = s.strip()
-  for pattern in DATETIME_FORMATS:
-    try:
-      return datetime.datetime.strptime(s, pattern)
-    except ValueError:
-      pass
-  raise ValueError('The provided timestamp %s is malformed. The supported '
-                   'formats are: [%s]' % (s, ', '.join(DATETIME_FORMATS)))
+  return _timestampParser.parse(s)
+
+
+
+def parseTimestamps(values):
+  """Parses a sequence of textual datetimes and returns a datetime64[us] array.
+  See TimestampParser.parseArray().
+  """
+  return TimestampParser().parseArray(values)
 
 
 
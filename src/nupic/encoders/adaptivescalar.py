@@ -23,6 +23,7 @@ import math
 import numpy as np
 
 from nupic.data import SENTINEL_VALUE_FOR_MISSING_DATA
+from nupic.encoders.base import Encoder
 from nupic.encoders.scalar import ScalarEncoder
 from nupic.utils import MovingAverage
 
@@ -172,6 +173,16 @@ class AdaptiveScalarEncoder(ScalarEncoder):
 
     super(AdaptiveScalarEncoder, self).encodeIntoArray(input, output)
 
+
+  def encodeBatch(self, values, output):
+    """
+    [overrides nupic.encoders.scalar.ScalarEncoder.encodeBatch]
+
+    The range adapts to every input, so the inputs are encoded one at a time.
+    """
+    Encoder.encodeBatch(self, values, output)
+
+
   def getBucketInfo(self, buckets):
     """
     [overrides nupic.encoders.scalar.ScalarEncoder.getBucketInfo]
@@ -21,11 +21,13 @@
 
 """Classes for encoding different types into SDRs for HTM input."""
 
+import itertools
+import numbers
 from collections import namedtuple
 
 import numpy
 
-from nupic.encoders.utils import bitsToString
+from nupic.encoders.utils import bitsToString, BucketCache
 
 defaultDtype = numpy.uint8
 
@@ -58,6 +60,9 @@ class Encoder(object):
 
   - encode() - returns a numpy array encoding the input; syntactic sugar
     on top of encodeIntoArray. If pprint, prints the encoding to the terminal
+  - encodeBatch() - encodes a column of inputs into the rows of a 2-D numpy
+    array. Encoders override it with a vectorized implementation where they can
+  - encodeSparse() - returns the indices of the active bits of the encoding
   - pprintHeader() - prints a header describing the encoding to the terminal
   - pprint() - prints an encoding to the terminal
 
@@ -94,6 +99,96 @@ class Encoder(object):
     raise NotImplementedError()
 
 
+  def encodeBatch(self, values, output):
+    """
+    Encodes a batch of inputs into the rows of a 2-D numpy output array. The
+    result is the same as calling encodeIntoArray() on each input in turn.
+
+    This implementation encodes the inputs one at a time. Subclasses override
+    it to encode the whole batch at once.
+
+    @param values Sequence or 1-D numpy array of inputs to encode
+    @param output numpy 2-D array with one row per input and getWidth() columns
+    """
+    self._checkBatchOutput(len(values), output)
+    for value, row in itertools.izip(values, output):
+      self.encodeIntoArray(value, row)
+
+
+  def _checkBatchOutput(self, numValues, output):
+    """
+    Raises ValueError if output can't hold the encodings of numValues inputs.
+    """
+    if output.shape != (numValues, self.getWidth()):
+      raise ValueError("Expected an output array of shape %s but got %s" % (
+          (numValues, self.getWidth()), output.shape))
+
+
+  @staticmethod
+  def _getScalarBatch(values):
+    """
+    Converts a batch of scalar inputs to floats.
+
+    @param values Sequence or 1-D numpy array of numbers or None
+
+    @returns (tuple) Contains:
+                       `scalars` (numpy.ndarray) inputs as floats, NaN for the
+                                 missing inputs,
+                       `missing` (numpy.ndarray) mask of the missing inputs
+    """
+    values = numpy.asarray(values)
+    if values.dtype.kind in "biuf":
+      scalars = values.astype(numpy.float64)
+    elif values.dtype.kind == "O":
+      for value in values:
+        if value is not None and not isinstance(value, numbers.Number):
+          raise TypeError(
+              "Expected a scalar input but got input of type %s" % type(value))
+      scalars = numpy.array([numpy.nan if value is None else value
+                             for value in values], dtype=numpy.float64)
+    else:
+      raise TypeError(
+          "Expected scalar inputs but got inputs of type %s" % values.dtype)
+
+    return scalars, numpy.isnan(scalars)
+
+
+  # Cache of the active bits per bucket, see enableBucketCache()
+  _bucketCache = None
+
+
+  def encodeSparse(self, inputData):
+    """
+    Returns the indices of the active bits of the encoding of inputData.
+
+    This implementation encodes into a dense array and scans it. Encoders whose
+    output is determined by a bucket index override it to return the active
+    bits of the bucket directly.
+
+    @param inputData Data to encode
+    @returns (numpy.ndarray) Sorted indices of the active bits. The array may
+             be shared with the encoder and must not be modified.
+    """
+    return numpy.flatnonzero(self.encode(inputData))
+
+
+  def enableBucketCache(self, maxBuckets=1024):
+    """
+    Caches the active bits of the most recently used buckets, so that
+    encodeSparse() of a value of a known bucket is a table lookup. Only used
+    by the encoders whose output is determined by a bucket index:
+    ScalarEncoder, RandomDistributedScalarEncoder and SDRCategoryEncoder.
+
+    @param maxBuckets (int) Maximum number of cached buckets
+    """
+    self._bucketCache = BucketCache(maxBuckets)
+
+
+  def disableBucketCache(self):
+    """Removes the cache created by enableBucketCache()."""
+    self._bucketCache = None
+
+
   def setLearning(self, learningEnabled):
     """Set whether learning is enabled.
 
@@ -126,6 +126,16 @@ class CategoryEncoder(Encoder):
       print "decoded:", self.decodedToStr(self.decode(output))
 
 
+  def encodeBatch(self, values, output):
+    """ See method description in base.py """
+    # Missing inputs are passed on as None, which the scalar encoder encodes
+    # as all 0's
+    indices = [None if value == SENTINEL_VALUE_FOR_MISSING_DATA
+               else self.categoryToIndex.get(value, 0)
+               for value in values]
+    self.encoder.encodeBatch(indices, output)
+
+
   def decode(self, encoded, parentFieldName=''):
     """ See the function description in base.py
     """
@@ -20,13 +20,19 @@
 # ----------------------------------------------------------------------
 
 import hashlib
-import itertools
 
 import numpy
 from nupic.bindings.math import Random
 from nupic.encoders.base import Encoder
 
 
+# Constants of the vectorized coordinate hash
+_HASH_SEED = numpy.uint64(0x9E3779B97F4A7C15)
+_BIT_SALT = numpy.uint64(0xD1B54A32D192ED03)
+_MIX_MULTIPLIER_1 = numpy.uint64(0xBF58476D1CE4E5B9)
+_MIX_MULTIPLIER_2 = numpy.uint64(0x94D049BB133111EB)
+_UINT53_SCALE = 1.0 / (1 << 53)
+
 
 class CoordinateEncoder(Encoder):
   """
@@ -51,17 +57,32 @@ class CoordinateEncoder(Encoder):
   deterministically map it to one of the bits in the SDR. Make this bit active.
   5. This results in a final SDR with exactly W bits active
   (barring chance hash collisions).
+
+  By default the order and bit of a coordinate are derived from an MD5 hash
+  of the coordinate, which is slow, so they are kept in a cache. Encodings of
+  nearby positions share most of their neighbors and look them up there
+  instead of hashing them again. With compatibleHash=False a vectorized
+  integer hash of the whole neighborhood is used instead. It is much faster
+  but yields different (equally well distributed) encodings.
   """
 
   def __init__(self,
                w=21,
                n=1000,
                name=None,
-               verbosity=0):
+               verbosity=0,
+               compatibleHash=True,
+               cacheSize=65536):
     """
     See `nupic.encoders.base.Encoder` for more information.
 
     @param name An optional string which will become part of the description
+    @param compatibleHash (bool) If True, hash coordinates with MD5 to produce
+                                 the same encodings as earlier versions of
+                                 this encoder, otherwise use the faster
+                                 vectorized integer hash
+    @param cacheSize (int) Maximum number of coordinates whose order and bit
+                           are cached when compatibleHash is True
     """
     # Validate inputs
     if (w <= 0) or (w % 2 == 0):
@@ -72,10 +93,16 @@ class CoordinateEncoder(Encoder):
                        "good results we recommend n be strictly greater "
                        "than 11*w")
 
+    if cacheSize < 1:
+      raise ValueError("cacheSize must be positive")
+
     self.w = w
     self.n = n
     self.verbosity = verbosity
     self.encoders = None
+    self.compatibleHash = compatibleHash
+    self.cacheSize = cacheSize
+    self._initHashCache()
 
     if name is None:
       name = "[%s:%s]" % (self.n, self.w)
@@ -107,10 +134,13 @@ class CoordinateEncoder(Encoder):
     """
     (coordinate, radius) = inputData
     neighbors = self._neighbors(coordinate, radius)
-    winners = self._topWCoordinates(neighbors, self.w)
 
-    bitFn = lambda coordinate: self._bitForCoordinate(coordinate, self.n)
-    indices = numpy.array([bitFn(w) for w in winners])
+    if self.compatibleHash:
+      orders, bits = self._cachedOrdersAndBits(neighbors)
+    else:
+      orders, bits = self._fastOrdersAndBits(neighbors, self.n)
+
+    indices = bits[numpy.argsort(orders)[-self.w:]]
 
     output[:] = 0
     output[indices] = 1
@@ -122,13 +152,121 @@ class CoordinateEncoder(Encoder):
     Returns coordinates around given coordinate, within given radius.
     Includes given coordinate.
 
+    The coordinates are in the same order as the product of the ranges of
+    each dimension, so the last dimension varies fastest.
+
     @param coordinate (numpy.array) Coordinate whose neighbors to find
     @param radius (float) Radius around `coordinate`
 
     @return (numpy.array) List of coordinates
     """
-    ranges = [range(n-radius, n+radius+1) for n in coordinate.tolist()]
-    return numpy.array(list(itertools.product(*ranges)))
+    coordinate = numpy.asarray(coordinate, dtype=numpy.int64)
+    radius = int(radius)
+    offsets = numpy.indices((2 * radius + 1,) * coordinate.size,
+                            dtype=numpy.int64)
+    offsets = offsets.reshape(coordinate.size, -1).T
+    return offsets + (coordinate - radius)
+
+
+  def _initHashCache(self):
+    """
+    Empties the cache of the orders and bits of the coordinates.
+
+    The cache is made of two generations. Lookups that miss the current
+    generation fall back to the previous one, and when the current
+    generation holds cacheSize / 2 coordinates it replaces the previous one.
+    This approximates a least recently used eviction policy at the cost of a
+    dict lookup.
+    """
+    self._hashCache = dict()
+    self._oldHashCache = dict()
+
+
+  def _cachedOrdersAndBits(self, coordinates):
+    """
+    Returns the orders and bits of coordinates, computed with
+    `_orderForCoordinate` and `_bitForCoordinate` for the coordinates that are
+    not cached yet.
+
+    @param coordinates (numpy.array) A 2D numpy array, where each element
+                                     is a coordinate
+    @return (tuple) Orders (numpy.array of floats) and bits (numpy.array of
+                    ints) of the coordinates
+    """
+    cache = self._hashCache
+    oldCache = self._oldHashCache
+    maxSize = max(self.cacheSize / 2, 1)
+    orders = numpy.empty(len(coordinates), dtype=numpy.float64)
+    bits = numpy.empty(len(coordinates), dtype=numpy.int64)
+
+    for i, coordinate in enumerate(coordinates.tolist()):
+      key = tuple(coordinate)
+      value = cache.get(key)
+      if value is None:
+        value = oldCache.get(key)
+        if value is None:
+          seed = self._hashCoordinate(coordinate)
+          value = (Random(seed).getReal64(), Random(seed).getUInt32(self.n))
+        if len(cache) >= maxSize:
+          self._oldHashCache = oldCache = cache
+          self._hashCache = cache = dict()
+        cache[key] = value
+      orders[i], bits[i] = value
+
+    return orders, bits
+
+
+  @classmethod
+  def _fastOrdersAndBits(cls, coordinates, n):
+    """
+    Returns the orders and bits of coordinates, using a vectorized integer
+    hash instead of `_orderForCoordinate` and `_bitForCoordinate`.
+
+    @param coordinates (numpy.array) A 2D numpy array, where each element
+                                     is a coordinate
+    @param n (int) The number of available bits in the SDR
+    @return (tuple) Orders (numpy.array of floats in [0, 1)) and bits
+                    (numpy.array of ints in [0, n)) of the coordinates
+    """
+    coordinates = numpy.asarray(coordinates, dtype=numpy.int64)
+    hashes = cls._hashCoordinates(coordinates)
+    orders = (hashes >> numpy.uint64(11)) * _UINT53_SCALE
+    bits = (cls._mix64(hashes ^ _BIT_SALT) % numpy.uint64(n)).astype(
+      numpy.int64)
+    return orders, bits
+
+
+  @classmethod
+  def _hashCoordinates(cls, coordinates):
+    """
+    Hash each coordinate of a 2D array of coordinates to a 64 bit unsigned
+    integer. Coordinates that differ in any dimension get unrelated hashes.
+
+    @param coordinates (numpy.array) A 2D numpy array of int64, where each
+                                     element is a coordinate
+    @return (numpy.array) Hashes of the coordinates (uint64)
+    """
+    hashes = numpy.empty(len(coordinates), dtype=numpy.uint64)
+    hashes.fill(_HASH_SEED)
+    for column in coordinates.view(numpy.uint64).T:
+      hashes = cls._mix64(hashes ^ column)
+    return hashes
+
+
+  @staticmethod
+  def _mix64(values):
+    """
+    SplitMix64 finalizer, a bijective mixing function on 64 bit unsigned
+    integers. Overflows wrap around.
+
+    @param values (numpy.array) uint64 values to mix
+    @return (numpy.array) Mixed values (uint64)
+    """
+    values = values ^ (values >> numpy.uint64(30))
+    values = values * _MIX_MULTIPLIER_1
+    values = values ^ (values >> numpy.uint64(27))
+    values = values * _MIX_MULTIPLIER_2
+    return values ^ (values >> numpy.uint64(31))
 
 
   @classmethod
@@ -191,6 +329,21 @@ class CoordinateEncoder(Encoder):
     print "  n:   %d" % self.n
 
 
+  def __getstate__(self):
+    state = self.__dict__.copy()
+    del state["_hashCache"]
+    del state["_oldHashCache"]
+    return state
+
+
+  def __setstate__(self, state):
+    self.__dict__.update(state)
+    if not hasattr(self, "compatibleHash"):
+      self.compatibleHash = True
+      self.cacheSize = 65536
+    self._initHashCache()
+
+
   @classmethod
   def read(cls, proto):
     encoder = object.__new__(cls)
@@ -198,6 +351,9 @@ class CoordinateEncoder(Encoder):
     encoder.n = proto.n
     encoder.verbosity = proto.verbosity
     encoder.name = proto.name
+    encoder.compatibleHash = proto.compatibleHash
+    encoder.cacheSize = proto.cacheSize
+    encoder._initHashCache()
     return encoder
 
 
@@ -206,3 +362,5 @@ class CoordinateEncoder(Encoder):
     proto.n = self.n
     proto.verbosity = self.verbosity
     proto.name = self.name
+    proto.compatibleHash = self.compatibleHash
+    proto.cacheSize = self.cacheSize
@@ -20,6 +20,7 @@
 # ----------------------------------------------------------------------
 
 import datetime
+import itertools
 
 import numpy
 
@@ -29,6 +30,27 @@ from nupic.encoders.scalar import ScalarEncoder
 
 
 
+_EPOCH = datetime.datetime(1970, 1, 1)
+_MICROSECONDS_PER_MINUTE = 60 * 1000000
+_MICROSECONDS_PER_HOUR = 60 * _MICROSECONDS_PER_MINUTE
+_MICROSECONDS_PER_DAY = 24 * _MICROSECONDS_PER_HOUR
+
+# Holidays that occur on a fixed date every year, as (month, day). Currently
+# the only holiday we know about is December 25.
+_HOLIDAYS = ((12, 25),)
+
+# Position of a day relative to a holiday, see _getDayInfo()
+_NOT_HOLIDAY = 0
+_HOLIDAY = 1
+_DAY_AFTER_HOLIDAY = 2
+_DAY_BEFORE_HOLIDAY = 3
+
+# Bounds of the caches of the date encoder
+_MAX_CACHED_DAYS = 4096
+_MAX_CACHED_ENCODINGS = 2048
+
+
+
 class DateEncoder(Encoder):
   """A date encoder encodes a date according to encoding parameters
   specified in its constructor.
@@ -208,6 +230,35 @@ class DateEncoder(Encoder):
       self.description.append(("time of day", self.timeOfDayOffset))
       self.encoders.append(("time of day", self.timeOfDayEncoder, self.timeOfDayOffset))
 
+    self._initCaches()
+
+
+  def _initCaches(self):
+    """
+    Initializes the caches used to encode timestamps.
+
+    _dayInfo maps the ordinal of a date to the values of the sub-fields that
+    only depend on the date, see _getDayInfo(). _encodingCaches holds one dict
+    per sub-encoder, which maps a scalar value to its encoding. All the
+    sub-fields except the holiday ramps take a small number of values (at most
+    one per day of the year or minute of the day), so most encodings are
+    copied from these caches instead of being computed.
+    """
+    self._dayInfo = dict()
+    self._encodingCaches = [dict() for _ in self.encoders]
+
+
+  def __getstate__(self):
+    state = self.__dict__.copy()
+    del state["_dayInfo"]
+    del state["_encodingCaches"]
+    return state
+
+
+  def __setstate__(self, state):
+    self.__dict__.update(state)
+    self._initCaches()
+
 
   def getWidth(self):
     return self.width
@@ -260,58 +311,46 @@ class DateEncoder(Encoder):
 
     # -------------------------------------------------------------------------
     # Get the scalar values for each sub-field
-    timetuple = input.timetuple()
-    timeOfDay = timetuple.tm_hour + float(timetuple.tm_min)/60.0
+    dayOfYear, dayOfWeek, customDay, holiday = self._getDayInfo(input)
+    timeOfDay = input.hour + float(input.minute)/60.0
 
     if self.seasonEncoder is not None:
-      dayOfYear = timetuple.tm_yday
-      # input.timetuple() computes the day of year 1 based, so convert to 0 based
-      values.append(dayOfYear-1)
+      values.append(dayOfYear)
 
     if self.dayOfWeekEncoder is not None:
-      dayOfWeek = timetuple.tm_wday #+ timeOfDay / 24.0
       values.append(dayOfWeek)
 
     if self.weekendEncoder is not None:
       # saturday, sunday or friday evening
-      if timetuple.tm_wday == 6 or timetuple.tm_wday == 5 \
-          or (timetuple.tm_wday == 4 and timeOfDay > 18):
+      if dayOfWeek == 6 or dayOfWeek == 5 \
+          or (dayOfWeek == 4 and timeOfDay > 18):
         weekend = 1
       else:
         weekend = 0
       values.append(weekend)
 
     if self.customDaysEncoder is not None:
-      if timetuple.tm_wday in self.customDays:
-        customDay = 1
-      else:
-        customDay = 0
       values.append(customDay)
+
     if self.holidayEncoder is not None:
       # A "continuous" binary value. = 1 on the holiday itself and smooth ramp
       #  0->1 on the day before the holiday and 1->0 on the day after the holiday.
-      # Currently the only holiday we know about is December 25
-      # holidays is a list of holidays that occur on a fixed date every year
-      holidays = [(12, 25)]
       val = 0
-      for h in holidays:
-        # hdate is midnight on the holiday
-        hdate = datetime.datetime(timetuple.tm_year, h[0], h[1], 0, 0, 0)
-        if input > hdate:
-          diff = input - hdate
-          if diff.days == 0:
-            # return 1 on the holiday itself
-            val = 1
-            break
-          elif diff.days == 1:
-            # ramp smoothly from 1 -> 0 on the next day
-            val = 1.0 - (float(diff.seconds) / (86400))
-            break
-        else:
-          diff = hdate - input
-          if diff.days == 0:
-            # ramp smoothly from 0 -> 1 on the previous day
-            val = 1.0 - (float(diff.seconds) / 86400)
+      if holiday == _HOLIDAY:
+        val = 1
+      elif holiday == _DAY_AFTER_HOLIDAY:
+        # ramp smoothly from 1 -> 0 on the next day
+        seconds = input.hour * 3600 + input.minute * 60 + input.second
+        val = 1.0 - (float(seconds) / 86400)
+      elif holiday == _DAY_BEFORE_HOLIDAY:
+        # ramp smoothly from 0 -> 1 on the previous day, based on the whole
+        # seconds left until the holiday. Midnight is a full day before the
+        # holiday, so the ramp starts right after it.
+        seconds = input.hour * 3600 + input.minute * 60 + input.second
+        if input.microsecond:
+          seconds += 1
+        if seconds:
+          val = 1.0 - (float(86400 - seconds) / 86400)
 
       values.append(val)
 
@@ -321,6 +360,47 @@ class DateEncoder(Encoder):
     return values
 
 
+  def _getDayInfo(self, input):
+    """
+    Returns the values of the sub-fields that only depend on the date of a
+    timestamp. They are cached for each date.
+
+    @param input (datetime.datetime) Timestamp
+
+    @returns (tuple) The 0 based day of the year, the day of the week (monday
+             = 0), 1 if the day is one of the customDays and 0 otherwise, and
+             the position of the day relative to the holidays of its year
+    """
+    ordinal = input.toordinal()
+    info = self._dayInfo.get(ordinal)
+    if info is None:
+      dayOfWeek = input.weekday()
+      customDay = 0
+      if self.customDaysEncoder is not None and dayOfWeek in self.customDays:
+        customDay = 1
+
+      holiday = _NOT_HOLIDAY
+      for month, day in _HOLIDAYS:
+        holidayOrdinal = datetime.date(input.year, month, day).toordinal()
+        if ordinal == holidayOrdinal:
+          holiday = _HOLIDAY
+          break
+        elif ordinal == holidayOrdinal + 1:
+          holiday = _DAY_AFTER_HOLIDAY
+          break
+        elif ordinal == holidayOrdinal - 1:
+          holiday = _DAY_BEFORE_HOLIDAY
+
+      dayOfYear = ordinal - datetime.date(input.year, 1, 1).toordinal()
+      info = (dayOfYear, dayOfWeek, customDay, holiday)
+
+      if len(self._dayInfo) >= _MAX_CACHED_DAYS:
+        self._dayInfo.clear()
+      self._dayInfo[ordinal] = info
+
+    return info
+
+
   def getScalars(self, input):
     """ See method description in base.py
 
@@ -371,11 +451,121 @@ class DateEncoder(Encoder):
             type(input), str(input)))
 
       # Get the scalar values for each sub-field
-      scalars = self.getScalars(input)
-      # Encoder each sub-field
-      for i in xrange(len(self.encoders)):
-        (name, encoder, offset) = self.encoders[i]
-        encoder.encodeIntoArray(scalars[i], output[offset:])
+      scalars = self.getEncodedValues(input)
+      # Encoder each sub-field, or copy its encoding from the cache
+      for (name, encoder, offset), value, cache in itertools.izip(
+          self.encoders, scalars, self._encodingCaches):
+        encoding = cache.get(value)
+        if encoding is None:
+          encoding = encoder.encode(float(value))
+          if len(cache) < _MAX_CACHED_ENCODINGS:
+            cache[value] = encoding
+        output[offset:offset + encoding.size] = encoding
+
+
+  def encodeBatch(self, values, output):
+    """ See method description in base.py
+
+    values may also be a numpy datetime64 array.
+    """
+    self._checkBatchOutput(len(values), output)
+
+    values = numpy.asarray(values)
+    if values.dtype.kind == "M":
+      timestamps = values.astype("datetime64[us]")
+      missing = timestamps.view(numpy.int64) == numpy.iinfo(numpy.int64).min
+    else:
+      missing = numpy.zeros(len(values), dtype=bool)
+      for i, value in enumerate(values):
+        if value == SENTINEL_VALUE_FOR_MISSING_DATA:
+          missing[i] = True
+        elif not isinstance(value, datetime.datetime):
+          raise ValueError("Input is type %s, expected datetime. Value: %s" % (
+              type(value), str(value)))
+        elif value.tzinfo is not None:
+          # timetuple() returns the local time of aware datetimes, which
+          # numpy doesn't preserve
+          return super(DateEncoder, self).encodeBatch(values, output)
+      timestamps = numpy.array([_EPOCH if value is None else value
+                                for value in values],
+                               dtype="datetime64[us]")
+
+    for (name, encoder, offset), scalars in itertools.izip(
+        self.encoders, self._getEncodedValuesBatch(timestamps)):
+      scalars[missing] = numpy.nan
+      encoder.encodeBatch(scalars,
+                          output[:, offset:offset + encoder.getWidth()])
+
+
+  def _getEncodedValuesBatch(self, timestamps):
+    """
+    Vectorized version of getEncodedValues.
+
+    @param timestamps (numpy.ndarray) datetime64[us] timestamps
+
+    @returns (list) One float array per sub-encoder, in the same order as
+             getEncodedValues
+    """
+    microseconds = timestamps.view(numpy.int64)
+    days = microseconds // _MICROSECONDS_PER_DAY
+    dayMicroseconds = microseconds - days * _MICROSECONDS_PER_DAY
+    hours = dayMicroseconds // _MICROSECONDS_PER_HOUR
+    minutes = (dayMicroseconds // _MICROSECONDS_PER_MINUTE) % 60
+    timeOfDay = hours + minutes / 60.0
+    # The epoch is a Thursday
+    dayOfWeek = (days + 3) % 7
+
+    years = timestamps.astype("datetime64[Y]")
+    yearStartDays = years.astype("datetime64[D]").view(numpy.int64)
+
+    values = []
+
+    if self.seasonEncoder is not None:
+      values.append((days - yearStartDays).astype(numpy.float64))
+
+    if self.dayOfWeekEncoder is not None:
+      values.append(dayOfWeek.astype(numpy.float64))
+
+    if self.weekendEncoder is not None:
+      # saturday, sunday or friday evening
+      weekend = ((dayOfWeek == 6) | (dayOfWeek == 5) |
+                 ((dayOfWeek == 4) & (timeOfDay > 18)))
+      values.append(weekend.astype(numpy.float64))
+
+    if self.customDaysEncoder is not None:
+      values.append(numpy.in1d(dayOfWeek, self.customDays).astype(
+          numpy.float64))
+
+    if self.holidayEncoder is not None:
+      # Same ramps as getEncodedValues around each holiday
+      holiday = numpy.zeros(len(timestamps))
+      pending = numpy.ones(len(timestamps), dtype=bool)
+      for month, day in _HOLIDAYS:
+        holidayStart = (years.astype("datetime64[M]") + (month - 1)).astype(
+            "datetime64[D]")
+        holidayStart = ((holidayStart + (day - 1)).view(numpy.int64) *
+                        _MICROSECONDS_PER_DAY)
+        after = microseconds - holidayStart
+        before = holidayStart - microseconds
+        afterDays = after // _MICROSECONDS_PER_DAY
+        afterSeconds = (after % _MICROSECONDS_PER_DAY) // 1000000
+        beforeDays = before // _MICROSECONDS_PER_DAY
+        beforeSeconds = (before % _MICROSECONDS_PER_DAY) // 1000000
+
+        isAfter = after > 0
+        onHoliday = pending & isAfter & (afterDays == 0)
+        holiday[onHoliday] = 1
+        ramp = pending & isAfter & (afterDays == 1)
+        holiday[ramp] = 1.0 - afterSeconds[ramp] / 86400.0
+        pending &= ~(onHoliday | ramp)
+        ramp = pending & ~isAfter & (beforeDays == 0)
+        holiday[ramp] = 1.0 - beforeSeconds[ramp] / 86400.0
+      values.append(holiday)
+
+    if self.timeOfDayEncoder is not None:
+      values.append(timeOfDay)
+
+    return values
 
 
   def getDescription(self):
@@ -410,6 +600,7 @@ class DateEncoder(Encoder):
     addEncoder("holidayEncoder", "holidayOffset")
     addEncoder("timeOfDayEncoder", "timeOfDayOffset")
 
+    encoder._initCaches()
     return encoder
 
 
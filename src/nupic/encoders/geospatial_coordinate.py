@@ -48,7 +48,9 @@ class GeospatialCoordinateEncoder(CoordinateEncoder):
                w=21,
                n=1000,
                name=None,
-               verbosity=0):
+               verbosity=0,
+               compatibleHash=True,
+               cacheSize=65536):
     """
     See `nupic.encoders.base.Encoder` for more information.
 
@@ -56,11 +58,16 @@ class GeospatialCoordinateEncoder(CoordinateEncoder):
                        distance between two coordinates
                        (in meters per dimensional unit)
     @param timestep (int) Time between readings (in seconds)
+    @param compatibleHash (bool) See `CoordinateEncoder`
+    @param cacheSize (int) See `CoordinateEncoder`
     """
-    super(GeospatialCoordinateEncoder, self).__init__(w=w,
-                                                      n=n,
-                                                      name=name,
-                                                      verbosity=verbosity)
+    super(GeospatialCoordinateEncoder, self).__init__(
+      w=w,
+      n=n,
+      name=name,
+      verbosity=verbosity,
+      compatibleHash=compatibleHash,
+      cacheSize=cacheSize)
 
     self.scale = scale
     self.timestep = timestep
@@ -19,6 +19,8 @@
 # http://numenta.org/licenses/
 # ----------------------------------------------------------------------
 
+import numpy
+
 from nupic.encoders.base import Encoder
 from nupic.encoders.scalar import ScalarEncoder
 from nupic.encoders.adaptivescalar import AdaptiveScalarEncoder
@@ -97,6 +99,31 @@ class MultiEncoder(Encoder):
         encoder.encodeIntoArray(self._getInputValue(obj, name), output[offset:])
 
 
+  def encodeBatch(self, values, output):
+    """ See method description in base.py
+
+    values is either a sequence of records (dicts or objects, like the input
+    of encodeIntoArray), a dict mapping each field name to a column of
+    inputs, or a numpy record array. Each sub-encoder encodes its whole column
+    at once.
+    """
+    for name, encoder, offset in self.encoders:
+      encoder.encodeBatch(self._getInputColumn(values, name),
+                          output[:, offset:offset + encoder.getWidth()])
+
+
+  def _getInputColumn(self, values, fieldName):
+    """
+    Gets the values of a given field from a batch of input records
+    """
+    if isinstance(values, dict):
+      return self._getInputValue(values, fieldName)
+    elif isinstance(values, numpy.ndarray) and values.dtype.names is not None:
+      return values[fieldName]
+    else:
+      return [self._getInputValue(record, fieldName) for record in values]
+
+
   def getDescription(self):
     return self.description
 
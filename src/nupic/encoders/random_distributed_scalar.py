@@ -156,8 +156,19 @@ class RandomDistributedScalarEncoder(Encoder):
       self.dump()
 
 
+  def __getstate__(self):
+    # The overlap index is rebuilt from the bucketMap when needed
+    state = self.__dict__.copy()
+    state["_bitBuckets"] = None
+    state["_minOverlaps"] = None
+    state["_maxOverlaps"] = None
+    return state
+
+
   def __setstate__(self, state):
     self.__dict__.update(state)
+    if "_bitBuckets" not in state:
+      self._bitBuckets = None
 
     # Initialize self.random as an instance of NupicRandom derived from the
     # previous numpy random state
@@ -247,6 +258,67 @@ class RandomDistributedScalarEncoder(Encoder):
       output[self.mapBucketIndexToNonZeroBits(bucketIdx)] = 1
 
 
+  def encodeSparse(self, x):
+    """ See method description in base.py """
+
+    if x is not None and not isinstance(x, numbers.Number):
+      raise TypeError(
+          "Expected a scalar input but got input of type %s" % type(x))
+
+    bucketIdx = self.getBucketIndices(x)[0]
+    if bucketIdx is None:
+      return numpy.zeros(0, dtype=numpy.uint32)
+
+    if self._bucketCache is not None:
+      bits = self._bucketCache.get(bucketIdx)
+      if bits is not None:
+        return bits
+
+    # The bucket map holds the bits in the order they were chosen
+    bits = numpy.sort(self.mapBucketIndexToNonZeroBits(bucketIdx))
+
+    if self._bucketCache is not None:
+      self._bucketCache.put(bucketIdx, bits)
+    return bits
+
+
+  def encodeBatch(self, values, output):
+    """ See method description in base.py """
+    self._checkBatchOutput(len(values), output)
+    output[:] = 0
+
+    scalars, missing = self._getScalarBatch(values)
+    rows = numpy.flatnonzero(~missing)
+    if len(rows) == 0:
+      return
+
+    if self._offset is None:
+      self._offset = numpy.asarray(values)[rows[0]]
+
+    # Same as getBucketIndices. round() rounds halfway cases away from zero.
+    deltas = (scalars[rows] - self._offset) / self.resolution
+    magnitudes = numpy.abs(deltas)
+    rounded = numpy.floor(magnitudes)
+    rounded += (magnitudes - rounded) >= 0.5
+    rounded = numpy.clip(numpy.copysign(rounded, deltas),
+                         -self._maxBuckets, self._maxBuckets)
+    bucketIndices = numpy.clip(
+        self._maxBuckets/2 + rounded.astype(numpy.int64),
+        0, self._maxBuckets - 1)
+
+    # Create the missing buckets in the order encodeIntoArray would, so that
+    # the random representations are the same
+    buckets, firstRows, inverse = numpy.unique(bucketIndices,
+                                               return_index=True,
+                                               return_inverse=True)
+    for bucketIdx in buckets[numpy.argsort(firstRows)]:
+      self.mapBucketIndexToNonZeroBits(int(bucketIdx))
+
+    representations = numpy.array([self.bucketMap[bucketIdx]
+                                   for bucketIdx in buckets])
+    output[rows[:, numpy.newaxis], representations[inverse]] = 1
+
+
   def _createBucket(self, index):
     """
     Create the given bucket index. Recursively create as many in-between
@@ -258,6 +330,7 @@ class RandomDistributedScalarEncoder(Encoder):
         # as the min representation
         self.bucketMap[index] = self._newRepresentation(self.minIndex,
                                                         index)
+        self._updateOverlapIndex(self.minIndex, index)
         self.minIndex = index
       else:
         # Recursively create all the indices above and then this index
@@ -269,6 +342,7 @@ class RandomDistributedScalarEncoder(Encoder):
         # as the max representation
         self.bucketMap[index] = self._newRepresentation(self.maxIndex,
                                                         index)
+        self._updateOverlapIndex(self.maxIndex, index)
         self.maxIndex = index
       else:
         # Recursively create all the indices below and then this index
@@ -289,18 +363,98 @@ class RandomDistributedScalarEncoder(Encoder):
     # representations, which is fairly high
     ri = newIndex % self.w
 
-    # Now we choose a bit such that the overlap rules are satisfied.
+    # Now we choose a bit such that the overlap rules are satisfied. The bits
+    # that satisfy them are computed upfront, which draws the same random
+    # numbers as checking each candidate with _newRepresentationOK.
+    allowedBits = self._allowedNewBits(index, newIndex, newRepresentation[ri])
     newBit = self.random.getUInt32(self.n)
-    newRepresentation[ri] = newBit
-    while newBit in self.bucketMap[index] or \
-          not self._newRepresentationOK(newRepresentation, newIndex):
+    while not allowedBits[newBit]:
       self.numTries += 1
       newBit = self.random.getUInt32(self.n)
-      newRepresentation[ri] = newBit
+    newRepresentation[ri] = newBit
 
     return newRepresentation
 
 
+  def _allowedNewBits(self, index, newIndex, replacedBit):
+    """
+    Return a boolean array marking the bits that can replace replacedBit in
+    the representation of index to form a representation for newIndex. A bit
+    is allowed if it is not already in the representation of index and
+    _newRepresentationOK accepts the resulting representation.
+
+    The overlap of each bucket with the representation without replacedBit
+    is derived from the overlap index. Adding the new bit increases the
+    overlap by one for the buckets that contain it, so each bucket either
+    forbids its bits, requires one of them, or accepts any bit.
+    """
+    bitBuckets, overlaps = self._getOverlapIndex(index)
+    bucketSlice = slice(self.minIndex, self.maxIndex + 1)
+    bucketBits = bitBuckets[:, bucketSlice]
+
+    overlapWithout = overlaps[bucketSlice] - bucketBits[replacedBit]
+    distances = numpy.abs(numpy.arange(self.minIndex, self.maxIndex + 1) -
+                          newIndex)
+    near = distances < self.w
+    okWithout = numpy.where(near, overlapWithout == self.w - distances,
+                            overlapWithout <= self._maxOverlap)
+    okWith = numpy.where(near, overlapWithout + 1 == self.w - distances,
+                         overlapWithout + 1 <= self._maxOverlap)
+
+    if not (okWithout | okWith).all():
+      return numpy.zeros(self.n, dtype=bool)
+
+    allowed = ~bucketBits[:, okWithout & ~okWith].any(axis=1)
+    allowed &= bucketBits[:, okWith & ~okWithout].all(axis=1)
+    return allowed
+
+
+  def _getOverlapIndex(self, index):
+    """
+    Return the bucket membership of each bit, as an (n, maxBuckets) boolean
+    array, and the overlaps of every bucket with bucket index, which must be
+    minIndex or maxIndex. The index is rebuilt from the bucketMap if needed.
+    """
+    if self._bitBuckets is None:
+      self._bitBuckets = numpy.zeros((self.n, self._maxBuckets), dtype=bool)
+      for i, representation in self.bucketMap.iteritems():
+        self._bitBuckets[representation, i] = True
+      self._minOverlaps = self._bitBuckets[
+        self.bucketMap[self.minIndex]].sum(axis=0)
+      self._maxOverlaps = self._bitBuckets[
+        self.bucketMap[self.maxIndex]].sum(axis=0)
+
+    if index == self.maxIndex:
+      return self._bitBuckets, self._maxOverlaps
+    elif index == self.minIndex:
+      return self._bitBuckets, self._minOverlaps
+    else:
+      raise ValueError("index must be minIndex or maxIndex")
+
+
+  def _updateOverlapIndex(self, index, newIndex):
+    """
+    Add the new bucket newIndex, whose representation was derived from the
+    one of index, to the overlap index. It differs from the representation of
+    index by a single bit, so the overlaps with it are updated in place.
+    """
+    bitBuckets, overlaps = self._getOverlapIndex(index)
+    ri = newIndex % self.w
+    replacedBit = self.bucketMap[index][ri]
+    newBit = self.bucketMap[newIndex][ri]
+
+    newOverlaps = overlaps - bitBuckets[replacedBit] + bitBuckets[newBit]
+    newOverlaps[newIndex] = self.w
+    bitBuckets[self.bucketMap[newIndex], newIndex] = True
+
+    if newIndex < self.minIndex:
+      self._maxOverlaps[newIndex] = newOverlaps[self.maxIndex]
+      self._minOverlaps = newOverlaps
+    else:
+      self._minOverlaps[newIndex] = newOverlaps[self.minIndex]
+      self._maxOverlaps = newOverlaps
+
+
   def _newRepresentationOK(self, newRep, newIndex):
     """
     Return True if this new candidate representation satisfies all our overlap
@@ -433,6 +587,12 @@ class RandomDistributedScalarEncoder(Encoder):
 
     self.bucketMap[self.minIndex] = _permutation(self.n)[0:self.w]
 
+    # Bucket membership of each bit and overlaps of the buckets with the min
+    # and max buckets, used to create new buckets. Built when first needed.
+    self._bitBuckets = None
+    self._minOverlaps = None
+    self._maxOverlaps = None
+
     # How often we need to retry when generating valid encodings
     self.numTries = 0
 
@@ -470,6 +630,7 @@ class RandomDistributedScalarEncoder(Encoder):
     encoder._maxBuckets = INITIAL_BUCKETS
     encoder.bucketMap = {x.key: numpy.array(x.value, dtype=numpy.uint32)
                          for x in proto.bucketMap}
+    encoder._bitBuckets = None
 
     return encoder
 
@@ -454,6 +454,76 @@ class ScalarEncoder(Encoder):
       print "input desc:", self.decodedToStr(self.decode(output))
 
 
+  def encodeSparse(self, input):
+    """ See method description in base.py """
+
+    if input is not None and not isinstance(input, numbers.Number):
+      raise TypeError(
+          "Expected a scalar input but got input of type %s" % type(input))
+
+    if type(input) is float and math.isnan(input):
+      input = SENTINEL_VALUE_FOR_MISSING_DATA
+
+    bucketIdx = self._getFirstOnBit(input)[0]
+    if bucketIdx is None:
+      return numpy.zeros(0, dtype=numpy.uint32)
+
+    return self._getBucketBits(bucketIdx)
+
+
+  def _getBucketBits(self, bucketIdx):
+    """ Returns the sorted indices of the active bits of the encoding whose
+    first bit is bucketIdx, from the bucket cache if enabled. """
+    if self._bucketCache is not None:
+      bits = self._bucketCache.get(bucketIdx)
+      if bits is not None:
+        return bits
+
+    # Periodic encodings wrap around the edges
+    bits = numpy.sort((bucketIdx + numpy.arange(self.w)) % self.n).astype(
+        numpy.uint32)
+
+    if self._bucketCache is not None:
+      self._bucketCache.put(bucketIdx, bits)
+    return bits
+
+
+  def encodeBatch(self, values, output):
+    """ See method description in base.py """
+    self._checkBatchOutput(len(values), output)
+    output[:] = 0
+
+    scalars, missing = self._getScalarBatch(values)
+    rows = numpy.flatnonzero(~missing)
+    inputs = scalars[rows]
+    if len(inputs) == 0:
+      return
+
+    if self.clipInput and not self.periodic:
+      inputs = numpy.clip(inputs, self.minval, self.maxval)
+    else:
+      if self.periodic:
+        outOfRange = (inputs < self.minval) | (inputs >= self.maxval)
+      else:
+        outOfRange = (inputs < self.minval) | (inputs > self.maxval)
+      if outOfRange.any():
+        # Raise the same error as encodeIntoArray
+        self._getFirstOnBit(numpy.asarray(values)[rows[outOfRange][0]])
+
+    # Same computation as _getFirstOnBit
+    if self.periodic:
+      centerbins = ((inputs - self.minval) * self.nInternal /
+                    self.range).astype(numpy.int64) + self.padding
+    else:
+      centerbins = (((inputs - self.minval) + self.resolution/2) /
+                    self.resolution).astype(numpy.int64) + self.padding
+    minbins = centerbins - self.halfwidth
+
+    # Periodic encodings wrap around the edges
+    bits = (minbins[:, numpy.newaxis] + numpy.arange(self.w)) % self.n
+    output[rows[:, numpy.newaxis], bits] = 1
+
+
   def decode(self, encoded, parentFieldName=''):
     """ See the function description in base.py
     """
@@ -245,6 +245,54 @@ class SDRCategoryEncoder(Encoder):
       print "decoded:", self.decodedToStr(self.decode(output))
 
 
+  def encodeSparse(self, input):
+    """ See method description in base.py """
+    if input == SENTINEL_VALUE_FOR_MISSING_DATA:
+      return numpy.zeros(0, dtype=numpy.uint32)
+
+    return self._getCategoryBits(self.getBucketIndices(input)[0])
+
+
+  def _getCategoryBits(self, index):
+    """ Returns the sorted indices of the active bits of a category, from the
+    bucket cache if enabled. """
+    if self._bucketCache is not None:
+      bits = self._bucketCache.get(index)
+      if bits is not None:
+        return bits
+
+    bits = self.sdrs[index].nonzero()[0].astype(numpy.uint32)
+
+    if self._bucketCache is not None:
+      self._bucketCache.put(index, bits)
+    return bits
+
+
+  def encodeBatch(self, values, output):
+    """ See method description in base.py """
+    self._checkBatchOutput(len(values), output)
+
+    # Unknown categories are added in input order when learning, like
+    # encodeIntoArray does
+    indices = numpy.zeros(len(values), dtype=numpy.int64)
+    missing = numpy.zeros(len(values), dtype=bool)
+    for i, value in enumerate(values):
+      if value == SENTINEL_VALUE_FOR_MISSING_DATA:
+        missing[i] = True
+        continue
+      index = self.categoryToIndex.get(value)
+      if index is None:
+        if self._learningEnabled:
+          self._addCategory(value)
+          index = self.ncategories - 1
+        else:
+          index = 0
+      indices[i] = index
+
+    output[:] = self.sdrs[indices]
+    output[missing] = 0
+
+
   def decode(self, encoded, parentFieldName=''):
     """ See the function description in base.py
     """
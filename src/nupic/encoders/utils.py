@@ -31,3 +31,84 @@ def bitsToString(arr):
       s[i]='*'
   return s
 
+
+
+
+class BucketCache(object):
+  """
+  Cache of the active bits of the encodings of buckets, keyed by bucket index.
+
+  Holds at most maxBuckets encodings. When it is full, the least recently
+  used quarter of the encodings is evicted, so that the eviction cost is
+  amortized over many insertions.
+  """
+
+  def __init__(self, maxBuckets):
+    """
+    @param maxBuckets (int) Maximum number of cached encodings
+    """
+    if maxBuckets < 1:
+      raise ValueError("maxBuckets must be positive")
+
+    self.maxBuckets = maxBuckets
+    self.hits = 0
+    self.misses = 0
+
+    self._bits = dict()
+    self._lastUse = dict()
+    self._clock = 0
+
+
+  def __len__(self):
+    return len(self._bits)
+
+
+  def get(self, bucketIdx):
+    """
+    Returns the cached active bits of a bucket, or None.
+
+    @param bucketIdx (int) Bucket index
+    """
+    bits = self._bits.get(bucketIdx)
+    if bits is None:
+      self.misses += 1
+    else:
+      self.hits += 1
+      self._lastUse[bucketIdx] = self._clock
+      self._clock += 1
+    return bits
+
+
+  def put(self, bucketIdx, bits):
+    """
+    Caches the active bits of a bucket. The array is made read-only since it
+    is shared by every lookup of the bucket.
+
+    @param bucketIdx (int)           Bucket index
+    @param bits      (numpy.ndarray) Sorted indices of the active bits
+    """
+    if len(self._bits) >= self.maxBuckets and bucketIdx not in self._bits:
+      self._evict()
+
+    bits.flags.writeable = False
+    self._bits[bucketIdx] = bits
+    self._lastUse[bucketIdx] = self._clock
+    self._clock += 1
+
+
+  def clear(self):
+    """
+    Removes all the cached encodings.
+    """
+    self._bits.clear()
+    self._lastUse.clear()
+
+
+  def _evict(self):
+    """
+    Removes the least recently used quarter of the encodings.
+    """
+    byAge = sorted(self._lastUse, key=self._lastUse.get)
+    for bucketIdx in byAge[:max(len(byAge) / 4, 1)]:
+      del self._bits[bucketIdx]
+      del self._lastUse[bucketIdx]
@@ -26,11 +26,13 @@ Encapsulation of CLAnetwork that implements the ModelBase.
 """
 
 import copy
+import cPickle as pickle
 import math
 import os
 import json
 import itertools
 import logging
+import timeit
 import traceback
 from collections import deque
 from operator import itemgetter
@@ -38,6 +40,11 @@ from operator import itemgetter
 import numpy
 
 from nupic.frameworks.opf.model import Model
+from nupic.frameworks.opf.clamodel_pipeline import DirectPipeline
+from nupic.frameworks.opf.incremental_checkpoint import (serializeRegion,
+                                                        deserializeRegion)
+from nupic.frameworks.opf.runtime_stats import (RuntimeStats, NULL_PHASE,
+                                                allocationCount)
 from nupic.algorithms.anomaly import Anomaly
 from nupic.data import SENTINEL_VALUE_FOR_MISSING_DATA
 from nupic.data.fieldmeta import FieldMetaSpecial, FieldMetaInfo
@@ -225,6 +232,12 @@ class CLAModel(Model):
 
     self._input = None
 
+    # Per-phase timing of run(), see enableRuntimeStats()
+    self._runtimeStats = None
+
+    # Direct calls to the regions in run(), see enableDirectPipeline()
+    self._directPipeline = None
+
     return
 
 
@@ -359,6 +372,10 @@ class CLAModel(Model):
     assert not self.__restoringFromState
     assert inputRecord
 
+    if self._runtimeStats is not None:
+      runAllocStart = allocationCount()
+      runStart = timeit.default_timer()
+
     results = super(CLAModel, self).run(inputRecord)
 
     self.__numRunCalls += 1
@@ -381,26 +398,34 @@ class CLAModel(Model):
     ###########################################################################
     # Predictions and Learning
     ###########################################################################
-    self._sensorCompute(inputRecord)
-    self._spCompute()
-    self._tpCompute()
+    with self._phase("sensorCompute"):
+      self._sensorCompute(inputRecord)
+    with self._phase("spCompute"):
+      self._spCompute()
+    with self._phase("tpCompute"):
+      self._tpCompute()
 
-    results.sensorInput = self._getSensorInputRecord(inputRecord)
+    with self._phase("sensorInput"):
+      results.sensorInput = self._getSensorInputRecord(inputRecord)
 
     inferences = {}
 
     # TODO: Reconstruction and temporal classification not used. Remove
     if self._isReconstructionModel():
-      inferences = self._reconstructionCompute()
+      with self._phase("reconstructionCompute"):
+        inferences = self._reconstructionCompute()
     elif self._isMultiStepModel():
-      inferences = self._multiStepCompute(rawInput=inputRecord)
+      with self._phase("multiStepCompute"):
+        inferences = self._multiStepCompute(rawInput=inputRecord)
     # For temporal classification. Not used, and might not work anymore
     elif self._isClassificationModel():
-      inferences = self._classificationCompute()
+      with self._phase("classificationCompute"):
+        inferences = self._classificationCompute()
 
     results.inferences.update(inferences)
 
-    inferences = self._anomalyCompute()
+    with self._phase("anomalyCompute"):
+      inferences = self._anomalyCompute()
     results.inferences.update(inferences)
 
     # -----------------------------------------------------------------------
@@ -420,19 +445,85 @@ class CLAModel(Model):
       self.__logger.debug("inputRecord: %r, results: %r" % (inputRecord,
                                                             results))
 
+    if self._runtimeStats is not None:
+      self._runtimeStats.record("run", timeit.default_timer() - runStart,
+                                max(allocationCount() - runAllocStart, 0))
+      self._runtimeStats.endRecord()
+
     return results
 
 
+  def enableRuntimeStats(self, exportHook=None, exportInterval=1000):
+    """ Starts recording the number of calls, the latency percentiles and the
+    allocation counts of each phase of run(). The statistics are reported
+    under the "runtime" key of getRuntimeStats(). They are not saved with the
+    model.
+
+    @param exportHook     (callable) Called with the runtime statistics (as
+                                     in getRuntimeStats()["runtime"]) every
+                                     exportInterval calls to run(), or None
+    @param exportInterval (int)      Number of records between two exports
+    """
+    self._runtimeStats = RuntimeStats(exportHook=exportHook,
+                                      exportInterval=exportInterval)
+
+
+  def disableRuntimeStats(self):
+    """ Stops recording runtime statistics and discards them.
+    """
+    self._runtimeStats = None
+
+
+  def enableDirectPipeline(self):
+    """ Makes run() call the region implementations of the network directly,
+    with their input and output buffers resolved once, instead of going
+    through the Network engine for every call. The inferences are the same,
+    and the model is saved in the same format. The direct pipeline is not
+    saved with the model.
+    """
+    self._directPipeline = DirectPipeline(self._netInfo.net)
+
+
+  def disableDirectPipeline(self):
+    """ Makes run() go through the Network engine again.
+    """
+    self._directPipeline = None
+
+
+  def _getComputeRegion(self, name):
+    """ Returns the region used by run() to compute: the region of the direct
+    pipeline if it is enabled, else the region of the network. None if there
+    is no such region.
+    """
+    if self._directPipeline is not None:
+      return self._directPipeline.regions.get(name)
+    return self._netInfo.net.regions.get(name, None)
+
+
+  def _phase(self, name):
+    """ Returns a context manager timing a phase of run() when runtime
+    statistics are enabled.
+    """
+    if self._runtimeStats is None:
+      return NULL_PHASE
+    return self._runtimeStats.phase(name)
+
+
   def _getSensorInputRecord(self, inputRecord):
     """
     inputRecord - dict containing the input to the sensor
 
     Return a 'SensorInput' object, which represents the 'parsed'
     representation of the input record
+
+    The sensor builds a new list of 'sourceOut' values for every record, so
+    dataRow is not copied. dataDict is a shallow snapshot of the input record:
+    it is not affected by later changes of the caller's dict, but shares its
+    values.
     """
-    sensor = self._getSensorRegion()
-    dataRow = copy.deepcopy(sensor.getSelf().getOutputValues('sourceOut'))
-    dataDict = copy.deepcopy(inputRecord)
+    sensor = self._getComputeRegion('sensor')
+    dataRow = sensor.getSelf().getOutputValues('sourceOut')
+    dataDict = copy.copy(inputRecord)
     inputRecordEncodings = sensor.getSelf().getOutputValues('sourceEncodings')
     inputRecordCategory = int(sensor.getOutputData('categoryOut')[0])
     resetOut = sensor.getOutputData('resetOut')[0]
@@ -461,7 +552,7 @@ class CLAModel(Model):
                            bucketIndex=bucketIdx)
 
   def _sensorCompute(self, inputRecord):
-    sensor = self._getSensorRegion()
+    sensor = self._getComputeRegion('sensor')
     self._getDataSource().push(inputRecord)
     sensor.setParameter('topDownMode', False)
     sensor.prepareInputs()
@@ -473,7 +564,7 @@ class CLAModel(Model):
 
 
   def _spCompute(self):
-    sp = self._getSPRegion()
+    sp = self._getComputeRegion('SP')
     if sp is None:
       return
 
@@ -485,7 +576,7 @@ class CLAModel(Model):
 
 
   def _tpCompute(self):
-    tp = self._getTPRegion()
+    tp = self._getComputeRegion('TP')
     if tp is None:
       return
 
@@ -495,7 +586,6 @@ class CLAModel(Model):
     else:
       topDownCompute = False
 
-    tp = self._getTPRegion()
     tp.setParameter('topDownMode', topDownCompute)
     tp.setParameter('inferenceMode', self.isInferenceEnabled())
     tp.setParameter('learningMode', self.isLearningEnabled())
@@ -528,16 +618,16 @@ class CLAModel(Model):
 
   def _multiStepCompute(self, rawInput):
     patternNZ = None
-    if self._getTPRegion() is not None:
-      tp = self._getTPRegion()
+    if self._getComputeRegion('TP') is not None:
+      tp = self._getComputeRegion('TP')
       tpOutput = tp.getSelf()._tfdr.infActiveState['t']
       patternNZ = tpOutput.reshape(-1).nonzero()[0]
-    elif self._getSPRegion() is not None:
-      sp = self._getSPRegion()
+    elif self._getComputeRegion('SP') is not None:
+      sp = self._getComputeRegion('SP')
       spOutput = sp.getOutputData('bottomUpOut')
       patternNZ = spOutput.nonzero()[0]
-    elif self._getSensorRegion() is not None:
-      sensor = self._getSensorRegion()
+    elif self._getComputeRegion('sensor') is not None:
+      sensor = self._getComputeRegion('sensor')
       sensorOutput = sensor.getOutputData('dataOut')
       patternNZ = sensorOutput.nonzero()[0]
     else:
@@ -616,18 +706,18 @@ class CLAModel(Model):
     inferenceType = self.getInferenceType()
 
     inferences = {}
-    sp = self._getSPRegion()
+    sp = self._getComputeRegion('SP')
     score = None
     if inferenceType == InferenceType.NontemporalAnomaly:
       score = sp.getOutputData("anomalyScore")[0] #TODO move from SP to Anomaly ?
 
     elif inferenceType == InferenceType.TemporalAnomaly:
-      tp = self._getTPRegion()
+      tp = self._getComputeRegion('TP')
 
       if sp is not None:
         activeColumns = sp.getOutputData("bottomUpOut").nonzero()[0]
       else:
-        sensor = self._getSensorRegion()
+        sensor = self._getComputeRegion('sensor')
         activeColumns = sensor.getOutputData('dataOut').nonzero()[0]
 
       if not self._predictedFieldName in self._input:
@@ -643,19 +733,19 @@ class CLAModel(Model):
                                    inputValue=self._input[self._predictedFieldName])
 
       # Store the predicted columns for the next timestep.
-      predictedColumns = tp.getOutputData("topDownOut").nonzero()[0]
-      self._prevPredictedColumns = copy.deepcopy(predictedColumns)
+      # nonzero() returns a new array, which the next record does not modify
+      self._prevPredictedColumns = tp.getOutputData("topDownOut").nonzero()[0]
 
       # Calculate the classifier's output and use the result as the anomaly
       # label. Stores as string of results.
 
       # TODO: make labels work with non-SP models
       if sp is not None:
-        self._getAnomalyClassifier().setParameter(
-            "activeColumnCount", len(activeColumns))
-        self._getAnomalyClassifier().prepareInputs()
-        self._getAnomalyClassifier().compute()
-        labels = self._getAnomalyClassifier().getSelf().getLabelResults()
+        anomalyClassifier = self._getComputeRegion('AnomalyClassifier')
+        anomalyClassifier.setParameter("activeColumnCount", len(activeColumns))
+        anomalyClassifier.prepareInputs()
+        anomalyClassifier.compute()
+        labels = anomalyClassifier.getSelf().getLabelResults()
         inferences[InferenceElement.anomalyLabel] = "%s" % labels
 
     inferences[InferenceElement.anomalyScore] = score
@@ -690,7 +780,7 @@ class CLAModel(Model):
       )
     self._predictedFieldName = predictedFieldName
 
-    classifier = self._getClassifierRegion()
+    classifier = self._getComputeRegion('Classifier')
     if not self._hasCL or classifier is None:
       # No classifier so return an empty dict for inferences.
       return {}
@@ -952,6 +1042,8 @@ class CLAModel(Model):
 
     ret[InferenceType.getLabel(InferenceType.TemporalNextStep)] = temporalStats
 
+    if self._runtimeStats is not None:
+      ret["runtime"] = self._runtimeStats.getStats()
 
     return ret
 
@@ -1196,6 +1288,13 @@ class CLAModel(Model):
                       self.__manglePrivateMemberName("__logger")]:
       state.pop(ephemeral)
 
+    # Runtime statistics are not saved, and their export hook may not be
+    # picklable
+    state.pop("_runtimeStats", None)
+
+    # The direct pipeline refers to the regions of the network
+    state.pop("_directPipeline", None)
+
     return state
 
 
@@ -1280,6 +1379,9 @@ class CLAModel(Model):
     if not hasattr(self, '_hasCL'):
       self._hasCL = (self._getClassifierRegion() is not None)
 
+    self._runtimeStats = None
+    self._directPipeline = None
+
     self.__logger.debug("Restoring %s from state..." % self.__class__.__name__)
 
 
@@ -1387,6 +1489,39 @@ class CLAModel(Model):
     return
 
 
+  def _getCheckpointStates(self):
+    """ [virtual method override] Returns the state of the model for
+    incremental checkpoints: the pickled model without its network, and the
+    state of each region of the network, so that the regions that did not
+    change, e.g. the SP once it stopped learning, are not saved again.
+    """
+    states = {"model": pickle.dumps(self, pickle.HIGHEST_PROTOCOL)}
+    for name, region in self._netInfo.net.regions.items():
+      states["region:" + name] = serializeRegion(region.getSelf())
+    return states
+
+
+  def _setCheckpointStates(self, states):
+    """ [virtual method override] Restores the components of the state
+    returned by _getCheckpointStates() into the model and the regions of its
+    network.
+    """
+    model = self
+    if "model" in states:
+      model = pickle.loads(states["model"])
+      model._netInfo.net = self._netInfo.net
+      # The network is restored by the regions below, instead of by
+      # _deSerializeExtraData()
+      model.__restoringFromState = False
+
+    regions = model._netInfo.net.regions
+    for name, state in states.iteritems():
+      if name.startswith("region:"):
+        deserializeRegion(regions[name[len("region:"):]].getSelf(), state)
+
+    return model
+
+
   def _addAnomalyClassifierRegion(self, network, params, spEnable, tpEnable):
     """
     Attaches an 'AnomalyClassifier' region to the network. Will remove current
@@ -1508,11 +1643,9 @@ class DataBuffer(object):
   def push(self, data):
     assert len(self.stack) == 0
 
-    # Copy the data, because sensor's pre-encoding filters (e.g.,
-    # AutoResetFilter) may modify it.  Our caller relies on the input record
-    # remaining unmodified.
-    data = data.__class__(data)
-
+    # The data is not copied: the sensor copies the records it modifies (e.g.,
+    # with pre-encoding filters such as AutoResetFilter), so our caller's input
+    # record remains unmodified.
     self.stack.append(data)
 
   def getNextRecordDict(self):
@@ -1,5 +1,3 @@
-import copy
-
 import numpy
 
 from nupic.support.configuration import Configuration
@@ -484,7 +482,7 @@ class CLAModelClassifierHelper(object):
     # Store the state for next time step
     numPredictedCols = len(self._prevPredictedColumns)
     predictedColumns = tp.getOutputData("topDownOut").nonzero()[0]
-    self._prevPredictedColumns = copy.deepcopy(predictedColumns)
+    self._prevPredictedColumns = predictedColumns
 
     if self._anomalyVectorLength is None:
       self._anomalyVectorLength = len(classificationVector)
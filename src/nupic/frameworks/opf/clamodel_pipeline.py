@@ -0,0 +1,166 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Direct-call execution of the bottom-up compute of a CLAModel network.
+
+CLAModel.run() drives its regions through the Network engine: every
+setParameter(), prepareInputs(), compute() and getOutputData() call crosses
+the engine boundary and looks up the region, its parameter spec and its
+buffers again. DirectPipeline resolves all of this once for the standard
+topology built by CLAModel (sensor -> SP -> TP -> Classifier, and the
+AnomalyClassifier of TemporalAnomaly models) and calls the Python region
+implementations directly.
+
+The input and output buffers of the regions are the arrays of the network,
+so the outputs are visible to the network, and to the regions that are still
+run through it (e.g. for top-down compute). The state of the regions is not
+changed, so the network is saved exactly as before.
+"""
+
+
+
+# Regions of the networks created by CLAModel
+_REGION_NAMES = ("sensor", "SP", "TP", "Classifier", "AnomalyClassifier")
+
+# Conversions of parameter values done by the engine, by spec dataType
+_PARAMETER_TYPES = {"UInt32": int,
+                    "Int32": int,
+                    "UInt64": int,
+                    "Int64": int,
+                    "Real32": float,
+                    "Real64": float,
+                    "Bool": bool}
+
+
+
+class DirectRegion(object):
+  """
+  The subset of the nupic.engine.Region interface used by CLAModel.run(),
+  implemented with direct calls to the region implementation.
+  """
+
+  def __init__(self, region, links=()):
+    """
+    @param region (nupic.engine.Region) The region of the network
+    @param links  (sequence)            (source array, input name) of the
+                                        inputs read by the bottom-up compute.
+                                        prepareInputs() copies each source
+                                        array to its input, as the links of
+                                        the network do.
+    """
+    self._impl = region.getSelf()
+    spec = self._impl.getSpec()
+    self._parameterTypes = dict(
+      (name, _PARAMETER_TYPES.get(parameter.get("dataType")))
+      for name, parameter in spec.get("parameters", {}).iteritems())
+
+    self.outputs = dict((name, region.getOutputData(name))
+                        for name in spec.get("outputs", {}))
+    self.inputs = dict((name, region.getInputData(name))
+                       for _, name in links)
+    self._links = [(source, self.inputs[name]) for source, name in links]
+
+
+  def getSelf(self):
+    """
+    Returns the region implementation.
+    """
+    return self._impl
+
+
+  def setParameter(self, name, value):
+    """
+    Sets a parameter of the region, converting the value to the type of the
+    parameter in the region spec as the engine does.
+    """
+    convert = self._parameterTypes.get(name)
+    if convert is not None:
+      value = convert(value)
+    self._impl.setParameter(name, -1, value)
+
+
+  def getParameter(self, name):
+    return self._impl.getParameter(name, -1)
+
+
+  def prepareInputs(self):
+    """
+    Copies the outputs of the linked regions to the inputs of the region.
+    """
+    for source, destination in self._links:
+      destination[:] = source
+
+
+  def compute(self):
+    self._impl.compute(self.inputs, self.outputs)
+
+
+  def getOutputData(self, name):
+    return self.outputs[name]
+
+
+
+class DirectPipeline(object):
+  """
+  Regions of a CLAModel network that are run with direct calls by
+  CLAModel.run(), see CLAModel.enableDirectPipeline().
+  """
+
+  def __init__(self, network):
+    """
+    @param network (nupic.engine.Network) Initialized network created by
+                                          CLAModel
+    """
+    unknownRegions = set(network.regions.keys()) - set(_REGION_NAMES)
+    if unknownRegions:
+      raise ValueError("The direct pipeline does not support the regions %s" %
+                       sorted(unknownRegions))
+
+    regions = network.regions
+    sensor = DirectRegion(regions["sensor"])
+    self.regions = {"sensor": sensor}
+    bottomUpOut = sensor.getOutputData("dataOut")
+    resetOut = sensor.getOutputData("resetOut")
+
+    if "SP" in regions:
+      sp = DirectRegion(regions["SP"], [(bottomUpOut, "bottomUpIn"),
+                                        (resetOut, "resetIn")])
+      self.regions["SP"] = sp
+      bottomUpOut = sp.getOutputData("bottomUpOut")
+    spBottomUpOut = bottomUpOut
+
+    if "TP" in regions:
+      tp = DirectRegion(regions["TP"], [(bottomUpOut, "bottomUpIn"),
+                                        (resetOut, "resetIn")])
+      self.regions["TP"] = tp
+
+      if "AnomalyClassifier" in regions:
+        self.regions["AnomalyClassifier"] = DirectRegion(
+          regions["AnomalyClassifier"],
+          [(spBottomUpOut, "spBottomUpOut"),
+           (tp.getOutputData("topDownOut"), "tpTopDownOut"),
+           (tp.getOutputData("lrnActiveStateT"), "tpLrnActiveStateT")])
+
+    if "Classifier" in regions:
+      # CLAModel calls the custom compute of the classifier, with the
+      # patterns it takes from the other regions
+      self.regions["Classifier"] = DirectRegion(regions["Classifier"])
@@ -0,0 +1,558 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+""" @file incremental_checkpoint.py
+
+ Incremental model checkpoints: a base checkpoint and deltas of the parts of
+ the model state that changed since the base.
+
+ The state of a model is serialized in memory as named components, see
+ Model._getCheckpointStates(). CLAModel has one component for itself and one
+ per region, so the SP permanences, the TP segments and the classifier state
+ are separate components. Every component is split into content-defined
+ chunks: the chunk boundaries depend on the bytes around them, so a change
+ of a component, even one that shifts the rest of its serialization, only
+ changes the chunks around it. A delta only stores the chunks that are not
+ stored yet.
+
+ Layout of a checkpoint directory, for the generation g of its base:
+
+   incremental.json       Manifest
+   model/                 Model saved with Model.save() when the checkpoint
+                          was created, which is the base of generation 0
+   base-g.pack            Chunks of the base, empty for generation 0
+   base-g.json            Offsets of the chunks in the pack, and chunk lists
+                          of the components of the base
+   delta-g-i.pack         Chunks of the i-th delta that were not stored yet
+   delta-g-i.json         Offsets of the chunks in the pack, and chunk lists
+                          of the components that differ from the base
+
+ Loading a checkpoint loads the model of the model/ directory and restores
+ the components of the base, unless the generation is 0, and those of the last
+ delta. After maxDeltas deltas, or when the deltas grow larger than
+ compactionRatio times the base, the next checkpoint is compacted into a new
+ base and the previous generation is removed. The model/ directory is never
+ written again, so every base is written once: the first delta of generation
+ 0 stores the changed components in full, and a compaction only writes a pack.
+
+ Usage:
+
+   checkpointer = IncrementalCheckpointer("/path/to/checkpoint")
+   checkpointer.save(model)
+   ...
+   model = ModelFactory.loadFromCheckpoint("/path/to/checkpoint")
+"""
+
+import cPickle as pickle
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy
+
+from nupic.frameworks.opf.model import Model
+
+
+
+# Deltas written before the checkpoint is compacted into a new base
+DEFAULT_MAX_DELTAS = 10
+
+# Size of the deltas, relative to the base, above which the checkpoint is
+# compacted into a new base
+DEFAULT_COMPACTION_RATIO = 0.5
+
+MANIFEST_NAME = "incremental.json"
+
+_VERSION = 1
+
+# Chunk sizes, in bytes. A chunk ends where the rolling hash of its last
+# _HASH_WINDOW bytes is below _BOUNDARY_THRESHOLD, so chunks are about
+# 2 ** _AVERAGE_CHUNK_BITS bytes long.
+_MIN_CHUNK_SIZE = 2 * 1024
+_MAX_CHUNK_SIZE = 64 * 1024
+_AVERAGE_CHUNK_BITS = 13
+_HASH_WINDOW = 32
+_BOUNDARY_THRESHOLD = 1 << (_HASH_WINDOW - _AVERAGE_CHUNK_BITS)
+
+# Number of bytes hashed at once, which bounds the memory used by chunking
+_SCAN_SIZE = 1 << 20
+
+# Random value of each byte, for the rolling hash
+_GEAR = numpy.frombuffer(numpy.random.RandomState(42).bytes(256 * 4),
+                         dtype=numpy.uint32)
+
+
+
+def _getBoundaryCandidates(data):
+  """
+  Returns the offsets after the bytes of data whose rolling hash is below
+  _BOUNDARY_THRESHOLD.
+
+  The rolling hash of byte i is sum(_GEAR[data[i - k]] << k) over the
+  previous _HASH_WINDOW bytes (a "gear" hash). It is computed for _SCAN_SIZE
+  bytes at a time, each scan starting _HASH_WINDOW - 1 bytes before the bytes
+  it hashes.
+  """
+  data = numpy.frombuffer(data, dtype=numpy.uint8)
+  candidates = []
+  for start in xrange(0, len(data), _SCAN_SIZE):
+    scanStart = max(start - (_HASH_WINDOW - 1), 0)
+    values = _GEAR[data[scanStart:start + _SCAN_SIZE]]
+    hashes = values.copy()
+    for k in xrange(1, min(_HASH_WINDOW, len(values))):
+      # values[j] becomes _GEAR[data[j]] << k
+      numpy.left_shift(values, 1, out=values)
+      hashes[k:] += values[:-k]
+    candidates.append(
+      numpy.flatnonzero(hashes[start - scanStart:] < _BOUNDARY_THRESHOLD) +
+      start + 1)
+  return numpy.concatenate(candidates) if candidates else numpy.array([])
+
+
+
+def _getChunkEnds(data):
+  """
+  Returns the end offsets of the content-defined chunks of data.
+  """
+  candidates = _getBoundaryCandidates(data)
+
+  ends = []
+  start = 0
+  while start < len(data):
+    i = numpy.searchsorted(candidates, start + _MIN_CHUNK_SIZE)
+    end = min(start + _MAX_CHUNK_SIZE, len(data))
+    if i < len(candidates) and candidates[i] < end:
+      end = int(candidates[i])
+    ends.append(end)
+    start = end
+  return ends
+
+
+
+def splitChunks(data):
+  """
+  Splits data into content-defined chunks.
+
+  @param data (str) Bytes
+  @return (list) (chunk ID, chunk) pairs, where the ID is the SHA-1 of the
+                 chunk
+  """
+  chunks = []
+  start = 0
+  for end in _getChunkEnds(data):
+    chunk = data[start:end]
+    chunks.append((hashlib.sha1(chunk).hexdigest(), chunk))
+    start = end
+  return chunks
+
+
+
+def serializeRegion(region):
+  """
+  Serializes a Python region implementation as the network engine saves it:
+  its pickled state and the extra data written by serializeExtraData().
+
+  @param region (nupic.regions.PyRegion.PyRegion) Region implementation
+  @return (str) The serialized region
+  """
+  if hasattr(region, "__getstate__"):
+    state = region.__getstate__()
+  else:
+    state = region.__dict__
+
+  fd, extraDataPath = tempfile.mkstemp()
+  os.close(fd)
+  try:
+    region.serializeExtraData(extraDataPath)
+    with open(extraDataPath, "rb") as extraDataFile:
+      extraData = extraDataFile.read()
+  finally:
+    os.remove(extraDataPath)
+
+  return pickle.dumps((state, extraData), pickle.HIGHEST_PROTOCOL)
+
+
+
+def deserializeRegion(region, data):
+  """
+  Restores the state of a Python region implementation serialized by
+  serializeRegion().
+
+  @param region (nupic.regions.PyRegion.PyRegion) Region implementation
+  @param data   (str)                             The serialized region
+  """
+  state, extraData = pickle.loads(data)
+  if hasattr(region, "__setstate__"):
+    region.__setstate__(state)
+  else:
+    region.__dict__.update(state)
+
+  fd, extraDataPath = tempfile.mkstemp()
+  try:
+    os.write(fd, extraData)
+  finally:
+    os.close(fd)
+  try:
+    region.deSerializeExtraData(extraDataPath)
+  finally:
+    os.remove(extraDataPath)
+
+
+
+def isIncrementalCheckpoint(checkpointDir):
+  """
+  Returns whether a directory holds an incremental checkpoint.
+  """
+  return os.path.isfile(os.path.join(checkpointDir, MANIFEST_NAME))
+
+
+
+def _readJson(path):
+  with open(path) as jsonFile:
+    return json.load(jsonFile)
+
+
+
+def _writeJson(path, value):
+  """
+  Writes a JSON file atomically, so that it is never partially written.
+  """
+  tempPath = path + ".tmp"
+  with open(tempPath, "w") as jsonFile:
+    json.dump(value, jsonFile)
+  os.rename(tempPath, path)
+
+
+
+class _CheckpointFiles(object):
+  """
+  Paths of the files of an incremental checkpoint, and reading of its chunks.
+  """
+
+  def __init__(self, checkpointDir):
+    self.checkpointDir = os.path.abspath(checkpointDir)
+    self.manifestPath = os.path.join(self.checkpointDir, MANIFEST_NAME)
+
+
+  def readManifest(self):
+    """
+    Returns the manifest, None if there is none.
+    """
+    if not os.path.isfile(self.manifestPath):
+      return None
+    manifest = _readJson(self.manifestPath)
+    if manifest["version"] != _VERSION:
+      raise ValueError("Unsupported incremental checkpoint version %r in %s" %
+                       (manifest["version"], self.checkpointDir))
+    return manifest
+
+
+  def getModelDir(self):
+    return os.path.join(self.checkpointDir, "model")
+
+
+  def getPackName(self, generation, delta):
+    """
+    Returns the name of the files of a pack, without extension. Delta 0 is the
+    pack of the base.
+    """
+    if delta == 0:
+      return "base-%d" % generation
+    return "delta-%d-%d" % (generation, delta)
+
+
+  def getPath(self, name, extension):
+    return os.path.join(self.checkpointDir, name + extension)
+
+
+  def readIndexes(self, manifest):
+    """
+    Returns the indexes of the packs of the current generation, base first.
+    """
+    return [_readJson(self.getPath(
+              self.getPackName(manifest["generation"], delta), ".json"))
+            for delta in xrange(manifest["numDeltas"] + 1)]
+
+
+  def readComponents(self, manifest, indexes, names):
+    """
+    Returns the serialized components of the checkpoint.
+
+    @param names (list) Names of the components to read
+    @return (dict) Component name -> serialized state
+    """
+    chunkLocations = dict()
+    for delta, index in enumerate(indexes):
+      packPath = self.getPath(self.getPackName(manifest["generation"], delta),
+                              ".pack")
+      for chunkId, offset, length in index["chunks"]:
+        chunkLocations[chunkId] = (packPath, offset, length)
+
+    components = indexes[-1]["components"]
+    if len(indexes) > 1:
+      # Components that did not change since the base are not in the delta
+      components = dict(indexes[0]["components"], **components)
+
+    packFiles = dict()
+    try:
+      states = dict()
+      for name in names:
+        parts = []
+        for chunkId in components[name]:
+          packPath, offset, length = chunkLocations[chunkId]
+          if packPath not in packFiles:
+            packFiles[packPath] = open(packPath, "rb")
+          packFile = packFiles[packPath]
+          packFile.seek(offset)
+          parts.append(packFile.read(length))
+        states[name] = "".join(parts)
+      return states
+    finally:
+      for packFile in packFiles.itervalues():
+        packFile.close()
+
+
+  def writePack(self, name, chunks, components):
+    """
+    Writes the chunks and the index of a pack.
+
+    @param chunks     (list) (chunk ID, chunk) pairs
+    @param components (dict) Component name -> list of chunk IDs
+    @return (int) Number of bytes of the pack
+    """
+    chunkIndex = []
+    offset = 0
+    with open(self.getPath(name, ".pack"), "wb") as packFile:
+      for chunkId, chunk in chunks:
+        packFile.write(chunk)
+        chunkIndex.append((chunkId, offset, len(chunk)))
+        offset += len(chunk)
+    _writeJson(self.getPath(name, ".json"),
+               {"chunks": chunkIndex, "components": components})
+    return offset
+
+
+  def removeGeneration(self, generation):
+    """
+    Removes the base and the deltas of a generation.
+    """
+    prefixes = ("base-%d." % generation, "delta-%d-" % generation)
+    for name in os.listdir(self.checkpointDir):
+      if name.startswith(prefixes):
+        os.remove(os.path.join(self.checkpointDir, name))
+
+
+
+class IncrementalCheckpointer(object):
+  """
+  Saves a model to an incremental checkpoint directory. See the module
+  documentation.
+  """
+
+  def __init__(self, checkpointDir, maxDeltas=DEFAULT_MAX_DELTAS,
+               compactionRatio=DEFAULT_COMPACTION_RATIO):
+    """
+    @param checkpointDir   (string) Directory of the checkpoint. If it holds a
+                                    checkpoint saved with Model.save(), the
+                                    checkpoint is replaced
+    @param maxDeltas       (int)    Number of deltas after which the
+                                    checkpoint is compacted into a new base
+    @param compactionRatio (float)  Size of the deltas relative to the base
+                                    above which the checkpoint is compacted
+                                    into a new base
+    """
+    self._files = _CheckpointFiles(checkpointDir)
+    self.maxDeltas = maxDeltas
+    self.compactionRatio = compactionRatio
+
+
+  def save(self, model):
+    """
+    Checkpoints a model, as a delta or as a new base.
+
+    @param model (nupic.frameworks.opf.model.Model) The model
+    @return (dict) "base": whether a new base was written, "bytesWritten":
+                   number of bytes of chunks written
+    """
+    manifest = self._files.readManifest()
+    if manifest is None:
+      self._prepareDirectory()
+      return self._saveBase(model, None)
+
+    if (manifest["numDeltas"] >= self.maxDeltas or
+        manifest["deltaBytes"] > self.compactionRatio * manifest["baseBytes"]):
+      return self._saveBase(model, manifest)
+
+    return self._saveDelta(model, manifest)
+
+
+  def compact(self, model):
+    """
+    Checkpoints a model as a new base, removing the previous base and deltas.
+
+    @param model (nupic.frameworks.opf.model.Model) The model
+    @return (dict) See save()
+    """
+    manifest = self._files.readManifest()
+    if manifest is None:
+      self._prepareDirectory()
+    return self._saveBase(model, manifest)
+
+
+  def _prepareDirectory(self):
+    """
+    Creates the checkpoint directory, replacing a checkpoint saved with
+    Model.save().
+    """
+    checkpointDir = self._files.checkpointDir
+    if os.path.exists(checkpointDir):
+      if os.path.isfile(Model._getModelPickleFilePath(checkpointDir)):
+        shutil.rmtree(checkpointDir)
+      elif not os.path.isdir(checkpointDir) or os.listdir(checkpointDir):
+        raise Exception(("Existing filesystem entry <%s> is not a model"
+                         " checkpoint -- refusing to delete") % checkpointDir)
+    if not os.path.exists(checkpointDir):
+      os.makedirs(checkpointDir)
+
+
+  def _getComponents(self, model):
+    """
+    Returns the chunks of the components of a model.
+
+    @return (dict) Component name -> list of (chunk ID, chunk) pairs
+    """
+    return dict((name, splitChunks(state))
+                for name, state in model._getCheckpointStates().iteritems())
+
+
+  def _saveBase(self, model, manifest):
+    """
+    Writes a new base: the model directory for generation 0, a pack of all
+    the chunks of the model for the next generations.
+    """
+    components = self._getComponents(model)
+    chunks = dict()
+    for componentChunks in components.itervalues():
+      chunks.update(componentChunks)
+    componentChunkIds = dict(
+      (name, [chunkId for chunkId, _ in componentChunks])
+      for name, componentChunks in components.iteritems())
+
+    if manifest is None:
+      # The chunks of generation 0 are stored by the deltas that use them
+      generation = 0
+      modelDir = self._files.getModelDir()
+      model.save(modelDir)
+      bytesWritten = _getDirectorySize(modelDir)
+      self._files.writePack(self._files.getPackName(generation, 0), [],
+                            componentChunkIds)
+    else:
+      generation = manifest["generation"] + 1
+      bytesWritten = self._files.writePack(
+        self._files.getPackName(generation, 0), sorted(chunks.iteritems()),
+        componentChunkIds)
+
+    _writeJson(self._files.manifestPath,
+               {"version": _VERSION, "generation": generation, "numDeltas": 0,
+                "baseBytes": sum(len(chunk) for chunk in chunks.itervalues()),
+                "deltaBytes": 0})
+
+    if manifest is not None:
+      self._files.removeGeneration(manifest["generation"])
+
+    return {"base": True, "bytesWritten": bytesWritten}
+
+
+  def _saveDelta(self, model, manifest):
+    indexes = self._files.readIndexes(manifest)
+    storedChunkIds = set()
+    for index in indexes:
+      storedChunkIds.update(chunkId for chunkId, _, _ in index["chunks"])
+    baseComponents = indexes[0]["components"]
+    baseChunkIds = set()
+    for chunkIds in baseComponents.itervalues():
+      baseChunkIds.update(chunkIds)
+
+    changedComponents = dict()
+    newChunks = dict()
+    for name, componentChunks in self._getComponents(model).iteritems():
+      chunkIds = [chunkId for chunkId, _ in componentChunks]
+      if chunkIds == baseComponents.get(name):
+        continue
+      changedComponents[name] = chunkIds
+      for chunkId, chunk in componentChunks:
+        if chunkId not in storedChunkIds:
+          newChunks[chunkId] = chunk
+
+    delta = manifest["numDeltas"] + 1
+    bytesWritten = self._files.writePack(
+      self._files.getPackName(manifest["generation"], delta),
+      sorted(newChunks.iteritems()), changedComponents)
+
+    # Chunks of the base of generation 0 are only stored by the first delta
+    # that uses them, and do not count as changes
+    deltaBytes = sum(len(chunk) for chunkId, chunk in newChunks.iteritems()
+                     if chunkId not in baseChunkIds)
+    manifest = dict(manifest, numDeltas=delta,
+                    deltaBytes=manifest["deltaBytes"] + deltaBytes)
+    _writeJson(self._files.manifestPath, manifest)
+
+    return {"base": False, "bytesWritten": bytesWritten}
+
+
+
+def _getDirectorySize(path):
+  """
+  Returns the number of bytes of the files in a directory tree.
+  """
+  return sum(os.path.getsize(os.path.join(dirPath, fileName))
+             for dirPath, _, fileNames in os.walk(path)
+             for fileName in fileNames)
+
+
+
+def load(checkpointDir):
+  """
+  Loads a model from an incremental checkpoint: loads its model directory and
+  restores the components of its base and its last delta.
+
+  @param checkpointDir (string) Directory of the checkpoint
+  @return (nupic.frameworks.opf.model.Model) The model
+  """
+  files = _CheckpointFiles(checkpointDir)
+  manifest = files.readManifest()
+  if manifest is None:
+    raise ValueError("%s is not an incremental checkpoint" % checkpointDir)
+
+  model = Model.load(files.getModelDir())
+  if manifest["generation"] == 0 and manifest["numDeltas"] == 0:
+    return model
+
+  indexes = files.readIndexes(manifest)
+  if manifest["generation"] == 0:
+    # The base of generation 0 is the model directory
+    names = indexes[-1]["components"]
+  else:
+    names = set(indexes[0]["components"]).union(indexes[-1]["components"])
+  return model._setCheckpointStates(
+    files.readComponents(manifest, indexes, sorted(names)))
@@ -276,6 +276,26 @@ class Model(object):
     """
     pass
 
+  def _getCheckpointStates(self):
+    """ Protected method that returns the state of the model serialized in
+    memory, as named components, for incremental checkpoints. A component
+    that does not change is not saved again. It can be overridden by
+    subclasses to split their state into components that change independently.
+    @returns (dict) Component name -> serialized state (string)
+    """
+    return {"model": pickle.dumps(self, pickle.HIGHEST_PROTOCOL)}
+
+  def _setCheckpointStates(self, states):
+    """ Protected method that restores components of the state of the model
+    returned by _getCheckpointStates(), on a model loaded from an older
+    checkpoint.
+    @param states (dict) Component name -> serialized state (string)
+    @returns (Model) The restored model instance, which may be a new instance
+    """
+    if "model" in states:
+      return pickle.loads(states["model"])
+    return self
+
   @staticmethod
   def _getModelPickleFilePath(saveModelDir):
     """ Return the absolute path of the model's pickle file.
@@ -0,0 +1,573 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+""" @file model_fleet.py
+
+ Runs a large number of independent OPF models, one per metric stream.
+
+ The models of a ModelFleet are sharded across worker processes by model ID.
+ Each record is routed to the worker that owns its model, the workers run
+ their records in parallel and the results are returned in the order of the
+ records, so the results of each model are in the order its records were
+ given. Every worker keeps at most a fixed number of models in memory: the
+ least recently used models are checkpointed to disk and evicted, and loaded
+ back when a record for them arrives. Models are sent to and from the workers
+ as checkpoints, since the network of a CLAModel is not pickled with it.
+
+ Closing the fleet checkpoints the models in memory. A fleet created on the
+ same checkpoint directory later serves all the checkpointed models; their IDs
+ are then str(modelId).
+
+ Usage:
+
+   with ModelFleet("/path/to/checkpoints", numWorkers=4,
+                   maxModelsInMemory=1000) as fleet:
+     fleet.createModel("metric1", modelConfig,
+                       inferenceArgs={"predictedField": "value"})
+     ...
+     results = fleet.run([("metric1", record1), ("metric2", record2), ...])
+
+ With incrementalCheckpoints=True, the models are checkpointed with
+ IncrementalCheckpointer, which only writes the parts of a model that changed
+ since its previous checkpoint.
+"""
+
+import collections
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import traceback
+import urllib
+import zlib
+
+from nupic.frameworks.opf import incremental_checkpoint
+from nupic.frameworks.opf.modelfactory import ModelFactory
+
+
+
+# Prefix of the temporary directories of the checkpoints of models sent to or
+# from a worker. It is not the quoted form of any model ID, see
+# ModelShard.getCheckpointPath().
+_TRANSFER_PREFIX = "%transfer-"
+
+
+
+def _getShardIndex(modelId, numShards):
+  """ Return the index of the shard that owns a model. Stable across
+  processes and runs.
+  """
+  return (zlib.crc32(str(modelId)) & 0xffffffff) % numShards
+
+
+
+class ModelFleetWorkerError(Exception):
+  """
+  Raised when a worker process fails to execute a request. Carries the
+  traceback of the worker.
+  """
+  pass
+
+
+
+class ModelShard(object):
+  """ The models owned by one worker of a ModelFleet.
+
+  Keeps at most maxModelsInMemory models in memory, checkpointing and evicting
+  the least recently used ones.
+  """
+
+  def __init__(self, checkpointDir, maxModelsInMemory=None,
+               incrementalCheckpoints=False, shardIndex=0, numShards=1):
+    """
+    @param checkpointDir (string) Directory where evicted models are
+           checkpointed, one sub-directory per model. The models of this shard
+           already checkpointed there are owned by the shard
+    @param maxModelsInMemory (int) Maximum number of models kept in memory.
+           None for no limit
+    @param incrementalCheckpoints (bool) Whether to save incremental
+           checkpoints, see IncrementalCheckpointer
+    @param shardIndex (int) Index of the shard in its fleet
+    @param numShards (int) Number of shards of the fleet
+    """
+    self._checkpointDir = os.path.abspath(checkpointDir)
+    self._maxModelsInMemory = maxModelsInMemory
+    self._incrementalCheckpoints = incrementalCheckpoints
+
+    # Models in memory, least recently used first
+    self._models = collections.OrderedDict()
+
+    # Time each model in memory was last used
+    self._lastUsed = dict()
+
+    # IDs of the models that are only checkpointed
+    self._evictedModelIds = set()
+    if os.path.isdir(self._checkpointDir):
+      for name in os.listdir(self._checkpointDir):
+        modelId = urllib.unquote(name)
+        if (urllib.quote(modelId, safe="") == name and
+            os.path.isdir(os.path.join(self._checkpointDir, name)) and
+            _getShardIndex(modelId, numShards) == shardIndex):
+          self._evictedModelIds.add(modelId)
+
+
+  def createModel(self, modelId, modelConfig, inferenceArgs=None):
+    """ Create a new model with ModelFactory.
+
+    @param modelId (hashable) ID of the model
+    @param modelConfig (dict) Model description, as for ModelFactory.create
+    @param inferenceArgs (dict) If not None, inference is enabled on the model
+           with these arguments
+    """
+    model = ModelFactory.create(modelConfig)
+    if inferenceArgs is not None:
+      model.enableInference(inferenceArgs)
+    self.addModel(modelId, model)
+
+
+  def addModel(self, modelId, model):
+    """ Add an existing model.
+
+    @param modelId (hashable) ID of the model
+    @param model (nupic.frameworks.opf.model.Model) The model
+    """
+    if self.hasModel(modelId):
+      raise ValueError("Model %r already exists" % (modelId,))
+
+    self._models[modelId] = model
+    self._lastUsed[modelId] = time.time()
+    self._evictLeastRecentlyUsed()
+
+
+  def addModelFromCheckpoint(self, modelId, checkpointPath):
+    """ Add a model saved with Model.save().
+
+    @param modelId (hashable) ID of the model
+    @param checkpointPath (string) Directory of the checkpoint
+    """
+    self.addModel(modelId, ModelFactory.loadFromCheckpoint(checkpointPath))
+
+
+  def saveModelCheckpoint(self, modelId, checkpointPath):
+    """ Save a model with Model.save(), keeping it in the shard.
+
+    @param modelId (hashable) ID of the model
+    @param checkpointPath (string) Directory of the checkpoint
+    """
+    self.getModel(modelId).save(checkpointPath)
+
+
+  def removeModel(self, modelId):
+    """ Remove a model, deleting its checkpoint if any.
+
+    @param modelId (hashable) ID of the model
+    """
+    if not self.hasModel(modelId):
+      raise KeyError(modelId)
+
+    if modelId in self._models:
+      del self._models[modelId]
+      del self._lastUsed[modelId]
+    else:
+      self._evictedModelIds.remove(modelId)
+
+    checkpointPath = self.getCheckpointPath(modelId)
+    if os.path.exists(checkpointPath):
+      shutil.rmtree(checkpointPath)
+
+
+  def hasModel(self, modelId):
+    """ Return whether the shard owns a model.
+    """
+    return modelId in self._models or modelId in self._evictedModelIds
+
+
+  def getModel(self, modelId):
+    """ Return a model, loading it from its checkpoint if it was evicted.
+
+    @param modelId (hashable) ID of the model
+    @returns (nupic.frameworks.opf.model.Model) The model
+    """
+    if modelId in self._models:
+      model = self._models.pop(modelId)
+      self._models[modelId] = model
+    elif modelId in self._evictedModelIds:
+      model = ModelFactory.loadFromCheckpoint(self.getCheckpointPath(modelId))
+      self._evictedModelIds.remove(modelId)
+      self._models[modelId] = model
+      self._evictLeastRecentlyUsed(keep=modelId)
+    else:
+      raise KeyError(modelId)
+
+    self._lastUsed[modelId] = time.time()
+    return model
+
+
+  def run(self, records):
+    """ Run records through their models, in order.
+
+    @param records (list) (modelId, inputRecord) pairs
+    @returns (list) The ModelResult of every record
+    """
+    return [self.getModel(modelId).run(inputRecord)
+            for modelId, inputRecord in records]
+
+
+  def evictIdleModels(self, maxIdleSeconds):
+    """ Checkpoint and evict the models that were not used recently.
+
+    @param maxIdleSeconds (float) Models not used for this long are evicted
+    @returns (int) The number of evicted models
+    """
+    idleTime = time.time() - maxIdleSeconds
+    idleModelIds = [modelId for modelId in self._models
+                    if self._lastUsed[modelId] <= idleTime]
+    for modelId in idleModelIds:
+      self._evict(modelId)
+    return len(idleModelIds)
+
+
+  def checkpoint(self):
+    """ Checkpoint all the models in memory, keeping them in memory.
+    """
+    for modelId, model in self._models.iteritems():
+      self._saveModel(modelId, model)
+
+
+  def getStats(self):
+    """ Return the number of models in memory and evicted.
+    """
+    return {"modelsInMemory": len(self._models),
+            "modelsEvicted": len(self._evictedModelIds)}
+
+
+  def getCheckpointPath(self, modelId):
+    """ Return the checkpoint directory of a model.
+    """
+    return os.path.join(self._checkpointDir,
+                        urllib.quote(str(modelId), safe=""))
+
+
+  def _evict(self, modelId):
+    """ Checkpoint a model and remove it from memory.
+    """
+    model = self._models.pop(modelId)
+    del self._lastUsed[modelId]
+    self._saveModel(modelId, model)
+    self._evictedModelIds.add(modelId)
+
+
+  def _saveModel(self, modelId, model):
+    """ Checkpoint a model.
+    """
+    checkpointPath = self.getCheckpointPath(modelId)
+    if self._incrementalCheckpoints:
+      incremental_checkpoint.IncrementalCheckpointer(checkpointPath).save(model)
+      return
+
+    if incremental_checkpoint.isIncrementalCheckpoint(checkpointPath):
+      shutil.rmtree(checkpointPath)
+    model.save(checkpointPath)
+
+
+  def _evictLeastRecentlyUsed(self, keep=None):
+    """ Evict the least recently used models until at most maxModelsInMemory
+    models are in memory.
+
+    @param keep (hashable) ID of a model that must stay in memory
+    """
+    if self._maxModelsInMemory is None:
+      return
+
+    while len(self._models) > self._maxModelsInMemory:
+      modelId = next(iter(self._models))
+      if modelId == keep:
+        if len(self._models) == 1:
+          break
+        # Move it to the most recently used end
+        self._models[modelId] = self._models.pop(modelId)
+        continue
+      self._evict(modelId)
+
+
+
+def _runShard(connection, checkpointDir, maxModelsInMemory,
+              incrementalCheckpoints, shardIndex, numShards):
+  """ Worker process loop. Executes ModelShard method calls received on the
+  connection until it receives None.
+
+  @param connection (multiprocessing.Connection) Connection to the fleet
+  @param checkpointDir (string) See ModelShard
+  @param maxModelsInMemory (int) See ModelShard
+  @param incrementalCheckpoints (bool) See ModelShard
+  @param shardIndex (int) See ModelShard
+  @param numShards (int) See ModelShard
+  """
+  shard = ModelShard(checkpointDir, maxModelsInMemory, incrementalCheckpoints,
+                     shardIndex, numShards)
+  while True:
+    request = connection.recv()
+    if request is None:
+      break
+
+    methodName, args = request
+    try:
+      result = getattr(shard, methodName)(*args)
+    except Exception:
+      connection.send((False, traceback.format_exc()))
+    else:
+      connection.send((True, result))
+
+  connection.close()
+
+
+
+class ModelFleet(object):
+  """ Runs a fleet of models sharded across a pool of worker processes.
+
+  See the module documentation.
+  """
+
+  def __init__(self, checkpointDir, numWorkers=None, maxModelsInMemory=None,
+               incrementalCheckpoints=False):
+    """
+    @param checkpointDir (string) Directory where evicted models are
+           checkpointed. The models already checkpointed there are part of
+           the fleet
+    @param numWorkers (int) Number of worker processes. Defaults to the number
+           of CPUs. If 0, the models are run in the calling process
+    @param maxModelsInMemory (int) Maximum number of models kept in memory,
+           split evenly between the workers. None for no limit
+    @param incrementalCheckpoints (bool) Whether to save incremental
+           checkpoints, see IncrementalCheckpointer
+    """
+    if numWorkers is None:
+      numWorkers = multiprocessing.cpu_count()
+
+    numShards = max(numWorkers, 1)
+    maxModelsPerShard = None
+    if maxModelsInMemory is not None:
+      maxModelsPerShard = max(1, maxModelsInMemory // numShards)
+
+    self._checkpointDir = os.path.abspath(checkpointDir)
+    self._shards = []
+    self._connections = []
+    self._workers = []
+    if numWorkers == 0:
+      self._shards.append(ModelShard(checkpointDir, maxModelsPerShard,
+                                     incrementalCheckpoints))
+    else:
+      for shardIndex in xrange(numWorkers):
+        connection, workerConnection = multiprocessing.Pipe()
+        worker = multiprocessing.Process(
+          target=_runShard,
+          args=(workerConnection, checkpointDir, maxModelsPerShard,
+                incrementalCheckpoints, shardIndex, numWorkers))
+        worker.daemon = True
+        worker.start()
+        self._connections.append(connection)
+        self._workers.append(worker)
+
+    self._numShards = numShards
+    self._closed = False
+
+
+  def __enter__(self):
+    return self
+
+
+  def __exit__(self, *args):
+    self.close()
+
+
+  def createModel(self, modelId, modelConfig, inferenceArgs=None):
+    """ Create a new model in the worker that owns modelId. See
+    ModelShard.createModel.
+    """
+    self._call(self._getShard(modelId), "createModel",
+               modelId, modelConfig, inferenceArgs)
+
+
+  def addModel(self, modelId, model):
+    """ Add an existing model to the fleet. The model is sent to the worker
+    that owns modelId as a checkpoint.
+    """
+    if self._shards:
+      self._call(self._getShard(modelId), "addModel", modelId, model)
+      return
+
+    transferDir = self._makeTransferDir()
+    try:
+      checkpointPath = os.path.join(transferDir, "model")
+      model.save(checkpointPath)
+      self._call(self._getShard(modelId), "addModelFromCheckpoint",
+                 modelId, checkpointPath)
+    finally:
+      shutil.rmtree(transferDir)
+
+
+  def removeModel(self, modelId):
+    """ Remove a model from the fleet, deleting its checkpoint if any.
+    """
+    self._call(self._getShard(modelId), "removeModel", modelId)
+
+
+  def getModel(self, modelId):
+    """ Return a copy of a model, loaded from a checkpoint saved by its
+    worker (the model itself when running in the calling process).
+    """
+    if self._shards:
+      return self._call(self._getShard(modelId), "getModel", modelId)
+
+    transferDir = self._makeTransferDir()
+    try:
+      checkpointPath = os.path.join(transferDir, "model")
+      self._call(self._getShard(modelId), "saveModelCheckpoint",
+                 modelId, checkpointPath)
+      return ModelFactory.loadFromCheckpoint(checkpointPath)
+    finally:
+      shutil.rmtree(transferDir)
+
+
+  def run(self, records):
+    """ Run records through their models. The workers run their records in
+    parallel, each one in the order given.
+
+    @param records (iterable) (modelId, inputRecord) pairs
+    @returns (list) The ModelResult of every record, in the order of records
+    """
+    shardRecords = [[] for _ in xrange(self._numShards)]
+    shardPositions = [[] for _ in xrange(self._numShards)]
+    numRecords = 0
+    for modelId, inputRecord in records:
+      shard = self._getShard(modelId)
+      shardRecords[shard].append((modelId, inputRecord))
+      shardPositions[shard].append(numRecords)
+      numRecords += 1
+
+    calls = [(shard, "run", (shardRecords[shard],))
+             for shard in xrange(self._numShards) if shardRecords[shard]]
+    shardResults = self._callAll(calls)
+
+    results = [None] * numRecords
+    for (shard, _, _), modelResults in zip(calls, shardResults):
+      for position, modelResult in zip(shardPositions[shard], modelResults):
+        results[position] = modelResult
+    return results
+
+
+  def evictIdleModels(self, maxIdleSeconds):
+    """ Checkpoint and evict the models that were not used recently, in all
+    workers.
+
+    @param maxIdleSeconds (float) Models not used for this long are evicted
+    @returns (int) The number of evicted models
+    """
+    return sum(self._callAll([(shard, "evictIdleModels", (maxIdleSeconds,))
+                              for shard in xrange(self._numShards)]))
+
+
+  def checkpoint(self):
+    """ Checkpoint all the models in memory, keeping them in memory.
+    """
+    self._callAll([(shard, "checkpoint", ())
+                   for shard in xrange(self._numShards)])
+
+
+  def getStats(self):
+    """ Return the number of models in memory and evicted, over all workers.
+    """
+    stats = collections.Counter()
+    for shardStats in self._callAll([(shard, "getStats", ())
+                                     for shard in xrange(self._numShards)]):
+      stats.update(shardStats)
+    return dict(stats)
+
+
+  def close(self, checkpoint=True):
+    """ Stop the worker processes.
+
+    @param checkpoint (bool) Whether to checkpoint the models in memory first.
+           If False, the changes of the models in memory since they were last
+           checkpointed are lost
+    """
+    if self._closed:
+      return
+
+    if checkpoint:
+      self.checkpoint()
+
+    for connection in self._connections:
+      connection.send(None)
+      connection.close()
+    for worker in self._workers:
+      worker.join()
+
+    self._connections = []
+    self._workers = []
+    self._closed = True
+
+
+  def _getShard(self, modelId):
+    """ Return the index of the shard that owns a model.
+    """
+    return _getShardIndex(modelId, self._numShards)
+
+
+  def _makeTransferDir(self):
+    """ Create a temporary directory for the checkpoint of a model sent to or
+    from a worker.
+    """
+    if not os.path.isdir(self._checkpointDir):
+      os.makedirs(self._checkpointDir)
+    return tempfile.mkdtemp(prefix=_TRANSFER_PREFIX, dir=self._checkpointDir)
+
+
+  def _call(self, shard, methodName, *args):
+    return self._callAll([(shard, methodName, args)])[0]
+
+
+  def _callAll(self, calls):
+    """ Call ModelShard methods, in parallel when they are in different
+    workers.
+
+    @param calls (list) (shard, methodName, args) tuples, at most one per shard
+    @returns (list) The result of every call
+    """
+    if self._shards:
+      return [getattr(self._shards[shard], methodName)(*args)
+              for shard, methodName, args in calls]
+
+    for shard, methodName, args in calls:
+      self._connections[shard].send((methodName, args))
+
+    results = []
+    error = None
+    for shard, _, _ in calls:
+      success, result = self._connections[shard].recv()
+      if not success and error is None:
+        error = result
+      results.append(result)
+
+    if error is not None:
+      raise ModelFleetWorkerError(error)
+    return results
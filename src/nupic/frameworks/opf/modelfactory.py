@@ -30,6 +30,7 @@ import nupic.frameworks.opf.opfutils as opfutils
 
 # Import models
 from clamodel import CLAModel
+import incremental_checkpoint
 from model import Model
 from two_gram_model import TwoGramModel
 from previousvaluemodel import PreviousValueModel
@@ -86,4 +87,6 @@ class ModelFactory(object):
            Directory of where the experiment is to be or was saved
     @returns (nupic.frameworks.opf.model.Model) The loaded model instance.
     """
+    if incremental_checkpoint.isIncrementalCheckpoint(savedModelDir):
+      return incremental_checkpoint.load(savedModelDir)
     return Model.load(savedModelDir)
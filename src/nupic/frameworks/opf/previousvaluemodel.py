@@ -153,8 +153,10 @@ class PreviousValueModel(model.Model):
     self._reset = True
 
   def __getstate__(self):
-    del self._logger
-    return self.__dict__
+    state = self.__dict__.copy()
+    del state["_logger"]
+    return state
 
-  def __setstate__(self):
+  def __setstate__(self, state):
+    self.__dict__.update(state)
     self._logger = opfutils.initLogger(self)
@@ -0,0 +1,312 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Lightweight instrumentation of the phases of a model's compute loop.
+
+RuntimeStats records, for every named phase, the number of calls, a latency
+histogram and the number of objects allocated during the phase. Models create
+one when runtime statistics are enabled and wrap each phase of their run
+method in RuntimeStats.phase(); when they are disabled the phases are wrapped
+in NULL_PHASE, which does nothing.
+"""
+
+import gc
+import math
+import timeit
+
+
+
+class LatencyHistogram(object):
+  """
+  Histogram of durations with logarithmically spaced buckets.
+
+  Bucket i > 0 holds the durations in
+  [minValue * ratio ** (i - 1), minValue * ratio ** i), bucket 0 holds the
+  durations below minValue and the last bucket the durations above the
+  largest bound. Percentiles are reported as the upper bound of the bucket
+  they fall in, so their relative error is at most ratio - 1.
+  """
+
+  def __init__(self, minValue=1e-6, maxValue=100.0, bucketsPerDoubling=4):
+    """
+    @param minValue           (float) Smallest duration, in seconds, resolved
+                                      by the buckets
+    @param maxValue           (float) Largest duration, in seconds, resolved
+                                      by the buckets
+    @param bucketsPerDoubling (int)   Number of buckets between a duration and
+                                      twice that duration
+    """
+    self.minValue = minValue
+    self.maxValue = maxValue
+    self.bucketsPerDoubling = bucketsPerDoubling
+
+    self._logRatio = math.log(2.0) / bucketsPerDoubling
+    numBounds = int(math.ceil(math.log(maxValue / minValue) /
+                              self._logRatio)) + 1
+    self._counts = [0] * (numBounds + 1)
+
+    self.count = 0
+    self.total = 0.0
+    self.min = None
+    self.max = None
+
+
+  def record(self, value):
+    """
+    Adds a duration to the histogram.
+
+    @param value (float) Duration, in seconds
+    """
+    if value < self.minValue:
+      bucket = 0
+    else:
+      bucket = min(int(math.log(value / self.minValue) / self._logRatio) + 1,
+                   len(self._counts) - 1)
+    self._counts[bucket] += 1
+
+    self.count += 1
+    self.total += value
+    if self.min is None or value < self.min:
+      self.min = value
+    if self.max is None or value > self.max:
+      self.max = value
+
+
+  def mean(self):
+    """
+    Returns the mean duration, or None if nothing was recorded.
+    """
+    if self.count == 0:
+      return None
+    return self.total / self.count
+
+
+  def percentile(self, percent):
+    """
+    Returns an upper bound of a percentile of the durations.
+
+    @param percent (float) Percentile, between 0 and 100
+
+    @return (float) Upper bound of the bucket holding the percentile, clipped
+                    to the range of the recorded durations, or None if nothing
+                    was recorded
+    """
+    if not 0 <= percent <= 100:
+      raise ValueError("Invalid percentile %r" % percent)
+    if self.count == 0:
+      return None
+
+    rank = max(int(math.ceil(self.count * percent / 100.0)), 1)
+    seen = 0
+    for bucket, bucketCount in enumerate(self._counts):
+      seen += bucketCount
+      if seen >= rank:
+        break
+
+    # The last bucket has no upper bound
+    if bucket == len(self._counts) - 1:
+      return self.max
+
+    bound = self.minValue * math.exp(bucket * self._logRatio)
+    return min(max(bound, self.min), self.max)
+
+
+  def merge(self, other):
+    """
+    Adds the durations recorded by another histogram with the same buckets.
+
+    @param other (LatencyHistogram) Histogram to merge into this one
+    """
+    if (other.minValue, other.maxValue, other.bucketsPerDoubling) != (
+        self.minValue, self.maxValue, self.bucketsPerDoubling):
+      raise ValueError("Cannot merge histograms with different buckets")
+
+    self._counts = [a + b for a, b in zip(self._counts, other._counts)]
+    self.count += other.count
+    self.total += other.total
+    for value in (other.min, other.max):
+      if value is not None:
+        if self.min is None or value < self.min:
+          self.min = value
+        if self.max is None or value > self.max:
+          self.max = value
+
+
+
+class _Phase(object):
+  """
+  Context manager timing one execution of a phase.
+  """
+
+  __slots__ = ("_stats", "_name", "_start", "_allocStart")
+
+
+  def __init__(self, stats, name):
+    self._stats = stats
+    self._name = name
+
+
+  def __enter__(self):
+    self._allocStart = allocationCount()
+    self._start = timeit.default_timer()
+
+
+  def __exit__(self, *exc):
+    elapsed = timeit.default_timer() - self._start
+    # A full collection during the phase makes the difference negative
+    allocations = max(allocationCount() - self._allocStart, 0)
+    self._stats.record(self._name, elapsed, allocations)
+    return False
+
+
+
+class _NullPhase(object):
+  """
+  Context manager that does nothing, used when statistics are disabled.
+  """
+
+  __slots__ = ()
+
+
+  def __enter__(self):
+    pass
+
+
+  def __exit__(self, *exc):
+    return False
+
+
+
+NULL_PHASE = _NullPhase()
+
+
+
+def allocationCount():
+  """
+  Returns a counter of the container objects allocated by the interpreter.
+
+  The garbage collector counts, per generation, the objects allocated since
+  the last collection of that generation. Weighting every generation by the
+  number of allocations its collections absorbed gives a counter whose
+  differences approximate the net number of objects allocated in between.
+  The counter drops when the oldest generation is collected, which is rare.
+  """
+  count0, count1, count2 = gc.get_count()
+  threshold0, threshold1, _ = gc.get_threshold()
+  return count0 + threshold0 * (count1 + threshold1 * count2)
+
+
+
+class RuntimeStats(object):
+  """
+  Per-phase call counts, latency histograms and allocation counts.
+
+  The statistics can be exported periodically by passing an exportHook: it is
+  called with the result of getStats() every exportInterval calls to
+  endRecord().
+  """
+
+  PERCENTILES = (50, 90, 99, 99.9)
+
+
+  def __init__(self, exportHook=None, exportInterval=1000):
+    """
+    @param exportHook     (callable) Called with the statistics every
+                                     exportInterval records, or None
+    @param exportInterval (int)      Number of records between two exports
+    """
+    if exportInterval < 1:
+      raise ValueError("exportInterval must be positive")
+
+    self.exportHook = exportHook
+    self.exportInterval = exportInterval
+    self.reset()
+
+
+  def reset(self):
+    """
+    Clears all the statistics.
+    """
+    self.numRecords = 0
+    self._histograms = dict()
+    self._allocations = dict()
+
+
+  def phase(self, name):
+    """
+    Returns a context manager that times its block as one call of a phase.
+
+    @param name (str) Phase name
+
+    @return context manager
+    """
+    return _Phase(self, name)
+
+
+  def record(self, name, elapsed, allocations=0):
+    """
+    Records one call of a phase.
+
+    @param name        (str)   Phase name
+    @param elapsed     (float) Duration of the call, in seconds
+    @param allocations (int)   Net number of objects allocated by the call
+    """
+    histogram = self._histograms.get(name)
+    if histogram is None:
+      histogram = self._histograms[name] = LatencyHistogram()
+      self._allocations[name] = 0
+    histogram.record(elapsed)
+    self._allocations[name] += allocations
+
+
+  def endRecord(self):
+    """
+    Marks the end of the processing of a record, exporting the statistics if
+    exportInterval records were processed since the last export.
+    """
+    self.numRecords += 1
+    if (self.exportHook is not None and
+        self.numRecords % self.exportInterval == 0):
+      self.exportHook(self.getStats())
+
+
+  def getStats(self):
+    """
+    Returns the statistics of every phase.
+
+    @return (dict) Keyed by phase name; each value is a dict with the
+                   "count", "totalTime", "meanTime", "minTime", "maxTime" and
+                   "allocations" of the phase, and its percentiles as
+                   "p50", "p90", ... Times are in seconds.
+    """
+    stats = dict()
+    for name, histogram in self._histograms.iteritems():
+      phaseStats = {"count": histogram.count,
+                    "totalTime": histogram.total,
+                    "meanTime": histogram.mean(),
+                    "minTime": histogram.min,
+                    "maxTime": histogram.max,
+                    "allocations": self._allocations[name]}
+      for percent in self.PERCENTILES:
+        phaseStats["p%g" % percent] = histogram.percentile(percent)
+      stats[name] = phaseStats
+    return stats
@@ -171,7 +171,7 @@ class CLAClassifierRegion(PyRegion):
           accessMode='ReadWrite',
           dataType='Byte',
           count=0,
-          constraints='enum: py, cpp'),
+          constraints='enum: py, cpp, dense'),
 
         clVerbosity=dict(
           description='An integer that controls the verbosity level, '
@@ -23,7 +23,6 @@
 ## @file
 This file defines the k Nearest Neighbor classifier region.
 """
-import copy
 
 import numpy
 from PyRegion import PyRegion
@@ -432,7 +431,7 @@ class KNNAnomalyClassifierRegion(PyRegion):
     # Store the state for next time step
     numPredictedCols = len(self._prevPredictedColumns)
     predictedColumns = allTPCells.nonzero()[0]
-    self._prevPredictedColumns = copy.deepcopy(predictedColumns)
+    self._prevPredictedColumns = predictedColumns
 
     if self._anomalyVectorLength is None:
       self._anomalyVectorLength = len(classificationVector)
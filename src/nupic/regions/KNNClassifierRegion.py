@@ -442,6 +442,18 @@ class KNNClassifierRegion(PyRegion):
             constraints='',
             defaultValue=-1,
             accessMode='Create'),
+
+          indexType=dict(
+            description='Index used to find the prototypes overlapping an '
+                        'input with the overlap distance methods. Possible '
+                        'options are none (compute all distances), inverted '
+                        '(exact inverted index) and lsh (approximate '
+                        'locality-sensitive hashing).',
+            dataType="Byte",
+            count=0,
+            constraints='enum: none, inverted, lsh',
+            defaultValue='none',
+            accessMode='Create'),
       ),
       commands=dict()
     )
@@ -475,7 +487,8 @@ class KNNClassifierRegion(PyRegion):
                doSelfValidation=False,
                replaceDuplicates=False,
                cellsPerCol=0,
-               maxStoredPatterns=-1
+               maxStoredPatterns=-1,
+               indexType='none'
                ):
 
     self.version = KNNClassifierRegion.__VERSION__
@@ -499,6 +512,9 @@ class KNNClassifierRegion(PyRegion):
     if justUseAuxiliary == 0:
       justUseAuxiliary = False
 
+    if indexType == 'none':
+      indexType = None
+
     # KNN Parameters
     self.knnParams = dict(
         k=k,
@@ -517,7 +533,8 @@ class KNNClassifierRegion(PyRegion):
         verbosity=clVerbosity,
         replaceDuplicates=replaceDuplicates,
         cellsPerCol=cellsPerCol,
-        maxStoredPatterns=maxStoredPatterns
+        maxStoredPatterns=maxStoredPatterns,
+        indexType=indexType
     )
 
     # Initialize internal structures
@@ -251,6 +251,14 @@ class RecordSensor(PyRegion):
       if not data:
         raise StopIteration("Datasource has no more data")
 
+      # The record may be owned by the caller of the data source (e.g. the
+      # input record of CLAModel.run()), so it is copied before being
+      # modified. Records that have the private keys are only modified by
+      # pre-encoding filters.
+      if (self.preEncodingFilters or "_reset" not in data or
+          "_sequenceId" not in data or "_category" not in data):
+        data = data.__class__(data)
+
       # temporary check
       if "_reset" not in data:
         data["_reset"] = 0
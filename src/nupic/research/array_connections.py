@@ -0,0 +1,451 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Connections implementation backed by flat numpy arrays.
+"""
+
+import numpy
+
+from nupic.research.connections import Connections, SynapseData
+
+
+
+class ArrayConnections(Connections):
+  """
+  Class to hold data representing the connectivity of a collection of cells.
+
+  Same interface as Connections, but instead of keeping a SynapseData object
+  per synapse, the cell of each segment and the segment, presynaptic cell and
+  permanence of each synapse are stored in flat, growable numpy arrays
+  indexed by segment and synapse index. SynapseData objects are only built
+  when requested through dataForSynapse and synapsesForPresynapticCell.
+
+  The synapses of each presynaptic cell are indexed in compressed sparse row
+  form: the synapses of cell c are
+  _presynapticSynapses[_presynapticOffsets[c]:_presynapticOffsets[c + 1]].
+  Synapses created since the index was last updated are merged into it when
+  it is next used.
+
+  Destroyed segments and synapses are left in the arrays and in the index as
+  tombstones (a segment or cell of -1). Call compact() to drop the destroyed
+  synapses and renumber the remaining ones.
+  """
+
+  # Initial number of segments and synapses the arrays can hold
+  INITIAL_CAPACITY = 1024
+
+
+  def __init__(self, numCells):
+    """
+    @param numCells (int) Number of cells in collection
+    """
+
+    # Save member variables
+    self.numCells = numCells
+
+    # Segment data, indexed by segment
+    self._segmentCells = numpy.empty(self.INITIAL_CAPACITY, dtype="int32")
+
+    # Synapse data, indexed by synapse
+    self._synapseSegments = numpy.empty(self.INITIAL_CAPACITY, dtype="int32")
+    self._synapsePresynapticCells = numpy.empty(self.INITIAL_CAPACITY,
+                                                dtype="int32")
+    self._synapsePermanences = numpy.empty(self.INITIAL_CAPACITY,
+                                           dtype="float64")
+
+    # Indexes into the arrays (for performance)
+    self._segmentsForCell = dict()
+    self._synapsesForSegment = dict()
+    self._presynapticOffsets = numpy.zeros(numCells + 1, dtype="int32")
+    self._presynapticSynapses = numpy.empty(0, dtype="int32")
+    # Synapses below this index are in the presynaptic index
+    self._nextIndexedSynapseIdx = 0
+
+    # Number of live segments and synapses
+    self._numSegments = 0
+    self._numSynapses = 0
+
+    # Index of the next segment to be created
+    self._nextSegmentIdx = 0
+    # Index of the next synapse to be created
+    self._nextSynapseIdx = 0
+
+
+  def cellForSegment(self, segment):
+    """
+    Returns the cell that a segment belongs to.
+
+    @param segment (int) Segment index
+
+    @return (int) Cell index
+    """
+    if not self._isSegment(segment):
+      raise KeyError(segment)
+
+    return int(self._segmentCells[segment])
+
+
+  def dataForSynapse(self, synapse):
+    """
+    Returns the data for a synapse.
+
+    @param synapse (int) Synapse index
+
+    @return (SynapseData) Synapse data
+    """
+    self._validateSynapse(synapse)
+
+    return self._synapseData(synapse)
+
+
+  def synapsesForPresynapticCell(self, presynapticCell):
+    """
+    Returns the synapses for the source cell that they synapse on.
+
+    @param presynapticCell (int) Source cell index
+
+    @return (dict) Synapse data, keyed by synapse index
+    """
+    synapses = self.synapseIndicesForPresynapticCells([presynapticCell])
+    return dict((synapse, self._synapseData(synapse))
+                for synapse in synapses.tolist())
+
+
+  def synapseIndicesForPresynapticCells(self, presynapticCells):
+    """
+    Returns the synapses of a group of presynaptic cells.
+
+    @param presynapticCells (iter) Source cell indices
+
+    @return (numpy.ndarray) Synapse indices, ordered by source cell in the
+                            order of presynapticCells
+    """
+    self._updatePresynapticIndex()
+
+    cells = numpy.fromiter(presynapticCells, dtype="int64")
+    cells = cells[(cells >= 0) & (cells < self.numCells)]
+    starts = self._presynapticOffsets[cells]
+    lengths = self._presynapticOffsets[cells + 1] - starts
+
+    # Positions in _presynapticSynapses of the synapses of every cell, one
+    # range per cell
+    ends = numpy.cumsum(lengths)
+    positions = (numpy.arange(ends[-1] if len(ends) else 0) +
+                 numpy.repeat(starts - (ends - lengths), lengths))
+    synapses = self._presynapticSynapses[positions]
+
+    return synapses[self._synapseSegments[synapses] != -1]
+
+
+  def createSegment(self, cell):
+    """
+    Adds a new segment on a cell.
+
+    @param cell (int) Cell index
+
+    @return (int) New segment index
+    """
+    self._validateCell(cell)
+
+    # Add data
+    segment = self._nextSegmentIdx
+    self._segmentCells = self._grow(self._segmentCells, segment + 1)
+    self._segmentCells[segment] = cell
+    self._nextSegmentIdx += 1
+    self._numSegments += 1
+
+    # Update indexes
+    if not cell in self._segmentsForCell:
+      self._segmentsForCell[cell] = set()
+    self._segmentsForCell[cell].add(segment)
+
+    return segment
+
+
+  def destroySegment(self, segment):
+    """
+    Destroys a segment.
+
+    @param segment (int) Segment index
+    """
+    synapses = set(self.synapsesForSegment(segment))
+    for synapse in synapses:
+      self.destroySynapse(synapse)
+
+    cell = self.cellForSegment(segment)
+    self._segmentCells[segment] = -1
+    self._numSegments -= 1
+    self._synapsesForSegment.pop(segment, None)
+
+    # Update indexes
+    self._segmentsForCell[cell].remove(segment)
+
+
+  def createSynapse(self, segment, presynapticCell, permanence):
+    """
+    Creates a new synapse on a segment.
+
+    @param segment         (int)   Segment index
+    @param presynapticCell (int)   Source cell index
+    @param permanence      (float) Initial permanence
+
+    @return (int) Synapse index
+    """
+    self._validateSegment(segment)
+    self._validateCell(presynapticCell)
+    self._validatePermanence(permanence)
+
+    # Add data
+    synapse = self._nextSynapseIdx
+    size = synapse + 1
+    self._synapseSegments = self._grow(self._synapseSegments, size)
+    self._synapsePresynapticCells = self._grow(self._synapsePresynapticCells,
+                                               size)
+    self._synapsePermanences = self._grow(self._synapsePermanences, size)
+
+    self._synapseSegments[synapse] = segment
+    self._synapsePresynapticCells[synapse] = presynapticCell
+    self._synapsePermanences[synapse] = permanence
+    self._nextSynapseIdx += 1
+    self._numSynapses += 1
+
+    # Update indexes
+    if not segment in self._synapsesForSegment:
+      self._synapsesForSegment[segment] = set()
+    self._synapsesForSegment[segment].add(synapse)
+
+    return synapse
+
+
+  def destroySynapse(self, synapse):
+    """
+    Destroys a synapse.
+
+    @param synapse (int) Synapse index
+    """
+    if not self._isSynapse(synapse):
+      raise KeyError(synapse)
+
+    segment = int(self._synapseSegments[synapse])
+    self._synapseSegments[synapse] = -1
+    self._numSynapses -= 1
+
+    # Update indexes
+    self._synapsesForSegment[segment].remove(synapse)
+
+
+  def updateSynapsePermanence(self, synapse, permanence):
+    """
+    Updates the permanence for a synapse.
+
+    @param synapse    (int)   Synapse index
+    @param permanence (float) New permanence
+    """
+    self._validatePermanence(permanence)
+
+    if not self._isSynapse(synapse):
+      raise KeyError(synapse)
+
+    self._synapsePermanences[synapse] = permanence
+
+
+  def computeActivity(self, activeCells, connectedPermanence):
+    """
+    Counts, for every segment, the synapses from a set of active presynaptic
+    cells. All synapses of all active cells are gathered from the
+    presynaptic index into one array and scattered onto their segments with a
+    single bincount per count.
+
+    @param activeCells         (iter)  Indices of active presynaptic cells
+    @param connectedPermanence (float) Minimum permanence for a synapse to be
+                                       counted as connected
+
+    @return (tuple) Contains, as arrays indexed by segment:
+                      `numActiveConnectedSynapsesForSegment` (numpy.ndarray),
+                      `numActivePotentialSynapsesForSegment` (numpy.ndarray)
+                    where potential synapses are those with a permanence
+                    above 0
+    """
+    synapses = self.synapseIndicesForPresynapticCells(activeCells)
+
+    segments = self._synapseSegments[synapses]
+    permanences = self._synapsePermanences[synapses]
+    numSegments = self._nextSegmentIdx
+    # bincount requires a positive minlength
+    minlength = max(numSegments, 1)
+
+    numActiveConnectedSynapsesForSegment = numpy.bincount(
+      segments[permanences >= connectedPermanence],
+      minlength=minlength)[:numSegments]
+    numActivePotentialSynapsesForSegment = numpy.bincount(
+      segments[permanences > 0], minlength=minlength)[:numSegments]
+
+    return (numActiveConnectedSynapsesForSegment,
+            numActivePotentialSynapsesForSegment)
+
+
+  def numSegments(self):
+    """
+    Returns the number of segments.
+    """
+    return self._numSegments
+
+
+  def numSynapses(self):
+    """
+    Returns the number of synapses.
+    """
+    return self._numSynapses
+
+
+  def numDestroyedSynapses(self):
+    """
+    Returns the number of destroyed synapses still held in the synapse arrays.
+    """
+    return self._nextSynapseIdx - self._numSynapses
+
+
+  def compact(self):
+    """
+    Drops destroyed synapses from the synapse arrays. The remaining synapses
+    keep their relative order but are renumbered from 0, so synapse indices
+    obtained before compacting are no longer valid. Segment indices are not
+    affected.
+    """
+    end = self._nextSynapseIdx
+    alive = numpy.where(self._synapseSegments[:end] != -1)[0]
+
+    self._synapseSegments = self._synapseSegments[alive]
+    self._synapsePresynapticCells = self._synapsePresynapticCells[alive]
+    self._synapsePermanences = self._synapsePermanences[alive]
+    self._nextSynapseIdx = len(alive)
+
+    for synapses in self._synapsesForSegment.itervalues():
+      synapses.clear()
+    for synapse, segment in enumerate(self._synapseSegments.tolist()):
+      self._synapsesForSegment[segment].add(synapse)
+
+    self._presynapticOffsets[:] = 0
+    self._presynapticSynapses = numpy.empty(0, dtype="int32")
+    self._nextIndexedSynapseIdx = 0
+    self._updatePresynapticIndex()
+
+
+  def _updatePresynapticIndex(self):
+    """
+    Merges the synapses created since the last update into the presynaptic
+    index. Within a cell, synapses stay ordered by index.
+    """
+    start = self._nextIndexedSynapseIdx
+    end = self._nextSynapseIdx
+    if start == end:
+      return
+
+    newSynapses = start + numpy.flatnonzero(
+      self._synapseSegments[start:end] != -1)
+    newCells = self._synapsePresynapticCells[newSynapses]
+    order = numpy.argsort(newCells, kind="mergesort")
+    newSynapses = newSynapses[order]
+    newCells = newCells[order]
+
+    # Each new synapse goes after the synapses of its cell
+    self._presynapticSynapses = numpy.insert(
+      self._presynapticSynapses, self._presynapticOffsets[newCells + 1],
+      newSynapses).astype("int32")
+    self._presynapticOffsets[1:] += numpy.cumsum(
+      numpy.bincount(newCells, minlength=self.numCells),
+      dtype="int32")
+    self._nextIndexedSynapseIdx = end
+
+
+  def _synapseData(self, synapse):
+    """
+    Builds the synapse data for a synapse. (Assumes the synapse exists.)
+
+    @param synapse (int) Synapse index
+
+    @return (SynapseData) Synapse data
+    """
+    return SynapseData(int(self._synapseSegments[synapse]),
+                       int(self._synapsePresynapticCells[synapse]),
+                       float(self._synapsePermanences[synapse]))
+
+
+  def _isSegment(self, segment):
+    """
+    Returns whether a segment index refers to a live segment.
+
+    @param segment (int) Segment index
+    """
+    return (isinstance(segment, (int, long, numpy.integer)) and
+            0 <= segment < self._nextSegmentIdx and
+            self._segmentCells[segment] != -1)
+
+
+  def _isSynapse(self, synapse):
+    """
+    Returns whether a synapse index refers to a live synapse.
+
+    @param synapse (int) Synapse index
+    """
+    return (isinstance(synapse, (int, long, numpy.integer)) and
+            0 <= synapse < self._nextSynapseIdx and
+            self._synapseSegments[synapse] != -1)
+
+
+  def _validateSegment(self, segment):
+    """
+    Raises an error if segment index is invalid.
+
+    @param segment (int) Segment index
+    """
+    if not self._isSegment(segment):
+      raise IndexError("Invalid segment")
+
+
+  def _validateSynapse(self, synapse):
+    """
+    Raises an error if synapse index is invalid.
+
+    @param synapse (int) Synapse index
+    """
+    if not self._isSynapse(synapse):
+      raise IndexError("Invalid synapse")
+
+
+  @staticmethod
+  def _grow(array, size):
+    """
+    Returns an array holding at least `size` elements, doubling the capacity
+    of `array` if it is too small. Existing elements are preserved.
+
+    @param array (numpy.ndarray) Array to grow
+    @param size  (int)           Minimum number of elements
+
+    @return (numpy.ndarray) `array`, or a larger copy of it
+    """
+    if size <= len(array):
+      return array
+
+    grown = numpy.empty(max(size, 2 * len(array)), dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
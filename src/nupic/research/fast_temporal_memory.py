@@ -36,8 +36,8 @@ class FastTemporalMemory(TemporalMemory):
   """
 
   def __init__(self, *args, **kwargs):
+    kwargs.setdefault("connectionsClass", Connections)
     super(FastTemporalMemory, self).__init__(*args, **kwargs)
-    self.connections = Connections(self.numberOfCells())
 
 
   def burstColumns(self,
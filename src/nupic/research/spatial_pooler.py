@@ -34,6 +34,15 @@ uintType = "uint32"
 
 VERSION = 2
 
+# Local inhibition looks up the neighbors of every column through a
+# precomputed index. Indices are shared by all spatial poolers with the same
+# column topology and inhibition radius, and are only built when one of those
+# changes. Topologies whose index would exceed the size limit (in entries)
+# compute the neighbors of each column on the fly instead.
+_NEIGHBORHOOD_INDEX_CACHE_SIZE = 8
+_MAX_NEIGHBORHOOD_INDEX_SIZE = 2 ** 24
+_neighborhoodIndexCache = {}
+
 
 
 class InvalidSPParamValueError(ValueError):
@@ -777,6 +786,57 @@ class SpatialPooler(object):
     activeArray[activeColumns] = 1
 
 
+  def computeBatch(self, inputMatrix, learn, activeMatrix):
+    """
+    Batched variant of compute(). Each row of 'inputMatrix' is one record and
+    the corresponding row of 'activeMatrix' receives the active columns for
+    that record, exactly as if compute() had been called on each row in turn.
+
+    When learning is off the SP state does not change between records, so
+    the overlaps for the whole block are computed with a single matrix
+    product against the connected synapses instead of one sparse
+    matrix-vector product per record. When learning is on every record
+    modifies the permanences, so the records are fed to compute() one at a
+    time.
+
+    @param inputMatrix: A 2-D numpy array of 0's and 1's with one row per
+        record. The number of columns must match the number of inputs.
+    @param learn: A boolean value indicating whether learning should be
+        performed. See compute().
+    @param activeMatrix: A 2-D array with one row per record and one column
+        per SP column. Before the function returns this array will be
+        populated with 1's at the active columns of each record, and 0's
+        everywhere else.
+    """
+    if not isinstance(inputMatrix, numpy.ndarray):
+      raise TypeError("Input matrix must be a numpy array, not %s" %
+                      str(type(inputMatrix)))
+
+    if inputMatrix.ndim != 2 or inputMatrix.shape[1] != self._numInputs:
+      raise ValueError(
+          "Input matrix dimensions don't match. Expecting (n, %s) but got %s"
+          % (self._numInputs, inputMatrix.shape))
+
+    numRecords = inputMatrix.shape[0]
+    if activeMatrix.shape != (numRecords, self._numColumns):
+      raise ValueError(
+          "Active matrix dimensions don't match. Expecting %s but got %s" % (
+              (numRecords, self._numColumns), activeMatrix.shape))
+
+    if learn:
+      for i in xrange(numRecords):
+        self.compute(inputMatrix[i], True, activeMatrix[i])
+      return
+
+    overlapMatrix = self._calculateOverlapBatch(inputMatrix)
+
+    activeMatrix.fill(0)
+    for i in xrange(numRecords):
+      self._updateBookeepingVars(False)
+      activeColumns = self._inhibitColumns(overlapMatrix[i])
+      activeMatrix[i, activeColumns] = 1
+
+
   def stripUnlearnedColumns(self, activeArray):
     """Removes the set of columns who have never been active from the set of
     active columns selected in the inhibition round. Such columns cannot
@@ -1367,6 +1427,26 @@ class SpatialPooler(object):
     return overlaps
 
 
+  def _calculateOverlapBatch(self, inputMatrix):
+    """
+    Computes the overlaps of every column with every record of a block of
+    inputs. This is equivalent to calling _calculateOverlap() on each row of
+    'inputMatrix', but performs a single dense matrix product against the
+    connected synapses.
+
+    Parameters:
+    ----------------------------
+    @param inputMatrix: a 2-D numpy array of 0's and 1's with one input vector
+                    per row.
+    @return a 2-D array with one row of column overlaps per input record.
+    """
+    connected = self._connectedSynapses.toDense().astype(realDType)
+    overlaps = numpy.dot(numpy.asarray(inputMatrix, dtype=realDType),
+                         connected.T)
+    overlaps[overlaps < self._stimulusThreshold] = 0
+    return overlaps
+
+
   def _calculateOverlapPct(self, overlaps):
     return overlaps.astype(realDType) / self._connectedCounts
 
@@ -1422,12 +1502,27 @@ class SpatialPooler(object):
     @return list with indices of the winning columns
     """
     #calculate num active per inhibition area
-
     numActive = int(density * self._numColumns)
-    winners = sorted(range(overlaps.size),
-                     key=lambda k: overlaps[k],
-                     reverse=True)[0:numActive]
-    return winners
+    if numActive <= 0:
+      return []
+
+    # Rather than sorting every column, use a partial selection to find the
+    # overlap of the numActive-th best column and only sort the candidates
+    # that reach it. Candidates are visited in index order and sorted stably,
+    # so ties are broken in favor of the lower column index, just like a
+    # stable full sort in descending order.
+    overlaps = numpy.asarray(overlaps)
+    if numActive < overlaps.size:
+      kth = overlaps.size - numActive
+      threshold = numpy.partition(overlaps, kth)[kth]
+      candidates = numpy.where(overlaps >= threshold)[0]
+    else:
+      candidates = numpy.arange(overlaps.size)
+
+    candidateOverlaps = overlaps[candidates].astype(numpy.float64)
+    order = numpy.argsort(-candidateOverlaps, kind="mergesort")
+    winners = candidates[order[:numActive]]
+    return winners.tolist()
 
 
   def _inhibitColumnsLocal(self, overlaps, density):
@@ -1448,18 +1543,100 @@ class SpatialPooler(object):
                     of surviving columns is likely to vary.
     @return list with indices of the winning columns
     """
-    winners = []
     addToWinners = max(overlaps)/1000.0
     overlaps = numpy.array(overlaps, dtype=realDType)
-    for i in xrange(self._numColumns):
-      maskNeighbors = self._getNeighborsND(i, self._columnDimensions, self._inhibitionRadius)
-      overlapSlice = overlaps[maskNeighbors]
-      numActive = int(0.5 + density * (len(maskNeighbors) + 1))
-      numBigger = numpy.count_nonzero(overlapSlice > overlaps[i])
-      if numBigger < numActive:
-        winners.append(i)
-        overlaps[i] += addToWinners
-    return winners
+    index = self._getNeighborhoodIndex(self._columnDimensions,
+                                       self._inhibitionRadius)
+    if index is None:
+      winners = []
+      for i in xrange(self._numColumns):
+        maskNeighbors = self._getNeighborsND(i, self._columnDimensions,
+                                             self._inhibitionRadius)
+        overlapSlice = overlaps[maskNeighbors]
+        numActive = int(0.5 + density * (len(maskNeighbors) + 1))
+        numBigger = numpy.count_nonzero(overlapSlice > overlaps[i])
+        if numBigger < numActive:
+          winners.append(i)
+          overlaps[i] += addToWinners
+      return winners
+
+    # Rank every column against its neighborhood at once. Padding entries in
+    # the index point back at the column itself, so they are never bigger.
+    neighbors, numNeighbors = index
+    numActive = (0.5 + density * (numNeighbors + 1)).astype(int)
+    neighborOverlaps = overlaps[neighbors]
+    columnOverlaps = overlaps[:, numpy.newaxis]
+    numBigger = (neighborOverlaps > columnOverlaps).sum(axis=1)
+    isWinner = numBigger < numActive
+
+    # Columns are selected in index order, and each winner's overlap is
+    # raised by addToWinners before the following columns are considered. The
+    # raise only matters for a column when an earlier neighbor was not bigger
+    # before the raise but is after it, so only those columns are revisited,
+    # in order, counting the earlier neighbors that actually won.
+    raisedOverlaps = (overlaps.astype(numpy.float64) +
+                      addToWinners).astype(realDType)
+    columns = numpy.arange(self._numColumns)
+    raised = ((neighbors < columns[:, numpy.newaxis]) &
+              (neighborOverlaps <= columnOverlaps) &
+              (raisedOverlaps[neighbors] > columnOverlaps))
+    for i in numpy.where(raised.any(axis=1))[0]:
+      numRaised = numpy.count_nonzero(isWinner[neighbors[i][raised[i]]])
+      isWinner[i] = numBigger[i] + numRaised < numActive[i]
+
+    return numpy.where(isWinner)[0].tolist()
+
+
+  @staticmethod
+  def _getNeighborhoodIndex(dimensions, radius):
+    """
+    Returns the neighbors of every column as a precomputed index, building it
+    if no spatial pooler with the same topology and radius has done so yet.
+    Neighbors follow the same definition as _getNeighborsND without wrap
+    around.
+
+    Parameters:
+    ----------------------------
+    @param dimensions: An array containing a dimensions for the column space.
+    @param radius:  Indicates how far away from a given column are other
+                    columns to be considered its neighbors.
+    @return a tuple (neighbors, numNeighbors), or None if the index would be
+            too large. 'neighbors' is a 2-D array whose row i holds the flat
+            indices of the neighbors of column i, padded with i itself.
+            'numNeighbors' holds the number of actual neighbors per column.
+    """
+    key = (tuple(int(d) for d in dimensions), int(radius))
+    if key in _neighborhoodIndexCache:
+      return _neighborhoodIndexCache[key]
+
+    dimensions = numpy.array(key[0], dtype=numpy.int64)
+    numColumns = int(dimensions.prod())
+    offsetRanges = [numpy.arange(-min(radius, d - 1), min(radius, d - 1) + 1)
+                    for d in dimensions]
+    offsets = numpy.array(list(itertools.product(*offsetRanges)),
+                          dtype=numpy.int64)
+    offsets = offsets[(offsets != 0).any(axis=1)]
+
+    if numColumns * len(offsets) > _MAX_NEIGHBORHOOD_INDEX_SIZE:
+      index = None
+    else:
+      columns = numpy.arange(numColumns)
+      coords = numpy.unravel_index(columns, dimensions)
+      strides = numpy.append(numpy.cumprod(dimensions[:0:-1])[::-1], 1)
+      valid = numpy.ones((numColumns, len(offsets)), dtype=bool)
+      flat = numpy.zeros((numColumns, len(offsets)), dtype=numpy.int64)
+      for i in xrange(dimensions.size):
+        neighborCoords = (coords[i][:, numpy.newaxis] +
+                          offsets[:, i][numpy.newaxis, :])
+        valid &= (neighborCoords >= 0) & (neighborCoords < dimensions[i])
+        flat += neighborCoords * strides[i]
+      neighbors = numpy.where(valid, flat, columns[:, numpy.newaxis])
+      index = (neighbors, valid.sum(axis=1))
+
+    if len(_neighborhoodIndexCache) >= _NEIGHBORHOOD_INDEX_CACHE_SIZE:
+      _neighborhoodIndexCache.clear()
+    _neighborhoodIndexCache[key] = index
+    return index
 
 
   @staticmethod
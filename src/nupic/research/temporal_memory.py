@@ -26,7 +26,10 @@ Temporal Memory implementation in Python.
 from collections import defaultdict, namedtuple
 from operator import mul
 
+import numpy
+
 from nupic.bindings.math import Random
+from nupic.research.array_connections import ArrayConnections
 from nupic.research.connections import Connections
 
 
@@ -51,7 +54,8 @@ class TemporalMemory(object):
                permanenceIncrement=0.10,
                permanenceDecrement=0.10,
                predictedSegmentDecrement=0.0,
-               seed=42):
+               seed=42,
+               connectionsClass=Connections):
     """
     @param columnDimensions          (list)  Dimensions of the column space
     @param cellsPerColumn            (int)   Number of cells per column
@@ -64,6 +68,7 @@ class TemporalMemory(object):
     @param permanenceDecrement       (float) Amount by which permanences of synapses are decremented during learning.
     @param predictedSegmentDecrement (float) Amount by which active permanences of synapses of previously predicted but inactive segments are decremented.
     @param seed                      (int)   Seed for the random number generator.
+    @param connectionsClass          (type)  Class holding the connectivity of the layer, Connections or ArrayConnections.
 
     Notes:
 
@@ -92,8 +97,9 @@ class TemporalMemory(object):
     self.permanenceIncrement = permanenceIncrement
     self.permanenceDecrement = permanenceDecrement
     self.predictedSegmentDecrement = predictedSegmentDecrement
+    self.connectionsClass = connectionsClass
     # Initialize member variables
-    self.connections = Connections(self.numberOfCells())
+    self.connections = connectionsClass(self.numberOfCells())
     self._random = Random(seed)
 
     self.activeCells = set()
@@ -391,6 +397,10 @@ class TemporalMemory(object):
     Forward propagates activity from active cells to the synapses that touch
     them, to determine which synapses are active.
 
+    When the layer's connectivity is an ArrayConnections, the synapse counts
+    of all segments are computed at once (see
+    `computePredictiveCellsVectorized`).
+
     @param activeCells (set)         Indices of active cells in `t`
     @param connections (Connections) Connectivity of layer
 
@@ -400,6 +410,9 @@ class TemporalMemory(object):
                       `matchingSegments` (set),
                       `matchingCells`    (set)
     """
+    if isinstance(connections, ArrayConnections):
+      return self.computePredictiveCellsVectorized(activeCells, connections)
+
     numActiveConnectedSynapsesForSegment = defaultdict(int)
     numActiveSynapsesForSegment = defaultdict(int)
     activeSegments = set()
@@ -431,6 +444,45 @@ class TemporalMemory(object):
     return activeSegments, predictiveCells, matchingSegments, matchingCells
 
 
+  def computePredictiveCellsVectorized(self, activeCells, connections):
+    """
+    Same as `computePredictiveCells`, but counts the active connected and
+    active potential synapses of every segment in one batched scatter-add
+    over all synapses of the active cells, instead of one synapse at a time.
+
+    @param activeCells (set)              Indices of active cells in `t`
+    @param connections (ArrayConnections) Connectivity of layer
+
+    @return (tuple) Contains:
+                      `activeSegments`  (set),
+                      `predictiveCells` (set),
+                      `matchingSegments` (set),
+                      `matchingCells`    (set)
+    """
+    (numActiveConnectedSynapsesForSegment,
+     numActiveSynapsesForSegment) = connections.computeActivity(
+       activeCells, self.connectedPermanence)
+
+    # Like the synapse-by-synapse version, only segments with at least one
+    # counted synapse can become active or matching.
+    activeSegments = set(numpy.where(
+      (numActiveConnectedSynapsesForSegment > 0) &
+      (numActiveConnectedSynapsesForSegment >= self.activationThreshold))[0]
+      .tolist())
+    predictiveCells = set(connections.cellForSegment(segment)
+                          for segment in activeSegments)
+
+    matchingSegments = set()
+    if self.predictedSegmentDecrement > 0:
+      matchingSegments = set(numpy.where(
+        (numActiveSynapsesForSegment > 0) &
+        (numActiveSynapsesForSegment >= self.minThreshold))[0].tolist())
+    matchingCells = set(connections.cellForSegment(segment)
+                        for segment in matchingSegments)
+
+    return activeSegments, predictiveCells, matchingSegments, matchingCells
+
+
   # ==============================
   # Helper functions
   # ==============================
@@ -714,11 +766,16 @@ class TemporalMemory(object):
 
 
   @classmethod
-  def read(cls, proto):
+  def read(cls, proto, connectionsClass=Connections):
     """
     Reads deserialized data from proto object
 
-    @param proto (DynamicStructBuilder) Proto object
+    @param proto            (DynamicStructBuilder) Proto object
+    @param connectionsClass (type)                 Class holding the
+                                                   connectivity of the layer.
+                                                   TemporalMemoryProto has no
+                                                   field for it, pickling
+                                                   keeps it.
 
     @return (TemporalMemory) TemporalMemory instance
     """
@@ -735,7 +792,8 @@ class TemporalMemory(object):
     tm.permanenceDecrement = proto.permanenceDecrement
     tm.predictedSegmentDecrement = proto.predictedSegmentDecrement
 
-    tm.connections = Connections.read(proto.connections)
+    tm.connectionsClass = connectionsClass
+    tm.connections = connectionsClass.read(proto.connections)
     tm._random = Random()
     tm._random.read(proto.random)
 
@@ -329,6 +329,132 @@ class AnomalyLikelihoodClassTest(TestCaseBase):
 
 
 
+class StreamingAnomalyLikelihoodTest(TestCaseBase):
+  """Tests the StreamingAnomalyLikelihood class"""
+
+
+  def testProbationaryPeriod(self):
+    l = an.StreamingAnomalyLikelihood(claLearningPeriod=2,
+                                      estimationSamples=2,
+                                      historicWindowSize=3)
+
+    # 0.5 result is expected during burn-in
+    for i in xrange(4):
+      self.assertEqual(l.anomalyProbability(i * 0.1, 0.1), 0.5)
+
+    self.assertGreater(l.anomalyProbability(10, 0.9), 0.5)
+
+
+  def testBadWindowSize(self):
+    with self.assertRaises(ValueError):
+      an.StreamingAnomalyLikelihood(estimationSamples=10, historicWindowSize=5)
+
+
+  def testMemoryIsBounded(self):
+    l = an.StreamingAnomalyLikelihood(claLearningPeriod=10,
+                                      estimationSamples=10,
+                                      historicWindowSize=50)
+    for _ in xrange(500):
+      l.anomalyProbability(numpy.random.random(), numpy.random.random())
+
+    self.assertEqual(l._numSamples, 50)
+    self.assertEqual(len(l._averagedScores), 50)
+    self.assertEqual(len(l._metricValues), 50)
+
+
+  def testRunningStatistics(self):
+    """The running sums give the statistics of the historical window."""
+    numpy.random.seed(42)
+    l = an.StreamingAnomalyLikelihood(claLearningPeriod=5,
+                                      estimationSamples=5,
+                                      historicWindowSize=40,
+                                      averagingWindow=3)
+    values = numpy.random.random(125) * 100 + 1e6
+    scores = numpy.random.random(125)
+    for value, score in zip(values, scores):
+      l.anomalyProbability(value, score)
+
+    movingAverages = numpy.convolve(scores, numpy.ones(3) / 3, mode="valid")
+    expectedParams = an.estimateNormal(movingAverages[-40:])
+    params = l._distribution()
+    self.assertAlmostEqual(params["mean"], expectedParams["mean"])
+    self.assertAlmostEqual(params["variance"], expectedParams["variance"])
+
+    self.assertAlmostEqual(l._valueSumSquares / 40 - (l._valueSum / 40) ** 2,
+                           values[-40:].var(), places=6)
+
+
+  def testFlatMetricValues(self):
+    """Flat metric values use the null distribution."""
+    l = an.StreamingAnomalyLikelihood(claLearningPeriod=10,
+                                      estimationSamples=10,
+                                      historicWindowSize=100)
+    for _ in xrange(200):
+      l.anomalyProbability(42.0, numpy.random.random() * 0.1)
+
+    self.assertDictEqual(l._distribution(), an.nullDistribution())
+    self.assertLess(l.anomalyProbability(42.0, 1.0), 0.6)
+
+
+  def testAnomalyDetected(self):
+    """A burst of high anomaly scores gets a high likelihood, similar to the
+    one AnomalyLikelihood gives."""
+    numpy.random.seed(42)
+    data = _generateSampleData(mean=0.1, variance=0.001)
+    for i in xrange(1200, 1205):
+      data[i][2] = 1.0
+
+    l = an.AnomalyLikelihood()
+    l2 = an.StreamingAnomalyLikelihood()
+    likelihoods = [l.anomalyProbability(v, s, t) for t, v, s in data]
+    likelihoods2 = [l2.anomalyProbability(v, s, t) for t, v, s in data]
+
+    self.assertGreater(max(likelihoods2[1200:1205]), 0.999)
+    self.assertLess(max(likelihoods2[500:1200]), 0.99)
+    self.assertAlmostEqual(numpy.mean(likelihoods), numpy.mean(likelihoods2),
+                           places=2)
+
+
+  def testAnomalyProbabilities(self):
+    """Bulk evaluation gives the same results as record by record."""
+    numpy.random.seed(42)
+    values = numpy.random.random(1000)
+    values[500:600] = 3.0
+    scores = numpy.random.random(1000) ** 3
+
+    l = an.StreamingAnomalyLikelihood(claLearningPeriod=50,
+                                      estimationSamples=50,
+                                      historicWindowSize=120)
+    l2 = an.StreamingAnomalyLikelihood(claLearningPeriod=50,
+                                       estimationSamples=50,
+                                       historicWindowSize=120)
+    likelihoods = [l.anomalyProbability(v, s) for v, s in zip(values, scores)]
+
+    likelihoods2 = numpy.concatenate(
+      [l2.anomalyProbabilities(values[:10], scores[:10]),
+       l2.anomalyProbabilities(values[10:10], scores[10:10]),
+       l2.anomalyProbabilities(values[10:433], scores[10:433]),
+       l2.anomalyProbabilities(values[433:], scores[433:])])
+
+    self.assertTrue(numpy.allclose(likelihoods, likelihoods2))
+    self.assertEqual(l._iteration, l2._iteration)
+    self.assertAlmostEqual(l.anomalyProbability(0.5, 0.9),
+                           l2.anomalyProbability(0.5, 0.9))
+
+
+  def testSerialization(self):
+    """serialization using pickle"""
+    l = an.StreamingAnomalyLikelihood(claLearningPeriod=2, estimationSamples=2)
+    for i in xrange(10):
+      l.anomalyProbability(i, 0.1 * (i % 3))
+
+    restored = pickle.loads(pickle.dumps(l))
+
+    self.assertEqual(l.anomalyProbability(3, 0.2),
+                     restored.anomalyProbability(3, 0.2))
+
+
+
 class AnomalyLikelihoodAlgorithmTest(TestCaseBase):
   """Tests the low-level algorithm functions"""
 
@@ -372,6 +498,20 @@ class AnomalyLikelihoodAlgorithmTest(TestCaseBase):
                              1.0 - an.normalProbability(-1.5, p))
 
 
+  def testNormalProbabilities(self):
+    """Vectorized version matches normalProbability."""
+    numpy.random.seed(42)
+    x = numpy.random.random(1000) * 4 - 2
+    means = numpy.random.random(1000) - 0.5
+    stdevs = numpy.random.random(1000) + 0.05
+
+    probabilities = an._normalProbabilities(x, means, stdevs)
+    for i in xrange(1000):
+      p = {"name": "normal", "mean": means[i], "stdev": stdevs[i],
+           "variance": stdevs[i] ** 2}
+      self.assertEqual(probabilities[i], an.normalProbability(x[i], p))
+
+
   def testEstimateNormal(self):
     """
     This passes in a known set of data and ensures the estimateNormal
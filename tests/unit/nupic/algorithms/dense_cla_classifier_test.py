@@ -0,0 +1,144 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""Unit tests for the DenseCLAClassifier.
+
+This test extends the test for the Python CLAClassifier to ensure that both
+classifiers and their tests stay in sync.
+"""
+
+import tempfile
+
+import numpy
+import unittest2 as unittest
+
+from nupic.algorithms.CLAClassifier import CLAClassifier
+from nupic.algorithms.dense_cla_classifier import DenseCLAClassifier
+
+# Don't import the CLAClassifierTest directly or the unittest.main() will pick
+# it up and run it.
+import cla_classifier_test
+
+try:
+  import capnp
+except ImportError:
+  capnp = None
+if capnp:
+  from nupic.proto import ClaClassifier_capnp
+
+
+
+class DenseCLAClassifierTest(cla_classifier_test.CLAClassifierTest):
+  """Unit tests for DenseCLAClassifier class."""
+
+
+  def setUp(self):
+    self._classifier = DenseCLAClassifier
+
+
+  def testMatchesCLAClassifier(self):
+    randomState = numpy.random.RandomState(42)
+
+    for steps in ([1], [0], [1, 5]):
+      c1 = CLAClassifier(steps, 0.1, 0.3, 0)
+      c2 = DenseCLAClassifier(steps, 0.1, 0.3, 0)
+
+      recordNum = 0
+      for _ in xrange(300):
+        # Skip a record now and then
+        recordNum += 1 if randomState.rand() > 0.1 else 2
+        patternNZ = sorted(set(randomState.randint(0, 200, 20).tolist()))
+        bucketIdx = int(randomState.randint(0, 20))
+        classification = {"bucketIdx": bucketIdx, "actValue": bucketIdx * 1.5}
+
+        result1 = c1.compute(recordNum, patternNZ, classification, True, True)
+        result2 = c2.compute(recordNum, patternNZ, classification, True, True)
+
+        self.assertEqual(result1["actualValues"], result2["actualValues"])
+        for nSteps in steps:
+          self.assertTrue(numpy.allclose(result1[nSteps], result2[nSteps]))
+
+
+  def testMatchesCLAClassifierRepeatedRecordNum(self):
+    randomState = numpy.random.RandomState(42)
+    c1 = CLAClassifier([1, 2], 0.1, 0.3, 0)
+    c2 = DenseCLAClassifier([1, 2], 0.1, 0.3, 0)
+
+    recordNum = 10
+    for _ in xrange(300):
+      # recordNum repeats or goes backwards now and then
+      recordNum += int(randomState.choice([-2, 0, 1, 1, 1]))
+      patternNZ = sorted(set(randomState.randint(0, 200, 20).tolist()))
+      bucketIdx = int(randomState.randint(0, 20))
+      classification = {"bucketIdx": bucketIdx, "actValue": bucketIdx * 1.5}
+
+      result1 = c1.compute(recordNum, patternNZ, classification, True, True)
+      result2 = c2.compute(recordNum, patternNZ, classification, True, True)
+
+      for nSteps in (1, 2):
+        self.assertTrue(numpy.allclose(result1[nSteps], result2[nSteps]))
+
+
+  def testGetMemoryUsage(self):
+    c = self._classifier([1, 2], 0.1, 0.1, 0)
+    for recordNum in xrange(3):
+      c.compute(recordNum=recordNum, patternNZ=[1, 5, 9],
+                classification={"bucketIdx": 4, "actValue": 34.7},
+                learn=True, infer=False)
+
+    usage = c.getMemoryUsage()
+    self.assertEqual(set(usage.keys()), set([1, 2]))
+    for nSteps in (1, 2):
+      self.assertGreaterEqual(usage[nSteps], 10 * 5 * 4)
+
+
+  @unittest.skipUnless(
+      capnp, "pycapnp is not installed, skipping serialization test.")
+  def testWriteReadCLAClassifierFormat(self):
+    c1 = DenseCLAClassifier([1], 0.1, 0.1, 0)
+    for recordNum, bucketIdx in enumerate((4, 2, 4, 7)):
+      c1.compute(recordNum=recordNum, patternNZ=[1, 5, 9],
+                 classification={"bucketIdx": bucketIdx, "actValue": 34.7},
+                 learn=True, infer=False)
+
+    proto1 = ClaClassifier_capnp.ClaClassifierProto.new_message()
+    c1.write(proto1)
+
+    # Write the proto to a temp file and read it back into a new proto
+    with tempfile.TemporaryFile() as f:
+      proto1.write(f)
+      f.seek(0)
+      proto2 = ClaClassifier_capnp.ClaClassifierProto.read(f)
+
+    # Both classifiers can load it and infer the same as the original
+    c2 = DenseCLAClassifier.read(proto2)
+    c3 = CLAClassifier.read(proto2)
+
+    classification = {"bucketIdx": 7, "actValue": 34.7}
+    result1 = c1.infer([1, 5, 9], classification)
+    for c in (c2, c3):
+      result = c.infer([1, 5, 9], classification)
+      self.assertTrue(numpy.allclose(result1[1], result[1]))
+
+
+
+if __name__ == "__main__":
+  unittest.main()
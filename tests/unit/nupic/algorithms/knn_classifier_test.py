@@ -123,6 +123,84 @@ class KNNClassifierTest(unittest.TestCase):
     self.assertEquals(cat, 0)
 
 
+  def _checkIndex(self, indexType, distanceMethod, exact):
+    """Compares inference with and without a prototype index"""
+    np.random.seed(42)
+    dimensionality = 1024
+    classifiers = [
+      KNNClassifier(k=3, distanceMethod=distanceMethod, maxStoredPatterns=300),
+      KNNClassifier(k=3, distanceMethod=distanceMethod, maxStoredPatterns=300,
+                    indexType=indexType)]
+
+    patterns = [np.sort(np.random.choice(dimensionality, 20, replace=False))
+                for _ in xrange(400)]
+    for classifier in classifiers:
+      for i, pattern in enumerate(patterns):
+        classifier.learn(pattern, i % 7, isSparse=dimensionality, rowID=i)
+      classifier.removeIds(range(150, 170))
+      self.assertEqual(classifier._numPatterns, 280)
+
+    for _ in xrange(50):
+      # A stored pattern with a few bits changed
+      pattern = patterns[np.random.randint(100, 400)].copy()
+      pattern[:3] = np.random.choice(dimensionality, 3)
+      denseInput = np.zeros(dimensionality)
+      denseInput[pattern] = 1.0
+
+      cat, _, dist, _ = classifiers[0].infer(denseInput)
+      indexCat, _, indexDist, _ = classifiers[1].infer(denseInput)
+      self.assertEqual(cat, indexCat)
+      if exact:
+        self.assertTrue(np.allclose(dist, indexDist))
+      else:
+        self.assertEqual(dist.min(), indexDist.min())
+
+
+  def testInvertedIndexRawOverlap(self):
+    self._checkIndex("inverted", "rawOverlap", exact=True)
+
+
+  def testInvertedIndexPctOverlapOfProto(self):
+    self._checkIndex("inverted", "pctOverlapOfProto", exact=True)
+
+
+  def testLshIndexRawOverlap(self):
+    self._checkIndex("lsh", "rawOverlap", exact=False)
+
+
+  def testLshIndexFallback(self):
+    """Approximate index falls back to exact distances without enough
+    candidates"""
+    params = {"distanceMethod": "rawOverlap", "indexType": "lsh", "k": 1}
+    classifier = KNNClassifier(**params)
+
+    dimensionality = 40
+    a = np.array([1, 3, 7, 11, 13, 17, 19, 23, 29], dtype=np.int32)
+    b = np.array([2, 4, 8, 12, 14, 18, 20, 28, 30], dtype=np.int32)
+    classifier.learn(a, 0, isSparse=dimensionality)
+    classifier.learn(b, 1, isSparse=dimensionality)
+
+    # Shares only one bit with a, so it is unlikely to be a candidate
+    denseInput = np.zeros(dimensionality)
+    denseInput[[1, 5, 6, 9, 10, 15]] = 1.0
+    cat, _, dist, _ = classifier.infer(denseInput)
+    self.assertEquals(cat, 0)
+    self.assertTrue(np.allclose(dist, [5.0 / 6.0, 1.0]))
+
+
+  def testIndexIgnoredForNorm(self):
+    """Distance methods not based on overlaps compute all distances"""
+    classifier = KNNClassifier(indexType="inverted")
+    dimensionality = 40
+    classifier.learn(np.array([1, 3, 7]), 0, isSparse=dimensionality)
+    classifier.learn(np.array([2, 4, 8]), 1, isSparse=dimensionality)
+
+    denseInput = np.zeros(dimensionality)
+    denseInput[[2, 4, 9]] = 1.0
+    cat, _, _, _ = classifier.infer(denseInput)
+    self.assertEquals(cat, 1)
+
+
   @unittest.skip("Finish when infer has options for sparse and dense "
                  "https://github.com/numenta/nupic/issues/2198")
   def testOverlapDistanceMethod_ClassifySparse(self):
@@ -0,0 +1,152 @@
+#! /usr/bin/env python
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+import numpy as np
+import unittest
+
+from nupic.algorithms.knn_index import InvertedIndex, MinHashIndex
+
+
+
+def _dense(nonZeros, dimensionality=100):
+  pattern = np.zeros(dimensionality)
+  pattern[nonZeros] = 1.0
+  return pattern
+
+
+
+class InvertedIndexTest(unittest.TestCase):
+
+
+  def testCandidateOverlaps(self):
+    index = InvertedIndex()
+    index.addRow([1, 2, 3])
+    index.addRow([2, 3, 4])
+    index.addRow([50, 60])
+    index.addRow([])
+
+    rows, overlaps = index.candidateOverlaps(_dense([2, 3, 4, 70]))
+    self.assertEqual(rows.tolist(), [0, 1])
+    self.assertEqual(overlaps.tolist(), [2, 3])
+
+    # Input values are summed like NearestNeighbor.rightVecSumAtNZ
+    pattern = _dense([1, 50])
+    pattern[50] = 0.5
+    rows, overlaps = index.candidateOverlaps(pattern)
+    self.assertEqual(rows.tolist(), [0, 2])
+    self.assertEqual(overlaps.tolist(), [1.0, 0.5])
+
+    rows, overlaps = index.candidateOverlaps(_dense([]))
+    self.assertEqual(len(rows), 0)
+    self.assertEqual(len(overlaps), 0)
+
+
+  def testDeleteRow(self):
+    index = InvertedIndex()
+    for i in xrange(6):
+      index.addRow([i, i + 1])
+
+    index.deleteRow(2)
+    index.deleteRow(0)
+    self.assertEqual(index.numRows(), 4)
+
+    # Rows 1, 3, 4, 5 moved to 0, 1, 2, 3
+    rows, overlaps = index.candidateOverlaps(_dense([2, 3, 4]))
+    self.assertEqual(rows.tolist(), [0, 1, 2])
+    self.assertEqual(overlaps.tolist(), [1, 2, 1])
+
+    index.addRow([3])
+    rows, overlaps = index.candidateOverlaps(_dense([3]))
+    self.assertEqual(rows.tolist(), [1, 4])
+
+    with self.assertRaises(IndexError):
+      index.deleteRow(5)
+
+
+  def testPurge(self):
+    index = InvertedIndex()
+    for i in xrange(1500):
+      index.addRow([i % 10, 10 + i % 7])
+    for _ in xrange(1000):
+      index.deleteRow(0)
+
+    # Deleted prototypes are dropped from the postings
+    self.assertEqual(index.numRows(), 500)
+    self.assertLessEqual(sum(len(index._getPostings(bit))
+                             for bit in index._postingLists), 2 * 2 * 500)
+
+    rows, overlaps = index.candidateOverlaps(_dense([3, 10]))
+    expected = [row for row in xrange(500)
+                if (row + 1000) % 10 == 3 or (row + 1000) % 7 == 0]
+    self.assertEqual(rows.tolist(), expected)
+
+
+
+class MinHashIndexTest(unittest.TestCase):
+
+
+  def testIdenticalPatternIsCandidate(self):
+    np.random.seed(42)
+    index = MinHashIndex(numBands=10, bandSize=3)
+    patterns = [np.sort(np.random.choice(2048, 40, replace=False))
+                for _ in xrange(200)]
+    for pattern in patterns:
+      index.addRow(pattern)
+
+    for i in (0, 57, 199):
+      rows, overlaps = index.candidateOverlaps(_dense(patterns[i], 2048))
+      self.assertIn(i, rows.tolist())
+      self.assertEqual(overlaps[rows.tolist().index(i)], 40)
+
+
+  def testSimilarPatternsAreCandidates(self):
+    np.random.seed(42)
+    index = MinHashIndex()
+    pattern = np.sort(np.random.choice(2048, 40, replace=False))
+    index.addRow(pattern)
+    index.addRow(np.sort(np.random.choice(2048, 40, replace=False)))
+
+    # Same pattern with 4 bits changed
+    noisy = pattern.copy()
+    noisy[:4] = np.random.choice(2048, 4)
+    rows, _ = index.candidateOverlaps(_dense(noisy, 2048))
+    self.assertEqual(rows.tolist(), [0])
+
+
+  def testDeleteRow(self):
+    index = MinHashIndex()
+    index.addRow([1, 2, 3])
+    index.addRow([4, 5, 6])
+    index.addRow([])
+    index.deleteRow(0)
+
+    rows, overlaps = index.candidateOverlaps(_dense([4, 5, 6]))
+    self.assertEqual(rows.tolist(), [0])
+    self.assertEqual(overlaps.tolist(), [3])
+
+    rows, _ = index.candidateOverlaps(_dense([1, 2, 3]))
+    self.assertEqual(len(rows), 0)
+
+
+
+if __name__ == "__main__":
+  unittest.main()
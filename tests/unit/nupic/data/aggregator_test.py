@@ -22,9 +22,41 @@
 
 """Unit tests for aggregator module."""
 
+import datetime
+
 import unittest2 as unittest
 
 from nupic.data import aggregator
+from nupic.data.fieldmeta import FieldMetaInfo
+from nupic.data.record_chunk import RecordChunkParser
+
+
+
+_FIELDS = [FieldMetaInfo("timestamp", "datetime", "T"),
+           FieldMetaInfo("reset", "int", "R"),
+           FieldMetaInfo("sequence", "string", "S"),
+           FieldMetaInfo("count", "int", ""),
+           FieldMetaInfo("value", "float", ""),
+           FieldMetaInfo("weight", "int", ""),
+           FieldMetaInfo("category", "string", "")]
+
+_AGGREGATION_FIELDS = [("reset", "first"), ("sequence", "last"),
+                       ("count", "sum"), ("value", "mean"),
+                       ("weight", "max"), ("category", "mode")]
+
+
+
+def _makeRows(times, numSequences=1):
+  rows = []
+  for i, t in enumerate(times):
+    rows.append([t.strftime("%Y-%m-%d %H:%M:%S"),
+                 "1" if i % 17 == 5 else "0",
+                 "s%d" % (i * numSequences // len(times)),
+                 "" if i % 7 == 3 else str(i % 11 - 4),
+                 "" if i % 5 == 1 else str(i * 0.1),
+                 str(i % 3),
+                 "abc"[i % 4 % 3]])
+  return rows
 
 
 class AggregatorTest(unittest.TestCase):
@@ -51,5 +83,63 @@ class AggregatorTest(unittest.TestCase):
     self.assertAlmostEqual(result, 1.0, places=7)
 
 
+  def _assertBulkAggregation(self, aggregationInfo, rows, chunkSizes):
+    chunk = RecordChunkParser(_FIELDS).parse(rows)
+    expected = []
+    agg = aggregator.Aggregator(aggregationInfo, _FIELDS)
+    for record in chunk.getRecords() + [None]:
+      outRecord, _ = agg.next(record, None)
+      if outRecord is not None:
+        expected.append(outRecord)
+
+    for chunkSize in chunkSizes:
+      parser = RecordChunkParser(_FIELDS)
+      bulkAgg = aggregator.BulkAggregator(aggregationInfo, _FIELDS)
+      result = []
+      for start in xrange(0, len(rows), chunkSize):
+        result.extend(
+          bulkAgg.aggregate(parser.parse(rows[start:start + chunkSize])))
+      result.extend(bulkAgg.finish())
+      self.assertEqual(result, expected)
+
+    return expected
+
+
+  def testBulkAggregation(self):
+    start = datetime.datetime(2011, 3, 4, 5, 6, 7)
+    times = [start + datetime.timedelta(minutes=i * 7 + i % 3)
+             for i in xrange(500)]
+    rows = _makeRows(times, numSequences=4)
+    aggregationInfo = {"minutes": 30, "fields": _AGGREGATION_FIELDS}
+    expected = self._assertBulkAggregation(aggregationInfo, rows,
+                                           [1, 10, 64, 1000])
+    self.assertGreater(len(expected), 100)
+
+    aggregationInfo = {"hours": 2,
+                       "fields": [("weight", "wmean:reset"), ("count", "min")]}
+    self._assertBulkAggregation(aggregationInfo, rows, [13, 1000])
+
+
+  def testBulkAggregationByMonths(self):
+    start = datetime.datetime(2011, 3, 20, 5, 6, 7)
+    times = [start + datetime.timedelta(hours=i * 31) for i in xrange(400)]
+    rows = _makeRows(times)
+    aggregationInfo = {"months": 2, "fields": _AGGREGATION_FIELDS}
+    expected = self._assertBulkAggregation(aggregationInfo, rows, [7, 1000])
+    self.assertEqual(expected[0][0], start)
+
+
+  def testBulkAggregationOutOfOrder(self):
+    start = datetime.datetime(2011, 3, 4, 5, 6, 7)
+    times = [start + datetime.timedelta(minutes=i * 7) for i in xrange(100)]
+    times[40:60] = reversed(times[40:60])
+    rows = _makeRows(times)
+    aggregationInfo = {"minutes": 15, "fields": _AGGREGATION_FIELDS}
+    self._assertBulkAggregation(aggregationInfo, rows, [1, 9, 1000])
+
+    aggregationInfo = {"days": 0, "fields": _AGGREGATION_FIELDS}
+    self._assertBulkAggregation(aggregationInfo, rows, [9])
+
+
 if __name__ == '__main__':
   unittest.main()
@@ -0,0 +1,164 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""Unit tests for the binary_record_stream module."""
+
+import datetime
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+import numpy
+
+from nupic.data.binary_record_stream import (BinaryRecordStream,
+                                             convertCsvToBinary,
+                                             isBinaryRecordFile)
+from nupic.data.fieldmeta import FieldMetaInfo, FieldMetaType, FieldMetaSpecial
+from nupic.data.file_record_stream import FileRecordStream
+
+
+
+class BinaryRecordStreamTest(unittest.TestCase):
+
+
+  def setUp(self):
+    self._tempDir = tempfile.mkdtemp()
+    self._csvPath = os.path.join(self._tempDir, "data.csv")
+    self._binaryPath = os.path.join(self._tempDir, "data.nrec")
+
+    self.fields = [
+      FieldMetaInfo("timestamp", FieldMetaType.datetime,
+                    FieldMetaSpecial.timestamp),
+      FieldMetaInfo("reset", FieldMetaType.integer, FieldMetaSpecial.reset),
+      FieldMetaInfo("value", FieldMetaType.float, FieldMetaSpecial.none),
+      FieldMetaInfo("flag", FieldMetaType.boolean, FieldMetaSpecial.none),
+      FieldMetaInfo("name", FieldMetaType.string, FieldMetaSpecial.none),
+      FieldMetaInfo("categories", FieldMetaType.list,
+                    FieldMetaSpecial.category)]
+    start = datetime.datetime(2016, 1, 1)
+    records = []
+    for i in xrange(100):
+      records.append([start + datetime.timedelta(minutes=i),
+                      int(i % 10 == 0),
+                      None if i % 7 == 0 else i * 0.5,
+                      i % 3 == 0,
+                      None if i % 11 == 0 else "name,%d" % (i % 4),
+                      range(i % 3)])
+    with FileRecordStream(self._csvPath, write=True, fields=self.fields) as s:
+      s.appendRecords(records)
+    with FileRecordStream(self._csvPath) as s:
+      self.records = list(s)
+
+    self.assertEqual(convertCsvToBinary(self._csvPath, self._binaryPath,
+                                        blockSize=32), 100)
+
+
+  def tearDown(self):
+    shutil.rmtree(self._tempDir)
+
+
+  def testRecords(self):
+    self.assertTrue(isBinaryRecordFile(self._binaryPath))
+    self.assertFalse(isBinaryRecordFile(self._csvPath))
+
+    with BinaryRecordStream(self._binaryPath) as s:
+      self.assertEqual(s.getFields(), self.fields)
+      self.assertEqual(s.getDataRowCount(), 100)
+      self.assertEqual(s.getTimestampFieldIdx(), 0)
+      self.assertEqual(list(s), self.records)
+      self.assertIsNone(s.getNextRecord())
+      self.assertEqual(s.getStats(),
+                       {"min": [None, 0, 0.5, None, None, None],
+                        "max": [None, 1, 49.5, None, None, None]})
+
+
+  def testChunks(self):
+    with BinaryRecordStream(self._binaryPath, firstRecord=30) as s:
+      chunk = s.getNextRecordChunk(10)
+      # Chunks don't span blocks
+      self.assertEqual(len(chunk), 2)
+      self.assertEqual(chunk.getRecords(), self.records[30:32])
+      self.assertIsInstance(chunk.columns[0], numpy.memmap)
+
+      chunk = s.getNextRecordChunk(10)
+      self.assertEqual(chunk.getRecords(), self.records[32:42])
+      self.assertEqual(s.getNextRecord(), self.records[42])
+      self.assertEqual(s.getNextRecordChunk(100).getRecords(),
+                       self.records[43:64])
+
+
+  def testSeek(self):
+    with BinaryRecordStream(self._binaryPath, firstRecord=40) as s:
+      self.assertEqual(s.getNextRecord(), self.records[40])
+      bookmark = s.getBookmark()
+      self.assertEqual(s.getRecordsRange(bookmark, 40), self.records[41:81])
+      self.assertEqual(s.getRecordsRange(), self.records)
+      self.assertEqual(s.getNextRecord(), self.records[41])
+
+      s.seekFromEnd(3)
+      self.assertEqual(list(s), self.records[97:])
+      s.setAutoRewind(True)
+      self.assertEqual(s.getNextRecord(), self.records[0])
+
+    with BinaryRecordStream(self._binaryPath, bookmark=bookmark) as s:
+      self.assertEqual(s.getNextRecordIdx(), 41)
+      self.assertEqual(s.getNextRecord(), self.records[41])
+      s = pickle.loads(pickle.dumps(s))
+      self.assertEqual(s.getNextRecord(), self.records[42])
+
+
+  def testNonUtf8Strings(self):
+    fields = [FieldMetaInfo("name", FieldMetaType.string,
+                            FieldMetaSpecial.none)]
+    with FileRecordStream(self._csvPath, write=True, fields=fields) as s:
+      s.appendRecords([["caf\xe9"], ["cafe"], ["caf\xe9"]])
+    convertCsvToBinary(self._csvPath, self._binaryPath)
+
+    with BinaryRecordStream(self._binaryPath) as s:
+      self.assertEqual(list(s), [["caf\xe9"], ["cafe"], ["caf\xe9"]])
+
+
+  def testClose(self):
+    s = BinaryRecordStream(self._binaryPath)
+    self.assertEqual(s.getRecordsRange(), self.records)
+    s.close()
+    self.assertIsNone(s._data)
+
+
+  def testEmpty(self):
+    with FileRecordStream(self._csvPath, write=True, fields=self.fields):
+      pass
+    with open(self._csvPath, "w") as f:
+      for header in zip(*self.fields):
+        f.write(",".join(header) + "\n")
+    self.assertEqual(convertCsvToBinary(self._csvPath, self._binaryPath), 0)
+
+    with BinaryRecordStream(self._binaryPath) as s:
+      self.assertEqual(s.getFields(), self.fields)
+      self.assertIsNone(s.getNextRecord())
+      self.assertEqual(s.getRecordsRange(), [])
+
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -20,6 +20,7 @@
 # http://numenta.org/licenses/
 # ----------------------------------------------------------------------
 
+import os
 import tempfile
 import unittest
 
@@ -27,6 +28,7 @@ from datetime import datetime
 from nupic.data import SENTINEL_VALUE_FOR_MISSING_DATA
 from nupic.data.fieldmeta import FieldMetaInfo, FieldMetaType, FieldMetaSpecial
 from nupic.data.file_record_stream import FileRecordStream
+from nupic.data.file_row_index import getIndexPath
 from nupic.data.utils import (
     parseTimestamp, serializeTimestamp, escape, unescape)
 
@@ -287,6 +289,110 @@ class TestFileRecordStream(unittest.TestCase):
     o.close()
 
 
+  def _writeSeekTestFile(self, numRecords, rowIndex=False):
+    filename = _getTempFileName()
+    self.addCleanup(os.remove, filename)
+    if rowIndex:
+      self.addCleanup(os.remove, getIndexPath(filename))
+
+    fields = [FieldMetaInfo('name', FieldMetaType.string,
+                            FieldMetaSpecial.none),
+              FieldMetaInfo('integer', FieldMetaType.integer,
+                            FieldMetaSpecial.none)]
+    records = [['rec_%d' % i, i] for i in xrange(numRecords)]
+    # Quoted names with newlines must not be mistaken for rows
+    records[5][0] = 'quoted,\nname'
+    with FileRecordStream(streamID=filename, write=True, fields=fields,
+                          rowIndex=rowIndex) as s:
+      s.appendRecords(records)
+
+    return filename, records
+
+
+  def testSeek(self):
+    filename, records = self._writeSeekTestFile(1000)
+
+    for row in (0, 5, 255, 256, 257, 999, 1000, 2000):
+      with FileRecordStream(filename, firstRecord=row) as s:
+        self.assertEqual(s.getNextRecord(),
+                         records[row] if row < 1000 else None)
+        self.assertEqual(s.getNextRecordIdx(), min(row + 1, 1000))
+        bookmark = s.getBookmark()
+
+      with FileRecordStream(filename, bookmark=bookmark) as s:
+        self.assertEqual(s.getNextRecord(),
+                         records[row + 1] if row + 1 < 1000 else None)
+
+    with FileRecordStream(filename) as s:
+      self.assertEqual(s.getDataRowCount(), 1000)
+      self.assertEqual(s.getNextRecord(), records[0])
+
+      bookmark = s.seekFromEnd(3)
+      self.assertEqual(s.getNextRecordIdx(), 997)
+      self.assertTrue(s.recordsExistAfter(bookmark))
+      self.assertEqual(s.getNextRecord(), records[997])
+
+      self.assertEqual(s.getRecordsRange(bookmark, 2), records[997:999])
+      self.assertEqual(s.getRecordsRange(bookmark), records[997:])
+      self.assertEqual(s.getRecordsRange(range=300), records[:300])
+      # getRecordsRange doesn't move the stream
+      self.assertEqual(s.getNextRecord(), records[998])
+
+
+  def testRowIndexFile(self):
+    filename, records = self._writeSeekTestFile(600, rowIndex=True)
+    self.assertTrue(os.path.exists(getIndexPath(filename)))
+
+    # Append records, the saved index is updated when reading
+    with open(filename, 'a') as f:
+      f.write('rec_600,600\r\nrec_601,601\r\n')
+    records.extend([['rec_600', 600], ['rec_601', 601]])
+
+    with FileRecordStream(filename, firstRecord=599, rowIndex=True) as s:
+      self.assertEqual(s.getDataRowCount(), 602)
+      self.assertEqual(list(s), records[599:])
+
+    with FileRecordStream(filename, rowIndex=True) as s:
+      s.seekFromEnd(1)
+      self.assertEqual(list(s), records[601:])
+
+    # The index can be saved somewhere else than next to the file
+    indexPath = _getTempFileName()
+    self.addCleanup(os.remove, indexPath)
+    with FileRecordStream(filename, firstRecord=10, rowIndex=indexPath) as s:
+      self.assertEqual(s.getNextRecord(), records[10])
+    self.assertTrue(os.path.exists(indexPath))
+
+
+  def testChunks(self):
+    filename, records = self._writeSeekTestFile(1000)
+
+    with FileRecordStream(filename) as s:
+      self.assertEqual(s.getNextRecord(), records[0])
+      chunk = s.getNextRecordChunk(600)
+      self.assertEqual(len(chunk), 600)
+      self.assertEqual(chunk.getColumn('integer')[0].tolist(), range(1, 601))
+      self.assertEqual(chunk.getRecords(), records[1:601])
+      self.assertEqual(s.getNextRecordIdx(), 601)
+      self.assertEqual(s.getNextRecordChunk(600).getRecords(), records[601:])
+      self.assertIsNone(s.getNextRecordChunk(600))
+
+    with FileRecordStream(filename, chunkSize=64) as s:
+      self.assertEqual([s.getNextRecord() for _ in xrange(10)], records[:10])
+      self.assertEqual(s.getNextRecordChunk(5).getRecords(), records[10:15])
+      bookmark = s.getBookmark()
+      self.assertEqual(list(s), records[15:])
+
+    with FileRecordStream(filename, bookmark=bookmark, chunkSize=64) as s:
+      self.assertEqual(s.getNextRecord(), records[15])
+
+    with FileRecordStream(filename, chunkSize=300) as s:
+      s.setAutoRewind(True)
+      readRecords = [s.getNextRecord() for _ in xrange(1010)]
+      self.assertEqual(readRecords, records + records[:10])
+      self.assertEqual(s.getNextRecordIdx(), 10)
+
+
   def testMissingValues(self):
 
     print "Beginning Missing Data test..."
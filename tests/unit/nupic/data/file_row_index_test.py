@@ -0,0 +1,136 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""Unit tests for the file_row_index module."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from nupic.data.file_row_index import FileRowIndex, getIndexPath
+
+
+
+class FileRowIndexTest(unittest.TestCase):
+
+
+  def setUp(self):
+    self._tempDir = tempfile.mkdtemp()
+    self._filename = os.path.join(self._tempDir, "data.csv")
+
+
+  def tearDown(self):
+    shutil.rmtree(self._tempDir)
+
+
+  def _write(self, data, mode="wb"):
+    with open(self._filename, mode) as f:
+      f.write(data)
+
+
+  def _rowStarts(self, data, numHeaderRows):
+    """Offsets of the data rows of data, which has no quoted newlines"""
+    starts = [0]
+    for i, c in enumerate(data):
+      if c == "\n" and i + 1 < len(data):
+        starts.append(i + 1)
+    return starts[numHeaderRows:]
+
+
+  def testIndex(self):
+    data = "a,b\nint,int\n,\n" + "".join("%d,%d\r\n" % (i, i)
+                                         for i in xrange(50))
+    self._write(data)
+    index = FileRowIndex(self._filename, 3, stride=8)
+    self.assertTrue(index.update())
+    self.assertFalse(index.update())
+
+    starts = self._rowStarts(data, 3)
+    self.assertEqual(index.numRows, 50)
+    self.assertEqual(index.dataOffset, starts[0])
+    for row in xrange(50):
+      offset, rowsToSkip = index.getRowOffset(row)
+      self.assertEqual(offset, starts[row - rowsToSkip])
+      self.assertLess(rowsToSkip, 8)
+    self.assertEqual(index.getRowOffset(50), (starts[48], 2))
+    self.assertRaises(IndexError, index.getRowOffset, 51)
+
+
+  def testQuotedNewlines(self):
+    data = 'a,b\nstring,int\n,\nx,0\n"y\nz",1\n"""w""",2\nv,3'
+    self._write(data)
+    index = FileRowIndex(self._filename, 3, stride=1)
+    index.update()
+
+    self.assertEqual(index.numRows, 4)
+    self.assertEqual([index.getRowOffset(row) for row in xrange(3)],
+                     [(data.index(prefix), 0)
+                      for prefix in ("x,", '"y', '"""')])
+    # The unterminated last row is reached from the last complete row
+    self.assertEqual(index.getRowOffset(3), (data.index('"""'), 1))
+
+
+  def testAppend(self):
+    header = "a\nint\n\n"
+    self._write(header + "".join("%d\n" % i for i in xrange(20)) + "20")
+    index = FileRowIndex(self._filename, 3, stride=4)
+    index.update()
+    self.assertEqual(index.numRows, 21)
+
+    # The unterminated row is completed
+    self._write("0\n21\n", mode="ab")
+    self.assertTrue(index.update())
+
+    expected = FileRowIndex(self._filename, 3, stride=4)
+    expected.update()
+    self.assertEqual(index.numRows, 22)
+    self.assertEqual([index.getRowOffset(row) for row in xrange(23)],
+                     [expected.getRowOffset(row) for row in xrange(23)])
+
+    # Rewritten files of the same size are indexed again
+    self._write(header + "1\n2\n3\n4\n5\n6\n7\n8\n9\n10\n11\n12\n13\n14\n"
+                "15\n16\n17\n18\n19\n20\n21\n22\n")
+    self.assertTrue(index.update())
+    self.assertEqual(index.numRows, 22)
+    self.assertEqual(index.getRowOffset(21), (len(header) + 51, 1))
+
+
+  def testSaveLoad(self):
+    self._write("a\nint\n\n" + "".join("%d\n" % i for i in xrange(20)))
+    index = FileRowIndex(self._filename, 3, stride=4)
+    index.update()
+    index.save(getIndexPath(self._filename))
+
+    loaded = FileRowIndex.load(self._filename, getIndexPath(self._filename))
+    self.assertFalse(loaded.update())
+    self.assertEqual(loaded.numRows, 20)
+    self.assertEqual(loaded.stride, 4)
+    self.assertEqual([loaded.getRowOffset(row) for row in xrange(21)],
+                     [index.getRowOffset(row) for row in xrange(21)])
+
+    self.assertIsNone(FileRowIndex.load(self._filename,
+                                        self._filename + ".missing"))
+
+
+
+if __name__ == "__main__":
+  unittest.main()
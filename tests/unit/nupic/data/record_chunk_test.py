@@ -0,0 +1,134 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""Unit tests for the record_chunk module."""
+
+import datetime
+import unittest
+
+import numpy
+
+from nupic.data.fieldmeta import FieldMetaInfo, FieldMetaType, FieldMetaSpecial
+from nupic.data.record_chunk import RecordChunkParser
+
+
+
+def _field(name, fieldType):
+  return FieldMetaInfo(name, fieldType, FieldMetaSpecial.none)
+
+
+
+class RecordChunkTest(unittest.TestCase):
+
+
+  def setUp(self):
+    self.fields = [_field("int", FieldMetaType.integer),
+                   _field("float", FieldMetaType.float),
+                   _field("bool", FieldMetaType.boolean),
+                   _field("datetime", FieldMetaType.datetime),
+                   _field("string", FieldMetaType.string),
+                   _field("list", FieldMetaType.list),
+                   _field("sdr", FieldMetaType.sdr)]
+    self.rows = [
+      ["1", "1.5", "T", "2011-01-02 03:04:05.000006", "a\tb", "1 2", "01"],
+      ["", "None", "false", "", "", "", ""],
+      [" NULL ", "-2", "1", "2011-01-02", "c", "3", "1"],
+      ["-4", "", "", "2011-01-02 03:04", "a\tb", "", "0"]]
+
+
+  def testColumns(self):
+    chunk = RecordChunkParser(self.fields).parse(self.rows)
+    self.assertEqual(len(chunk), 4)
+
+    column, mask = chunk.getColumn("int")
+    self.assertEqual(column.dtype, numpy.int64)
+    self.assertEqual(column.tolist(), [1, 0, 0, -4])
+    self.assertEqual(mask.tolist(), [False, True, True, False])
+
+    column, mask = chunk.getColumn("float")
+    self.assertEqual(column[[0, 2]].tolist(), [1.5, -2.0])
+    self.assertTrue(numpy.isnan(column[[1, 3]]).all())
+    self.assertEqual(mask.tolist(), [False, True, False, True])
+
+    column, mask = chunk.getColumn("bool")
+    self.assertEqual(column.tolist(), [True, False, True, False])
+    self.assertEqual(mask.tolist(), [False, False, False, True])
+
+    column, mask = chunk.getColumn("datetime")
+    self.assertEqual(column.dtype, numpy.dtype("datetime64[us]"))
+    self.assertEqual(column[[0, 2, 3]].tolist(),
+                     [datetime.datetime(2011, 1, 2, 3, 4, 5, 6),
+                      datetime.datetime(2011, 1, 2),
+                      datetime.datetime(2011, 1, 2, 3, 4)])
+    self.assertEqual(mask.tolist(), [False, True, False, False])
+
+    column, mask = chunk.getColumn("string")
+    self.assertEqual(column.tolist(), [0, -1, 1, 0])
+    self.assertEqual(chunk.categories[chunk.getFieldIndex("string")],
+                     ["a,b", "c"])
+
+    column, mask = chunk.getColumn("list")
+    self.assertEqual(column.tolist(), [[1, 2], None, [3], None])
+
+
+  def testRecords(self):
+    chunk = RecordChunkParser(self.fields).parse(self.rows)
+    self.assertEqual(chunk.getRecords(), [
+      [1, 1.5, True, datetime.datetime(2011, 1, 2, 3, 4, 5, 6), "a,b", [1, 2],
+       [0, 1]],
+      [None, None, False, None, None, None, None],
+      [None, -2.0, True, datetime.datetime(2011, 1, 2), "c", [3], [1]],
+      [-4, None, None, datetime.datetime(2011, 1, 2, 3, 4), "a,b", None, [0]]])
+    self.assertEqual(list(chunk.slice(1, 3)), chunk.getRecords()[1:3])
+    records = chunk.getRecords()
+    self.assertEqual(list(chunk.take(numpy.array([2, 0]))),
+                     [records[2], records[0]])
+
+
+  def testCategoryCodesAreStable(self):
+    fields = [_field("string", FieldMetaType.string)]
+    parser = RecordChunkParser(fields, missingValues=["", "NA"])
+    first = parser.parse([["b"], ["NA"], ["a"]])
+    second = parser.parse([["a"], ["c"], ["b"]])
+    self.assertEqual(first.columns[0].tolist(), [1, -1, 0])
+    self.assertEqual(second.columns[0].tolist(), [0, 2, 1])
+    self.assertEqual(first.getRecords(), [["b"], [None], ["a"]])
+    self.assertEqual(second.getRecords(), [["a"], ["c"], ["b"]])
+
+
+  def testInvalidRows(self):
+    parser = RecordChunkParser(self.fields)
+    self.assertRaises(ValueError, parser.parse, self.rows + [["1"]])
+    self.assertRaises(ValueError, parser.parse,
+                      [["x"] + self.rows[0][1:]])
+    self.assertRaises(Exception, parser.parse,
+                      [self.rows[0][:2] + ["maybe"] + self.rows[0][3:]])
+
+
+  def testEmpty(self):
+    chunk = RecordChunkParser(self.fields).parse([])
+    self.assertEqual(len(chunk), 0)
+    self.assertEqual(chunk.getRecords(), [])
+
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,152 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""Unit tests for the sorter module."""
+
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+from operator import itemgetter
+
+from nupic.data import sorter
+from nupic.data.fieldmeta import FieldMetaInfo, FieldMetaType, FieldMetaSpecial
+from nupic.data.file_record_stream import FileRecordStream
+
+
+
+class SorterTest(unittest.TestCase):
+
+
+  def setUp(self):
+    self._tempDir = tempfile.mkdtemp()
+    self._inputPath = os.path.join(self._tempDir, "input.csv")
+    self._outputPath = os.path.join(self._tempDir, "output.csv")
+
+    self.fields = [
+      FieldMetaInfo("timestamp", FieldMetaType.datetime,
+                    FieldMetaSpecial.timestamp),
+      FieldMetaInfo("count", FieldMetaType.integer, FieldMetaSpecial.none),
+      FieldMetaInfo("value", FieldMetaType.float, FieldMetaSpecial.none),
+      FieldMetaInfo("name", FieldMetaType.string, FieldMetaSpecial.none)]
+    start = datetime.datetime(2016, 1, 1)
+    records = []
+    for i in xrange(200):
+      records.append([start + datetime.timedelta(hours=i % 13),
+                      None if i % 11 == 0 else i % 7,
+                      i * 0.5,
+                      ["b", "a", "", "ab", "B"][i % 5]])
+    with FileRecordStream(self._inputPath, write=True,
+                          fields=self.fields) as f:
+      f.appendRecords(records)
+    # Empty strings are read back as missing values
+    with FileRecordStream(self._inputPath) as f:
+      self.records = list(f)
+
+
+  def tearDown(self):
+    shutil.rmtree(self._tempDir)
+
+
+  def _readOutput(self):
+    with FileRecordStream(self._outputPath) as f:
+      return list(f)
+
+
+  def testSort(self):
+    progress = []
+    stats = sorter.sort(self._inputPath, ["name", "count"], self._outputPath,
+                        memoryBudget=1000, numWorkers=2,
+                        progressCB=lambda s: progress.append(dict(s)))
+
+    self.assertEqual(self._readOutput(),
+                     sorted(self.records, key=itemgetter(3, 1)))
+    self.assertGreater(stats["numChunks"], 1)
+    self.assertEqual(stats["sortedRecords"], 200)
+    self.assertEqual(stats["mergedRecords"], 200)
+    self.assertEqual(len(progress), stats["numChunks"] + 1)
+    # The chunk files and the row index are removed, nothing is written next
+    # to the input
+    self.assertEqual(sorted(os.listdir(self._tempDir)),
+                     ["input.csv", "output.csv"])
+
+
+  def testSortMergePasses(self):
+    maxMergeFiles = sorter._MAX_MERGE_FILES
+    sorter._MAX_MERGE_FILES = 3
+    try:
+      stats = sorter.sort(self._inputPath, ["name", "timestamp"],
+                          self._outputPath, memoryBudget=1000, numWorkers=1)
+    finally:
+      sorter._MAX_MERGE_FILES = maxMergeFiles
+
+    self.assertEqual(self._readOutput(),
+                     sorted(self.records, key=itemgetter(3, 0)))
+    self.assertGreater(stats["numChunks"], 9)
+    self.assertGreater(stats["numMergePasses"], 2)
+    self.assertEqual(stats["mergedRecords"], 200)
+
+
+  def testSortIsStable(self):
+    sorter.sort(self._inputPath, ["timestamp"], self._outputPath,
+                memoryBudget=1000, numWorkers=1)
+    self.assertEqual(self._readOutput(),
+                     sorted(self.records, key=itemgetter(0)))
+
+
+  def testSortFields(self):
+    fields = [self.fields[3], self.fields[2]]
+    sorter.sort(self._inputPath, ["value"], self._outputPath, fields=fields)
+
+    with FileRecordStream(self._outputPath) as f:
+      self.assertEqual(f.getFieldNames(), ["name", "value"])
+      records = list(f)
+    self.assertEqual(records, [[r[3], r[2]] for r in self.records])
+
+
+  def testSortNonUtf8Strings(self):
+    fields = [FieldMetaInfo("name", FieldMetaType.string,
+                            FieldMetaSpecial.none)]
+    with FileRecordStream(self._inputPath, write=True, fields=fields) as f:
+      f.appendRecords([["caf\xe9"], ["cafe"], ["caf\xe9"], ["ab"]])
+    sorter.sort(self._inputPath, ["name"], self._outputPath, numWorkers=1)
+
+    self.assertEqual(self._readOutput(),
+                     [["ab"], ["cafe"], ["caf\xe9"], ["caf\xe9"]])
+
+
+  def testSortEmptyFile(self):
+    # Only the header rows
+    inputPath = os.path.join(self._tempDir, "empty.csv")
+    with open(self._inputPath) as f:
+      header = [f.readline() for _ in xrange(3)]
+    with open(inputPath, "w") as f:
+      f.writelines(header)
+    stats = sorter.sort(inputPath, ["count"], self._outputPath)
+
+    self.assertEqual(stats["numChunks"], 0)
+    self.assertEqual(stats["mergedRecords"], 0)
+
+
+
+if __name__ == "__main__":
+  unittest.main()
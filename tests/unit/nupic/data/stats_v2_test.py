@@ -0,0 +1,113 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""Unit tests for the stats_v2 module."""
+
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+
+from nupic.data import stats_v2
+from nupic.data.fieldmeta import FieldMetaInfo, FieldMetaType, FieldMetaSpecial
+from nupic.data.file_record_stream import FileRecordStream
+
+
+
+class StatsV2Test(unittest.TestCase):
+
+
+  def setUp(self):
+    self._tempDir = tempfile.mkdtemp()
+    self._path = os.path.join(self._tempDir, "data.csv")
+
+    fields = [
+      FieldMetaInfo("timestamp", FieldMetaType.datetime,
+                    FieldMetaSpecial.timestamp),
+      FieldMetaInfo("reset", FieldMetaType.integer, FieldMetaSpecial.reset),
+      FieldMetaInfo("count", FieldMetaType.integer, FieldMetaSpecial.none),
+      FieldMetaInfo("value", FieldMetaType.float, FieldMetaSpecial.none),
+      FieldMetaInfo("name", FieldMetaType.string, FieldMetaSpecial.none)]
+    start = datetime.datetime(2016, 1, 4)
+    with FileRecordStream(self._path, write=True, fields=fields) as f:
+      for i in xrange(300):
+        f.appendRecord([start + datetime.timedelta(hours=i), int(i == 0),
+                        None if i % 10 == 0 else i % 21, i * 0.25,
+                        "ab"[i % 3 == 0]])
+
+
+  def tearDown(self):
+    shutil.rmtree(self._tempDir)
+
+
+  def testCollectorStats(self):
+    collector = stats_v2.IntStatsCollector("count", "int", "")
+    for value in [4, None, 1, 3, 3, 2]:
+      collector.addValue(value)
+    stats = {}
+    collector.getStats(stats)
+
+    self.assertEqual(stats["count"]["totalNumEntries"], 6)
+    self.assertEqual(stats["count"]["totalNumDistinctEntries"], 5)
+    self.assertEqual(stats["count"]["min"], 1)
+    self.assertEqual(stats["count"]["max"], 4)
+    self.assertEqual(stats["count"]["mean"], 2.6)
+    self.assertEqual(stats["count"]["median"], 3)
+    self.assertEqual(stats["count"]["meanResolution"], 1.0)
+
+
+  def testGenerateStats(self):
+    stats = stats_v2.generateStats(self._path)
+
+    self.assertNotIn("reset", stats)
+    self.assertEqual(stats["count"]["totalNumEntries"], 300)
+    # 0 to 20 and the missing value
+    self.assertEqual(stats["count"]["totalNumDistinctEntries"], 22)
+    self.assertEqual(stats["count"]["min"], 0)
+    self.assertEqual(stats["count"]["max"], 20)
+    self.assertEqual(stats["value"]["max"], 74.75)
+    self.assertEqual(stats["value"]["median"], 37.5)
+    self.assertEqual(stats["name"]["topValues"], [("a", 200), ("b", 100)])
+    self.assertEqual(stats["timestamp"]["min"], datetime.datetime(2016, 1, 4))
+    self.assertTrue(stats["timestamp"]["day of week"])
+    self.assertFalse(stats["timestamp"]["holiday"])
+
+
+  def testGenerateStatsInParallel(self):
+    stats = stats_v2.generateStats(self._path)
+    parallelStats = stats_v2.generateStats(self._path, numWorkers=3)
+
+    for name in stats:
+      for key in stats[name]:
+        if key in ("mean", "stdev"):
+          self.assertAlmostEqual(parallelStats[name][key], stats[name][key])
+        else:
+          self.assertEqual(parallelStats[name][key], stats[name][key],
+                           (name, key))
+
+    # The row index shared by the processes is not saved next to the file
+    self.assertEqual(os.listdir(self._tempDir), ["data.csv"])
+
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,120 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""Unit tests for the streaming_stats module."""
+
+import unittest
+
+import numpy
+
+from nupic.data.streaming_stats import (DistinctCountSketch, HeavyHitters,
+                                        MomentStats, QuantileSketch,
+                                        hashValues)
+
+
+
+class StreamingStatsTest(unittest.TestCase):
+
+
+  def setUp(self):
+    self.values = numpy.random.RandomState(42).normal(10, 3, size=100000)
+
+
+  def _merged(self, cls, add):
+    merged = cls()
+    for part in numpy.array_split(self.values, 7):
+      sketch = cls()
+      add(sketch, part)
+      merged.merge(sketch)
+    return merged
+
+
+  def testMomentStats(self):
+    moments = self._merged(MomentStats, MomentStats.add)
+    self.assertEqual(moments.count, len(self.values))
+    self.assertAlmostEqual(moments.mean, self.values.mean(), places=10)
+    self.assertAlmostEqual(moments.variance, self.values.var(), places=8)
+    self.assertEqual(moments.min, self.values.min())
+    self.assertEqual(moments.max, self.values.max())
+
+    moments = MomentStats()
+    self.assertIsNone(moments.variance)
+    moments.add(numpy.array([3, 1, 2]))
+    moments.add(numpy.array([numpy.nan, 4.0]))
+    self.assertEqual((moments.count, moments.min, moments.max), (4, 1, 4.0))
+    self.assertIsInstance(moments.min, int)
+
+
+  def testQuantileSketch(self):
+    sketch = self._merged(QuantileSketch, QuantileSketch.add)
+    self.assertEqual(sketch.count, len(self.values))
+    sortedValues = numpy.sort(self.values)
+    for q in (0.01, 0.5, 0.99):
+      rank = numpy.searchsorted(sortedValues, sketch.quantile(q))
+      self.assertLess(abs(rank - q * len(self.values)), 0.01 * len(self.values))
+
+    # Exact until the values are compacted
+    sketch = QuantileSketch(capacity=1000)
+    values = numpy.random.RandomState(1).randint(0, 50, size=1000)
+    sketch.add(values)
+    sortedValues = sorted(values)
+    for q in (0, 0.01, 0.5, 0.99):
+      self.assertEqual(sketch.quantile(q), sortedValues[int(q * 1000)])
+    self.assertIsNone(QuantileSketch().quantile(0.5))
+
+
+  def testDistinctCountSketch(self):
+    sketch = self._merged(DistinctCountSketch,
+                          lambda s, v: s.add(hashValues(v)))
+    self.assertLess(abs(sketch.estimate() - len(self.values)),
+                    0.05 * len(self.values))
+
+    sketch = DistinctCountSketch()
+    sketch.add(hashValues(numpy.array([1.0, 2.0, 0.0, -0.0, 1.0])))
+    sketch.add(hashValues(numpy.array(["a", "b", "a"], dtype=object)))
+    self.assertEqual(sketch.estimate(), 5)
+
+
+  def testHeavyHitters(self):
+    values = ["a"] * 50 + ["b"] * 30 + list("cdefghijklmnopqrstuvwxyz") * 2
+    heavyHitters = HeavyHitters(capacity=5)
+    heavyHitters.add(values[::2])
+    other = HeavyHitters(capacity=5)
+    other.add(values[1::2])
+    heavyHitters.merge(other)
+
+    self.assertEqual(heavyHitters.total, len(values))
+    self.assertLessEqual(len(heavyHitters.counts), 5)
+    top = heavyHitters.getTopValues(2)
+    self.assertEqual([value for value, _ in top], ["a", "b"])
+    for value, count in top:
+      self.assertLessEqual(count, values.count(value))
+      self.assertGreaterEqual(count, values.count(value) - len(values) / 6)
+
+    heavyHitters = HeavyHitters()
+    heavyHitters.add(values)
+    self.assertEqual(heavyHitters.getTopValues(3), [("a", 50), ("b", 30),
+                                                    ("c", 2)])
+
+
+
+if __name__ == "__main__":
+  unittest.main()
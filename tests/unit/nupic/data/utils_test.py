@@ -24,6 +24,8 @@
 
 from datetime import datetime
 
+import numpy
+
 from nupic.data import utils
 from nupic.support.unittesthelpers.testcasebase import (TestCaseBase,
                                                         unittest)
@@ -46,6 +48,32 @@ class UtilsTest(TestCaseBase):
     for timestamp, dt in expectedResults:
       self.assertEqual(utils.parseTimestamp(timestamp), dt)
 
+  def testTimestampParser(self):
+    parser = utils.TimestampParser()
+    timestamps = ('2011-09-08 05:30:32.920000', '2011-09-08 05:30:32.92',
+                  '9/8/2011 05:30', '9/8/11 05:30', ' 2011-09-08 05:30 ',
+                  '9/8/11 05:30', '2011-09-08T05:30:32.9Z')
+    for timestamp in timestamps:
+      self.assertEqual(parser.parse(timestamp),
+                       utils.parseTimestamp(timestamp))
+      self.assertEqual(parser(timestamp), utils.parseTimestamp(timestamp))
+
+    for timestamp in ('2011-02-29', '2011-09-08 24:00', '0000-01-01', '1-1-1',
+                      '2011-09-08 05:30:32.9200001', 'x'):
+      self.assertRaises(ValueError, parser.parse, timestamp)
+
+  def testParseTimestamps(self):
+    timestamps = ['2011-09-08 05:30:32.920000', '1969-12-31', '2012-02-29',
+                  '2011-09-08 5:30', '9/8/11 05:30', '2011-09-08 05:30:32.9',
+                  '2011-09-08 05:30:32.920000']
+    parsed = utils.parseTimestamps(timestamps)
+    self.assertEqual(parsed.dtype, numpy.dtype('datetime64[us]'))
+    self.assertEqual(parsed.tolist(),
+                     [utils.parseTimestamp(t) for t in timestamps])
+    self.assertEqual(len(utils.parseTimestamps([])), 0)
+    self.assertRaises(ValueError, utils.parseTimestamps,
+                      ['2011-09-08', '2011-02-29'])
+
   def testSerializeTimestamp(self):
     self.assertEqual(
         utils.serializeTimestamp(datetime(2011, 9, 8, 5, 30, 32, 920000)),
@@ -209,6 +209,18 @@ class CategoryEncoderTest(unittest.TestCase):
 
 
 
+  def testEncodeBatch(self):
+    categories = ["ES", "GB", "US"]
+    encoder = CategoryEncoder(w=3, categoryList=categories, forced=True)
+    values = ["US", "ES", SENTINEL_VALUE_FOR_MISSING_DATA, "NA", "GB", "US"]
+
+    output = numpy.ones((len(values), encoder.getWidth()), dtype=defaultDtype)
+    encoder.encodeBatch(values, output)
+
+    for value, row in zip(values, output):
+      self.assertTrue(numpy.array_equal(row, encoder.encode(value)))
+
+
   @unittest.skipUnless(
       capnp, "pycapnp is not installed, skipping serialization test.")
   def testReadWrite(self):
@@ -20,6 +20,7 @@
 # http://numenta.org/licenses/
 # ----------------------------------------------------------------------
 
+import itertools
 import numpy as np
 import tempfile
 import unittest
@@ -155,6 +156,63 @@ class CoordinateEncoderTest(unittest.TestCase):
     self.assertIn([100, 200, 300], neighbors)
 
 
+  def testNeighborsOrder(self):
+    coordinate = np.array([-3, 7, 0])
+    radius = 2
+    neighbors = self.encoder._neighbors(coordinate, radius).tolist()
+    ranges = [range(c - radius, c + radius + 1) for c in coordinate]
+
+    self.assertEqual(neighbors,
+                     [list(c) for c in itertools.product(*ranges)])
+
+
+  def testEncodeMatchesUncachedHash(self):
+    n = 999
+    w = 25
+    radius = 3
+    encoder = CoordinateEncoder(name="coordinate", n=n, w=w, cacheSize=100)
+
+    for coordinate in ([100, 200], [101, 200], [5000, -3], [100, 200]):
+      coordinate = np.array(coordinate)
+      neighbors = encoder._neighbors(coordinate, radius)
+      winners = encoder._topWCoordinates(neighbors, w)
+      expected = np.zeros(n, dtype=defaultDtype)
+      expected[[encoder._bitForCoordinate(c, n) for c in winners]] = 1
+
+      output = encode(encoder, coordinate, radius)
+      self.assertTrue(np.array_equal(output, expected))
+      self.assertLessEqual(
+        len(encoder._hashCache) + len(encoder._oldHashCache), 100)
+
+
+  def testFastHash(self):
+    n = 999
+    w = 25
+    encoder = CoordinateEncoder(name="coordinate", n=n, w=w,
+                                compatibleHash=False)
+
+    neighbors = encoder._neighbors(np.array([100, -200, 3]), 4)
+    orders, bits = encoder._fastOrdersAndBits(neighbors, n)
+    self.assertTrue(np.all((orders >= 0) & (orders < 1)))
+    self.assertTrue(np.all((bits >= 0) & (bits < n)))
+    self.assertEqual(len(np.unique(orders)), len(neighbors))
+
+    output1 = encode(encoder, np.array([100, 200]), 10)
+    output2 = encode(encoder, np.array([100, 200]), 10)
+    self.assertTrue(np.array_equal(output1, output2))
+    self.assertGreaterEqual(output1.sum(), w - 2)
+
+    adjacent = encode(encoder, np.array([100, 201]), 10)
+    self.assertGreater(overlap(output1, adjacent), 0.75)
+
+    unrelated = encode(encoder, np.array([100, 300]), 10)
+    self.assertLess(overlap(output1, unrelated), 0.17)
+
+    compatibleEncoder = CoordinateEncoder(name="coordinate", n=n, w=w)
+    self.assertFalse(np.array_equal(
+      output1, encode(compatibleEncoder, np.array([100, 200]), 10)))
+
+
   def testEncodeIntoArray(self):
     n = 33
     w = 3
@@ -275,6 +333,8 @@ class CoordinateEncoderTest(unittest.TestCase):
   @unittest.skipUnless(
       capnp, "pycapnp is not installed, skipping serialization test.")
   def testReadWrite(self):
+    self.encoder = CoordinateEncoder(name="coordinate", n=33, w=3,
+                                     cacheSize=100)
     coordinate = np.array([100, 200])
     radius = 5
     output1 = encode(self.encoder, coordinate, radius)
@@ -295,6 +355,8 @@ class CoordinateEncoderTest(unittest.TestCase):
     self.assertEqual(encoder.n, self.encoder.n)
     self.assertEqual(encoder.name, self.encoder.name)
     self.assertEqual(encoder.verbosity, self.encoder.verbosity)
+    self.assertEqual(encoder.compatibleHash, self.encoder.compatibleHash)
+    self.assertEqual(encoder.cacheSize, 100)
 
     coordinate = np.array([100, 200])
     radius = 5
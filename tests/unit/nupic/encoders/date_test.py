@@ -23,6 +23,7 @@
 """Unit tests for date encoder"""
 
 import datetime
+import pickle
 import numpy
 import tempfile
 from nupic.encoders.base import defaultDtype
@@ -159,6 +160,47 @@ class DateEncoderTest(unittest.TestCase):
     self.assertTrue(numpy.array_equal(e.encode(d), holiday2))
 
 
+  def testHolidayRamps(self):
+    """holiday ramps count whole seconds to and from the holiday"""
+    e = DateEncoder(holiday=5, forced=True)
+    for d, expected in [
+        (datetime.datetime(2010, 12, 24, 0, 0), 0),
+        (datetime.datetime(2010, 12, 24, 0, 0, 0, 1), 1.0 / 86400),
+        (datetime.datetime(2010, 12, 24, 18, 0), 0.75),
+        (datetime.datetime(2010, 12, 24, 18, 0, 0, 500), 0.75 + 1.0 / 86400),
+        (datetime.datetime(2010, 12, 25, 0, 0), 1),
+        (datetime.datetime(2010, 12, 25, 23, 59, 59, 999999), 1),
+        (datetime.datetime(2010, 12, 26, 6, 0, 0, 999999), 0.75),
+        (datetime.datetime(2010, 12, 27, 0, 0), 0)]:
+      self.assertAlmostEqual(e.getEncodedValues(d)[0], expected)
+
+
+  def testEncodingCaches(self):
+    """cached encodings are the same as the ones of the sub-encoders"""
+    encoder = DateEncoder(season=5, dayOfWeek=3, weekend=3, holiday=5,
+                          timeOfDay=5, customDays=(3, ["sat", "mon"]),
+                          forced=True)
+    values = [datetime.datetime(2010, 12, 20) + datetime.timedelta(minutes=97*i)
+              for i in xrange(200)]
+
+    for _ in xrange(2):
+      for value in values:
+        expected = numpy.concatenate([
+          subEncoder.encode(scalar) for (_, subEncoder, _), scalar in
+          zip(encoder.encoders, encoder.getScalars(value))])
+        self.assertTrue(numpy.array_equal(encoder.encode(value), expected))
+
+    self.assertEqual(len(encoder._dayInfo), 14)
+    # The day of the week has 7 values, the weekend and custom days 2
+    self.assertEqual([len(cache) for cache in encoder._encodingCaches][1:4],
+                     [7, 2, 2])
+
+    expected = encoder.encode(values[0])
+    encoder = pickle.loads(pickle.dumps(encoder))
+    self.assertEqual(len(encoder._dayInfo), 0)
+    self.assertTrue(numpy.array_equal(encoder.encode(values[0]), expected))
+
+
   def testWeekend(self):
     """Test weekend encoder"""
     # use of forced is not recommended, used here for readibility, see scalar.py
@@ -179,6 +221,36 @@ class DateEncoderTest(unittest.TestCase):
         self.assertNotEqual(d.weekday(), 0)
 
 
+  def testEncodeBatch(self):
+    encoder = DateEncoder(season=5, dayOfWeek=3, weekend=3, holiday=5,
+                          timeOfDay=5, customDays=(3, ["sat", "mon"]),
+                          forced=True)
+    values = [datetime.datetime(2010, 11, 4, 14, 55),
+              datetime.datetime(2010, 12, 24, 12, 0),
+              datetime.datetime(2010, 12, 25, 4, 0),
+              datetime.datetime(2010, 12, 26, 18, 30),
+              SENTINEL_VALUE_FOR_MISSING_DATA,
+              datetime.datetime(2011, 1, 1, 0, 0),
+              datetime.datetime(2012, 2, 29, 23, 59, 59),
+              datetime.datetime(1969, 12, 31, 22, 10),
+              datetime.datetime(2015, 5, 15, 19, 0)]
+    expected = numpy.array([encoder.encode(value) for value in values])
+
+    output = numpy.ones((len(values), encoder.getWidth()), dtype=defaultDtype)
+    encoder.encodeBatch(values, output)
+    self.assertTrue(numpy.array_equal(output, expected))
+
+    # datetime64 column, with NaT for the missing value
+    timestamps = numpy.array([value if value is not None else "NaT"
+                              for value in values], dtype="datetime64[s]")
+    output[:] = 1
+    encoder.encodeBatch(timestamps, output)
+    self.assertTrue(numpy.array_equal(output, expected))
+
+    with self.assertRaises(ValueError):
+      encoder.encodeBatch(["2010-11-04"], output[:1])
+
+
   @unittest.skipUnless(
       capnp, "pycapnp is not installed, skipping serialization test.")
   def testReadWrite(self):
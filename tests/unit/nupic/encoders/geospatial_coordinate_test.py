@@ -167,7 +167,8 @@ class GeospatialCoordinateEncoderTest(unittest.TestCase):
     scale = 30 # meters
     timestep = 60 # seconds
     speed = 2.5 # meters per second
-    original = GeospatialCoordinateEncoder(scale, timestep, n=999, w=25)
+    original = GeospatialCoordinateEncoder(scale, timestep, n=999, w=25,
+                                           cacheSize=100)
     encode(original, speed, -122.229194, 37.486782, 0)
     encode(original, speed, -122.229294, 37.486882, 100)
 
@@ -187,6 +188,7 @@ class GeospatialCoordinateEncoderTest(unittest.TestCase):
     self.assertEqual(encoder.n, original.n)
     self.assertEqual(encoder.name, original.name)
     self.assertEqual(encoder.verbosity, original.verbosity)
+    self.assertEqual(encoder.cacheSize, 100)
 
     # Compare a new value with the original and deserialized.
     encoding3 = encode(original, speed, -122.229294, 37.486982, 1000)
@@ -92,6 +92,38 @@ class MultiEncoderTest(unittest.TestCase):
 
 
 
+  def testEncodeBatch(self):
+    encoder = MultiEncoder()
+    encoder.addEncoder("dow", ScalarEncoder(w=3, resolution=1, minval=1,
+                                            maxval=8, periodic=True,
+                                            name="day of week", forced=True))
+    encoder.addEncoder("myval", SDRCategoryEncoder(n=7, w=3,
+                                                   categoryList=["run", "pass",
+                                                                 "kick"],
+                                                   forced=True))
+    records = [DictObj(dow=3, myval="pass"), DictObj(dow=1, myval="kick"),
+               DictObj(dow=7.5, myval=None), DictObj(dow=None, myval="run")]
+    expected = numpy.array([encoder.encode(record) for record in records])
+
+    output = numpy.ones((len(records), encoder.getWidth()), dtype="uint8")
+    encoder.encodeBatch(records, output)
+    self.assertTrue(numpy.array_equal(output, expected))
+
+    columns = {"dow": [record.dow for record in records],
+               "myval": [record.myval for record in records]}
+    output[:] = 1
+    encoder.encodeBatch(columns, output)
+    self.assertTrue(numpy.array_equal(output, expected))
+
+    recordArray = numpy.array([(3, "pass"), (1, "kick"), (7.5, "kick")],
+                              dtype=[("dow", float), ("myval", "S4")])
+    output = numpy.ones((len(recordArray), encoder.getWidth()), dtype="uint8")
+    encoder.encodeBatch(recordArray, output)
+    self.assertTrue(numpy.array_equal(output[:2], expected[:2]))
+    self.assertTrue(numpy.array_equal(
+        output[2], encoder.encode(DictObj(dow=7.5, myval="kick"))))
+
+
   @unittest.skipUnless(
       capnp, "pycapnp is not installed, skipping serialization test.")
   def testReadWrite(self):
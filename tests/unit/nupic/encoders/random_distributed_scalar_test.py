@@ -21,6 +21,7 @@
 # ----------------------------------------------------------------------
 
 from cStringIO import StringIO
+import pickle
 import sys
 import tempfile
 import unittest2 as unittest
@@ -73,6 +74,26 @@ def validateEncoder(encoder, subsampling):
 
 
 
+class ReferenceRandomDistributedScalarEncoder(RandomDistributedScalarEncoder):
+  """
+  Creates new representations by checking every candidate bit with
+  _newRepresentationOK instead of using the overlap index.
+  """
+
+  def _newRepresentation(self, index, newIndex):
+    newRepresentation = self.bucketMap[index].copy()
+    ri = newIndex % self.w
+    newBit = self.random.getUInt32(self.n)
+    newRepresentation[ri] = newBit
+    while newBit in self.bucketMap[index] or \
+          not self._newRepresentationOK(newRepresentation, newIndex):
+      self.numTries += 1
+      newBit = self.random.getUInt32(self.n)
+      newRepresentation[ri] = newBit
+    return newRepresentation
+
+
+
 class RandomDistributedScalarEncoderTest(unittest.TestCase):
   """
   Unit tests for RandomDistributedScalarEncoder class.
@@ -138,6 +159,80 @@ class RandomDistributedScalarEncoderTest(unittest.TestCase):
     self.assertEqual(empty.sum(), 0)
 
 
+  def testEncodeBatch(self):
+    """
+    Test that encodeBatch encodes like encodeIntoArray, creating the buckets
+    in the same order.
+    """
+    values = [23.0, 24.5, 18.0, None, 25.5, 24.0, 2.5, 99.0, 23.5, 22.5,
+              float("nan"), -1.5, 40]
+    encoder1 = RandomDistributedScalarEncoder(name="encoder", resolution=1.0,
+                                              w=23, n=500, seed=getSeed())
+    encoder2 = RandomDistributedScalarEncoder(name="encoder", resolution=1.0,
+                                              w=23, n=500, seed=getSeed())
+
+    output = numpy.ones((len(values), encoder1.getWidth()), dtype=defaultDtype)
+    encoder1.encodeBatch(values, output)
+
+    for value, row in zip(values, output):
+      self.assertTrue(numpy.array_equal(row, encoder2.encode(value)))
+    self.assertEqual(encoder1._offset, encoder2._offset)
+    self.assertEqual(encoder1.minIndex, encoder2.minIndex)
+    self.assertEqual(encoder1.maxIndex, encoder2.maxIndex)
+
+
+  def testOverlapIndex(self):
+    """
+    Test that the buckets created with the overlap index are the same as the
+    ones created by checking each candidate with _newRepresentationOK.
+    """
+    seed = getSeed()
+    encoder = RandomDistributedScalarEncoder(resolution=1.0, w=7, n=50,
+                                             seed=seed)
+    reference = ReferenceRandomDistributedScalarEncoder(resolution=1.0, w=7,
+                                                        n=50, seed=seed)
+
+    for value in [0, 3, -2, 10, 9, -15, 30, -40, 31, 45]:
+      self.assertTrue(numpy.array_equal(encoder.encode(value),
+                                        reference.encode(value)))
+
+    self.assertEqual(sorted(encoder.bucketMap), sorted(reference.bucketMap))
+    for index, representation in reference.bucketMap.iteritems():
+      self.assertTrue(numpy.array_equal(encoder.bucketMap[index],
+                                        representation))
+    self.assertEqual(encoder.numTries, reference.numTries)
+    self.assertGreater(encoder.numTries, 0)
+
+    bitBuckets, maxOverlaps = encoder._getOverlapIndex(encoder.maxIndex)
+    for index in reference.bucketMap:
+      self.assertEqual(maxOverlaps[index],
+                       encoder._countOverlapIndices(index, encoder.maxIndex))
+      self.assertTrue(bitBuckets[encoder.bucketMap[index], index].all())
+      self.assertEqual(bitBuckets[:, index].sum(), encoder.w)
+
+    # The index is rebuilt after unpickling
+    encoder = pickle.loads(pickle.dumps(encoder))
+    self.assertIsNone(encoder._bitBuckets)
+    self.assertTrue(numpy.array_equal(encoder.encode(-60),
+                                      reference.encode(-60)))
+
+
+  def testEncodeSparse(self):
+    encoder = RandomDistributedScalarEncoder(name="encoder", resolution=1.0,
+                                             w=23, n=500, seed=getSeed())
+    encoder.enableBucketCache(maxBuckets=4)
+    for value in [23.0, 24.5, 18.0, 25.5, 24.0, 2.5, 23.5, 22.5, 24.0, 18.0]:
+      bits = encoder.encodeSparse(value)
+      self.assertEqual(list(bits), list(encoder.encode(value).nonzero()[0]))
+    self.assertLessEqual(len(encoder._bucketCache), 4)
+    self.assertGreater(encoder._bucketCache.hits, 0)
+
+    self.assertEqual(len(encoder.encodeSparse(None)), 0)
+    self.assertEqual(len(encoder.encodeSparse(float("nan"))), 0)
+    with self.assertRaises(TypeError):
+      encoder.encodeSparse("String")
+
+
   def testResolution(self):
     """
     Test that numbers within the same resolution return the same encoding.
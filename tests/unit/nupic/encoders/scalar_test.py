@@ -380,6 +380,70 @@ class ScalarEncoderTest(unittest.TestCase):
       encoder.encode("String")
 
 
+  def testEncodeBatch(self):
+    values = [1, 1.5, 3.2, 4.75, None, 7.999, float("nan"), 5]
+    for periodic in (True, False):
+      encoder = ScalarEncoder(name="enc", n=14, w=3, minval=1, maxval=8,
+                              periodic=periodic, forced=True)
+      output = numpy.ones((len(values), encoder.getWidth()), dtype=defaultDtype)
+      encoder.encodeBatch(values, output)
+      for value, row in itertools.izip(values, output):
+        self.assertTrue(numpy.array_equal(row, encoder.encode(value)))
+
+
+  def testEncodeBatchOutOfRange(self):
+    encoder = ScalarEncoder(name="enc", n=14, w=3, minval=1, maxval=8,
+                            periodic=False, forced=True)
+    output = numpy.zeros((2, encoder.getWidth()), dtype=defaultDtype)
+    with self.assertRaises(Exception):
+      encoder.encodeBatch([2, 9], output)
+    with self.assertRaises(TypeError):
+      encoder.encodeBatch(["a", "b"], output)
+    with self.assertRaises(ValueError):
+      encoder.encodeBatch([2, 3, 4], output)
+
+    encoder = ScalarEncoder(name="enc", n=14, w=3, minval=1, maxval=8,
+                            periodic=False, forced=True, clipInput=True)
+    encoder.encodeBatch(numpy.array([-3.0, 12.0]), output)
+    self.assertTrue(numpy.array_equal(output[0], encoder.encode(1)))
+    self.assertTrue(numpy.array_equal(output[1], encoder.encode(8)))
+
+
+  def testEncodeSparse(self):
+    values = [1, 1.5, 3.2, 4.75, 7.999, 5, 1.5]
+    for periodic in (True, False):
+      encoder = ScalarEncoder(name="enc", n=14, w=3, minval=1, maxval=8,
+                              periodic=periodic, forced=True)
+      for value in values:
+        self.assertEqual(list(encoder.encodeSparse(value)),
+                         list(encoder.encode(value).nonzero()[0]))
+      self.assertEqual(len(encoder.encodeSparse(None)), 0)
+      self.assertEqual(len(encoder.encodeSparse(float("nan"))), 0)
+      with self.assertRaises(TypeError):
+        encoder.encodeSparse("String")
+
+
+  def testBucketCache(self):
+    values = [1, 1.5, 3.2, 4.75, 7.999, 5, 1.5, 3.2, None]
+    for periodic in (True, False):
+      encoder = ScalarEncoder(name="enc", n=14, w=3, minval=1, maxval=8,
+                              periodic=periodic, forced=True)
+      expected = [encoder.encode(value) for value in values]
+
+      encoder.enableBucketCache(maxBuckets=3)
+      for value, encoding in zip(values, expected):
+        self.assertTrue(numpy.array_equal(encoder.encode(value), encoding))
+        bits = encoder.encodeSparse(value)
+        self.assertEqual(list(bits), list(encoding.nonzero()[0]))
+        if value is not None:
+          # The second lookup hits the cache
+          self.assertIs(encoder.encodeSparse(value), bits)
+      self.assertLessEqual(len(encoder._bucketCache), 3)
+
+      encoder.disableBucketCache()
+      self.assertIsNone(encoder._bucketCache)
+
+
   def testGetBucketInfoIntResolution(self):
     """Ensures that passing resolution as an int doesn't truncate values."""
     encoder = ScalarEncoder(w=3, resolution=1, minval=1, maxval=8,
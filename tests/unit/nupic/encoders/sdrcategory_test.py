@@ -250,6 +250,41 @@ class SDRCategoryEncoderTest(unittest.TestCase):
     self.assertEqual(s.topDownCompute(encoded).value, "catC")
 
 
+  def testEncodeSparse(self):
+    encoder = SDRCategoryEncoder(n=100, w=21, name="foo")
+    values = ["ES", "GB", "US", "ES", "FR", "GB"]
+    expected = [encoder.encode(value) for value in values]
+
+    encoder.enableBucketCache(maxBuckets=2)
+    for value, encoding in zip(values, expected):
+      self.assertTrue(numpy.array_equal(encoder.encode(value), encoding))
+      self.assertEqual(list(encoder.encodeSparse(value)),
+                       list(encoding.nonzero()[0]))
+    self.assertLessEqual(len(encoder._bucketCache), 2)
+    self.assertEqual(len(encoder.encodeSparse(SENTINEL_VALUE_FOR_MISSING_DATA)),
+                     0)
+
+
+  def testEncodeBatch(self):
+    values = ["ES", "GB", SENTINEL_VALUE_FOR_MISSING_DATA, "US", "ES", "FR"]
+    # Without a category list the encoder learns new categories as they are
+    # encountered
+    encoder1 = SDRCategoryEncoder(n=100, w=21, name="foo")
+    encoder2 = SDRCategoryEncoder(n=100, w=21, name="foo")
+
+    output = numpy.ones((len(values), encoder1.getWidth()), dtype="uint8")
+    encoder1.encodeBatch(values, output)
+
+    for value, row in zip(values, output):
+      self.assertTrue(numpy.array_equal(row, encoder2.encode(value)))
+    self.assertEqual(encoder1.categories, encoder2.categories)
+
+    encoder1.setLearning(False)
+    encoder1.encodeBatch(["IT"] * len(values), output)
+    self.assertTrue((output == encoder1.sdrs[0]).all())
+    self.assertEqual(encoder1.categories, encoder2.categories)
+
+
   @unittest.skipUnless(
       capnp, "pycapnp is not installed, skipping serialization test.")
   def testReadWrite(self):
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""Unit tests for the encoder utilities"""
+
+import unittest
+
+import numpy
+
+from nupic.encoders.utils import BucketCache
+
+
+
+class BucketCacheTest(unittest.TestCase):
+
+
+  def testGetPut(self):
+    cache = BucketCache(10)
+    self.assertIsNone(cache.get(3))
+
+    cache.put(3, numpy.array([1, 5, 7]))
+    self.assertEqual(list(cache.get(3)), [1, 5, 7])
+    self.assertEqual(len(cache), 1)
+    self.assertEqual(cache.hits, 1)
+    self.assertEqual(cache.misses, 1)
+
+    # Cached arrays are shared so they can't be modified
+    with self.assertRaises(ValueError):
+      cache.get(3)[0] = 2
+
+    cache.clear()
+    self.assertEqual(len(cache), 0)
+    self.assertIsNone(cache.get(3))
+
+
+  def testEviction(self):
+    cache = BucketCache(8)
+    for bucketIdx in xrange(8):
+      cache.put(bucketIdx, numpy.array([bucketIdx]))
+
+    # Use the first buckets so that the next ones are the least recently used
+    for bucketIdx in xrange(4):
+      cache.get(bucketIdx)
+
+    cache.put(8, numpy.array([8]))
+    self.assertEqual(len(cache), 7)
+    self.assertIsNone(cache.get(4))
+    self.assertIsNone(cache.get(5))
+    for bucketIdx in (0, 1, 2, 3, 6, 7, 8):
+      self.assertEqual(list(cache.get(bucketIdx)), [bucketIdx])
+
+    for bucketIdx in xrange(100):
+      cache.put(bucketIdx, numpy.array([bucketIdx]))
+      self.assertLessEqual(len(cache), 8)
+
+    self.assertRaises(ValueError, BucketCache, 0)
+
+
+
+if __name__ == "__main__":
+  unittest.main()
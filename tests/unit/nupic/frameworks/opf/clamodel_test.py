@@ -23,18 +23,42 @@
 """Unit tests for the clamodel module."""
 
 import datetime
+import os
+import shutil
+import tempfile
 import unittest2 as unittest
 
 from nupic.frameworks.opf.clamodel import CLAModel
+from nupic.frameworks.opf.common_models.cluster_params import (
+  getScalarMetricWithTimeOfDayAnomalyParams)
+from nupic.frameworks.opf.incremental_checkpoint import IncrementalCheckpointer
 from nupic.frameworks.opf.modelfactory import ModelFactory
 from nupic.frameworks.opf.opfutils import ModelResult
 
 
 
+def _getAnomalyRecords(numRecords):
+  """ Returns records for the anomaly models of
+  getScalarMetricWithTimeOfDayAnomalyParams().
+  """
+  start = datetime.datetime(2013, 12, 5)
+  return [{"c0": start + datetime.timedelta(hours=i), "c1": float(i % 10)}
+          for i in xrange(numRecords)]
+
+
+
 class CLAModelTest(unittest.TestCase):
   """CLAModel unit tests."""
 
 
+  def _createAnomalyModel(self):
+    params = getScalarMetricWithTimeOfDayAnomalyParams([0], minVal=0.0,
+                                                       maxVal=10.0)
+    model = ModelFactory.create(modelConfig=params["modelConfig"])
+    model.enableInference(params["inferenceArgs"])
+    return model
+
+
   def testRemoveUnlikelyPredictionsEmpty(self):
     result = CLAModel._removeUnlikelyPredictions({}, 0.01, 3)
     self.assertDictEqual(result, {})
@@ -192,5 +216,113 @@ class CLAModelTest(unittest.TestCase):
       self.assertIsInstance(result, ModelResult)
 
 
+  def testRunDoesNotModifyInputRecord(self):
+    model = self._createAnomalyModel()
+
+    # The sensor adds the missing private keys to its own copy
+    record = {u'c0': datetime.datetime(2013, 12, 5, 0, 0), u'c1': 5.0}
+    result = model.run(record)
+    self.assertEqual(record, {u'c0': datetime.datetime(2013, 12, 5, 0, 0),
+                              u'c1': 5.0})
+
+    # The sensor input is a snapshot of the record
+    self.assertEqual(result.sensorInput.dataDict, record)
+    record[u'c1'] = 6.0
+    self.assertEqual(result.sensorInput.dataDict[u'c1'], 5.0)
+
+
+  def testDirectPipeline(self):
+    model = self._createAnomalyModel()
+    directModel = self._createAnomalyModel()
+    directModel.enableDirectPipeline()
+
+    for row in _getAnomalyRecords(10):
+      result = model.run(row)
+      directResult = directModel.run(row)
+      self.assertEqual(directResult.inferences, result.inferences)
+      self.assertEqual(directResult.sensorInput.dataRow,
+                       result.sensorInput.dataRow)
+      self.assertEqual(directResult.sensorInput.sequenceReset,
+                       result.sensorInput.sequenceReset)
+
+
+  def testDirectPipelineCheckpoint(self):
+    model = self._createAnomalyModel()
+    model.enableDirectPipeline()
+    records = _getAnomalyRecords(10)
+    for row in records[:-1]:
+      model.run(row)
+
+    checkpointDir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, checkpointDir)
+    checkpointPath = os.path.join(checkpointDir, "model")
+    model.save(checkpointPath)
+
+    # The pipeline is not saved, and the restored model uses the network
+    restoredModel = ModelFactory.loadFromCheckpoint(checkpointPath)
+    self.assertIsNone(restoredModel._directPipeline)
+    self.assertEqual(restoredModel.run(records[-1]).inferences,
+                     model.run(records[-1]).inferences)
+
+
+  def testIncrementalCheckpoint(self):
+    model = self._createAnomalyModel()
+
+    checkpointDir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, checkpointDir)
+    checkpointPath = os.path.join(checkpointDir, "model")
+    checkpointer = IncrementalCheckpointer(checkpointPath)
+    self.assertTrue(checkpointer.save(model)["base"])
+
+    # The model and every region are separate components
+    self.assertEqual(
+      sorted(model._getCheckpointStates()),
+      ["model"] + sorted("region:" + name
+                         for name in model._netInfo.net.regions.keys()))
+
+    records = _getAnomalyRecords(10)
+    for row in records[:-1]:
+      model.run(row)
+    self.assertFalse(checkpointer.save(model)["base"])
+
+    restoredModel = ModelFactory.loadFromCheckpoint(checkpointPath)
+    self.assertEqual(restoredModel.run(records[-1]).inferences,
+                     model.run(records[-1]).inferences)
+
+
+  def testRuntimeStats(self):
+    params = getScalarMetricWithTimeOfDayAnomalyParams([0], minVal=0.0,
+                                                       maxVal=10.0)
+    model = ModelFactory.create(modelConfig=params["modelConfig"])
+    model.enableInference(params["inferenceArgs"])
+    start = datetime.datetime(2013, 12, 5)
+    records = [{"c0": start + datetime.timedelta(hours=i), "c1": float(i)}
+               for i in xrange(3)]
+
+    model.run(records[0])
+    self.assertNotIn("runtime", model.getRuntimeStats())
+
+    exported = []
+    model.enableRuntimeStats(exportHook=exported.append, exportInterval=2)
+    for row in records:
+      model.run(row)
+
+    runtimeStats = model.getRuntimeStats()["runtime"]
+    self.assertEqual(set(runtimeStats.keys()),
+                     set(["run", "sensorCompute", "spCompute", "tpCompute",
+                          "sensorInput", "multiStepCompute",
+                          "anomalyCompute"]))
+    for phaseStats in runtimeStats.itervalues():
+      self.assertEqual(phaseStats["count"], len(records))
+    self.assertLessEqual(runtimeStats["spCompute"]["totalTime"],
+                         runtimeStats["run"]["totalTime"])
+
+    self.assertEqual(len(exported), 1)
+    self.assertEqual(exported[0]["run"]["count"], 2)
+
+    model.disableRuntimeStats()
+    self.assertNotIn("runtime", model.getRuntimeStats())
+
+
 if __name__ == "__main__":
   unittest.main()
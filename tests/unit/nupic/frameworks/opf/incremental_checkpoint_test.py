@@ -0,0 +1,173 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""Unit tests for incremental_checkpoint.py."""
+
+import os
+import shutil
+import tempfile
+
+import numpy
+import unittest2 as unittest
+
+from nupic.frameworks.opf import incremental_checkpoint, opfutils
+from nupic.frameworks.opf.incremental_checkpoint import (
+  IncrementalCheckpointer, splitChunks)
+from nupic.frameworks.opf.modelfactory import ModelFactory
+from nupic.frameworks.opf.previousvaluemodel import PreviousValueModel
+
+
+
+class _LargeStateModel(PreviousValueModel):
+  """ A model with a large state, of which run() changes a small part.
+  """
+
+  def __init__(self):
+    super(_LargeStateModel, self).__init__(
+      opfutils.InferenceType.TemporalNextStep, fieldNames=["value"],
+      fieldTypes=["float"], predictedField="value")
+    self.weights = numpy.random.RandomState(42).rand(50000)
+    self.numRuns = 0
+
+
+  def run(self, inputRecord):
+    self.weights[self.numRuns * 1000] = inputRecord["value"]
+    self.numRuns += 1
+    return super(_LargeStateModel, self).run(inputRecord)
+
+
+
+class IncrementalCheckpointTest(unittest.TestCase):
+  """Unit tests for IncrementalCheckpointer."""
+
+
+  def setUp(self):
+    self._tempDir = tempfile.mkdtemp()
+    self._checkpointDir = os.path.join(self._tempDir, "checkpoint")
+
+
+  def tearDown(self):
+    shutil.rmtree(self._tempDir)
+
+
+  def _checkLoad(self, model):
+    loadedModel = ModelFactory.loadFromCheckpoint(self._checkpointDir)
+    self.assertEqual(loadedModel.numRuns, model.numRuns)
+    self.assertTrue(numpy.array_equal(loadedModel.weights, model.weights))
+    self.assertEqual(loadedModel.run({"value": 1.0}).predictionNumber,
+                     model.numRuns)
+
+
+  def testSplitChunks(self):
+    data = numpy.random.RandomState(42).bytes(200000)
+    chunks = splitChunks(data)
+    self.assertEqual("".join(chunk for _, chunk in chunks), data)
+    for _, chunk in chunks[:-1]:
+      self.assertGreaterEqual(len(chunk), 2 * 1024)
+      self.assertLessEqual(len(chunk), 64 * 1024)
+    self.assertEqual(splitChunks(""), [])
+
+    # Inserting bytes only changes the chunks around them
+    chunkIds = set(chunkId for chunkId, _ in chunks)
+    newChunks = splitChunks(data[:100000] + "inserted" + data[100000:])
+    newChunkIds = [chunkId for chunkId, _ in newChunks
+                   if chunkId not in chunkIds]
+    self.assertLessEqual(len(newChunkIds), 2)
+
+
+  def testDeltas(self):
+    model = _LargeStateModel()
+    checkpointer = IncrementalCheckpointer(self._checkpointDir)
+    baseStats = checkpointer.save(model)
+    self.assertTrue(baseStats["base"])
+    self.assertTrue(incremental_checkpoint.isIncrementalCheckpoint(
+      self._checkpointDir))
+    self._checkLoad(model)
+
+    # The first delta stores the chunks of the changed components, the next
+    # ones only the chunks that changed
+    model.run({"value": -1.0})
+    self.assertFalse(checkpointer.save(model)["base"])
+    self._checkLoad(model)
+
+    for i in xrange(3):
+      model.run({"value": float(i)})
+      stats = checkpointer.save(model)
+      self.assertFalse(stats["base"])
+      self.assertLess(stats["bytesWritten"], baseStats["bytesWritten"] / 10)
+      self._checkLoad(model)
+
+    # Checkpoints without changes write no chunks
+    self.assertEqual(checkpointer.save(model)["bytesWritten"], 0)
+    self._checkLoad(model)
+
+
+  def testCompaction(self):
+    model = _LargeStateModel()
+    checkpointer = IncrementalCheckpointer(self._checkpointDir, maxDeltas=2)
+    checkpointer.save(model)
+    self.assertEqual(sorted(os.listdir(self._checkpointDir)),
+                     ["base-0.json", "base-0.pack",
+                      incremental_checkpoint.MANIFEST_NAME, "model"])
+    modelPicklePath = os.path.join(self._checkpointDir, "model", "model.pkl")
+    with open(modelPicklePath, "rb") as modelPickleFile:
+      modelPickle = modelPickleFile.read()
+
+    for i in xrange(3):
+      model.run({"value": float(i)})
+      self.assertEqual(checkpointer.save(model)["base"], i == 2)
+      self._checkLoad(model)
+
+    # The previous base and its deltas are removed
+    self.assertEqual(sorted(os.listdir(self._checkpointDir)),
+                     ["base-1.json", "base-1.pack",
+                      incremental_checkpoint.MANIFEST_NAME, "model"])
+
+    model.run({"value": 3.0})
+    stats = checkpointer.compact(model)
+    self.assertTrue(stats["base"])
+    self._checkLoad(model)
+
+    # A compaction only writes the pack of the new base
+    self.assertEqual(stats["bytesWritten"], os.path.getsize(
+      os.path.join(self._checkpointDir, "base-2.pack")))
+    with open(modelPicklePath, "rb") as modelPickleFile:
+      self.assertEqual(modelPickleFile.read(), modelPickle)
+
+
+  def testReplaceCheckpoint(self):
+    model = _LargeStateModel()
+    model.save(self._checkpointDir)
+    IncrementalCheckpointer(self._checkpointDir).save(model)
+    self.assertFalse(os.path.exists(os.path.join(self._checkpointDir,
+                                                 "model.pkl")))
+    self._checkLoad(model)
+
+    otherDir = os.path.join(self._tempDir, "other")
+    os.makedirs(otherDir)
+    open(os.path.join(otherDir, "file"), "w").close()
+    with self.assertRaises(Exception):
+      IncrementalCheckpointer(otherDir).save(model)
+
+
+
+if __name__ == "__main__":
+  unittest.main()
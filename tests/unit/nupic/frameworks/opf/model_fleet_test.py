@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""Unit tests for model_fleet.py."""
+
+import datetime
+import os
+import shutil
+import tempfile
+
+import unittest2 as unittest
+
+from nupic.frameworks.opf import incremental_checkpoint, opfutils
+from nupic.frameworks.opf.common_models.cluster_params import (
+  getScalarMetricWithTimeOfDayAnomalyParams)
+from nupic.frameworks.opf.model_fleet import (ModelFleet,
+                                              ModelFleetWorkerError,
+                                              ModelShard)
+from nupic.frameworks.opf.modelfactory import ModelFactory
+
+
+
+MODEL_CONFIG = {
+  "model": "PreviousValue",
+  "modelParams": {
+    "inferenceType": opfutils.InferenceType.TemporalNextStep,
+    "fieldNames": ["value"],
+    "fieldTypes": ["float"],
+    "predictedField": "value",
+  },
+}
+
+
+
+class ModelFleetTest(unittest.TestCase):
+  """Unit tests for ModelFleet and ModelShard."""
+
+
+  def setUp(self):
+    self._checkpointDir = tempfile.mkdtemp()
+
+
+  def tearDown(self):
+    shutil.rmtree(self._checkpointDir)
+
+
+  def _checkFleet(self, fleet):
+    modelIds = ["metric%d" % i for i in xrange(5)] + ["a/b c"]
+    for modelId in modelIds:
+      fleet.createModel(modelId, MODEL_CONFIG)
+
+    records = [(modelId, {"value": float(i * 10 + j)})
+               for i in xrange(4)
+               for j, modelId in enumerate(modelIds)]
+    results = fleet.run(records[:10])
+    results += fleet.run(records[10:])
+
+    # The results are in the order of the records and each model ran its
+    # records in order
+    self.assertEqual(len(results), len(records))
+    for (modelId, record), result in zip(records, results):
+      self.assertEqual(result.rawInput, record)
+      self.assertEqual(
+        result.inferences[opfutils.InferenceElement.prediction],
+        record["value"])
+      self.assertEqual(result.predictionNumber, int(record["value"]) // 10)
+
+
+  def testInProcess(self):
+    with ModelFleet(self._checkpointDir, numWorkers=0) as fleet:
+      self._checkFleet(fleet)
+      self.assertEqual(fleet.getStats(),
+                       {"modelsInMemory": 6, "modelsEvicted": 0})
+
+
+  def testWorkers(self):
+    with ModelFleet(self._checkpointDir, numWorkers=2) as fleet:
+      self._checkFleet(fleet)
+      self.assertEqual(fleet.getStats()["modelsInMemory"], 6)
+
+
+  def testEviction(self):
+    with ModelFleet(self._checkpointDir, numWorkers=0,
+                    maxModelsInMemory=2) as fleet:
+      self._checkFleet(fleet)
+      self.assertEqual(fleet.getStats(),
+                       {"modelsInMemory": 2, "modelsEvicted": 4})
+      self.assertEqual(len(os.listdir(self._checkpointDir)), 6)
+
+
+  def testEvictIdleModels(self):
+    with ModelFleet(self._checkpointDir, numWorkers=2) as fleet:
+      fleet.createModel("m1", MODEL_CONFIG)
+      fleet.createModel("m2", MODEL_CONFIG)
+      fleet.run([("m1", {"value": 1.0}), ("m2", {"value": 2.0})])
+
+      self.assertEqual(fleet.evictIdleModels(0), 2)
+      self.assertEqual(fleet.getStats(),
+                       {"modelsInMemory": 0, "modelsEvicted": 2})
+
+      # Evicted models are loaded back with their state
+      result, = fleet.run([("m2", {"value": 3.0})])
+      self.assertEqual(result.predictionNumber, 1)
+      self.assertEqual(fleet.getStats(),
+                       {"modelsInMemory": 1, "modelsEvicted": 1})
+
+
+  def testReopen(self):
+    with ModelFleet(self._checkpointDir, numWorkers=2) as fleet:
+      self._checkFleet(fleet)
+
+    # The models are checkpointed when the fleet is closed, and served by a
+    # new fleet on the same directory
+    with ModelFleet(self._checkpointDir, numWorkers=2) as fleet:
+      self.assertEqual(fleet.getStats(),
+                       {"modelsInMemory": 0, "modelsEvicted": 6})
+      result, = fleet.run([("a/b c", {"value": 1.0})])
+      self.assertEqual(result.predictionNumber, 4)
+
+
+  def testCloseTwice(self):
+    # Closing a closed fleet, also when leaving the with block, does nothing
+    with ModelFleet(self._checkpointDir, numWorkers=0) as fleet:
+      fleet.createModel("m1", MODEL_CONFIG)
+      fleet.close()
+      fleet.close()
+    with ModelFleet(self._checkpointDir, numWorkers=2) as fleet:
+      fleet.createModel("m2", MODEL_CONFIG)
+      fleet.close()
+      fleet.close()
+
+    self.assertEqual(sorted(os.listdir(self._checkpointDir)), ["m1", "m2"])
+
+
+  def testCLAModel(self):
+    params = getScalarMetricWithTimeOfDayAnomalyParams([0], minVal=0.0,
+                                                       maxVal=10.0)
+    model = ModelFactory.create(modelConfig=params["modelConfig"])
+    model.enableInference(params["inferenceArgs"])
+    start = datetime.datetime(2013, 12, 5)
+    records = [{"c0": start + datetime.timedelta(hours=i), "c1": float(i % 5)}
+               for i in xrange(10)]
+
+    with ModelFleet(self._checkpointDir, numWorkers=2) as fleet:
+      # The model is sent to its worker with its network
+      fleet.addModel("m1", model)
+      results = fleet.run([("m1", record) for record in records[:-1]])
+      for record, result in zip(records, results):
+        self.assertEqual(result.inferences, model.run(record).inferences)
+
+      # And returned with its network
+      modelCopy = fleet.getModel("m1")
+      result, = fleet.run([("m1", records[-1])])
+      self.assertEqual(modelCopy.run(records[-1]).inferences,
+                       result.inferences)
+      self.assertEqual(os.listdir(self._checkpointDir), [])
+
+
+  def testIncrementalCheckpoints(self):
+    with ModelFleet(self._checkpointDir, numWorkers=0, maxModelsInMemory=2,
+                    incrementalCheckpoints=True) as fleet:
+      self._checkFleet(fleet)
+      fleet.checkpoint()
+      for name in os.listdir(self._checkpointDir):
+        self.assertTrue(incremental_checkpoint.isIncrementalCheckpoint(
+          os.path.join(self._checkpointDir, name)))
+
+
+  def testRemoveModel(self):
+    shard = ModelShard(self._checkpointDir, maxModelsInMemory=1)
+    shard.createModel("m1", MODEL_CONFIG)
+    shard.createModel("m2", MODEL_CONFIG)
+    self.assertTrue(os.path.exists(shard.getCheckpointPath("m1")))
+
+    shard.removeModel("m1")
+    self.assertFalse(shard.hasModel("m1"))
+    self.assertFalse(os.path.exists(shard.getCheckpointPath("m1")))
+    with self.assertRaises(KeyError):
+      shard.run([("m1", {"value": 1.0})])
+
+    with self.assertRaises(ValueError):
+      shard.createModel("m2", MODEL_CONFIG)
+
+
+  def testWorkerError(self):
+    with ModelFleet(self._checkpointDir, numWorkers=2) as fleet:
+      with self.assertRaises(ModelFleetWorkerError):
+        fleet.run([("unknown", {"value": 1.0})])
+
+      # The workers keep running
+      fleet.createModel("m1", MODEL_CONFIG)
+      result, = fleet.run([("m1", {"value": 1.0})])
+      self.assertEqual(result.predictionNumber, 0)
+
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,159 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""Unit tests for the runtime_stats module."""
+
+import unittest2 as unittest
+
+from nupic.frameworks.opf.runtime_stats import (LatencyHistogram,
+                                                RuntimeStats, NULL_PHASE)
+
+
+
+class LatencyHistogramTest(unittest.TestCase):
+
+
+  def testEmpty(self):
+    histogram = LatencyHistogram()
+    self.assertEqual(histogram.count, 0)
+    self.assertIsNone(histogram.mean())
+    self.assertIsNone(histogram.percentile(50))
+
+
+  def testPercentiles(self):
+    histogram = LatencyHistogram(bucketsPerDoubling=16)
+    # 1ms to 1s
+    for i in xrange(1, 1001):
+      histogram.record(i * 1e-3)
+
+    self.assertEqual(histogram.count, 1000)
+    self.assertAlmostEqual(histogram.mean(), 0.5005)
+    self.assertEqual(histogram.min, 1e-3)
+    self.assertEqual(histogram.max, 1.0)
+
+    ratio = 2 ** (1.0 / 16)
+    for percent, expected in ((50, 0.5), (90, 0.9), (99, 0.99)):
+      value = histogram.percentile(percent)
+      self.assertGreaterEqual(value, expected)
+      self.assertLessEqual(value, expected * ratio)
+
+    self.assertGreaterEqual(histogram.percentile(0), 1e-3)
+    self.assertLessEqual(histogram.percentile(0), 1e-3 * ratio)
+    self.assertEqual(histogram.percentile(100), 1.0)
+    self.assertRaises(ValueError, histogram.percentile, 101)
+
+
+  def testOutOfRangeValues(self):
+    histogram = LatencyHistogram(minValue=1e-3, maxValue=1.0)
+    histogram.record(1e-5)
+    histogram.record(50.0)
+
+    self.assertEqual(histogram.percentile(50), 1e-3)
+    self.assertEqual(histogram.percentile(100), 50.0)
+
+
+  def testMerge(self):
+    histogram1 = LatencyHistogram()
+    histogram2 = LatencyHistogram()
+    merged = LatencyHistogram()
+    for i in xrange(1, 100):
+      histogram1.record(i * 1e-4)
+      histogram2.record(i * 1e-2)
+      merged.record(i * 1e-4)
+      merged.record(i * 1e-2)
+
+    histogram1.merge(histogram2)
+
+    self.assertEqual(histogram1.count, merged.count)
+    self.assertAlmostEqual(histogram1.total, merged.total)
+    self.assertEqual(histogram1.min, merged.min)
+    self.assertEqual(histogram1.max, merged.max)
+    for percent in (10, 50, 90):
+      self.assertEqual(histogram1.percentile(percent),
+                       merged.percentile(percent))
+
+    self.assertRaises(ValueError, histogram1.merge,
+                      LatencyHistogram(bucketsPerDoubling=8))
+
+
+
+class RuntimeStatsTest(unittest.TestCase):
+
+
+  def testPhases(self):
+    stats = RuntimeStats()
+    for _ in xrange(5):
+      with stats.phase("a"):
+        [[] for _ in xrange(100)]
+      with stats.phase("b"):
+        pass
+      stats.endRecord()
+
+    with NULL_PHASE:
+      pass
+
+    result = stats.getStats()
+    self.assertEqual(set(result.keys()), set(["a", "b"]))
+    self.assertEqual(stats.numRecords, 5)
+    for phaseStats in result.itervalues():
+      self.assertEqual(phaseStats["count"], 5)
+      self.assertGreaterEqual(phaseStats["totalTime"], 0)
+      self.assertLessEqual(phaseStats["minTime"], phaseStats["p50"])
+      self.assertLessEqual(phaseStats["p50"], phaseStats["p99.9"])
+      self.assertLessEqual(phaseStats["p99.9"], phaseStats["maxTime"])
+      self.assertGreaterEqual(phaseStats["allocations"], 0)
+
+    stats.reset()
+    self.assertEqual(stats.getStats(), {})
+    self.assertEqual(stats.numRecords, 0)
+
+
+  def testRecord(self):
+    stats = RuntimeStats()
+    stats.record("a", 0.25, 3)
+    stats.record("a", 0.75, 4)
+
+    result = stats.getStats()["a"]
+    self.assertEqual(result["count"], 2)
+    self.assertEqual(result["totalTime"], 1.0)
+    self.assertEqual(result["meanTime"], 0.5)
+    self.assertEqual(result["minTime"], 0.25)
+    self.assertEqual(result["maxTime"], 0.75)
+    self.assertEqual(result["allocations"], 7)
+
+
+  def testExportHook(self):
+    exported = []
+    stats = RuntimeStats(exportHook=exported.append, exportInterval=3)
+    for i in xrange(7):
+      stats.record("a", 0.001)
+      stats.endRecord()
+
+    self.assertEqual(len(exported), 2)
+    self.assertEqual(exported[0]["a"]["count"], 3)
+    self.assertEqual(exported[1]["a"]["count"], 6)
+
+    self.assertRaises(ValueError, RuntimeStats, exportInterval=0)
+
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -24,11 +24,23 @@
 import numpy
 import unittest2 as unittest
 
+from nupic.data.filters import DeltaFilter
 from nupic.engine import Network
 from nupic.regions.RecordSensor import RecordSensor
 
 
 
+class _RecordSource(object):
+  """Data source returning the same record, as CLAModel's DataBuffer does."""
+
+  def __init__(self, record):
+    self.record = record
+
+  def getNextRecordDict(self):
+    return self.record
+
+
+
 class RecordSensorRegionTest(unittest.TestCase):
   """RecordSensor region unit tests."""
 
@@ -74,5 +86,31 @@ class RecordSensorRegionTest(unittest.TestCase):
         "Sensor failed to populate the array w/ record of zero categories.")
 
 
+  def testGetNextRecordCopiesModifiedRecords(self):
+    sensor = RecordSensor()
+
+    # Records with the private keys are not copied without filters
+    record = {"_reset": 0, "_sequenceId": 0, "_category": [None], "x": 1.0}
+    sensor.dataSource = _RecordSource(record)
+    self.assertIs(sensor.getNextRecord(), record)
+
+    # Missing private keys are added to a copy
+    record = {"x": 1.0}
+    sensor.dataSource = _RecordSource(record)
+    data = sensor.getNextRecord()
+    self.assertEqual(record, {"x": 1.0})
+    self.assertEqual(data, {"_reset": 0, "_sequenceId": 0,
+                            "_category": [None], "x": 1.0})
+
+    # Pre-encoding filters modify a copy
+    record = {"_reset": 0, "_sequenceId": 0, "_category": [None], "x": 1.0}
+    sensor.dataSource = _RecordSource(record)
+    sensor.preEncodingFilters = [DeltaFilter("x", "dx")]
+    data = sensor.getNextRecord()
+    self.assertEqual(data["dx"], 0.0)
+    self.assertEqual(record, {"_reset": 0, "_sequenceId": 0,
+                              "_category": [None], "x": 1.0})
+
+
 if __name__ == "__main__":
   unittest.main()
@@ -0,0 +1,172 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""Unit tests for ArrayConnections.
+
+This test extends the test for the Python Connections to ensure that both
+implementations and their tests stay in sync.
+"""
+
+import unittest
+
+from nupic.research.array_connections import ArrayConnections
+from nupic.research.connections import Connections
+
+# Don't import the ConnectionsTest directly or the unittest.main() will pick
+# it up and run it.
+import connections_test
+
+
+
+class ArrayConnectionsTest(connections_test.ConnectionsTest):
+
+
+  def setUp(self):
+    self._connectionsClass = ArrayConnections
+    self.connections = self._connectionsClass(2048 * 32)
+
+
+  def testGrowArrays(self):
+    connections = ArrayConnections(1024)
+    numSegments = 3 * ArrayConnections.INITIAL_CAPACITY
+
+    for i in xrange(numSegments):
+      self.assertEqual(connections.createSegment(i % 1024), i)
+      self.assertEqual(connections.createSynapse(i, (i * 7) % 1024, 0.5), i)
+
+    self.assertEqual(connections.numSegments(), numSegments)
+    self.assertEqual(connections.numSynapses(), numSegments)
+    self.assertEqual(connections.cellForSegment(numSegments - 1),
+                     (numSegments - 1) % 1024)
+    self.assertEqual(connections.dataForSynapse(numSegments - 1),
+                     (numSegments - 1, ((numSegments - 1) * 7) % 1024, 0.5))
+
+
+  def testCompact(self):
+    connections = self.connections
+
+    connections.createSegment(0)
+    connections.createSegment(10)
+    connections.createSynapse(0, 254, 0.1173)
+    connections.createSynapse(0, 477, 0.3253)
+    connections.createSynapse(1, 254, 0.5)
+    connections.createSynapse(1, 12, 0.25)
+    connections.destroySynapse(0)
+    connections.destroySynapse(2)
+
+    self.assertEqual(connections.numSynapses(), 2)
+    self.assertEqual(connections.numDestroyedSynapses(), 2)
+
+    connections.compact()
+
+    self.assertEqual(connections.numSynapses(), 2)
+    self.assertEqual(connections.numDestroyedSynapses(), 0)
+    self.assertEqual(connections.synapsesForSegment(0), set([0]))
+    self.assertEqual(connections.synapsesForSegment(1), set([1]))
+    self.assertEqual(connections.dataForSynapse(0), (0, 477, 0.3253))
+    self.assertEqual(connections.dataForSynapse(1), (1, 12, 0.25))
+    self.assertEqual(connections.synapsesForPresynapticCell(254), {})
+    self.assertEqual(connections.synapsesForPresynapticCell(12),
+                     {1: (1, 12, 0.25)})
+
+    args = [2]
+    self.assertRaises(IndexError, connections.dataForSynapse, *args)
+
+    # New synapses are numbered after the compacted ones
+    self.assertEqual(connections.createSynapse(1, 13, 0.5), 2)
+
+
+  def testSynapseIndicesForPresynapticCells(self):
+    connections = self.connections
+
+    connections.createSegment(0)
+    connections.createSynapse(0, 254, 0.1)
+    connections.createSynapse(0, 12, 0.2)
+    connections.createSynapse(0, 254, 0.3)
+    self.assertListEqual(
+      list(connections.synapseIndicesForPresynapticCells([254, 12, 1000])),
+      [0, 2, 1])
+
+    # Synapses created or destroyed after the index was built
+    connections.createSynapse(0, 12, 0.4)
+    connections.destroySynapse(0)
+    self.assertListEqual(
+      list(connections.synapseIndicesForPresynapticCells([254, 12])),
+      [2, 1, 3])
+
+    connections.compact()
+    self.assertListEqual(
+      list(connections.synapseIndicesForPresynapticCells([254, 12])),
+      [1, 0, 2])
+    self.assertListEqual(
+      list(connections.synapseIndicesForPresynapticCells([])), [])
+
+
+  def testComputeActivity(self):
+    connections = self.connections
+
+    connections.createSegment(0)
+    connections.createSynapse(0, 23, 0.6)
+    connections.createSynapse(0, 37, 0.5)
+    connections.createSynapse(0, 477, 0.9)
+
+    connections.createSegment(1)
+    connections.createSynapse(1, 733, 0.7)
+    connections.createSynapse(1, 733, 0.4)
+    connections.createSynapse(1, 23, 0.0)
+
+    connections.createSegment(1)
+    connections.createSynapse(2, 974, 0.9)
+    connections.destroySegment(2)
+
+    connections.createSegment(8)
+    connections.createSynapse(3, 486, 0.9)
+
+    (numActiveConnectedSynapsesForSegment,
+     numActivePotentialSynapsesForSegment) = connections.computeActivity(
+       set([23, 37, 733, 974, 1000]), 0.5)
+
+    self.assertListEqual(list(numActiveConnectedSynapsesForSegment),
+                         [2, 1, 0, 0])
+    self.assertListEqual(list(numActivePotentialSynapsesForSegment),
+                         [2, 2, 0, 0])
+
+
+  def testEqualToConnections(self):
+    connections = self.connections
+    other = Connections(2048 * 32)
+
+    for c in (connections, other):
+      c.createSegment(0)
+      c.createSegment(5)
+      c.createSynapse(0, 254, 0.1173)
+      c.createSynapse(1, 477, 0.3253)
+      c.createSynapse(1, 4, 0.3253)
+      c.updateSynapsePermanence(2, 0.9)
+      c.destroySynapse(1)
+
+    self.assertEqual(connections, other)
+    self.assertEqual(other, connections)
+
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -42,7 +42,8 @@ class ConnectionsTest(unittest.TestCase):
 
 
   def setUp(self):
-    self.connections = Connections(2048 * 32)
+    self._connectionsClass = Connections
+    self.connections = self._connectionsClass(2048 * 32)
 
 
   def testCreateSegment(self):
@@ -223,7 +224,7 @@ class ConnectionsTest(unittest.TestCase):
   @unittest.skipUnless(
       capnp, "pycapnp is not installed, skipping serialization test.")
   def testWriteRead(self):
-    c1 = Connections(1024)
+    c1 = self._connectionsClass(1024)
 
     # Add data before serializing
     c1.createSegment(0)
@@ -253,7 +254,8 @@ class ConnectionsTest(unittest.TestCase):
       proto2 = ConnectionsProto_capnp.ConnectionsProto.read(f)
 
     # Load the deserialized proto
-    c2 = Connections.read(proto2)
+    c2 = self._connectionsClass.read(proto2)
+    self.assertEqual(type(c1), type(c2))
 
     # Check that the two connections objects are functionally equal
     self.assertEqual(c1, c2)
@@ -125,5 +125,60 @@ class SpatialPoolerComputeTest(unittest.TestCase):
     self.basicComputeLoop('cpp', params, inputSize, columnDimensions)
 
 
+  def testComputeBatchMatchesCompute(self):
+    """
+    computeBatch should produce exactly the same outputs as calling compute
+    once per record, both with and without learning.
+    """
+    inputSize = 100
+    columnDimensions = 200
+    numRecords = 50
+
+    params = {
+      "inputDimensions": [inputSize],
+      "columnDimensions": [columnDimensions],
+      "potentialRadius": inputSize,
+      'globalInhibition': True,
+      "seed": 42,
+    }
+    randomState = getNumpyRandomGenerator(42)
+    inputMatrix = (
+      randomState.rand(numRecords, inputSize) > 0.8).astype(uintType)
+
+    sp1 = CreateSP('py', params)
+    sp2 = CreateSP('py', params)
+
+    for learn in (True, False):
+      expected = numpy.zeros((numRecords, columnDimensions), dtype=uintType)
+      for i, v in enumerate(inputMatrix):
+        sp1.compute(v, learn, expected[i])
+
+      actual = numpy.zeros((numRecords, columnDimensions), dtype=uintType)
+      sp2.computeBatch(inputMatrix, learn, actual)
+
+      self.assertTrue(numpy.array_equal(expected, actual))
+      self.assertEqual(sp1.getIterationNum(), sp2.getIterationNum())
+      self.assertEqual(sp1.getIterationLearnNum(),
+                       sp2.getIterationLearnNum())
+
+
+  def testComputeBatchBadShape(self):
+    params = {
+      "inputDimensions": [10],
+      "columnDimensions": [20],
+      "potentialRadius": 10,
+      'globalInhibition': True,
+    }
+    sp = CreateSP('py', params)
+    activeMatrix = numpy.zeros((3, 20), dtype=uintType)
+
+    with self.assertRaises(ValueError):
+      sp.computeBatch(numpy.zeros((3, 11), dtype=uintType), False,
+                      activeMatrix)
+    with self.assertRaises(ValueError):
+      sp.computeBatch(numpy.zeros((4, 10), dtype=uintType), False,
+                      activeMatrix)
+
+
 if __name__ == "__main__":
   unittest.main()
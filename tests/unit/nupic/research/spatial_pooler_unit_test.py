@@ -1295,6 +1295,29 @@ class SpatialPoolerTest(unittest.TestCase):
     self.assertListEqual(trueActive, sorted(active))
 
 
+  def testInhibitColumnsGlobalTieBreaking(self):
+    """
+    Tests that global inhibition returns the winners ordered by decreasing
+    overlap, breaking ties in favor of the lower column index, the same as a
+    stable full sort of the overlaps.
+    """
+    sp = self._sp
+    sp._numColumns = 10
+    overlaps = numpy.array([3, 5, 3, 1, 5, 3, 0, 3, 5, 1])
+    active = sp._inhibitColumnsGlobal(overlaps, 0.5)
+    self.assertListEqual([1, 4, 8, 0, 2], active)
+
+    randomState = getNumpyRandomGenerator()
+    sp._numColumns = 1000
+    for density in (0.0, 0.02, 0.1, 0.5):
+      overlaps = randomState.randint(0, 10, sp._numColumns)
+      trueActive = sorted(range(overlaps.size),
+                          key=lambda k: overlaps[k],
+                          reverse=True)[0:int(density * sp._numColumns)]
+      active = sp._inhibitColumnsGlobal(overlaps, density)
+      self.assertListEqual(trueActive, active)
+
+
   def testInhibitColumnsLocal(self):
     sp = self._sp
     density = 0.5
@@ -1329,6 +1352,55 @@ class SpatialPoolerTest(unittest.TestCase):
     self.assertListEqual(trueActive, sorted(active))
 
 
+  def testInhibitColumnsLocal2D(self):
+    """
+    Tests that local inhibition over the precomputed neighborhood index picks
+    the same winners as checking each column's neighbors in turn, including
+    the overlap raise applied to earlier winners.
+    """
+    sp = self._sp
+    randomState = getNumpyRandomGenerator()
+    sp._columnDimensions = numpy.array([20, 15])
+    sp._numColumns = 300
+
+    for radius, density in ((1, 0.2), (3, 0.05), (5, 0.5)):
+      sp._inhibitionRadius = radius
+      overlaps = (randomState.randint(0, 5, sp._numColumns) +
+                  0.01 * randomState.random_sample(sp._numColumns))
+
+      trueActive = []
+      addToWinners = max(overlaps)/1000.0
+      trueOverlaps = numpy.array(overlaps, dtype=realDType)
+      for i in xrange(sp._numColumns):
+        neighbors = sp._getNeighborsND(i, sp._columnDimensions, radius)
+        numActive = int(0.5 + density * (len(neighbors) + 1))
+        if (numpy.count_nonzero(trueOverlaps[neighbors] > trueOverlaps[i]) <
+            numActive):
+          trueActive.append(i)
+          trueOverlaps[i] += addToWinners
+
+      active = sp._inhibitColumnsLocal(overlaps, density)
+      self.assertListEqual(trueActive, active)
+
+
+  def testGetNeighborhoodIndex(self):
+    """
+    Tests that the precomputed neighborhood index holds the same neighbors as
+    _getNeighborsND, padded with the column itself.
+    """
+    sp = self._sp
+    for dimensions, radius in (([10], 2), ([6, 7], 1), ([6, 7], 3),
+                               ([4, 3, 5], 2), ([5, 1], 2)):
+      dimensions = numpy.array(dimensions)
+      neighbors, numNeighbors = sp._getNeighborhoodIndex(dimensions, radius)
+      for i in xrange(dimensions.prod()):
+        trueNeighbors = sp._getNeighborsND(i, dimensions, radius)
+        row = [n for n in neighbors[i] if n != i]
+        self.assertEqual(len(trueNeighbors), numNeighbors[i])
+        self.assertSetEqual(set(trueNeighbors), set(row))
+        self.assertEqual(len(trueNeighbors), len(row))
+
+
   def testGetNeighbors1D(self):
     """
     Test that _getNeighbors static method correctly computes
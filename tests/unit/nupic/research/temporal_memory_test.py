@@ -24,11 +24,13 @@ TODO: Mock out all function calls.
 TODO: Make default test TM instance simpler, with 4 cells per column.
 """
 
+import cPickle as pickle
 import tempfile
 import unittest
 
 from nupic.data.generators.pattern_machine import PatternMachine
 from nupic.data.generators.sequence_machine import SequenceMachine
+from nupic.research.array_connections import ArrayConnections
 from nupic.research.temporal_memory import TemporalMemory
 
 try:
@@ -314,6 +316,76 @@ class TemporalMemoryTest(unittest.TestCase):
     self.assertEqual(matchingCells, set([0,1]))
 
 
+  def testComputePredictiveCellsVectorized(self):
+    tm = TemporalMemory(activationThreshold=2, minThreshold=2, predictedSegmentDecrement=0.004)
+
+    connections = ArrayConnections(tm.numberOfCells())
+    connections.createSegment(0)
+    connections.createSynapse(0, 23, 0.6)
+    connections.createSynapse(0, 37, 0.5)
+    connections.createSynapse(0, 477, 0.9)
+
+    connections.createSegment(1)
+    connections.createSynapse(1, 733, 0.7)
+    connections.createSynapse(1, 733, 0.4)
+
+    connections.createSegment(1)
+    connections.createSynapse(2, 974, 0.9)
+
+    connections.createSegment(8)
+    connections.createSynapse(3, 486, 0.9)
+
+    connections.createSegment(100)
+
+    activeCells = set([23, 37, 733, 974])
+
+    (activeSegments,
+     predictiveCells,
+     matchingSegments,
+     matchingCells) = tm.computePredictiveCells(activeCells, connections)
+    self.assertEqual(activeSegments, set([0]))
+    self.assertEqual(predictiveCells, set([0]))
+    self.assertEqual(matchingSegments, set([0,1]))
+    self.assertEqual(matchingCells, set([0,1]))
+
+
+  def testComputeWithArrayConnections(self):
+    params = {
+      "columnDimensions": [100],
+      "cellsPerColumn": 4,
+      "activationThreshold": 3,
+      "minThreshold": 2,
+      "predictedSegmentDecrement": 0.01,
+      "seed": 42
+    }
+    tm1 = TemporalMemory(**params)
+    tm2 = TemporalMemory(connectionsClass=ArrayConnections, **params)
+    self.assertIsInstance(tm2.connections, ArrayConnections)
+
+    patternMachine = PatternMachine(100, 4)
+    sequenceMachine = SequenceMachine(patternMachine)
+    sequence = sequenceMachine.generateFromNumbers(range(5))
+    for _ in range(3):
+      for pattern in sequence:
+        tm1.compute(pattern)
+        tm2.compute(pattern)
+        self.assertEqual(tm1.activeCells, tm2.activeCells)
+        self.assertEqual(tm1.predictiveCells, tm2.predictiveCells)
+        self.assertEqual(tm1.activeSegments, tm2.activeSegments)
+        self.assertEqual(tm1.matchingSegments, tm2.matchingSegments)
+        self.assertEqual(tm1.matchingCells, tm2.matchingCells)
+
+    self.assertEqual(tm1.connections, tm2.connections)
+
+    tm3 = pickle.loads(pickle.dumps(tm2, pickle.HIGHEST_PROTOCOL))
+    self.assertIs(tm3.connectionsClass, ArrayConnections)
+    self.assertIsInstance(tm3.connections, ArrayConnections)
+    for pattern in sequence:
+      tm2.compute(pattern)
+      tm3.compute(pattern)
+      self.assertEqual(tm2.predictiveCells, tm3.predictiveCells)
+
+
   def testBestMatchingCell(self):
     tm = TemporalMemory(
       connectedPermanence=0.50,
@@ -690,6 +762,24 @@ class TemporalMemoryTest(unittest.TestCase):
     self.assertEqual(tm1.connections, tm2.connections)
 
 
+  @unittest.skipUnless(
+      capnp, "pycapnp is not installed, skipping serialization test.")
+  def testWriteReadArrayConnections(self):
+    tm1 = TemporalMemory(columnDimensions=[100], cellsPerColumn=4,
+                         connectionsClass=ArrayConnections)
+    patternMachine = PatternMachine(100, 4)
+    sequence = SequenceMachine(patternMachine).generateFromNumbers(range(5))
+    for pattern in sequence:
+      tm1.compute(pattern)
+
+    proto = TemporalMemoryProto_capnp.TemporalMemoryProto.new_message()
+    tm1.write(proto)
+    tm2 = TemporalMemory.read(proto, connectionsClass=ArrayConnections)
+
+    self.assertIsInstance(tm2.connections, ArrayConnections)
+    self.assertEqual(tm1, tm2)
+
+
 
 if __name__ == '__main__':
   unittest.main()